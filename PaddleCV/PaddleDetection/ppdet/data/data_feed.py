@@ -73,6 +73,11 @@ def _prepare_data_config(feed, args_path):
     if feed.mode == 'TRAIN':
         data_config['CLASS_AWARE_SAMPLING'] = getattr(
             feed, 'class_aware_sampling', False)
+        grouping = getattr(feed, 'aspect_ratio_grouping', False)
+        if grouping:
+            data_config['ASPECT_RATIO_BINS'] = [1.] if grouping is True \
+                else list(grouping)
+            data_config['BATCH_SIZE'] = feed.batch_size
 
     if len(getattr(feed.dataset, 'images', [])) > 0:
         data_config['IMAGES'] = feed.dataset.images
@@ -97,16 +102,28 @@ def create_reader(feed, max_iter=0, args_path=None, my_source=None):
     bufsize = getattr(feed, 'bufsize', 10)
     use_process = getattr(feed, 'use_process', False)
     memsize = getattr(feed, 'memsize', '3G')
+    zero_copy = getattr(feed, 'zero_copy', False)
+    preserve_order = getattr(feed, 'preserve_order', False)
+    batch_in_worker = getattr(feed, 'batch_in_worker', False)
+    if 'ASPECT_RATIO_BINS' in data_config and not batch_in_worker:
+        # keep the grouped batches of source, which are batched after
+        # samples are mapped by workers
+        preserve_order = True
+    seed = getattr(feed, 'seed', None)
     transform_config = {
         'WORKER_CONF': {
             'bufsize': bufsize,
             'worker_num': feed.num_workers,
             'use_process': use_process,
-            'memsize': memsize
+            'memsize': memsize,
+            'zero_copy': zero_copy,
+            'preserve_order': preserve_order,
+            'seed': seed
         },
         'BATCH_SIZE': feed.batch_size,
         'DROP_LAST': feed.drop_last,
         'USE_PADDED_IM_INFO': feed.use_padded_im_info,
+        'BATCH_IN_WORKER': batch_in_worker,
     }
 
     batch_transforms = feed.batch_transforms
@@ -306,6 +323,19 @@ class DataFeed(object):
         use_process (bool): use process or thread as workers
         memsize (str): size of shared memory used in result queue
                         when 'use_process' is True, default to '3G'
+        zero_copy (bool): when 'use_process' is True, pass ndarrays of
+                        samples through shared memory without pickling
+        preserve_order (bool): output samples of workers in source order
+        batch_in_worker (bool): assemble and post-process whole batches
+                        in workers instead of in the main thread, batches
+                        which lost empty samples are topped up with the
+                        samples of the following ones in the main thread
+        seed (int): seed of random augmentations, samples are mapped with
+                        the same random state in every run if it's set
+        aspect_ratio_grouping (bool|list): batch images of the same aspect
+                        ratio (w / h) group to pad less pixels, True groups
+                        landscape and portrait images, a list gives the
+                        ratio thresholds between groups
     """
     __category__ = 'data'
 
@@ -325,7 +355,12 @@ class DataFeed(object):
                  use_process=False,
                  memsize=None,
                  use_padded_im_info=False,
-                 class_aware_sampling=False):
+                 class_aware_sampling=False,
+                 zero_copy=False,
+                 preserve_order=False,
+                 seed=None,
+                 batch_in_worker=False,
+                 aspect_ratio_grouping=False):
         super(DataFeed, self).__init__()
         self.fields = fields
         self.image_shape = image_shape
@@ -343,6 +378,11 @@ class DataFeed(object):
         self.dataset = dataset
         self.use_padded_im_info = use_padded_im_info
         self.class_aware_sampling = class_aware_sampling
+        self.zero_copy = zero_copy
+        self.preserve_order = preserve_order
+        self.seed = seed
+        self.batch_in_worker = batch_in_worker
+        self.aspect_ratio_grouping = aspect_ratio_grouping
         if isinstance(dataset, dict):
             self.dataset = DataSet(**dataset)
 
@@ -366,7 +406,12 @@ class TrainFeed(DataFeed):
                  num_workers=2,
                  bufsize=10,
                  use_process=True,
-                 memsize=None):
+                 memsize=None,
+                 zero_copy=False,
+                 preserve_order=False,
+                 seed=None,
+                 batch_in_worker=False,
+                 aspect_ratio_grouping=False):
         super(TrainFeed, self).__init__(
             dataset,
             fields,
@@ -381,7 +426,12 @@ class TrainFeed(DataFeed):
             num_workers=num_workers,
             bufsize=bufsize,
             use_process=use_process,
-            memsize=memsize)
+            memsize=memsize,
+            zero_copy=zero_copy,
+            preserve_order=preserve_order,
+            seed=seed,
+            batch_in_worker=batch_in_worker,
+            aspect_ratio_grouping=aspect_ratio_grouping)
 
 
 @register
@@ -399,7 +449,9 @@ class EvalFeed(DataFeed):
                  samples=-1,
                  drop_last=False,
                  with_background=True,
-                 num_workers=2):
+                 num_workers=2,
+                 preserve_order=False,
+                 seed=None):
         super(EvalFeed, self).__init__(
             dataset,
             fields,
@@ -411,7 +463,9 @@ class EvalFeed(DataFeed):
             samples=samples,
             drop_last=drop_last,
             with_background=with_background,
-            num_workers=num_workers)
+            num_workers=num_workers,
+            preserve_order=preserve_order,
+            seed=seed)
 
 
 @register
@@ -428,7 +482,9 @@ class TestFeed(DataFeed):
                  shuffle=False,
                  drop_last=False,
                  with_background=True,
-                 num_workers=2):
+                 num_workers=2,
+                 preserve_order=False,
+                 seed=None):
         super(TestFeed, self).__init__(
             dataset,
             fields,
@@ -439,7 +495,9 @@ class TestFeed(DataFeed):
             shuffle=shuffle,
             drop_last=drop_last,
             with_background=with_background,
-            num_workers=num_workers)
+            num_workers=num_workers,
+            preserve_order=preserve_order,
+            seed=seed)
 
 
 # yapf: disable
@@ -473,7 +531,12 @@ class FasterRCNNTrainFeed(DataFeed):
                  num_workers=2,
                  use_process=False,
                  memsize=None,
-                 class_aware_sampling=False):
+                 class_aware_sampling=False,
+                 zero_copy=False,
+                 preserve_order=False,
+                 seed=None,
+                 batch_in_worker=False,
+                 aspect_ratio_grouping=False):
         # XXX this should be handled by the data loader, since `fields` is
         # given, just collect them
         sample_transforms.append(ArrangeRCNN())
@@ -491,7 +554,12 @@ class FasterRCNNTrainFeed(DataFeed):
             num_workers=num_workers,
             use_process=use_process,
             memsize=memsize,
-            class_aware_sampling=class_aware_sampling)
+            class_aware_sampling=class_aware_sampling,
+            zero_copy=zero_copy,
+            preserve_order=preserve_order,
+            seed=seed,
+            batch_in_worker=batch_in_worker,
+            aspect_ratio_grouping=aspect_ratio_grouping)
         # XXX these modes should be unified
         self.mode = 'TRAIN'
 
@@ -524,7 +592,9 @@ class FasterRCNNEvalFeed(DataFeed):
                  use_padded_im_info=True,
                  enable_multiscale=False,
                  num_scale=1,
-                 enable_aug_flip=False):
+                 enable_aug_flip=False,
+                 preserve_order=False,
+                 seed=None):
         sample_transforms.append(ArrangeEvalRCNN())
         super(FasterRCNNEvalFeed, self).__init__(
             dataset,
@@ -537,7 +607,9 @@ class FasterRCNNEvalFeed(DataFeed):
             samples=samples,
             drop_last=drop_last,
             num_workers=num_workers,
-            use_padded_im_info=use_padded_im_info)
+            use_padded_im_info=use_padded_im_info,
+            preserve_order=preserve_order,
+            seed=seed)
         self.mode = 'VAL'
         self.enable_multiscale = enable_multiscale
         self.num_scale = num_scale
@@ -567,7 +639,9 @@ class FasterRCNNTestFeed(DataFeed):
                  samples=-1,
                  drop_last=False,
                  num_workers=2,
-                 use_padded_im_info=True):
+                 use_padded_im_info=True,
+                 preserve_order=False,
+                 seed=None):
         sample_transforms.append(ArrangeTestRCNN())
         if isinstance(dataset, dict):
             dataset = SimpleDataSet(**dataset)
@@ -582,7 +656,9 @@ class FasterRCNNTestFeed(DataFeed):
             samples=samples,
             drop_last=drop_last,
             num_workers=num_workers,
-            use_padded_im_info=use_padded_im_info)
+            use_padded_im_info=use_padded_im_info,
+            preserve_order=preserve_order,
+            seed=seed)
         self.mode = 'TEST'
 
 
@@ -620,7 +696,10 @@ class MaskRCNNTrainFeed(DataFeed):
                  drop_last=False,
                  num_workers=2,
                  use_process=False,
-                 use_padded_im_info=False):
+                 use_padded_im_info=False,
+                 preserve_order=False,
+                 seed=None,
+                 aspect_ratio_grouping=False):
         sample_transforms.append(ArrangeRCNN(is_mask=True))
         super(MaskRCNNTrainFeed, self).__init__(
             dataset,
@@ -633,7 +712,10 @@ class MaskRCNNTrainFeed(DataFeed):
             samples=samples,
             drop_last=drop_last,
             num_workers=num_workers,
-            use_process=use_process)
+            use_process=use_process,
+            preserve_order=preserve_order,
+            seed=seed,
+            aspect_ratio_grouping=aspect_ratio_grouping)
         self.mode = 'TRAIN'
 
 
@@ -668,7 +750,9 @@ class MaskRCNNEvalFeed(DataFeed):
                  use_padded_im_info=True,
                  enable_multiscale=False,
                  num_scale=1,
-                 enable_aug_flip=False):
+                 enable_aug_flip=False,
+                 preserve_order=False,
+                 seed=None):
         sample_transforms.append(ArrangeTestRCNN())
         super(MaskRCNNEvalFeed, self).__init__(
             dataset,
@@ -682,7 +766,9 @@ class MaskRCNNEvalFeed(DataFeed):
             drop_last=drop_last,
             num_workers=num_workers,
             use_process=use_process,
-            use_padded_im_info=use_padded_im_info)
+            use_padded_im_info=use_padded_im_info,
+            preserve_order=preserve_order,
+            seed=seed)
         self.mode = 'VAL'
         self.enable_multiscale = enable_multiscale
         self.num_scale = num_scale
@@ -714,7 +800,9 @@ class MaskRCNNTestFeed(DataFeed):
                  drop_last=False,
                  num_workers=2,
                  use_process=False,
-                 use_padded_im_info=True):
+                 use_padded_im_info=True,
+                 preserve_order=False,
+                 seed=None):
         sample_transforms.append(ArrangeTestRCNN())
         if isinstance(dataset, dict):
             dataset = SimpleDataSet(**dataset)
@@ -730,7 +818,9 @@ class MaskRCNNTestFeed(DataFeed):
             drop_last=drop_last,
             num_workers=num_workers,
             use_process=use_process,
-            use_padded_im_info=use_padded_im_info)
+            use_padded_im_info=use_padded_im_info,
+            preserve_order=preserve_order,
+            seed=seed)
         self.mode = 'TEST'
 
 
@@ -772,7 +862,11 @@ class SSDTrainFeed(DataFeed):
                  num_workers=8,
                  bufsize=10,
                  use_process=True,
-                 memsize=None):
+                 memsize=None,
+                 zero_copy=False,
+                 preserve_order=False,
+                 seed=None,
+                 batch_in_worker=False):
         sample_transforms.append(ArrangeSSD())
         super(SSDTrainFeed, self).__init__(
             dataset,
@@ -787,7 +881,11 @@ class SSDTrainFeed(DataFeed):
             num_workers=num_workers,
             bufsize=bufsize,
             use_process=use_process,
-            memsize=None)
+            memsize=None,
+            zero_copy=zero_copy,
+            preserve_order=preserve_order,
+            seed=seed,
+            batch_in_worker=batch_in_worker)
         self.mode = 'TRAIN'
 
 
@@ -819,7 +917,9 @@ class SSDEvalFeed(DataFeed):
             num_workers=8,
             bufsize=10,
             use_process=False,
-            memsize=None):
+            memsize=None,
+            preserve_order=False,
+            seed=None):
         sample_transforms.append(ArrangeEvalSSD(fields))
         super(SSDEvalFeed, self).__init__(
             dataset,
@@ -834,7 +934,9 @@ class SSDEvalFeed(DataFeed):
             num_workers=num_workers,
             bufsize=bufsize,
             use_process=use_process,
-            memsize=memsize)
+            memsize=memsize,
+            preserve_order=preserve_order,
+            seed=seed)
         self.mode = 'VAL'
 
 
@@ -863,7 +965,9 @@ class SSDTestFeed(DataFeed):
                  num_workers=8,
                  bufsize=10,
                  use_process=False,
-                 memsize=None):
+                 memsize=None,
+                 preserve_order=False,
+                 seed=None):
         sample_transforms.append(ArrangeTestSSD())
         if isinstance(dataset, dict):
             dataset = SimpleDataSet(**dataset)
@@ -880,7 +984,9 @@ class SSDTestFeed(DataFeed):
             num_workers=num_workers,
             bufsize=bufsize,
             use_process=use_process,
-            memsize=memsize)
+            memsize=memsize,
+            preserve_order=preserve_order,
+            seed=seed)
         self.mode = 'TEST'
 
 
@@ -931,7 +1037,11 @@ class YoloTrainFeed(DataFeed):
                  memsize=None,
                  num_max_boxes=50,
                  mixup_epoch=250,
-                 class_aware_sampling=False):
+                 class_aware_sampling=False,
+                 zero_copy=False,
+                 preserve_order=False,
+                 seed=None,
+                 batch_in_worker=False):
         sample_transforms.append(ArrangeYOLO())
         super(YoloTrainFeed, self).__init__(
             dataset,
@@ -948,7 +1058,11 @@ class YoloTrainFeed(DataFeed):
             bufsize=bufsize,
             use_process=use_process,
             memsize=memsize,
-            class_aware_sampling=class_aware_sampling)
+            class_aware_sampling=class_aware_sampling,
+            zero_copy=zero_copy,
+            preserve_order=preserve_order,
+            seed=seed,
+            batch_in_worker=batch_in_worker)
         self.num_max_boxes = num_max_boxes
         self.mixup_epoch = mixup_epoch
         self.mode = 'TRAIN'
@@ -983,7 +1097,9 @@ class YoloEvalFeed(DataFeed):
                  num_workers=8,
                  num_max_boxes=50,
                  use_process=False,
-                 memsize=None):
+                 memsize=None,
+                 preserve_order=False,
+                 seed=None):
         sample_transforms.append(ArrangeEvalYOLO())
         super(YoloEvalFeed, self).__init__(
             dataset,
@@ -998,7 +1114,9 @@ class YoloEvalFeed(DataFeed):
             with_background=with_background,
             num_workers=num_workers,
             use_process=use_process,
-            memsize=memsize)
+            memsize=memsize,
+            preserve_order=preserve_order,
+            seed=seed)
         self.num_max_boxes = num_max_boxes
         self.mode = 'VAL'
         self.bufsize = 128
@@ -1038,7 +1156,9 @@ class YoloTestFeed(DataFeed):
                  num_workers=8,
                  num_max_boxes=50,
                  use_process=False,
-                 memsize=None):
+                 memsize=None,
+                 preserve_order=False,
+                 seed=None):
         sample_transforms.append(ArrangeTestYOLO())
         if isinstance(dataset, dict):
             dataset = SimpleDataSet(**dataset)
@@ -1055,7 +1175,9 @@ class YoloTestFeed(DataFeed):
             with_background=with_background,
             num_workers=num_workers,
             use_process=use_process,
-            memsize=memsize)
+            memsize=memsize,
+            preserve_order=preserve_order,
+            seed=seed)
         self.mode = 'TEST'
         self.bufsize = 128
 
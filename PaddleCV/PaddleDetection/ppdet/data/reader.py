@@ -25,7 +25,9 @@ from numbers import Integral
 
 import logging
 from .source import build_source
-from .transform import build_mapper, map, batch, batch_map
+from .transform import build_mapper, build_batch_mapper, map, batch, top_up
+from .transform.post_map import build_post_map, padding_waste
+from .transform.image_cache import merge_stats
 
 logger = logging.getLogger(__name__)
 
@@ -65,12 +67,6 @@ class Reader(object):
             worker_args = self._trans_conf[mode]['WORKER_CONF']
             worker_args = {k.lower(): v for k, v in worker_args.items()}
 
-        mapped_ds = map(sc, mapper, worker_args)
-        # In VAL mode, gt_bbox, gt_label can be empty, and should
-        # not be dropped
-        batched_ds = batch(
-            mapped_ds, batchsize, drop_last, drop_empty=(mode != "VAL"))
-
         trans_conf = {k.lower(): v for k, v in self._trans_conf[mode].items()}
         need_keys = {
             'is_padding',
@@ -86,7 +82,25 @@ class Reader(object):
             for key, value in trans_conf.items() if key in need_keys
         }
 
-        batched_ds = batch_map(batched_ds, bm_config)
+        # In VAL mode, gt_bbox, gt_label can be empty, and should
+        # not be dropped
+        drop_empty = mode != "VAL"
+        post_mapper = build_post_map(**bm_config)
+        if worker_args is not None and \
+                trans_conf.get('batch_in_worker', False):
+            # assemble and post-process batches in workers, so that
+            # only ready batches are fetched in main thread
+            batched_sc = batch(sc, batchsize, drop_last, drop_empty=False)
+            batch_mapper = build_batch_mapper(mapper, post_mapper, drop_empty)
+            batched_ds = map(batched_sc, batch_mapper, worker_args)
+            # batches which lost empty samples are topped up with the
+            # samples of the following ones in main thread
+            batched_ds = top_up(batched_ds, batchsize, post_mapper, drop_last)
+        else:
+            mapped_ds = map(sc, mapper, worker_args)
+            batched_ds = batch(
+                mapped_ds, batchsize, drop_last, drop_empty=drop_empty)
+            batched_ds = map(batched_ds, post_mapper)
 
         batched_ds.reset()
         if mode.lower() == 'train':
@@ -96,15 +110,28 @@ class Reader(object):
 
         # 3, Build a reader
         maxit = -1 if self._maxiter <= 0 else self._maxiter
+        # padding stats of batches padded in this process, batches padded
+        # by worker processes are not counted
+        padding_stats = post_mapper.padding_stats
 
         def _reader():
             n = 0
+            epoch_stats = dict(padding_stats)
             while True:
                 for _batch in batched_ds:
+                    if len(_batch) == 0:
+                        continue
                     yield _batch
                     n += 1
                     if maxit > 0 and n == maxit:
                         return
+                stats = {k: padding_stats[k] - v
+                         for k, v in epoch_stats.items()}
+                if stats['batches'] > 0:
+                    logger.info('padded {} batches of epoch, {:.1%} of '
+                                'pixels are padding'.format(
+                                    stats['batches'], padding_waste(stats)))
+                epoch_stats = dict(padding_stats)
                 batched_ds.reset()
                 if maxit <= 0:
                     return
@@ -112,6 +139,12 @@ class Reader(object):
         if hasattr(sc, 'get_imid2path'):
             _reader.imid2path = sc.get_imid2path()
 
+        _reader.padding_stats = lambda: dict(padding_stats)
+
+        if len(mapper.caches) > 0:
+            # hits, misses and cached bytes of decoded images
+            _reader.cache_stats = lambda: merge_stats(mapper.caches)
+
         return _reader
 
     def train(self):
@@ -22,6 +22,7 @@ from .roidb_source import RoiDbSource
 from .simple_source import SimpleSource
 from .iterator_source import IteratorSource
 from .class_aware_sampling_roidb_source import ClassAwareSamplingRoiDbSource
+from .aspect_ratio_grouped_roidb_source import AspectRatioGroupedRoiDbSource
 
 
 def build_source(config):
@@ -38,6 +39,8 @@ def build_source(config):
                 load_img (bool): should images be loaded
                 mixup_epoch (int): parse mixup in first n epoch
                 with_background (bool): whether load background as a class
+                aspect_ratio_bins (list of float): group batches of
+                    'batch_size' images by these aspect ratio thresholds
             cname2cid (dict): the label name to id dictionary
         }
     """
@@ -56,10 +59,15 @@ def build_source(config):
         if data_cf['type'] in ['VOCSource', 'COCOSource', 'RoiDbSource']:
             if 'class_aware_sampling' in args and args['class_aware_sampling']:
                 source_type = 'ClassAwareSamplingRoiDbSource'
+            elif args.get('aspect_ratio_bins'):
+                source_type = 'AspectRatioGroupedRoiDbSource'
             else:
                 source_type = 'RoiDbSource'
             if 'class_aware_sampling' in args:
                 del args['class_aware_sampling']
+            if source_type != 'AspectRatioGroupedRoiDbSource':
+                args.pop('aspect_ratio_bins', None)
+                args.pop('batch_size', None)
         else:
             source_type = data_cf['type']
         del args['type']
@@ -69,5 +77,7 @@ def build_source(config):
         return SimpleSource(**args)
     elif source_type == 'ClassAwareSamplingRoiDbSource':
         return ClassAwareSamplingRoiDbSource(**args)
+    elif source_type == 'AspectRatioGroupedRoiDbSource':
+        return AspectRatioGroupedRoiDbSource(**args)
     else:
         raise ValueError('source type not supported: ' + source_type)
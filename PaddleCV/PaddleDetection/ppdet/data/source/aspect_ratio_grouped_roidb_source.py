@@ -0,0 +1,152 @@
+# Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#function:
+#    interface to load roidb data whose consecutive batches are
+#    grouped by aspect ratio, so that less pixels are padded in batches
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import random
+
+import numpy as np
+from .roidb_source import RoiDbSource
+from .roidb_store import RoiDbStore
+
+
+def group_by_aspect_ratio(indexes,
+                          ratios,
+                          batch_size,
+                          bins=(1., ),
+                          shuffle=True,
+                          valid=None):
+    """ reorder 'indexes' so that every 'batch_size' consecutive indexes
+        are images of the same aspect ratio group
+
+    Args:
+        indexes (list of int): indexes of images in sampling order
+        ratios (np.ndarray): aspect ratios (w / h) of all images
+        batch_size (int): number of images of a batch
+        bins (list of float): thresholds of aspect ratios between groups,
+            (1., ) groups portrait and landscape images
+        shuffle (bool): shuffle the order of batches across groups,
+            otherwise the batches of a group follow each other
+        valid (np.ndarray): whether every image is kept in batches, the
+            images dropped in batching, e.g. images without boxes, are
+            put at the end so that they don't break the batches of groups
+
+    Returns:
+        list of int, the images of every group are in the order of
+        'indexes', and the incomplete batches of groups and the images
+        dropped in batching are at the end
+    """
+    indexes = np.asarray(indexes, dtype=np.int64)
+    groups = np.digitize(ratios[indexes], bins)
+    if valid is not None:
+        groups[~valid[indexes]] = -1
+    batches = []
+    rests = []
+    for group in np.unique(groups):
+        ids = indexes[groups == group]
+        if group < 0:
+            continue
+        num_full = len(ids) // batch_size * batch_size
+        if num_full > 0:
+            batches.extend(np.split(ids[:num_full], num_full // batch_size))
+        rests.append(ids[num_full:])
+    if shuffle:
+        random.shuffle(batches)
+    return np.concatenate(batches + rests + [indexes[groups < 0]]).tolist()
+
+
+class AspectRatioGroupedRoiDbSource(RoiDbSource):
+    """ interface to load roidb data in batches of images of the same
+        aspect ratio group
+    """
+
+    def __init__(self,
+                 anno_file,
+                 image_dir=None,
+                 samples=-1,
+                 is_shuffle=True,
+                 load_img=False,
+                 cname2cid=None,
+                 use_default_label=None,
+                 mixup_epoch=-1,
+                 with_background=True,
+                 batch_size=1,
+                 aspect_ratio_bins=(1., )):
+        """ Init
+
+        Args:
+            fname (str): label file path
+            image_dir (str): root dir for images
+            samples (int): samples to load, -1 means all
+            is_shuffle (bool): whether to shuffle samples
+            load_img (bool): whether load data in this class
+            cname2cid (dict): the label name to id dictionary
+            use_default_label (bool):whether use the default mapping of label to id
+            mixup_epoch (int): parse mixup in first n epoch
+            with_background (bool): whether load background 
+                                    as a class
+            batch_size (int): number of images of a batch
+            aspect_ratio_bins (list of float): thresholds of aspect ratios
+                                    (w / h) between groups
+        """
+        super(AspectRatioGroupedRoiDbSource, self).__init__(
+            anno_file=anno_file,
+            image_dir=image_dir,
+            samples=samples,
+            is_shuffle=is_shuffle,
+            load_img=load_img,
+            cname2cid=cname2cid,
+            use_default_label=use_default_label,
+            mixup_epoch=mixup_epoch,
+            with_background=with_background)
+        self._batch_size = batch_size
+        self._bins = sorted(aspect_ratio_bins)
+        self._ratios = None
+        self._has_box = None
+
+    def __str__(self):
+        return 'AspectRatioGroupedRoiDbSource(fname:%s,epoch:%d,size:%d,pos:%d)' \
+            % (self._fname, self._epoch, self.size(), self._pos)
+
+    def _get_aspect_ratios(self):
+        """ aspect ratios (w / h) of all images, 1 if the size is unknown,
+            and whether every image has boxes
+        """
+        if isinstance(self._roidb, RoiDbStore):
+            h, w = self._roidb.get_im_shapes()
+            offsets, _ = self._roidb.get_gt_classes()
+            has_box = np.diff(offsets) > 0
+        else:
+            h = np.array([rec['h'] for rec in self._roidb], dtype='float32')
+            w = np.array([rec['w'] for rec in self._roidb], dtype='float32')
+            has_box = np.array(
+                [len(rec['gt_bbox']) > 0 for rec in self._roidb], dtype=bool)
+        return np.where(h > 0, w / np.maximum(h, 1e-6), 1.), has_box
+
+    def reset(self):
+        """ implementation of Dataset.reset
+        """
+        super(AspectRatioGroupedRoiDbSource, self).reset()
+        if self._ratios is None:
+            self._ratios, self._has_box = self._get_aspect_ratios()
+        self._indexes = group_by_aspect_ratio(
+            self._indexes, self._ratios, self._batch_size, self._bins,
+            self._is_shuffle, self._has_box)
@@ -24,11 +24,11 @@ from __future__ import unicode_literals
 import os
 import random
 
-import copy
 import collections
 import pickle as pkl
 import numpy as np
 from .roidb_source import RoiDbSource
+from .roidb_store import RoiDbStore
 
 
 class ClassAwareSamplingRoiDbSource(RoiDbSource):
@@ -70,6 +70,9 @@ class ClassAwareSamplingRoiDbSource(RoiDbSource):
             mixup_epoch=mixup_epoch,
             with_background=with_background)
         self._img_weights = None
+        self._img_cdf = None
+        self._drawn = []
+        self._drawn_pos = 0
 
     def __str__(self):
         return 'ClassAwareSamplingRoidbSource(fname:%s,epoch:%d,size:%d)' \
@@ -81,9 +84,12 @@ class ClassAwareSamplingRoiDbSource(RoiDbSource):
         if self._epoch < 0:
             self.reset()
 
-        _pos = np.random.choice(
-            self._samples, 1, replace=False, p=self._img_weights)[0]
-        sample = copy.deepcopy(self._roidb[_pos])
+        if self._drawn_pos >= len(self._drawn):
+            self._drawn = self._draw_indexes(self._samples)
+            self._drawn_pos = 0
+        _pos = self._drawn[self._drawn_pos]
+        self._drawn_pos += 1
+        sample = self._get_record(_pos)
 
         if self._load_img:
             sample['image'] = self._load_image(sample['im_file'])
@@ -92,27 +98,47 @@ class ClassAwareSamplingRoiDbSource(RoiDbSource):
 
         return sample
 
+    def _draw_indexes(self, num):
+        """ draw 'num' indexes of images with probabilities of
+            image weights, which is what 'np.random.choice' does,
+            but amortizes the O(N) cost over 'num' samples
+        """
+        uniform = np.random.random_sample(num)
+        indexes = np.searchsorted(self._img_cdf, uniform, side='right')
+        # guard against rounding errors of the last cdf value
+        return np.minimum(indexes, self._samples - 1)
+
+    def _get_gt_classes(self):
+        """ get box offsets of images and classes of all boxes
+        """
+        if isinstance(self._roidb, RoiDbStore):
+            return self._roidb.get_gt_classes()
+        nums = [len(rec['gt_class']) for rec in self._roidb]
+        offsets = np.zeros(len(nums) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(nums)
+        if offsets[-1] == 0:
+            return offsets, np.zeros(0, dtype=np.int64)
+        classes = np.concatenate([
+            np.asarray(rec['gt_class']).reshape(-1) for rec in self._roidb
+        ]).astype(np.int64)
+        return offsets, classes
+
     def _calc_img_weights(self):
         """ calculate the probabilities of each sample
         """
-        imgs_cls = []
-        num_per_cls = {}
-        img_weights = []
-        for i, roidb in enumerate(self._roidb):
-            img_cls = set(
-                [k for cls in self._roidb[i]['gt_class'] for k in cls])
-            imgs_cls.append(img_cls)
-            for c in img_cls:
-                if c not in num_per_cls:
-                    num_per_cls[c] = 1
-                else:
-                    num_per_cls[c] += 1
-
-        for i in range(len(self._roidb)):
-            weights = 0
-            for c in imgs_cls[i]:
-                weights += 1 / num_per_cls[c]
-            img_weights.append(weights)
+        offsets, classes = self._get_gt_classes()
+        num_imgs = len(offsets) - 1
+        img_ids = np.repeat(np.arange(num_imgs), np.diff(offsets))
+        # unique (image, class) pairs are the CSR incidence of the
+        # image-class matrix, with rows sorted by image id
+        num_cls = int(classes.max()) + 1 if len(classes) > 0 else 1
+        pairs = np.unique(img_ids * num_cls + classes)
+        pair_imgs = pairs // num_cls
+        pair_cls = pairs % num_cls
+        num_per_cls = np.bincount(pair_cls, minlength=num_cls)
+        cls_weights = 1. / np.maximum(num_per_cls, 1)
+        img_weights = np.bincount(
+            pair_imgs, weights=cls_weights[pair_cls], minlength=num_imgs)
         # Probabilities sum to 1
         img_weights = img_weights / np.sum(img_weights)
         return img_weights
@@ -125,6 +151,7 @@ class ClassAwareSamplingRoiDbSource(RoiDbSource):
 
         if self._img_weights is None:
             self._img_weights = self._calc_img_weights()
+            self._img_cdf = np.cumsum(self._img_weights)
 
         self._samples = len(self._roidb)
 
@@ -26,6 +26,8 @@ import numpy as np
 import logging
 import pickle as pkl
 
+from .roidb_store import RoiDbStore, is_roidb_store
+
 logger = logging.getLogger(__name__)
 
 
@@ -82,6 +84,22 @@ def load_roidb(anno_file, sample_num=-1):
     return records, cname2cid
 
 
+def load_roidb_store(store_dir, sample_num=-1):
+    """ load records from 'store_dir' which is saved
+        by 'roidb_store.dump_roidb_store', the records are
+        memory-mapped and built lazily when accessed
+
+    Args:
+        store_dir (str): directory of the roidb store
+        sample_num (int): number of samples to load
+
+    Returns:
+        (records, cname2cid), 'records' is a list-like 'RoiDbStore'
+    """
+    records = RoiDbStore(store_dir, sample_num)
+    return records, records.cname2cid
+
+
 def load(fname,
          samples=-1,
          with_background=True,
@@ -92,7 +110,8 @@ def load(fname,
 
     Args:
         fnames (str): file name for data record, eg:
-            instances_val2017.json or COCO17_val2017.roidb
+            instances_val2017.json, COCO17_val2017.roidb or
+            a directory of roidb store
         samples (int): number of samples to load, default to all
         with_background (bool): whether load background as a class.
                                 default True.
@@ -115,7 +134,9 @@ def load(fname,
 
     """
 
-    if fname.endswith('.roidb'):
+    if is_roidb_store(fname):
+        records, cname2cid = load_roidb_store(fname, samples)
+    elif fname.endswith('.roidb'):
         records, cname2cid = load_roidb(fname, samples)
     elif fname.endswith('.json'):
         from . import coco_loader
@@ -136,7 +157,9 @@ def load(fname,
     else:
         raise ValueError('invalid file type when load data from file[%s]' %
                          (fname))
-    check_records(records)
+    if not is_roidb_store(fname):
+        # fields of records in roidb store are ensured when dumped
+        check_records(records)
     if with_cat2id:
         return records, cname2cid
     else:
@@ -27,6 +27,7 @@ import random
 import copy
 import pickle as pkl
 from ..dataset import Dataset
+from .roidb_store import RoiDbStore
 
 
 class RoiDbSource(Dataset):
@@ -67,6 +68,7 @@ class RoiDbSource(Dataset):
             assert os.path.isdir(image_dir), \
                     'image_dir {} is not a directory'.format(image_dir)
         self._roidb = None
+        self._indexes = None
         self._pos = -1
         self._drained = False
         self._samples = samples
@@ -90,7 +92,7 @@ class RoiDbSource(Dataset):
         if self._pos >= self._samples:
             self._drained = True
             raise StopIteration('%s no more data' % (str(self)))
-        sample = copy.deepcopy(self._roidb[self._pos])
+        sample = self._get_record(self._indexes[self._pos])
         if self._load_img:
             sample['image'] = self._load_image(sample['im_file'])
         else:
@@ -99,7 +101,7 @@ class RoiDbSource(Dataset):
         if self._epoch < self._mixup_epoch:
             mix_idx = random.randint(1, self._samples - 1)
             mix_pos = (mix_idx + self._pos) % self._samples
-            sample['mixup'] = copy.deepcopy(self._roidb[mix_pos])
+            sample['mixup'] = self._get_record(self._indexes[mix_pos])
             if self._load_img:
                 sample['mixup']['image'] = \
                         self._load_image(sample['mixup']['im_file'])
@@ -119,6 +121,14 @@ class RoiDbSource(Dataset):
         self.cname2cid = cname2cid
         return records
 
+    def _get_record(self, idx):
+        """ get a copy of record 'idx' which can be modified freely
+        """
+        if isinstance(self._roidb, RoiDbStore):
+            # a new record is built on each access of the store
+            return self._roidb[idx]
+        return copy.deepcopy(self._roidb[idx])
+
     def _load_image(self, where):
         fn = os.path.join(self._image_dir, where)
         with open(fn, 'rb') as f:
@@ -131,8 +141,10 @@ class RoiDbSource(Dataset):
             self._roidb = self._load()
 
         self._samples = len(self._roidb)
+        if self._indexes is None:
+            self._indexes = list(range(self._samples))
         if self._is_shuffle:
-            random.shuffle(self._roidb)
+            random.shuffle(self._indexes)
 
         if self._epoch < 0:
             self._epoch = 0
@@ -162,6 +174,12 @@ class RoiDbSource(Dataset):
         """return image id to image path map"""
         if self._imid2path is None:
             self._imid2path = {}
+            if isinstance(self._roidb, RoiDbStore):
+                for i, im_id in enumerate(self._roidb.get_im_ids()):
+                    im_path = os.path.join(self._image_dir,
+                                           self._roidb.get_im_file(i))
+                    self._imid2path[int(im_id)] = im_path
+                return self._imid2path
             for record in self._roidb:
                 im_id = record['im_id']
                 im_id = im_id if isinstance(im_id, int) else im_id[0]
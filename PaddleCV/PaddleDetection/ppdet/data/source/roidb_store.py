@@ -0,0 +1,302 @@
+# Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# function:
+#   a compact columnar format for roidb records, which is stored
+#   as a directory of '.npy' files and loaded by memory-mapping,
+#   so that all reader processes share the same physical pages
+#
+# layout of a store directory:
+#   meta.pkl            : version, number of records and cname2cid
+#   im_id.npy           : int64 [N]
+#   h.npy, w.npy        : float64 [N]
+#   im_file.npy         : uint8 [total bytes], utf-8 encoded file names
+#   im_file_offsets.npy : int64 [N + 1]
+#   box_offsets.npy     : int64 [N + 1], boxes of record i are
+#                         [box_offsets[i], box_offsets[i + 1])
+#   gt_bbox.npy         : float32 [M, 4]
+#   gt_class.npy, is_crowd.npy, difficult.npy : int32 [M, 1]
+#   gt_score.npy        : float32 [M, 1]
+#   has_poly.npy        : bool [N], False if 'gt_poly' is an empty list
+#   poly_kind.npy       : int8 [M], one of POLY_NONE/POLY_LIST/POLY_OBJECT
+#   poly_offsets.npy    : int64 [M + 1], index into 'seg_offsets'
+#   seg_offsets.npy     : int64 [P + 1], index into 'seg_coords'
+#   seg_coords.npy      : float64 [total coordinates]
+#   objects.pkl         : {box index: gt_poly} for polys which are not
+#                         a list of polygons (eg: RLE of crowd boxes)
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import logging
+import pickle as pkl
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['RoiDbStore', 'is_roidb_store', 'dump_roidb_store']
+
+STORE_VERSION = 1
+META_FILE = 'meta.pkl'
+OBJECTS_FILE = 'objects.pkl'
+
+POLY_NONE = 0
+POLY_LIST = 1
+POLY_OBJECT = 2
+
+# (field name, dtype, number of columns) of per-box fields
+BOX_FIELDS = [
+    ('gt_bbox', 'float32', 4),
+    ('gt_class', 'int32', 1),
+    ('is_crowd', 'int32', 1),
+    ('gt_score', 'float32', 1),
+    ('difficult', 'int32', 1),
+]
+
+# default values of optional per-box fields
+BOX_FIELD_DEFAULTS = {'gt_score': 1., 'difficult': 0}
+
+ARRAY_FIELDS = [
+    'im_id', 'h', 'w', 'im_file', 'im_file_offsets', 'box_offsets',
+    'has_poly', 'poly_kind', 'poly_offsets', 'seg_offsets', 'seg_coords'
+] + [f[0] for f in BOX_FIELDS]
+
+
+def is_roidb_store(fname):
+    """ whether 'fname' is a directory of roidb store
+    """
+    return os.path.isdir(fname) and \
+        os.path.isfile(os.path.join(fname, META_FILE))
+
+
+def _load_pickle(fname):
+    with open(fname, 'rb') as f:
+        data = f.read()
+    # for support python3 and python2
+    try:
+        return pkl.loads(data, encoding='bytes')
+    except:
+        return pkl.loads(data)
+
+
+def _im_id_of(rec):
+    im_id = rec['im_id']
+    return int(im_id if np.isscalar(im_id) else np.asarray(im_id).ravel()[0])
+
+
+def dump_roidb_store(records, cname2cid, store_dir):
+    """ save 'records' to 'store_dir' in the columnar format
+
+    Args:
+        records (list of dict): records returned by 'loader.load'
+        cname2cid (dict): the mapping of category name to id
+        store_dir (str): directory to save the store
+
+    Returns:
+        number of dumped records
+    """
+    if not os.path.exists(store_dir):
+        os.makedirs(store_dir)
+
+    num = len(records)
+    arrays = {}
+    arrays['im_id'] = np.array([_im_id_of(r) for r in records], dtype='int64')
+    arrays['h'] = np.array([r['h'] for r in records], dtype='float64')
+    arrays['w'] = np.array([r['w'] for r in records], dtype='float64')
+
+    names = [r['im_file'].encode('utf-8') for r in records]
+    name_lens = np.array([len(n) for n in names], dtype='int64')
+    arrays['im_file'] = np.frombuffer(b''.join(names), dtype='uint8')
+    arrays['im_file_offsets'] = np.concatenate(
+        [[0], np.cumsum(name_lens)]).astype('int64')
+
+    box_nums = np.array(
+        [len(r['gt_bbox']) for r in records], dtype='int64')
+    arrays['box_offsets'] = np.concatenate(
+        [[0], np.cumsum(box_nums)]).astype('int64')
+    num_boxes = int(arrays['box_offsets'][-1])
+    for name, dtype, cols in BOX_FIELDS:
+        column = np.empty((num_boxes, cols), dtype=dtype)
+        for i, rec in enumerate(records):
+            start, end = arrays['box_offsets'][i:i + 2]
+            if name in rec:
+                column[start:end] = np.asarray(rec[name]).reshape(-1, cols)
+            else:
+                column[start:end] = BOX_FIELD_DEFAULTS[name]
+        arrays[name] = column
+
+    has_poly = np.zeros(num, dtype='bool')
+    poly_kind = np.zeros(num_boxes, dtype='int8')
+    poly_nums = np.zeros(num_boxes, dtype='int64')
+    seg_lens = []
+    seg_coords = []
+    objects = {}
+    for i, rec in enumerate(records):
+        polys = rec.get('gt_poly', [])
+        if len(polys) == 0:
+            continue
+        has_poly[i] = True
+        assert len(polys) == box_nums[i], \
+            'number of gt_poly mismatches gt_bbox in record[%d]' % (i)
+        for j, poly in enumerate(polys):
+            box_idx = int(arrays['box_offsets'][i]) + j
+            if poly is None:
+                continue
+            if isinstance(poly, list) and \
+                    all(isinstance(seg, list) for seg in poly):
+                poly_kind[box_idx] = POLY_LIST
+                poly_nums[box_idx] = len(poly)
+                for seg in poly:
+                    seg_lens.append(len(seg))
+                    seg_coords.extend(seg)
+            else:
+                poly_kind[box_idx] = POLY_OBJECT
+                objects[box_idx] = poly
+    arrays['has_poly'] = has_poly
+    arrays['poly_kind'] = poly_kind
+    arrays['poly_offsets'] = np.concatenate(
+        [[0], np.cumsum(poly_nums)]).astype('int64')
+    arrays['seg_offsets'] = np.concatenate(
+        [[0], np.cumsum(seg_lens, dtype='int64')]).astype('int64')
+    arrays['seg_coords'] = np.array(seg_coords, dtype='float64')
+
+    for name in ARRAY_FIELDS:
+        np.save(os.path.join(store_dir, name + '.npy'), arrays[name])
+    with open(os.path.join(store_dir, OBJECTS_FILE), 'wb') as f:
+        pkl.dump(objects, f)
+    # meta is written last, so an incomplete store is never recognized
+    meta = {'version': STORE_VERSION, 'num': num, 'cname2cid': cname2cid}
+    with open(os.path.join(store_dir, META_FILE), 'wb') as f:
+        pkl.dump(meta, f)
+    logger.info('dumped {} records with {} boxes to roidb store {}'.format(
+        num, num_boxes, store_dir))
+    return num
+
+
+class RoiDbStore(object):
+    """ memory-mapped roidb records in the columnar format,
+        it behaves like a read-only list of records, and each
+        access builds a new record, so no deepcopy is needed
+
+    Args:
+        store_dir (str): directory saved by 'dump_roidb_store'
+        sample_num (int): number of samples to load, -1 means all
+    """
+
+    def __init__(self, store_dir, sample_num=-1):
+        assert is_roidb_store(store_dir), \
+            'invalid roidb store[%s]' % (store_dir)
+        self._store_dir = store_dir
+        self._sample_num = sample_num
+        meta = _load_pickle(os.path.join(store_dir, META_FILE))
+        assert meta['version'] == STORE_VERSION, \
+            'unsupported roidb store version[%s]' % (meta['version'])
+        self.cname2cid = meta['cname2cid']
+        self._num = meta['num']
+        if sample_num > 0 and sample_num < self._num:
+            self._num = sample_num
+
+        self._arrays = {}
+        for name in ARRAY_FIELDS:
+            fname = os.path.join(store_dir, name + '.npy')
+            try:
+                self._arrays[name] = np.load(fname, mmap_mode='r')
+            except ValueError:
+                # an empty array can not be memory-mapped
+                self._arrays[name] = np.load(fname)
+        self._objects = _load_pickle(os.path.join(store_dir, OBJECTS_FILE))
+
+    def __getstate__(self):
+        # only pass the path to subprocesses which map the files again
+        return {
+            'store_dir': self._store_dir,
+            'sample_num': self._sample_num
+        }
+
+    def __setstate__(self, state):
+        self.__init__(state['store_dir'], state['sample_num'])
+
+    def __len__(self):
+        return self._num
+
+    def __iter__(self):
+        for i in range(self._num):
+            yield self[i]
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += self._num
+        if idx < 0 or idx >= self._num:
+            raise IndexError('record index[%d] out of range' % (idx))
+        arrays = self._arrays
+        start, end = arrays['im_file_offsets'][idx:idx + 2]
+        im_file = arrays['im_file'][start:end].tobytes().decode('utf-8')
+        rec = {
+            'im_file': im_file,
+            'im_id': np.array([arrays['im_id'][idx]]),
+            'h': float(arrays['h'][idx]),
+            'w': float(arrays['w'][idx]),
+        }
+        start, end = arrays['box_offsets'][idx:idx + 2]
+        for name, _, _ in BOX_FIELDS:
+            # copy from the mapped pages, so transforms can modify them
+            rec[name] = np.array(arrays[name][start:end])
+        if arrays['has_poly'][idx]:
+            rec['gt_poly'] = [self._get_poly(i) for i in range(start, end)]
+        else:
+            rec['gt_poly'] = []
+        return rec
+
+    def _get_poly(self, box_idx):
+        kind = self._arrays['poly_kind'][box_idx]
+        if kind == POLY_NONE:
+            return None
+        elif kind == POLY_OBJECT:
+            return self._objects[box_idx]
+        poly_offsets = self._arrays['poly_offsets']
+        seg_offsets = self._arrays['seg_offsets']
+        seg_coords = self._arrays['seg_coords']
+        poly = []
+        for i in range(poly_offsets[box_idx], poly_offsets[box_idx + 1]):
+            poly.append(seg_coords[seg_offsets[i]:seg_offsets[i + 1]].tolist())
+        return poly
+
+    def get_im_ids(self):
+        """ image ids of all records, without building the records
+        """
+        return self._arrays['im_id'][:self._num]
+
+    def get_im_file(self, idx):
+        """ image file name of record 'idx'
+        """
+        start, end = self._arrays['im_file_offsets'][idx:idx + 2]
+        return self._arrays['im_file'][start:end].tobytes().decode('utf-8')
+
+    def get_im_shapes(self):
+        """ heights and widths of all records, without building the records
+        """
+        return (np.array(self._arrays['h'][:self._num]),
+                np.array(self._arrays['w'][:self._num]))
+
+    def get_gt_classes(self):
+        """ box offsets of records and classes of all boxes,
+            without building the records
+        """
+        offsets = np.array(self._arrays['box_offsets'][:self._num + 1])
+        classes = np.array(self._arrays['gt_class'][:offsets[-1], 0])
+        return offsets, classes.astype('int64')
@@ -0,0 +1,71 @@
+#   Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Benchmark the startup (image weights) and per-sample cost of class
+aware sampling on a synthetic roidb as large as Objects365:
+
+    python ppdet/data/tests/benchmark_class_aware_sampling.py --images 600000
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import time
+import numpy as np
+
+from ppdet.data.source.class_aware_sampling_roidb_source import \
+    ClassAwareSamplingRoiDbSource
+from test_class_aware_sampling import random_roidb, loop_img_weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--images', type=int, default=600000)
+    parser.add_argument('--classes', type=int, default=365)
+    parser.add_argument('--draws', type=int, default=2000)
+    args = parser.parse_args()
+
+    roidb = random_roidb(args.images, args.classes)
+    source = ClassAwareSamplingRoiDbSource.__new__(
+        ClassAwareSamplingRoiDbSource)
+    source._roidb = roidb
+    source._samples = len(roidb)
+
+    start = time.time()
+    expect = loop_img_weights(roidb)
+    loop_cost = time.time() - start
+    start = time.time()
+    weights = source._calc_img_weights()
+    vec_cost = time.time() - start
+    assert np.allclose(weights, expect)
+    print("image weights: loop {:.3f}s, vectorized {:.3f}s".format(
+        loop_cost, vec_cost))
+
+    start = time.time()
+    for _ in range(args.draws):
+        np.random.choice(len(roidb), 1, replace=False, p=weights)[0]
+    choice_cost = (time.time() - start) / args.draws
+    source._img_weights = weights
+    source._img_cdf = np.cumsum(weights)
+    start = time.time()
+    drawn = source._draw_indexes(len(roidb))
+    drawn_cost = (time.time() - start) / len(drawn)
+    print("per sample draw: np.random.choice {:.1f}us, pre-drawn {:.3f}us".
+          format(choice_cost * 1e6, drawn_cost * 1e6))
+
+
+if __name__ == '__main__':
+    main()
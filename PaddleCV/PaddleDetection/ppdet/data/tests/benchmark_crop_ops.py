@@ -0,0 +1,164 @@
+#   Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Benchmark the crop sampling of SSD (CropImage) and face detection
+(CropImageWithDataAchorSampling) against the per-box python loops:
+
+    python ppdet/data/tests/benchmark_crop_ops.py --boxes 50
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import time
+import numpy as np
+
+from ppdet.data.transform import op_helper
+from ppdet.data.transform.operators import CropImage, \
+    CropImageWithDataAchorSampling
+from test_op_helper import SSD_SAMPLERS, FACE_SAMPLERS, random_gt, \
+    loop_filter_and_process
+
+
+def loop_ssd_sampling(samplers, gt_bbox):
+    """ candidate crops of CropImage sampled one by one """
+    sampled_bbox = []
+    gt_bbox = gt_bbox.tolist()
+    for sampler in samplers:
+        found = 0
+        for i in range(sampler[1]):
+            if found >= sampler[0]:
+                break
+            sample_bbox = op_helper.generate_sample_bbox(sampler)
+            if op_helper.satisfy_sample_constraint(sampler, sample_bbox,
+                                                   gt_bbox):
+                sampled_bbox.append(sample_bbox)
+                found = found + 1
+    return sampled_bbox
+
+
+def loop_face_sampling(samplers, gt_bbox, w, h):
+    """ candidate crops of CropImageWithDataAchorSampling one by one """
+    sampled_bbox = []
+    gt_bbox = gt_bbox.tolist()
+    for sampler in samplers:
+        found = 0
+        for i in range(sampler[1]):
+            if found >= sampler[0]:
+                break
+            sample_bbox = op_helper.generate_sample_bbox_square(sampler, w, h)
+            if op_helper.satisfy_sample_constraint_coverage(
+                    sampler, sample_bbox, gt_bbox):
+                sampled_bbox.append(sample_bbox)
+                found = found + 1
+    return sampled_bbox
+
+
+def vec_sampling(samplers, gt_bbox, w=None, h=None):
+    sampled_bbox = []
+    for sampler in samplers:
+        if w is None:
+            constraint = lambda bboxes: op_helper.satisfy_sample_constraints(
+                sampler, bboxes, gt_bbox)
+        else:
+            constraint = lambda bboxes: \
+                op_helper.satisfy_sample_constraints_coverage(
+                    sampler, bboxes, gt_bbox)
+        sampled_bbox.extend(
+            op_helper.sample_bboxes_with_constraint(sampler, constraint, w,
+                                                    h))
+    return sampled_bbox
+
+
+def timeit(func, repeat):
+    start = time.time()
+    for i in range(repeat):
+        func(i)
+    return (time.time() - start) / repeat * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--boxes', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    gts = [random_gt(args.boxes, seed=i) for i in range(args.repeat)]
+    # a few large faces, which are seldom covered by a random crop
+    large_gts = [random_gt(2, seed=i) for i in range(args.repeat)]
+    for gt_bbox, _, _ in large_gts:
+        gt_bbox[:, 2:] = np.minimum(gt_bbox[:, :2] + 0.6, 1.)
+    w, h = 1024, 768
+    # the same samplers as the face detection configs
+    face_samplers = [[1, 50, 0.3, 1.0, 1.0, 1.0, 0.0, 0.0, 1.0, 0.0]] * 5
+
+    print("sampling of {} boxes (ms per image):".format(args.boxes))
+    loop_cost = timeit(lambda i: loop_ssd_sampling(SSD_SAMPLERS, gts[i][0]),
+                       args.repeat)
+    vec_cost = timeit(lambda i: vec_sampling(SSD_SAMPLERS, gts[i][0]),
+                      args.repeat)
+    print("  ssd crops : loop {:.3f}, vectorized {:.3f}".format(loop_cost,
+                                                                vec_cost))
+    loop_cost = timeit(
+        lambda i: loop_face_sampling(face_samplers, gts[i][0], w, h),
+        args.repeat)
+    vec_cost = timeit(lambda i: vec_sampling(face_samplers, gts[i][0], w, h),
+                      args.repeat)
+    print("  face crops: loop {:.3f}, vectorized {:.3f}".format(loop_cost,
+                                                                vec_cost))
+    loop_cost = timeit(
+        lambda i: loop_face_sampling(face_samplers, large_gts[i][0], w, h),
+        args.repeat)
+    vec_cost = timeit(
+        lambda i: vec_sampling(face_samplers, large_gts[i][0], w, h),
+        args.repeat)
+    print("  face crops of 2 large faces: loop {:.3f}, vectorized {:.3f}".
+          format(loop_cost, vec_cost))
+
+    crop = [0.1, 0.1, 0.8, 0.9]
+    loop_cost = timeit(
+        lambda i: loop_filter_and_process(crop, gts[i][0].tolist(), gts[i][1],
+                                          gts[i][2]), args.repeat)
+    vec_cost = timeit(
+        lambda i: op_helper.filter_and_process(crop, *gts[i]), args.repeat)
+    print("  filter    : loop {:.3f}, vectorized {:.3f}".format(loop_cost,
+                                                                vec_cost))
+
+    def samples(i):
+        return {
+            'image': np.zeros((h, w, 3), dtype='uint8'),
+            'gt_bbox': gts[i][0],
+            'gt_class': gts[i][1],
+            'gt_score': gts[i][2],
+            'w': w,
+            'h': h
+        }
+
+    ssd_op = CropImage(SSD_SAMPLERS)
+    face_op = CropImageWithDataAchorSampling(
+        face_samplers,
+        anchor_sampler=[[1, 10, 1.0, 1.0, 1.0, 1.0, 0.0, 0.0, 0.2, 0.0]],
+        target_size=640,
+        sampling_prob=1.)
+    print("operators (ms per image):")
+    print("  CropImage: {:.3f}".format(
+        timeit(lambda i: ssd_op(samples(i), None), args.repeat)))
+    print("  CropImageWithDataAchorSampling: {:.3f}".format(
+        timeit(lambda i: face_op(samples(i), None), args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#   Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Benchmark samples/sec of the process based ParallelMappedDataset with
+pickled and zero-copy transport of mapped samples, and with samples
+output in source order:
+
+    python ppdet/data/tests/benchmark_parallel_map.py --worker_nums 8 16
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import time
+import numpy as np
+
+from ppdet.data.transform.parallel_map import ParallelMappedDataset
+from ppdet.data.tests.test_parallel_map import RangeSource
+
+
+class ImageMapper(object):
+    """ produce samples like decoded and normalized images """
+
+    def __init__(self, image_shape):
+        self.image = np.random.uniform(size=image_shape).astype('float32')
+
+    def __call__(self, sample):
+        im_info = np.array(self.image.shape[1:] + (1., ), dtype='float32')
+        gt_box = np.random.uniform(size=(20, 4)).astype('float32')
+        return (self.image.copy(), im_info, sample, gt_box)
+
+
+def run(args, worker_num, zero_copy, preserve_order=False):
+    source = RangeSource(args.samples)
+    worker_args = {
+        'bufsize': args.bufsize,
+        'worker_num': worker_num,
+        'use_process': True,
+        'memsize': args.memsize,
+        'zero_copy': zero_copy,
+        'preserve_order': preserve_order
+    }
+    mapper = ImageMapper(tuple(args.image_shape))
+    mapped_ds = ParallelMappedDataset(source, mapper, worker_args)
+    # the first epoch starts workers and warms up the shared memory
+    for _ in mapped_ds:
+        pass
+    mapped_ds.reset()
+    start = time.time()
+    count = 0
+    for sample in mapped_ds:
+        count += 1
+    cost = time.time() - start
+    mapped_ds.stop()
+    return count / cost, mapped_ds.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--worker_nums', type=int, nargs='+', default=[8, 16])
+    parser.add_argument('--samples', type=int, default=2000)
+    parser.add_argument(
+        '--image_shape', type=int, nargs=3, default=[3, 608, 608])
+    parser.add_argument('--bufsize', type=int, default=100)
+    parser.add_argument('--memsize', type=str, default='3G')
+    args = parser.parse_args()
+
+    for worker_num in args.worker_nums:
+        for zero_copy, preserve_order in [(False, False), (True, False),
+                                          (True, True)]:
+            speed, stats = run(args, worker_num, zero_copy, preserve_order)
+            msg = "worker_num={:<3d} zero_copy={:<5} preserve_order={:<5} " \
+                "{:.1f} samples/sec".format(worker_num, str(zero_copy),
+                                            str(preserve_order), speed)
+            if preserve_order:
+                msg += ", reorder stall {:.2f}s of {:.2f}s".format(
+                    stats['reorder_stall_time'], stats['next_time'])
+            print(msg)
+
+
+if __name__ == '__main__':
+    main()
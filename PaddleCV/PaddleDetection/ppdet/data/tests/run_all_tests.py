@@ -23,6 +23,13 @@ import test_roidb_source
 import test_iterator_source
 import test_transformer
 import test_reader
+import test_shared_queue
+import test_parallel_map
+import test_roidb_store
+import test_image_cache
+import test_class_aware_sampling
+import test_aspect_ratio_grouping
+import test_op_helper
 
 if __name__ == '__main__':
     alltests = unittest.TestSuite([
@@ -34,6 +41,13 @@ if __name__ == '__main__':
             test_iterator_source.TestIteratorSource,
             test_transformer.TestTransformer,
             test_reader.TestReader,
+            test_shared_queue.TestSharedQueue,
+            test_parallel_map.TestParallelMap,
+            test_roidb_store.TestRoiDbStore,
+            test_image_cache.TestImageCache,
+            test_class_aware_sampling.TestClassAwareSampling,
+            test_aspect_ratio_grouping.TestAspectRatioGrouping,
+            test_op_helper.TestOpHelper,
         ]
     ])
 
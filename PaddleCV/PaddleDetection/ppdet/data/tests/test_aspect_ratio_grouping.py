@@ -0,0 +1,137 @@
+#   Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import division
+
+import os
+import pickle as pkl
+import random
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from ppdet.data.source.aspect_ratio_grouped_roidb_source import \
+    AspectRatioGroupedRoiDbSource, group_by_aspect_ratio
+from ppdet.data.source.roidb_store import dump_roidb_store
+from ppdet.data.transform.post_map import build_post_map, padding_waste
+
+
+def random_roidb(num, seed=0):
+    """ records of landscape, portrait and square images """
+    rng = np.random.RandomState(seed)
+    records = []
+    for i in range(num):
+        h, w = [(480., 640.), (640., 480.), (500., 500.)][rng.randint(3)]
+        # images without boxes are dropped in batching
+        num_box = int(i % 10 != 0)
+        records.append({
+            'im_file': '%d.jpg' % i,
+            'im_id': np.array([i]),
+            'h': h,
+            'w': w,
+            'is_crowd': np.zeros((num_box, 1), dtype='int32'),
+            'gt_class': np.ones((num_box, 1), dtype='int32'),
+            'gt_bbox': np.zeros((num_box, 4), dtype='float32'),
+            'gt_poly': [],
+        })
+    return records
+
+
+class TestAspectRatioGrouping(unittest.TestCase):
+    """Test cases for source.aspect_ratio_grouped_roidb_source
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.records = random_roidb(203)
+        cls.roidb_file = os.path.join(cls.tmp_dir, 'test.roidb')
+        with open(cls.roidb_file, 'wb') as f:
+            pkl.dump((cls.records, {}), f)
+        cls.store_dir = os.path.join(cls.tmp_dir, 'test.roidb_store')
+        dump_roidb_store(cls.records, {}, cls.store_dir)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+    def check_batches(self, indexes, ratios, batch_size, bins, valid=None):
+        """ every full batch is of one group, and only the batches at
+            the end are incomplete
+        """
+        if valid is not None:
+            indexes = [i for i in indexes if valid[i]]
+        groups = np.digitize(ratios[indexes], bins)
+        num_full = sum(
+            np.sum(groups == g) // batch_size * batch_size
+            for g in np.unique(groups))
+        for i in range(0, num_full, batch_size):
+            self.assertEqual(len(set(groups[i:i + batch_size])), 1)
+
+    def test_group_by_aspect_ratio(self):
+        """ test indexes are a permutation grouped in batches
+        """
+        random.seed(0)
+        ratios = np.random.RandomState(0).uniform(0.5, 2., 100)
+        indexes = list(range(100))
+        random.shuffle(indexes)
+        for bins in [(1., ), (0.8, 1.25)]:
+            grouped = group_by_aspect_ratio(indexes, ratios, 8, bins)
+            self.assertEqual(sorted(grouped), list(range(100)))
+            self.check_batches(grouped, ratios, 8, bins)
+        # the order of images of a group is kept
+        grouped = group_by_aspect_ratio(indexes, ratios, 8, shuffle=False)
+        landscape = [i for i in indexes if ratios[i] >= 1.]
+        self.assertEqual([i for i in grouped if ratios[i] >= 1.], landscape)
+
+    def test_source(self):
+        """ test an epoch of source samples every image once in batches
+            of groups, from both roidb files and stores
+        """
+        ratios = np.array([r['w'] / r['h'] for r in self.records])
+        valid = np.array([len(r['gt_bbox']) > 0 for r in self.records])
+        for anno_file in [self.roidb_file, self.store_dir]:
+            source = AspectRatioGroupedRoiDbSource(
+                anno_file,
+                image_dir=self.tmp_dir,
+                batch_size=4,
+                aspect_ratio_bins=[1.])
+            for _ in range(2):
+                source.reset()
+                ids = []
+                while not source.drained():
+                    ids.append(int(source.next()['im_id'][0]))
+                self.assertEqual(sorted(ids), list(range(len(self.records))))
+                # images without boxes don't break batches
+                self.check_batches(ids, ratios, 4, [1.], valid)
+                self.assertFalse(any(valid[ids[-int((~valid).sum()):]]))
+
+    def test_padding_stats(self):
+        """ test the padded pixels of batches are counted
+        """
+        post_mapper = build_post_map(is_padding=True)
+        landscape = np.zeros((3, 4, 6), dtype='float32')
+        portrait = np.zeros((3, 6, 4), dtype='float32')
+        post_mapper([(landscape, ), (landscape, )])
+        self.assertEqual(padding_waste(post_mapper.padding_stats), 0.)
+        post_mapper([(landscape, ), (portrait, )])
+        stats = post_mapper.padding_stats
+        self.assertEqual(stats['batches'], 2)
+        self.assertEqual(stats['pixels'], 4 * 24)
+        self.assertEqual(stats['padded_pixels'], 2 * 24 + 2 * 36)
+        self.assertAlmostEqual(padding_waste(stats), 1 - 96. / 120)
+
+
+if __name__ == '__main__':
+    unittest.main()
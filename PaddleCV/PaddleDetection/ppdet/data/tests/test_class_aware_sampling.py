@@ -0,0 +1,119 @@
+#   Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import division
+
+import os
+import pickle as pkl
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from ppdet.data.source.class_aware_sampling_roidb_source import \
+    ClassAwareSamplingRoiDbSource
+from ppdet.data.source.roidb_store import dump_roidb_store
+
+
+def random_roidb(num, num_cls, max_box=10, seed=0):
+    """ records with only the fields used by class aware sampling """
+    rng = np.random.RandomState(seed)
+    # skewed class frequencies, and some images without boxes
+    cls_probs = 1. / np.arange(1, num_cls + 1)
+    cls_probs /= cls_probs.sum()
+    records = []
+    for i in range(num):
+        num_box = rng.randint(0, max_box + 1)
+        records.append({
+            'im_file': '%d.jpg' % i,
+            'im_id': np.array([i]),
+            'h': 100.,
+            'w': 100.,
+            'is_crowd': np.zeros((num_box, 1), dtype='int32'),
+            'gt_class': rng.choice(
+                num_cls, (num_box, 1), p=cls_probs).astype('int32') + 1,
+            'gt_bbox': np.zeros((num_box, 4), dtype='float32'),
+            'gt_poly': [],
+        })
+    return records
+
+
+def loop_img_weights(roidb):
+    """ reference of the image weights computed by python loops """
+    imgs_cls = []
+    num_per_cls = {}
+    img_weights = []
+    for i, roidb_i in enumerate(roidb):
+        img_cls = set([k for cls in roidb[i]['gt_class'] for k in cls])
+        imgs_cls.append(img_cls)
+        for c in img_cls:
+            if c not in num_per_cls:
+                num_per_cls[c] = 1
+            else:
+                num_per_cls[c] += 1
+
+    for i in range(len(roidb)):
+        weights = 0
+        for c in imgs_cls[i]:
+            weights += 1 / num_per_cls[c]
+        img_weights.append(weights)
+    img_weights = img_weights / np.sum(img_weights)
+    return img_weights
+
+
+class TestClassAwareSampling(unittest.TestCase):
+    """Test cases for source.class_aware_sampling_roidb_source
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.records = random_roidb(500, 20)
+        cls.roidb_file = os.path.join(cls.tmp_dir, 'test.roidb')
+        with open(cls.roidb_file, 'wb') as f:
+            pkl.dump((cls.records, {}), f)
+        cls.store_dir = os.path.join(cls.tmp_dir, 'test.roidb_store')
+        dump_roidb_store(cls.records, {}, cls.store_dir)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+    def test_img_weights(self):
+        """ test weights are the same as computed by loops
+        """
+        expect = loop_img_weights(self.records)
+        for anno_file in [self.roidb_file, self.store_dir]:
+            source = ClassAwareSamplingRoiDbSource(
+                anno_file, image_dir=self.tmp_dir)
+            source.reset()
+            self.assertTrue(np.allclose(source._img_weights, expect))
+
+    def test_sampling(self):
+        """ test images are drawn with their weights
+        """
+        np.random.seed(0)
+        source = ClassAwareSamplingRoiDbSource(
+            self.store_dir, image_dir=self.tmp_dir)
+        num = 50000
+        counts = np.zeros(len(self.records))
+        for _ in range(num):
+            counts[source.next()['im_id'][0]] += 1
+        weights = source._img_weights
+        # images without boxes are never drawn
+        self.assertEqual(counts[weights == 0].sum(), 0)
+        self.assertLess(np.abs(counts / num - weights).sum(), 0.15)
+
+
+if __name__ == '__main__':
+    unittest.main()
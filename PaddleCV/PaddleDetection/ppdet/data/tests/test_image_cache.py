@@ -0,0 +1,125 @@
+#   Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import multiprocessing as mp
+
+from ppdet.data.transform.image_cache import ImageCache, parse_size, \
+    merge_stats
+
+
+def _lookup(cache, keys):
+    for k in keys:
+        if cache.get(k) is None:
+            cache.put(k, np.full((8, 8, 3), len(k), dtype='uint8'))
+
+
+class TestImageCache(unittest.TestCase):
+    """Test cases for transform.image_cache
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_parse_size(self):
+        self.assertEqual(parse_size(None), 0)
+        self.assertEqual(parse_size(100), 100)
+        self.assertEqual(parse_size('2k'), 2048)
+        self.assertEqual(parse_size('1.5G'), 3 * 1024**3 // 2)
+
+    def test_lru(self):
+        """ test least recently used images are evicted
+        """
+        image = np.zeros((10, 10, 3), dtype='uint8')
+        cache = ImageCache(capacity=image.nbytes * 2)
+        cache.put('a', image)
+        cache.put('b', image + 1)
+        self.assertIsNotNone(cache.get('a'))
+        cache.put('c', image + 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertTrue(np.array_equal(cache.get('a'), image))
+        self.assertTrue(np.array_equal(cache.get('c'), image + 2))
+
+        # cached images are not modified through returned copies
+        cache.get('a')[:] = 255
+        self.assertTrue(np.array_equal(cache.get('a'), image))
+
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 5)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['bytes'], image.nbytes * 2)
+
+    def test_disk_cache(self):
+        """ test images spilled to disk are shared by caches
+        """
+        image = np.arange(300, dtype='uint8').reshape((10, 10, 3))
+        cache = ImageCache(capacity=0, cache_dir=self.tmp_dir)
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', image)
+
+        other = ImageCache(capacity='1M', cache_dir=self.tmp_dir)
+        cached = other.get('a')
+        self.assertTrue(np.array_equal(cached, image))
+        self.assertTrue(cached.flags.writeable)
+        self.assertTrue(np.array_equal(other.get('a'), image))
+        self.assertEqual(other.stats()['disk_hits'], 1)
+        self.assertEqual(other.stats()['hits'], 1)
+
+    def test_shared_counters(self):
+        """ test counters are shared by forked workers
+        """
+        cache = ImageCache(capacity='1M')
+        keys = ['key_%d' % i for i in range(10)]
+        procs = [
+            mp.Process(target=_lookup, args=(cache, keys)) for _ in range(2)
+        ]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        stats = merge_stats([cache])
+        self.assertEqual(stats['misses'], 20)
+        self.assertEqual(stats['hit_rate'], 0.)
+
+        _lookup(cache, keys)
+        _lookup(cache, keys)
+        stats = merge_stats([cache])
+        self.assertEqual(stats['hits'], 10)
+        self.assertAlmostEqual(stats['hit_rate'], 0.25)
+
+    def test_decode_image(self):
+        """ test DecodeImage with cache gives the same image
+        """
+        from ppdet.data.transform.operators import DecodeImage
+        fname = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), '000012.jpg')
+        decode = DecodeImage(to_rgb=True)
+        cached_decode = DecodeImage(
+            to_rgb=True, cache_size='64M', cache_dir=self.tmp_dir)
+        expect = decode({'im_file': fname})['image']
+        for _ in range(2):
+            sample = cached_decode({'im_file': fname})
+            self.assertTrue(np.array_equal(sample['image'], expect))
+        self.assertEqual(cached_decode.cache.stats()['hits'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
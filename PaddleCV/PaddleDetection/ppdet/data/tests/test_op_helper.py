@@ -0,0 +1,227 @@
+#   Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from __future__ import division
+
+import unittest
+import numpy as np
+
+from ppdet.data.transform import op_helper
+from ppdet.data.transform.op_helper import (
+    filter_and_process, bbox_area_sampling, generate_sample_bbox,
+    generate_sample_bbox_square, generate_sample_bboxes, jaccard_overlap,
+    jaccard_overlap_matrix, bbox_coverage, bbox_coverage_matrix,
+    satisfy_sample_constraint, satisfy_sample_constraints,
+    satisfy_sample_constraint_coverage, satisfy_sample_constraints_coverage)
+
+SSD_SAMPLERS = [[1, 1, 1.0, 1.0, 1.0, 1.0, 0.0, 1.0],
+                [1, 50, 0.3, 1.0, 0.5, 2.0, 0.1, 1.0],
+                [1, 50, 0.3, 1.0, 0.5, 2.0, 0.3, 1.0],
+                [1, 50, 0.3, 1.0, 0.5, 2.0, 0.5, 1.0],
+                [1, 50, 0.3, 1.0, 0.5, 2.0, 0.7, 1.0],
+                [1, 50, 0.3, 1.0, 0.5, 2.0, 0.9, 1.0],
+                [1, 50, 0.3, 1.0, 0.5, 2.0, 0.0, 1.0]]
+
+FACE_SAMPLERS = [[1, 50, 1.0, 1.0, 1.0, 1.0, 0.0, 0.0, 1.0, 0.0],
+                 [1, 50, 0.3, 1.0, 1.0, 1.0, 0.0, 0.0, 1.0, 0.0],
+                 [1, 50, 0.3, 1.0, 1.0, 1.0, 0.2, 0.0, 0.5, 0.0],
+                 [1, 10, 1.0, 1.0, 1.0, 1.0, 0.0, 0.0, 0.2, 0.0],
+                 [1, 50, 0.3, 1.0, 1.0, 1.0, 0.0, 0.0, 0.0, 0.0]]
+
+
+def random_gt(num, seed=0):
+    rng = np.random.RandomState(seed)
+    xy = rng.uniform(0, 0.9, (num, 2))
+    wh = rng.uniform(0.001, 0.3, (num, 2))
+    gt_bbox = np.concatenate([xy, xy + wh], axis=1).astype('float32')
+    gt_class = rng.randint(1, 21, (num, 1)).astype('int32')
+    gt_score = rng.rand(num, 1).astype('float32')
+    return gt_bbox, gt_class, gt_score
+
+
+def loop_filter_and_process(sample_bbox, bboxes, labels, scores=None):
+    """ reference of 'filter_and_process' computed by python loops """
+    new_bboxes = []
+    new_labels = []
+    new_scores = []
+    for i in range(len(bboxes)):
+        obj_bbox = [bboxes[i][0], bboxes[i][1], bboxes[i][2], bboxes[i][3]]
+        if not op_helper.meet_emit_constraint(obj_bbox, sample_bbox):
+            continue
+        if not op_helper.is_overlap(obj_bbox, sample_bbox):
+            continue
+        sample_width = sample_bbox[2] - sample_bbox[0]
+        sample_height = sample_bbox[3] - sample_bbox[1]
+        new_bbox = [(obj_bbox[0] - sample_bbox[0]) / sample_width,
+                    (obj_bbox[1] - sample_bbox[1]) / sample_height,
+                    (obj_bbox[2] - sample_bbox[0]) / sample_width,
+                    (obj_bbox[3] - sample_bbox[1]) / sample_height]
+        new_bbox = op_helper.clip_bbox(new_bbox)
+        if op_helper.bbox_area(new_bbox) > 0:
+            new_bboxes.append(new_bbox)
+            new_labels.append([labels[i][0]])
+            if scores is not None:
+                new_scores.append([scores[i][0]])
+    return np.array(new_bboxes), np.array(new_labels), np.array(new_scores)
+
+
+def loop_bbox_area_sampling(bboxes, labels, scores, target_size, min_size):
+    """ reference of 'bbox_area_sampling' computed by python loops """
+    new_bboxes = []
+    new_labels = []
+    new_scores = []
+    for i, bbox in enumerate(bboxes):
+        w = float((bbox[2] - bbox[0]) * target_size)
+        h = float((bbox[3] - bbox[1]) * target_size)
+        if w * h < float(min_size * min_size):
+            continue
+        new_bboxes.append(bbox)
+        new_labels.append(labels[i])
+        if scores is not None and scores.size != 0:
+            new_scores.append(scores[i])
+    return np.array(new_bboxes), np.array(new_labels), np.array(new_scores)
+
+
+class TestOpHelper(unittest.TestCase):
+    """Test cases for transform.op_helper
+    """
+
+    def assertArraysEqual(self, results, expects):
+        for res, expect in zip(results, expects):
+            self.assertEqual(res.shape, expect.shape)
+            if expect.size > 0:
+                self.assertEqual(res.dtype, expect.dtype)
+            self.assertTrue(np.array_equal(res, expect))
+
+    def test_generate_sample_bboxes(self):
+        """ test vectorized sample bboxes follow the scalar formulas
+        """
+        for sampler in SSD_SAMPLERS + FACE_SAMPLERS:
+            np.random.seed(1)
+            bboxes = generate_sample_bboxes(sampler, 200)
+            self.assertEqual(bboxes.shape, (200, 4))
+            w = bboxes[:, 2] - bboxes[:, 0]
+            h = bboxes[:, 3] - bboxes[:, 1]
+            self.assertTrue(np.all(bboxes[:, :2] >= -1e-9))
+            self.assertTrue(np.all(bboxes[:, 2:] <= 1 + 1e-9))
+            self.assertTrue(np.all(w * h <= sampler[3]**2 + 1e-9))
+            self.assertTrue(np.all(w * h >= sampler[2]**2 - 1e-9))
+
+            bboxes = generate_sample_bboxes(sampler, 200, 640, 480)
+            w = bboxes[:, 2] - bboxes[:, 0]
+            h = bboxes[:, 3] - bboxes[:, 1]
+            self.assertTrue(np.allclose(w * 640, h * 480))
+
+        # a single draw matches the scalar one with the same seed
+        # when there is only one random value per variable
+        sampler = [1, 1, 1.0, 1.0, 1.0, 1.0, 0.0, 1.0]
+        np.random.seed(3)
+        expect = generate_sample_bbox(sampler)
+        np.random.seed(3)
+        self.assertTrue(
+            np.allclose(generate_sample_bboxes(sampler, 1)[0], expect))
+        np.random.seed(3)
+        expect = generate_sample_bbox_square(sampler, 300, 200)
+        np.random.seed(3)
+        self.assertTrue(
+            np.allclose(
+                generate_sample_bboxes(sampler, 1, 300, 200)[0], expect))
+
+    def test_overlap_matrix(self):
+        """ test overlap matrices equal the scalar functions
+        """
+        gt_bbox, _, _ = random_gt(20)
+        np.random.seed(0)
+        samples = generate_sample_bboxes(SSD_SAMPLERS[1], 50)
+        # touching and identical boxes
+        samples = np.concatenate(
+            [samples, gt_bbox[:3].astype('float64'),
+             [[0., 0., gt_bbox[0][0], 1.]]])
+        overlaps = jaccard_overlap_matrix(samples, gt_bbox)
+        coverages = bbox_coverage_matrix(gt_bbox, samples)
+        self.assertEqual(overlaps.shape, (len(samples), len(gt_bbox)))
+        gt_list = gt_bbox.tolist()
+        for i, sample in enumerate(samples.tolist()):
+            for j, gt in enumerate(gt_list):
+                self.assertAlmostEqual(overlaps[i, j],
+                                       jaccard_overlap(sample, gt))
+                self.assertAlmostEqual(coverages[i, j],
+                                       bbox_coverage(gt, sample))
+        self.assertEqual(
+            jaccard_overlap_matrix(samples, np.zeros((0, 4))).shape,
+            (len(samples), 0))
+
+    def test_sample_constraints(self):
+        """ test constraint masks equal the scalar functions
+        """
+        for num_gt in [0, 1, 5, 30]:
+            gt_bbox, _, _ = random_gt(num_gt, seed=num_gt)
+            gt_list = gt_bbox.tolist()
+            np.random.seed(num_gt)
+            for sampler in SSD_SAMPLERS:
+                samples = generate_sample_bboxes(sampler, 100)
+                for satisfy_all in [False, True]:
+                    mask = satisfy_sample_constraints(sampler, samples,
+                                                      gt_bbox, satisfy_all)
+                    expect = [
+                        bool(
+                            satisfy_sample_constraint(sampler, s, gt_list,
+                                                      satisfy_all))
+                        for s in samples.tolist()
+                    ]
+                    self.assertEqual(mask.tolist(), expect)
+            for sampler in FACE_SAMPLERS:
+                samples = generate_sample_bboxes(sampler, 100, 640, 480)
+                mask = satisfy_sample_constraints_coverage(sampler, samples,
+                                                           gt_bbox)
+                expect = [
+                    bool(
+                        satisfy_sample_constraint_coverage(sampler, s,
+                                                           gt_list))
+                    for s in samples.tolist()
+                ]
+                self.assertEqual(mask.tolist(), expect)
+
+    def test_filter_and_process(self):
+        """ test boxes filtered by arrays equal the loop version
+        """
+        gt_bbox, gt_class, gt_score = random_gt(50)
+        np.random.seed(0)
+        samples = generate_sample_bboxes(SSD_SAMPLERS[1], 100).tolist()
+        # expanded image, and crops without any box
+        samples += [[-0.5, -0.2, 1.5, 1.2], [0.99, 0.99, 1.0, 1.0]]
+        for sample in samples:
+            for score in [gt_score, None]:
+                results = filter_and_process(sample, gt_bbox, gt_class, score)
+                expects = loop_filter_and_process(sample, gt_bbox.tolist(),
+                                                  gt_class, score)
+                self.assertArraysEqual(results, expects)
+
+    def test_bbox_area_sampling(self):
+        """ test boxes filtered by area equal the loop version
+        """
+        gt_bbox, gt_class, gt_score = random_gt(50)
+        for min_size in [0., 8., 60., 1000.]:
+            for score in [gt_score, np.array([]), None]:
+                results = bbox_area_sampling(gt_bbox, gt_class, score, 640,
+                                             min_size)
+                expects = loop_bbox_area_sampling(gt_bbox, gt_class, score,
+                                                  640, min_size)
+                self.assertArraysEqual(results, expects)
+        results = bbox_area_sampling(
+            np.array([]), np.array([]), np.array([]), 640, 8.)
+        self.assertEqual([len(r) for r in results], [0, 0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#   Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import time
+import random
+import unittest
+import logging
+import numpy as np
+
+from ppdet.data.dataset import Dataset
+from ppdet.data.transform.parallel_map import ParallelMappedDataset
+logging.basicConfig(level=logging.INFO)
+
+
+class RangeSource(Dataset):
+    """ source of sample ids in range [0, samples) """
+
+    def __init__(self, samples):
+        super(RangeSource, self).__init__()
+        self._samples = samples
+        self._pos = 0
+
+    def next(self):
+        if self._epoch < 0:
+            self.reset()
+        if self._pos >= self._samples:
+            raise StopIteration()
+        self._pos += 1
+        return self._pos - 1
+
+    def reset(self):
+        self._epoch += 1
+        self._pos = 0
+
+    def size(self):
+        return self._samples
+
+    def drained(self):
+        return self._pos >= self._samples
+
+    def epoch_id(self):
+        return self._epoch
+
+
+def _random_mapper(sample):
+    # random delay to shuffle the finishing order of workers
+    time.sleep(random.random() * 0.005)
+    return (sample, random.random(), np.random.randint(1000))
+
+
+class TestParallelMap(unittest.TestCase):
+    """Test cases for transform.parallel_map
+    """
+
+    def _map(self, mapper=_random_mapper, **kwargs):
+        worker_args = {'worker_num': 4, 'bufsize': 10, 'memsize': '1G'}
+        worker_args.update(kwargs)
+        mapped_ds = ParallelMappedDataset(
+            RangeSource(100), mapper, worker_args)
+        samples = list(mapped_ds)
+        mapped_ds.stop()
+        return samples, mapped_ds.stats()
+
+    def test_preserve_order(self):
+        for use_process in [False, True]:
+            samples, stats = self._map(
+                use_process=use_process, preserve_order=True)
+            self.assertEqual([s[0] for s in samples], list(range(100)))
+            self.assertTrue(stats['max_reorder_buffer'] <= 20)
+
+    def test_seed(self):
+        samples, _ = self._map(use_process=True, preserve_order=True, seed=1)
+        samples_again, _ = self._map(use_process=True, seed=1)
+        self.assertEqual(samples, sorted(samples_again))
+
+    def test_worker_seed(self):
+        # forked workers do not repeat the numpy random state of parent,
+        # which is not reseeded after fork like 'random'
+        samples, _ = self._map(
+            lambda sample: np.random.uniform(), use_process=True)
+        self.assertEqual(len(set(samples)), len(samples))
+
+
+if __name__ == '__main__':
+    unittest.main()
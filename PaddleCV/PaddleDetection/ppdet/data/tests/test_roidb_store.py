@@ -0,0 +1,131 @@
+#   Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import pickle as pkl
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from ppdet.data.source import loader
+from ppdet.data.source.roidb_source import RoiDbSource
+from ppdet.data.source.roidb_store import RoiDbStore, dump_roidb_store
+
+
+def random_records(num, seed=0):
+    rng = np.random.RandomState(seed)
+    records = []
+    for i in range(num):
+        num_box = rng.randint(0, 5)
+        polys = []
+        for j in range(num_box):
+            if j % 3 == 0:
+                polys.append(None)
+            elif j % 3 == 1:
+                polys.append([rng.rand(6).tolist(), rng.rand(8).tolist()])
+            else:
+                polys.append({'size': [10, 10], 'counts': 'abc%d' % j})
+        records.append({
+            'im_file': 'image_%d.jpg' % i,
+            'im_id': np.array([i * 7]),
+            'h': float(rng.randint(100, 800)),
+            'w': float(rng.randint(100, 800)),
+            'is_crowd': rng.randint(0, 2, (num_box, 1)).astype('int32'),
+            'gt_class': rng.randint(1, 81, (num_box, 1)).astype('int32'),
+            'gt_bbox': rng.rand(num_box, 4).astype('float32'),
+            'gt_score': rng.rand(num_box, 1).astype('float32'),
+            'difficult': np.zeros((num_box, 1), dtype='int32'),
+            # records of VOC have no polys
+            'gt_poly': polys if i % 4 else [],
+        })
+    return records
+
+
+class TestRoiDbStore(unittest.TestCase):
+    """Test cases for dataset.source.roidb_store
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.records = random_records(50)
+        cls.cname2cid = {'cls_%d' % i: i for i in range(1, 81)}
+        cls.store_dir = os.path.join(cls.tmp_dir, 'test.roidb_store')
+        dump_roidb_store(cls.records, cls.cname2cid, cls.store_dir)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+    def assertRecordEqual(self, rec, expect):
+        self.assertEqual(set(rec.keys()), set(expect.keys()))
+        for k, v in expect.items():
+            if isinstance(v, np.ndarray):
+                self.assertEqual(rec[k].dtype, v.dtype)
+                self.assertTrue(np.array_equal(rec[k], v), k)
+            else:
+                self.assertEqual(rec[k], v, k)
+
+    def test_records(self):
+        """ test records built from store are the same as dumped
+        """
+        store = RoiDbStore(self.store_dir)
+        self.assertEqual(len(store), len(self.records))
+        self.assertEqual(store.cname2cid, self.cname2cid)
+        for rec, expect in zip(store, self.records):
+            self.assertRecordEqual(rec, expect)
+        self.assertRecordEqual(store[-1], self.records[-1])
+
+        rec = store[1]
+        rec['gt_bbox'][:] = 0
+        self.assertRecordEqual(store[1], self.records[1])
+
+        store = RoiDbStore(self.store_dir, 10)
+        self.assertEqual(len(store), 10)
+        self.assertRaises(IndexError, store.__getitem__, 10)
+
+    def test_pickle(self):
+        """ test store is pickled by path
+        """
+        store = RoiDbStore(self.store_dir, 20)
+        data = pkl.dumps(store)
+        self.assertLess(len(data), 1024)
+        store = pkl.loads(data)
+        self.assertEqual(len(store), 20)
+        self.assertRecordEqual(store[3], self.records[3])
+
+    def test_load(self):
+        """ test loading store by 'loader.load' and 'RoiDbSource'
+        """
+        records, cname2cid = loader.load(
+            self.store_dir, 30, with_cat2id=True)
+        self.assertEqual(len(records), 30)
+        self.assertEqual(cname2cid, self.cname2cid)
+
+        source = RoiDbSource(
+            self.store_dir, image_dir=self.tmp_dir, is_shuffle=True)
+        im_ids = []
+        for sample in source:
+            im_ids.append(sample['im_id'][0])
+            self.assertTrue(sample['im_file'].startswith(self.tmp_dir))
+        self.assertTrue(source.drained())
+        self.assertEqual(
+            sorted(im_ids), [r['im_id'][0] for r in self.records])
+        imid2path = source.get_imid2path()
+        self.assertEqual(imid2path[7],
+                         os.path.join(self.tmp_dir, 'image_1.jpg'))
+
+
+if __name__ == '__main__':
+    unittest.main()
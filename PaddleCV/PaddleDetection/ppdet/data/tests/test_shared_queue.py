@@ -0,0 +1,68 @@
+#   Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import gc
+import unittest
+import logging
+import numpy as np
+import multiprocessing as mp
+
+from ppdet.data.transform.shared_queue import SharedQueue
+logging.basicConfig(level=logging.INFO)
+
+
+def _producer(queue, num):
+    for i in range(num):
+        image = np.full((3, 64, 64), i, dtype='float32')
+        queue.put({'image': image, 'im_id': np.array([i]), 'id': i})
+    queue.put('end')
+
+
+class TestSharedQueue(unittest.TestCase):
+    """Test cases for transform.shared_queue
+    """
+
+    def _check_queue(self, zero_copy):
+        queue = SharedQueue(
+            10, memsize=16 * 1024 * 1024, zero_copy=zero_copy)
+        proc = mp.Process(target=_producer, args=(queue, 20))
+        proc.start()
+        samples = []
+        while True:
+            sample = queue.get()
+            if sample == 'end':
+                break
+            samples.append(sample)
+        proc.join()
+
+        self.assertEqual(len(samples), 20)
+        for i, sample in enumerate(samples):
+            self.assertEqual(sample['id'], i)
+            self.assertEqual(sample['im_id'].tolist(), [i])
+            self.assertEqual(sample['image'].shape, (3, 64, 64))
+            self.assertTrue(np.all(sample['image'] == i))
+
+        # shared memory is freed after samples are released
+        samples = sample = None
+        gc.collect()
+        self.assertTrue(queue._shared_mem._allocator.empty())
+
+    def test_pickle(self):
+        self._check_queue(zero_copy=False)
+
+    def test_zero_copy(self):
+        self._check_queue(zero_copy=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
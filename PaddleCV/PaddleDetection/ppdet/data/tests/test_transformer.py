@@ -21,6 +21,7 @@ import numpy as np
 import set_env
 import ppdet.data.transform as tf
 from ppdet.data.source import build_source
+from ppdet.data.tests.test_parallel_map import RangeSource
 
 logger = logging.getLogger(__name__)
 
@@ -112,6 +113,63 @@ class TestTransformer(unittest.TestCase):
             out = sample
         self.assertEqual(len(out), batchsize)
 
+    def test_batch_in_worker(self):
+        """ test batches assembled and post-processed in workers
+        """
+        batchsize = 2
+        mapper = tf.build_mapper(self.ops)
+        post_mapper = tf.post_map.build_post_map(
+            is_padding=True, coarsest_stride=32)
+        batch_mapper = tf.build_batch_mapper(mapper, post_mapper)
+        ds = build_source(self.sc_config)
+        batched_sc = tf.batch(ds, batchsize, True, drop_empty=False)
+        worker_conf = {'WORKER_NUM': 2, 'use_process': True}
+        batched_ds = tf.map(batched_sc, batch_mapper, worker_conf)
+        batched_ds = tf.top_up(batched_ds, batchsize, post_mapper, True)
+        ct = 0
+        for batch in batched_ds:
+            self.assertTrue(len(batch) <= batchsize)
+            shapes = set(sample[0].shape for sample in batch)
+            self.assertEqual(len(shapes), 1)
+            self.assertEqual(shapes.pop()[1] % 32, 0)
+            ct += len(batch)
+        self.assertTrue(ct > 0)
+
+    def test_batch_mapper_top_up(self):
+        """ test batches which lost empty samples are topped up with the
+            samples of the following batches
+        """
+
+        def mapper(sample):
+            # every third sample is mapped empty
+            gt_bbox = np.zeros((0 if sample % 3 == 0 else 1, 4))
+            return (sample, gt_bbox)
+
+        def post_mapper(batch):
+            return [(s[0], len(batch)) for s in batch]
+
+        batch_mapper = tf.build_batch_mapper(mapper, post_mapper)
+        self.assertEqual(batch_mapper([1, 2]), [(1, 2), (2, 2)])
+        self.assertTrue(
+            isinstance(batch_mapper([2, 3]), tf.transformer.ShortBatch))
+
+        expect = [i for i in range(20) if i % 3 != 0]
+        for drop_last in [False, True]:
+            batched_sc = tf.batch(RangeSource(20), 4, drop_empty=False)
+            batched_ds = tf.top_up(
+                tf.map(batched_sc, batch_mapper), 4, post_mapper, drop_last)
+            batches = list(batched_ds)
+            samples = [s[0] for b in batches for s in b]
+            # every sample is output at most once
+            self.assertEqual(len(samples), len(set(samples)))
+            self.assertTrue(set(samples) <= set(expect))
+            self.assertTrue(all(s[1] == len(b) for b in batches for s in b))
+            if drop_last:
+                self.assertTrue(all(len(b) == 4 for b in batches))
+                self.assertEqual(len(samples), len(expect) // 4 * 4)
+            else:
+                self.assertEqual(sorted(samples), expect)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -14,7 +14,8 @@
 
 # function:
 #   tool used convert COCO or VOC data to a pickled file whose
-#   schema for each sample is the same.
+#   schema for each sample is the same, or to a columnar roidb
+#   store which is memory-mapped when loading.
 #
 # notes:
 #   Original data format of COCO or VOC can also be directly
@@ -39,6 +40,7 @@ if path not in sys.path:
     sys.path.insert(0, path)
 
 from data.source import loader
+from data.source.roidb_store import dump_roidb_store
 
 
 def parse_args():
@@ -51,7 +53,8 @@ def parse_args():
         '--type',
         type=str,
         default='json',
-        help='file format of label file, eg: json for COCO and xml for VOC')
+        help='file format of label file, eg: json for COCO, xml for VOC '
+        'and roidb for pickled file')
     parser.add_argument(
         '--annotation',
         type=str,
@@ -67,11 +70,32 @@ def parse_args():
         type=int,
         default=-1,
         help='number of samples to dump, default to all')
+    parser.add_argument(
+        '--format',
+        type=str,
+        default='pickle',
+        help='output format, pickle for a .roidb file and store for '
+        'a directory of columnar roidb store')
 
     args = parser.parse_args()
     return args
 
 
+def dump_records(roidb, cat2id, save_dir, dsname, fmt):
+    """ Save records in format 'fmt', and return the saved path
+    """
+    if fmt == 'store':
+        roidb_fname = save_dir + "/%s.roidb_store" % (dsname)
+        dump_roidb_store(roidb, cat2id, roidb_fname)
+    elif fmt == 'pickle':
+        roidb_fname = save_dir + "/%s.roidb" % (dsname)
+        with open(roidb_fname, "wb") as fout:
+            pkl.dump((roidb, cat2id), fout)
+    else:
+        raise ValueError('invalid output format[%s]' % (fmt))
+    return roidb_fname
+
+
 def dump_coco_as_pickle(args):
     """ Load COCO data, and then save it as pickled file.
 
@@ -87,9 +111,7 @@ def dump_coco_as_pickle(args):
     roidb, cat2id = loader.load(anno_path, samples, with_cat2id=True)
     samples = len(roidb)
     dsname = os.path.basename(anno_path).rstrip('.json')
-    roidb_fname = save_dir + "/%s.roidb" % (dsname)
-    with open(roidb_fname, "wb") as fout:
-        pkl.dump((roidb, cat2id), fout)
+    roidb_fname = dump_records(roidb, cat2id, save_dir, dsname, args.format)
 
     #for rec in roidb:
     #    sys.stderr.write('%s\n' % (rec['im_file']))
@@ -115,9 +137,7 @@ def dump_voc_as_pickle(args):
     samples = len(roidb)
     part = anno_path.split('/')
     dsname = part[-4]
-    roidb_fname = save_dir + "/%s.roidb" % (dsname)
-    with open(roidb_fname, "wb") as fout:
-        pkl.dump((roidb, cat2id), fout)
+    roidb_fname = dump_records(roidb, cat2id, save_dir, dsname, args.format)
     anno_path = os.path.join(anno_path.split('/train.txt')[0], 'label_list.txt')
     with open(anno_path, 'w') as fw:
         for key in cat2id.keys():
@@ -125,6 +145,20 @@ def dump_voc_as_pickle(args):
     logging.info('dumped %d samples to file[%s]' % (samples, roidb_fname))
 
 
+def convert_roidb_to_store(args):
+    """ Load a pickled roidb file, and then save it as roidb store.
+    """
+    save_dir = args.save_dir
+    if not os.path.exists(save_dir):
+        os.makedirs(save_dir)
+    anno_path = os.path.expanduser(args.annotation)
+    roidb, cat2id = loader.load_roidb(anno_path, args.samples)
+    samples = len(roidb)
+    dsname = os.path.basename(anno_path)[:-len('.roidb')]
+    roidb_fname = dump_records(roidb, cat2id, save_dir, dsname, 'store')
+    logging.info('dumped %d samples to file[%s]' % (samples, roidb_fname))
+
+
 if __name__ == "__main__":
     """ Make sure you have already downloaded original COCO or VOC data,
         then you can convert it using this tool.
@@ -133,6 +167,13 @@ if __name__ == "__main__":
         python generate_data_for_training.py --type=json
             --annotation=./annotations/instances_val2017.json
             --save-dir=./roidb --samples=100
+
+        add '--format=store' to save a memory-mapped roidb store,
+        or convert an existing pickled file by:
+
+        python generate_data_for_training.py --type=roidb
+            --annotation=./roidb/instances_val2017.roidb
+            --save-dir=./roidb
     """
     args = parse_args()
 
@@ -142,6 +183,9 @@ if __name__ == "__main__":
     # COCO data are organized in json file
     elif args.type == 'json':
         dump_coco_as_pickle(args)
+    # pickled records converted to roidb store
+    elif args.type == 'roidb':
+        convert_roidb_to_store(args)
     else:
         TypeError('Can\'t deal with {} type. '\
             'Only xml or json file format supported'.format(args.type))
@@ -19,12 +19,15 @@ import copy
 import logging
 import traceback
 
-from .transformer import MappedDataset, BatchedDataset
+from .transformer import MappedDataset, BatchedDataset, TopUpDataset, \
+    ShortBatch, has_empty
 from .post_map import build_post_map
 from .parallel_map import ParallelMappedDataset
 from .operators import BaseOperator, registered_ops
 
-__all__ = ['build_mapper', 'map', 'batch', 'batch_map']
+__all__ = [
+    'build_mapper', 'build_batch_mapper', 'map', 'batch', 'top_up', 'batch_map'
+]
 
 logger = logging.getLogger(__name__)
 
@@ -84,9 +87,43 @@ def build_mapper(ops, context=None):
         return out
 
     _mapper.ops = op_repr
+    # image caches of operators, whose stats are exposed by reader
+    _mapper.caches = [
+        o.cache for o in op_funcs if getattr(o, 'cache', None) is not None
+    ]
     return _mapper
 
 
+def build_batch_mapper(mapper, post_mapper=None, drop_empty=True):
+    """
+    Build a mapper which maps a list of source samples to a batch,
+    so that batches can be assembled and post-processed in workers
+
+    Args:
+        mapper (function): mapper for every sample
+        post_mapper (function): mapper for the batch of mapped samples
+        drop_empty (bool): drop mapped samples which have empty field,
+            the other samples of the batch are returned as a 'ShortBatch'
+            without post-processing, to be topped up by 'top_up'
+
+    Returns:
+        a mapper function which accept a list of samples and return
+        the processed batch
+    """
+
+    def _batch_mapper(samples):
+        batch = [mapper(sample) for sample in samples]
+        if drop_empty:
+            mapped = [out for out in batch if not has_empty(out)]
+            if len(mapped) < len(batch):
+                return ShortBatch(mapped)
+        if post_mapper is not None and len(batch) > 0:
+            batch = post_mapper(batch)
+        return batch
+
+    return _batch_mapper
+
+
 def map(ds, mapper, worker_args=None):
     """
     Apply 'mapper' to 'ds'
@@ -122,6 +159,23 @@ def batch(ds, batchsize, drop_last=False, drop_empty=True):
                           drop_empty=drop_empty)
 
 
+def top_up(ds, batchsize, post_mapper=None, drop_last=False):
+    """
+    Top up the short batches of batches mapped by 'build_batch_mapper'
+
+    Args:
+        ds (instance of Dataset): dataset of mapped batches
+        batchsize (int): number of samples for a batch
+        post_mapper (function): mapper for the topped up batches
+        drop_last (bool): drop last few samples if not enough for a batch
+
+    Returns:
+        a batched dataset
+    """
+
+    return TopUpDataset(ds, batchsize, post_mapper, drop_last)
+
+
 def batch_map(ds, config):
     """
     Post process the batches.
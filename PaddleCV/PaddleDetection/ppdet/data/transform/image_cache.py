@@ -0,0 +1,210 @@
+# Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# function:
+#   cache of decoded images, which keeps the recently used images
+#   in memory of each worker, and optionally spills them to a disk
+#   directory whose files are memory-mapped and shared by workers
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import uuid
+import hashlib
+import logging
+import threading
+import multiprocessing as mp
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['ImageCache', 'parse_size', 'merge_stats']
+
+_UNITS = {'k': 1024, 'm': 1024**2, 'g': 1024**3}
+
+# indexes of the shared counters
+_HITS, _DISK_HITS, _MISSES, _BYTES, _EVICTIONS = range(5)
+
+
+def parse_size(size):
+    """ parse size like '512M' or '2G' to number of bytes
+    """
+    if size is None:
+        return 0
+    if not isinstance(size, str):
+        return int(size)
+    size = size.strip().lower()
+    if size[-1:] in _UNITS:
+        return int(float(size[:-1]) * _UNITS[size[-1]])
+    return int(size)
+
+
+def merge_stats(caches):
+    """ sum up the stats of 'caches'
+    """
+    stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'bytes': 0,
+             'evictions': 0}
+    for cache in caches:
+        for k, v in cache.stats().items():
+            if k in stats:
+                stats[k] += v
+    lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+    stats['hit_rate'] = float(lookups - stats['misses']) / lookups \
+        if lookups > 0 else 0.
+    return stats
+
+
+class ImageCache(object):
+    """ LRU cache of decoded images keyed by file name
+
+    Images are kept in memory until 'capacity' bytes are used, after
+    that the least recently used ones are evicted. The memory part is
+    private to each worker, but the counters are shared by workers
+    forked after the cache is created. If 'cache_dir' is given, the
+    missed images are also saved there as '.npy' files, which are
+    memory-mapped when loaded, so all workers share the page cache.
+
+    Args:
+        capacity (int|str): bytes of memory for each worker, eg: '1G'
+        cache_dir (str): directory of the disk cache, None to disable it
+    """
+
+    def __init__(self, capacity=0, cache_dir=None):
+        self._capacity = parse_size(capacity)
+        self._cache_dir = cache_dir
+        if cache_dir is not None and not os.path.exists(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError:
+                # created by another process
+                pass
+        self._images = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = mp.Array('q', 5)
+
+    def __getstate__(self):
+        # counters can only be shared by inheritance, so a copied
+        # cache starts with new counters and an empty memory part
+        return {'capacity': self._capacity, 'cache_dir': self._cache_dir}
+
+    def __setstate__(self, state):
+        self.__init__(state['capacity'], state['cache_dir'])
+
+    def __str__(self):
+        return 'ImageCache(capacity:%d,cache_dir:%s)' % (self._capacity,
+                                                         self._cache_dir)
+
+    def _count(self, idx, num=1):
+        with self._counters.get_lock():
+            self._counters[idx] += num
+
+    def _disk_path(self, key):
+        name = hashlib.md5(key.encode('utf-8')).hexdigest()
+        return os.path.join(self._cache_dir, name[:2], name + '.npy')
+
+    def _load_from_disk(self, key):
+        fname = self._disk_path(key)
+        if not os.path.exists(fname):
+            return None
+        try:
+            return np.load(fname, mmap_mode='r')
+        except (IOError, ValueError) as e:
+            logger.warn('failed to load cached image {}: {}'.format(fname, e))
+            return None
+
+    def _save_to_disk(self, key, image):
+        fname = self._disk_path(key)
+        if os.path.exists(fname):
+            return
+        dirname = os.path.dirname(fname)
+        if not os.path.exists(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                pass
+        # rename is atomic, so other workers never see a partial file
+        tmp = '%s.%s.tmp.npy' % (fname[:-len('.npy')], uuid.uuid4().hex)
+        np.save(tmp, image)
+        os.rename(tmp, fname)
+
+    def _put_in_memory(self, key, image):
+        if image.nbytes > self._capacity:
+            return
+        with self._lock:
+            if key in self._images:
+                return
+            self._images[key] = image
+            self._bytes += image.nbytes
+            freed = 0
+            evicted = 0
+            while self._bytes > self._capacity:
+                _, old = self._images.popitem(last=False)
+                self._bytes -= old.nbytes
+                freed += old.nbytes
+                evicted += 1
+        self._count(_BYTES, image.nbytes - freed)
+        if evicted > 0:
+            self._count(_EVICTIONS, evicted)
+
+    def get(self, key):
+        """ get a copy of cached image 'key', None if not cached
+        """
+        with self._lock:
+            image = self._images.pop(key, None)
+            if image is not None:
+                # move to the most recently used end
+                self._images[key] = image
+        if image is not None:
+            self._count(_HITS)
+            return image.copy()
+
+        if self._cache_dir is not None:
+            image = self._load_from_disk(key)
+            if image is not None:
+                self._count(_DISK_HITS)
+                image = np.array(image)
+                if image.nbytes <= self._capacity:
+                    self._put_in_memory(key, image)
+                    image = image.copy()
+                return image
+
+        self._count(_MISSES)
+        return None
+
+    def put(self, key, image):
+        """ cache a copy of 'image' with 'key'
+        """
+        image = np.ascontiguousarray(image).copy()
+        self._put_in_memory(key, image)
+        if self._cache_dir is not None:
+            self._save_to_disk(key, image)
+
+    def stats(self):
+        """ counters of all workers sharing this cache
+        """
+        with self._counters.get_lock():
+            counters = list(self._counters)
+        return {
+            'hits': counters[_HITS],
+            'disk_hits': counters[_DISK_HITS],
+            'misses': counters[_MISSES],
+            'bytes': counters[_BYTES],
+            'evictions': counters[_EVICTIONS],
+        }
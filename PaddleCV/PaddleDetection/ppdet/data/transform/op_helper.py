@@ -62,52 +62,59 @@ def is_overlap(object_bbox, sample_bbox):
 
 
 def filter_and_process(sample_bbox, bboxes, labels, scores=None):
-    new_bboxes = []
-    new_labels = []
-    new_scores = []
-    for i in range(len(bboxes)):
-        new_bbox = [0, 0, 0, 0]
-        obj_bbox = [bboxes[i][0], bboxes[i][1], bboxes[i][2], bboxes[i][3]]
-        if not meet_emit_constraint(obj_bbox, sample_bbox):
-            continue
-        if not is_overlap(obj_bbox, sample_bbox):
-            continue
-        sample_width = sample_bbox[2] - sample_bbox[0]
-        sample_height = sample_bbox[3] - sample_bbox[1]
-        new_bbox[0] = (obj_bbox[0] - sample_bbox[0]) / sample_width
-        new_bbox[1] = (obj_bbox[1] - sample_bbox[1]) / sample_height
-        new_bbox[2] = (obj_bbox[2] - sample_bbox[0]) / sample_width
-        new_bbox[3] = (obj_bbox[3] - sample_bbox[1]) / sample_height
-        new_bbox = clip_bbox(new_bbox)
-        if bbox_area(new_bbox) > 0:
-            new_bboxes.append(new_bbox)
-            new_labels.append([labels[i][0]])
-            if scores is not None:
-                new_scores.append([scores[i][0]])
-    bboxes = np.array(new_bboxes)
-    labels = np.array(new_labels)
-    scores = np.array(new_scores)
+    """
+    Keep the boxes whose centers are in 'sample_bbox' and overlap with
+    it, and transform them to the coordinates of 'sample_bbox'.
+    """
+    bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    sample_bbox = [float(x) for x in sample_bbox[:4]]
+    center_x = (bboxes[:, 2] + bboxes[:, 0]) / 2
+    center_y = (bboxes[:, 3] + bboxes[:, 1]) / 2
+    # meet_emit_constraint and is_overlap
+    keep = (center_x >= sample_bbox[0]) & (center_x <= sample_bbox[2]) & \
+        (center_y >= sample_bbox[1]) & (center_y <= sample_bbox[3]) & \
+        (bboxes[:, 0] < sample_bbox[2]) & (bboxes[:, 2] > sample_bbox[0]) & \
+        (bboxes[:, 1] < sample_bbox[3]) & (bboxes[:, 3] > sample_bbox[1])
+    sample_width = sample_bbox[2] - sample_bbox[0]
+    sample_height = sample_bbox[3] - sample_bbox[1]
+    new_bboxes = np.empty((int(keep.sum()), 4), dtype=np.float64)
+    new_bboxes[:, 0] = (bboxes[keep, 0] - sample_bbox[0]) / sample_width
+    new_bboxes[:, 1] = (bboxes[keep, 1] - sample_bbox[1]) / sample_height
+    new_bboxes[:, 2] = (bboxes[keep, 2] - sample_bbox[0]) / sample_width
+    new_bboxes[:, 3] = (bboxes[keep, 3] - sample_bbox[1]) / sample_height
+    new_bboxes = np.clip(new_bboxes, 0.0, 1.0)
+    # bbox_area > 0
+    valid = (new_bboxes[:, 2] > new_bboxes[:, 0]) & \
+        (new_bboxes[:, 3] > new_bboxes[:, 1])
+    if not valid.any():
+        return np.array([]), np.array([]), np.array([])
+    idx = np.nonzero(keep)[0][valid]
+    bboxes = new_bboxes[valid]
+    labels = np.asarray(labels)[idx, :1]
+    scores = np.asarray(scores)[idx, :1] if scores is not None \
+        else np.array([])
     return bboxes, labels, scores
 
 
 def bbox_area_sampling(bboxes, labels, scores, target_size, min_size):
-    new_bboxes = []
-    new_labels = []
-    new_scores = []
-    for i, bbox in enumerate(bboxes):
-        w = float((bbox[2] - bbox[0]) * target_size)
-        h = float((bbox[3] - bbox[1]) * target_size)
-        if w * h < float(min_size * min_size):
-            continue
-        else:
-            new_bboxes.append(bbox)
-            new_labels.append(labels[i])
-            if scores is not None and scores.size != 0:
-                new_scores.append(scores[i])
-    bboxes = np.array(new_bboxes)
-    labels = np.array(new_labels)
-    scores = np.array(new_scores)
-    return bboxes, labels, scores
+    """
+    Keep the boxes whose areas are not less than 'min_size' ** 2
+    after resized to 'target_size'.
+    """
+    if len(bboxes) == 0:
+        return np.array([]), np.array([]), np.array([])
+    bboxes = np.asarray(bboxes)
+    w = ((bboxes[:, 2] - bboxes[:, 0]) * target_size).astype(np.float64)
+    h = ((bboxes[:, 3] - bboxes[:, 1]) * target_size).astype(np.float64)
+    keep = w * h >= float(min_size * min_size)
+    if not keep.any():
+        return np.array([]), np.array([]), np.array([])
+    labels = np.asarray(labels)[keep]
+    if scores is not None and scores.size != 0:
+        scores = np.asarray(scores)[keep]
+    else:
+        scores = np.array([])
+    return bboxes[keep], labels, scores
 
 
 def generate_sample_bbox(sampler):
@@ -148,6 +155,65 @@ def generate_sample_bbox_square(sampler, image_width, image_height):
     return sampled_bbox
 
 
+def generate_sample_bboxes(sampler, num, image_width=None,
+                           image_height=None):
+    """
+    Generate 'num' sample bboxes like 'generate_sample_bbox' at once,
+    or like 'generate_sample_bbox_square' if image size is given.
+
+    Returns:
+        np.ndarray with shape [num, 4]
+    """
+    rand = np.random.random_sample((4, num))
+    scale = sampler[2] + (sampler[3] - sampler[2]) * rand[0]
+    aspect_ratio = sampler[4] + (sampler[5] - sampler[4]) * rand[1]
+    aspect_ratio = np.clip(aspect_ratio, scale**2.0, 1 / (scale**2.0))
+    bbox_width = scale * (aspect_ratio**0.5)
+    bbox_height = scale / (aspect_ratio**0.5)
+    if image_width is not None and image_height is not None:
+        if image_height < image_width:
+            bbox_width = bbox_height * image_height / image_width
+        else:
+            bbox_height = bbox_width * image_width / image_height
+    sample_bboxes = np.empty((num, 4))
+    sample_bboxes[:, 0] = rand[2] * (1 - bbox_width)
+    sample_bboxes[:, 1] = rand[3] * (1 - bbox_height)
+    sample_bboxes[:, 2] = sample_bboxes[:, 0] + bbox_width
+    sample_bboxes[:, 3] = sample_bboxes[:, 1] + bbox_height
+    return sample_bboxes
+
+
+def sample_bboxes_with_constraint(sampler,
+                                  constraint,
+                                  image_width=None,
+                                  image_height=None,
+                                  min_chunk=8):
+    """
+    Draw at most sampler[1] trials of sample bboxes, and keep the first
+    sampler[0] ones satisfying 'constraint', a function mapping sample
+    bboxes with shape [N, 4] to a bool mask with shape [N]. The trials
+    are drawn in doubling chunks, so an easy constraint only pays for
+    a few trials, and a hard one for a few vectorized calls.
+
+    Returns:
+        list of sample bboxes
+    """
+    max_sample = int(sampler[0])
+    max_trial = int(sampler[1])
+    sampled_bbox = []
+    chunk = min_chunk
+    while max_trial > 0 and len(sampled_bbox) < max_sample:
+        num = min(chunk, max_trial)
+        sample_bboxes = generate_sample_bboxes(sampler, num, image_width,
+                                               image_height)
+        satisfied = sample_bboxes[constraint(sample_bboxes)]
+        sampled_bbox.extend(
+            satisfied[:max_sample - len(sampled_bbox)].tolist())
+        max_trial -= num
+        chunk *= 2
+    return sampled_bbox
+
+
 def data_anchor_sampling(bbox_labels, image_width, image_height, scale_array,
                          resize_width):
     num_gt = len(bbox_labels)
@@ -305,6 +371,106 @@ def satisfy_sample_constraint(sampler,
         return False
 
 
+def _intersect_areas(s, o):
+    # boxes which do not intersect get zero areas
+    inter_w = np.minimum(s[..., 2], o[..., 2]) - \
+        np.maximum(s[..., 0], o[..., 0])
+    inter_h = np.minimum(s[..., 3], o[..., 3]) - \
+        np.maximum(s[..., 1], o[..., 1])
+    return np.maximum(inter_w, 0.) * np.maximum(inter_h, 0.)
+
+
+def jaccard_overlap_matrix(sample_bboxes, object_bboxes):
+    """
+    Jaccard overlaps of every sample bbox with every object bbox, the
+    element [i, j] equals jaccard_overlap(sample_bboxes[i],
+    object_bboxes[j]).
+
+    Returns:
+        np.ndarray with shape [len(sample_bboxes), len(object_bboxes)]
+    """
+    s = np.asarray(sample_bboxes, dtype=np.float64).reshape(-1, 1, 4)
+    o = np.asarray(object_bboxes, dtype=np.float64).reshape(1, -1, 4)
+    inter_size = _intersect_areas(s, o)
+    # both boxes have positive areas where they intersect
+    union = (s[..., 2] - s[..., 0]) * (s[..., 3] - s[..., 1]) + \
+        (o[..., 2] - o[..., 0]) * (o[..., 3] - o[..., 1]) - inter_size
+    return np.divide(
+        inter_size,
+        union,
+        out=np.zeros_like(inter_size),
+        where=inter_size > 0)
+
+
+def bbox_coverage_matrix(object_bboxes, sample_bboxes):
+    """
+    Coverages of every object bbox by every sample bbox, the element
+    [i, j] equals bbox_coverage(object_bboxes[j], sample_bboxes[i]).
+
+    Returns:
+        np.ndarray with shape [len(sample_bboxes), len(object_bboxes)]
+    """
+    s = np.asarray(sample_bboxes, dtype=np.float64).reshape(-1, 1, 4)
+    o = np.asarray(object_bboxes, dtype=np.float64).reshape(1, -1, 4)
+    inter_size = _intersect_areas(s, o)
+    object_size = (o[..., 2] - o[..., 0]) * (o[..., 3] - o[..., 1])
+    return np.divide(
+        inter_size,
+        np.broadcast_to(object_size, inter_size.shape),
+        out=np.zeros_like(inter_size),
+        where=inter_size > 0)
+
+
+def _in_range(values, min_value, max_value):
+    ok = np.ones(values.shape, dtype=bool)
+    if min_value != 0:
+        ok &= values >= min_value
+    if max_value != 0:
+        ok &= values <= max_value
+    return ok
+
+
+def satisfy_sample_constraints(sampler,
+                               sample_bboxes,
+                               gt_bboxes,
+                               satisfy_all=False):
+    """
+    Vectorized 'satisfy_sample_constraint' of all sample bboxes.
+
+    Returns:
+        np.ndarray of bool with shape [len(sample_bboxes)]
+    """
+    num = len(sample_bboxes)
+    if sampler[6] == 0 and sampler[7] == 0:
+        return np.ones(num, dtype=bool)
+    overlaps = jaccard_overlap_matrix(sample_bboxes, gt_bboxes)
+    satisfied = _in_range(overlaps, sampler[6], sampler[7])
+    if satisfy_all:
+        return satisfied.all(axis=1)
+    return satisfied.any(axis=1)
+
+
+def satisfy_sample_constraints_coverage(sampler, sample_bboxes, gt_bboxes):
+    """
+    Vectorized 'satisfy_sample_constraint_coverage' of all sample bboxes.
+
+    Returns:
+        np.ndarray of bool with shape [len(sample_bboxes)]
+    """
+    num = len(sample_bboxes)
+    has_jaccard_overlap = sampler[6] != 0 or sampler[7] != 0
+    has_object_coverage = sampler[8] != 0 or sampler[9] != 0
+    if not has_jaccard_overlap and not has_object_coverage:
+        return np.ones(num, dtype=bool)
+    # as in 'satisfy_sample_constraint_coverage', once a box meets the
+    # jaccard overlap constraint, the sample is satisfied
+    if has_jaccard_overlap:
+        overlaps = jaccard_overlap_matrix(sample_bboxes, gt_bboxes)
+        return _in_range(overlaps, sampler[6], sampler[7]).any(axis=1)
+    coverages = bbox_coverage_matrix(gt_bboxes, sample_bboxes)
+    return _in_range(coverages, sampler[8], sampler[9]).any(axis=1)
+
+
 def satisfy_sample_constraint_coverage(sampler, sample_bbox, gt_bboxes):
     if sampler[6] == 0 and sampler[7] == 0:
         has_jaccard_overlap = False
@@ -30,10 +30,12 @@ from PIL import Image, ImageEnhance
 
 from ppdet.core.workspace import serializable
 
-from .op_helper import (satisfy_sample_constraint, filter_and_process,
-                        generate_sample_bbox, clip_bbox, data_anchor_sampling,
-                        satisfy_sample_constraint_coverage, crop_image_sampling,
-                        generate_sample_bbox_square, bbox_area_sampling)
+from .image_cache import ImageCache, parse_size
+from .op_helper import (satisfy_sample_constraints, filter_and_process,
+                        sample_bboxes_with_constraint, clip_bbox,
+                        data_anchor_sampling,
+                        satisfy_sample_constraints_coverage,
+                        crop_image_sampling, bbox_area_sampling)
 
 logger = logging.getLogger(__name__)
 
@@ -79,24 +81,36 @@ class BaseOperator(object):
 
 @register_op
 class DecodeImage(BaseOperator):
-    def __init__(self, to_rgb=True, with_mixup=False):
+    def __init__(self,
+                 to_rgb=True,
+                 with_mixup=False,
+                 cache_size=0,
+                 cache_dir=None):
         """ Transform the image data to numpy format.
 
         Args:
             to_rgb (bool): whether to convert BGR to RGB
             with_mixup (bool): whether or not to mixup image and gt_bbbox/gt_score
+            cache_size (int|str): bytes of memory used to cache decoded
+                images in each worker, eg: '2G', 0 to disable it
+            cache_dir (str): directory to save decoded images, which are
+                memory-mapped and shared by workers, None to disable it
         """
 
         super(DecodeImage, self).__init__()
         self.to_rgb = to_rgb
         self.with_mixup = with_mixup
+        self.cache_size = cache_size
+        self.cache_dir = cache_dir
         if not isinstance(self.to_rgb, bool):
             raise TypeError("{}: input type is invalid.".format(self))
         if not isinstance(self.with_mixup, bool):
             raise TypeError("{}: input type is invalid.".format(self))
+        self.cache = None
+        if parse_size(cache_size) > 0 or cache_dir is not None:
+            self.cache = ImageCache(cache_size, cache_dir)
 
-    def __call__(self, sample, context=None):
-        """ load image if 'im_file' field is not empty but 'image' is"""
+    def _decode(self, sample):
         if 'image' not in sample:
             with open(sample['im_file'], 'rb') as f:
                 sample['image'] = f.read()
@@ -106,6 +120,18 @@ class DecodeImage(BaseOperator):
         im = cv2.imdecode(data, 1)  # BGR mode, but need RGB mode
         if self.to_rgb:
             im = cv2.cvtColor(im, cv2.COLOR_BGR2RGB)
+        return im
+
+    def __call__(self, sample, context=None):
+        """ load image if 'im_file' field is not empty but 'image' is"""
+        if self.cache is not None:
+            key = '{}:{}'.format(sample['im_file'], int(self.to_rgb))
+            im = self.cache.get(key)
+            if im is None:
+                im = self._decode(sample)
+                self.cache.put(key, im)
+        else:
+            im = self._decode(sample)
         sample['image'] = im
 
         if 'h' not in sample:
@@ -671,17 +697,11 @@ class CropImage(BaseOperator):
         if 'gt_score' in sample:
             gt_score = sample['gt_score']
         sampled_bbox = []
-        gt_bbox = gt_bbox.tolist()
         for sampler in self.batch_sampler:
-            found = 0
-            for i in range(sampler[1]):
-                if found >= sampler[0]:
-                    break
-                sample_bbox = generate_sample_bbox(sampler)
-                if satisfy_sample_constraint(sampler, sample_bbox, gt_bbox,
-                                             self.satisfy_all):
-                    sampled_bbox.append(sample_bbox)
-                    found = found + 1
+            sampled_bbox.extend(
+                sample_bboxes_with_constraint(
+                    sampler, lambda bboxes: satisfy_sample_constraints(
+                        sampler, bboxes, gt_bbox, self.satisfy_all)))
         im = np.array(im)
         while sampled_bbox:
             idx = int(np.random.uniform(0, len(sampled_bbox)))
@@ -767,23 +787,23 @@ class CropImageWithDataAchorSampling(BaseOperator):
         if 'gt_score' in sample:
             gt_score = sample['gt_score']
         sampled_bbox = []
-        gt_bbox = gt_bbox.tolist()
 
         prob = np.random.uniform(0., 1.)
         if prob > self.sampling_prob:  # anchor sampling
             assert self.anchor_sampler
+            gt_bbox_list = gt_bbox.tolist()
             for sampler in self.anchor_sampler:
                 found = 0
                 for i in range(sampler[1]):
                     if found >= sampler[0]:
                         break
                     sample_bbox = data_anchor_sampling(
-                        gt_bbox, image_width, image_height,
+                        gt_bbox_list, image_width, image_height,
                         self.das_anchor_scales, self.target_size)
                     if sample_bbox == 0:
                         break
-                    if satisfy_sample_constraint_coverage(sampler, sample_bbox,
-                                                          gt_bbox):
+                    if satisfy_sample_constraints_coverage(
+                            sampler, [sample_bbox], gt_bbox)[0]:
                         sampled_bbox.append(sample_bbox)
                         found = found + 1
             im = np.array(im)
@@ -811,16 +831,12 @@ class CropImageWithDataAchorSampling(BaseOperator):
 
         else:
             for sampler in self.batch_sampler:
-                found = 0
-                for i in range(sampler[1]):
-                    if found >= sampler[0]:
-                        break
-                    sample_bbox = generate_sample_bbox_square(
-                        sampler, image_width, image_height)
-                    if satisfy_sample_constraint_coverage(sampler, sample_bbox,
-                                                          gt_bbox):
-                        sampled_bbox.append(sample_bbox)
-                        found = found + 1
+                sampled_bbox.extend(
+                    sample_bboxes_with_constraint(
+                        sampler, lambda bboxes:
+                        satisfy_sample_constraints_coverage(
+                            sampler, bboxes, gt_bbox),
+                        image_width, image_height))
             im = np.array(im)
             while sampled_bbox:
                 idx = int(np.random.uniform(0, len(sampled_bbox)))
@@ -21,10 +21,13 @@ from __future__ import print_function
 
 import sys
 import six
+import time
 import uuid
+import random
 import logging
 import signal
 import threading
+import numpy as np
 from .transformer import ProxiedDataset
 
 logger = logging.getLogger(__name__)
@@ -41,6 +44,31 @@ class ParallelMappedDataset(ProxiedDataset):
     Transform samples to mapped samples which is similar to 'basic.MappedDataset',
     but multiple workers (threads or processes) will be used
 
+    Args:
+        source (Dataset): source dataset to be mapped
+        mapper (callable): function to transform a sample
+        worker_args (dict): configs for workers, including
+            bufsize (int): size of input/output queues
+            worker_num (int): number of workers
+            use_process (bool): use processes instead of threads as workers
+            memsize (str|int): size of shared memory used by queues
+                when 'use_process' is True, eg: '3G'
+            zero_copy (bool): when 'use_process' is True, write ndarrays
+                of mapped samples directly into shared memory and return
+                views on it instead of pickling them
+            preserve_order (bool): output mapped samples in the order of
+                source, samples finished ahead of order are kept in a
+                reorder buffer
+            reorder_bufsize (int): max number of samples which are in
+                process or kept in the reorder buffer, default to
+                2 * bufsize
+            seed (int): when set, 'random' and 'numpy.random' are seeded
+                with 'seed' and sequence number of the sample before
+                mapping it, so random augmentations are reproducible
+                when 'use_process' is True, otherwise worker processes
+                are seeded with a base seed and their worker index, so
+                they do not repeat the random state forked from parent
+
     Notes:
         this class is not thread-safe
     """
@@ -50,7 +78,8 @@ class ParallelMappedDataset(ProxiedDataset):
         worker_args = {k.lower(): v for k, v in worker_args.items()}
 
         args = {'bufsize': 100, 'worker_num': 8,
-            'use_process': False, 'memsize': '3G'}
+            'use_process': False, 'memsize': '3G', 'zero_copy': False,
+            'preserve_order': False, 'reorder_bufsize': None, 'seed': None}
         args.update(worker_args)
         if args['use_process'] and type(args['memsize']) is str:
             assert args['memsize'][-1].lower() == 'g', \
@@ -63,6 +92,11 @@ class ParallelMappedDataset(ProxiedDataset):
         self._source = source
         self._mapper = mapper
         self._exit = False
+        self._preserve_order = args['preserve_order']
+        self._seed = args['seed']
+        # samples are numbered when they are needed to be ordered or seeded
+        self._numbered = self._preserve_order or self._seed is not None
+        self._reorder_bufsize = args['reorder_bufsize'] or 2 * args['bufsize']
         self._setup()
 
     def _setup(self):
@@ -72,6 +106,9 @@ class ParallelMappedDataset(ProxiedDataset):
             logger.info("Use multi-thread reader instead of "
                         "multi-process reader on Windows.")
             use_process = False
+        if self._seed is not None and not use_process:
+            logger.warn("random state is shared by threads, set "
+                        "'use_process' to make mapping reproducible")
 
         bufsize = self._worker_args['bufsize']
         if use_process:
@@ -80,7 +117,8 @@ class ParallelMappedDataset(ProxiedDataset):
             from multiprocessing import Event
             memsize = self._worker_args['memsize']
             self._inq = Queue(bufsize, memsize=memsize)
-            self._outq = Queue(bufsize, memsize=memsize)
+            self._outq = Queue(bufsize, memsize=memsize,
+                               zero_copy=self._worker_args['zero_copy'])
         else:
             if six.PY3:
                 from queue import Queue
@@ -98,12 +136,19 @@ class ParallelMappedDataset(ProxiedDataset):
             args=('producer-' + id, self._source, self._inq))
         self._producer.daemon = True
 
+        # forked workers inherit the random state of parent, so they are
+        # seeded differently unless every sample is seeded
+        base_seed = None
+        if use_process and self._seed is None:
+            base_seed = np.random.randint(2**31)
+
         self._consumers = []
         for i in range(consumer_num):
+            worker_seed = None if base_seed is None else base_seed + i
             p = Worker(
                 target=self._consume,
                 args=('consumer-' + id + '_' + str(i), self._inq, self._outq,
-                      self._mapper))
+                      self._mapper, worker_seed))
             self._consumers.append(p)
             p.daemon = True
 
@@ -113,6 +158,17 @@ class ParallelMappedDataset(ProxiedDataset):
         self._consumed = 0  # consumed sample in self.next
         self._stopped_consumers = 0
 
+        self._seq = 0  # sequence number of next produced sample
+        self._next_seq = 0  # sequence number of next sample to output
+        self._reorder_buf = {}
+        self._order_cond = threading.Condition()
+        self._stats = {
+            'next_time': 0.,
+            'reorder_stall_time': 0.,
+            'reorder_stalls': 0,
+            'max_reorder_buffer': 0,
+        }
+
     def _produce(self, id, source, inq):
         """Fetch data from source and feed it to 'inq' queue"""
         while True:
@@ -120,7 +176,13 @@ class ParallelMappedDataset(ProxiedDataset):
             if self._exit:
                 break
             try:
-                inq.put(source.next())
+                sample = source.next()
+                if self._numbered:
+                    sample = (self._seq, sample)
+                    self._seq += 1
+                if self._preserve_order:
+                    self._wait_reorder_window()
+                inq.put(sample)
                 self._produced += 1
             except StopIteration:
                 self._feeding_ev.clear()
@@ -133,8 +195,20 @@ class ParallelMappedDataset(ProxiedDataset):
 
         logger.debug("producer[{}] exits".format(id))
 
-    def _consume(self, id, inq, outq, mapper):
+    def _wait_reorder_window(self):
+        """ block producer until there are less than 'reorder_bufsize'
+            samples in process or in reorder buffer
+        """
+        with self._order_cond:
+            while not self._exit and \
+                    self._seq - self._next_seq > self._reorder_bufsize:
+                self._order_cond.wait(0.1)
+
+    def _consume(self, id, inq, outq, mapper, worker_seed=None):
         """Fetch data from 'inq', process it and put result to 'outq'"""
+        if worker_seed is not None:
+            random.seed(worker_seed)
+            np.random.seed(worker_seed)
         while True:
             sample = inq.get()
             if isinstance(sample, EndSignal):
@@ -145,7 +219,15 @@ class ParallelMappedDataset(ProxiedDataset):
                 break
 
             try:
-                result = mapper(sample)
+                if self._numbered:
+                    seq, sample = sample
+                    if self._seed is not None:
+                        seed = (self._seed + seq) % (2**32)
+                        random.seed(seed)
+                        np.random.seed(seed)
+                    result = (seq, mapper(sample))
+                else:
+                    result = mapper(sample)
                 outq.put(result)
             except Exception as e:
                 msg = 'failed to map consumer[%s], error: {}'.format(str(e), id)
@@ -161,6 +243,8 @@ class ParallelMappedDataset(ProxiedDataset):
         """
         self._exit = True
         self._feeding_ev.set()
+        with self._order_cond:
+            self._order_cond.notify_all()
         for _ in range(len(self._consumers)):
             self._inq.put(EndSignal(0, "notify consumers to exit"))
 
@@ -173,8 +257,25 @@ class ParallelMappedDataset(ProxiedDataset):
         if self.drained():
             raise StopIteration()
 
+        start = time.time()
+        try:
+            return self._next()
+        finally:
+            self._stats['next_time'] += time.time() - start
+
+    def _next(self):
         while True:
+            if self._preserve_order and self._next_seq in self._reorder_buf:
+                return self._pop_ordered()
+
+            get_start = time.time()
             sample = self._outq.get()
+            if self._preserve_order and len(self._reorder_buf) > 0:
+                # blocked by a sample which is not finished yet while
+                # samples behind it are ready
+                self._stats['reorder_stall_time'] += time.time() - get_start
+                self._stats['reorder_stalls'] += 1
+
             if isinstance(sample, EndSignal):
                 self._stopped_consumers += 1
                 if sample.errno != 0:
@@ -185,9 +286,32 @@ class ParallelMappedDataset(ProxiedDataset):
                     self._inq.put(sample)
                 else:
                     raise ValueError("all consumers exited, no more samples")
+            elif self._preserve_order:
+                seq, sample = sample
+                self._reorder_buf[seq] = sample
+                self._stats['max_reorder_buffer'] = max(
+                    self._stats['max_reorder_buffer'], len(self._reorder_buf))
             else:
                 self._consumed += 1
-                return sample
+                return sample[1] if self._numbered else sample
+
+    def _pop_ordered(self):
+        sample = self._reorder_buf.pop(self._next_seq)
+        with self._order_cond:
+            self._next_seq += 1
+            self._order_cond.notify_all()
+        self._consumed += 1
+        return sample
+
+    def stats(self):
+        """ statistics of the mapping, including
+            next_time: time spent in 'next'
+            reorder_stall_time: time spent waiting for the next sample in
+                order while later samples are ready in reorder buffer
+            reorder_stalls: number of such waits
+            max_reorder_buffer: max number of samples in reorder buffer
+        """
+        return dict(self._stats)
 
     def reset(self):
         """ reset for a new epoch of samples
@@ -48,24 +48,35 @@ def build_post_map(coarsest_stride=1,
           }
     Returns:
         a mapper function which accept one argument 'batch' and
-        return the processed result
+        return the processed result, its attribute 'padding_stats' counts
+        the padded batches, the pixels of their images and the pixels of
+        the padded images
     """
+    padding_stats = {'batches': 0, 'pixels': 0, 'padded_pixels': 0}
 
     def padding_minibatch(batch_data):
+        shapes = np.array([data[0].shape for data in batch_data])
+        padding_stats['batches'] += 1
+        padding_stats['pixels'] += int(np.sum(shapes[:, 1] * shapes[:, 2]))
         if len(batch_data) == 1 and coarsest_stride == 1:
+            padding_stats['padded_pixels'] += int(shapes[0, 1] * shapes[0, 2])
             return batch_data
-        max_shape = np.array([data[0].shape for data in batch_data]).max(axis=0)
+        max_shape = shapes.max(axis=0)
         if coarsest_stride > 1:
             max_shape[1] = int(
                 np.ceil(max_shape[1] / coarsest_stride) * coarsest_stride)
             max_shape[2] = int(
                 np.ceil(max_shape[2] / coarsest_stride) * coarsest_stride)
+        padding_stats['padded_pixels'] += \
+            len(batch_data) * int(max_shape[1] * max_shape[2])
+        # images of the batch are padded into one preallocated array
+        padding_ims = np.zeros(
+            (len(batch_data), max_shape[0], max_shape[1], max_shape[2]),
+            dtype=np.float32)
         padding_batch = []
-        for data in batch_data:
+        for data, padding_im in zip(batch_data, padding_ims):
             im_c, im_h, im_w = data[0].shape[:]
-            padding_im = np.zeros(
-                (im_c, max_shape[1], max_shape[2]), dtype=np.float32)
-            padding_im[:, :im_h, :im_w] = data[0]
+            padding_im[:im_c, :im_h, :im_w] = data[0]
             if use_padded_im_info:
                 data[1][:2] = max_shape[1:3]
             padding_batch.append((padding_im, ) + data[1:])
@@ -149,4 +160,14 @@ def build_post_map(coarsest_stride=1,
 
         return batch_data
 
+    _mapper.padding_stats = padding_stats
     return _mapper
+
+
+def padding_waste(stats):
+    """ fraction of the pixels of padded images which are padding,
+        of the 'padding_stats' of a post mapper
+    """
+    if stats['padded_pixels'] == 0:
+        return 0.
+    return 1. - float(stats['pixels']) / stats['padded_pixels']
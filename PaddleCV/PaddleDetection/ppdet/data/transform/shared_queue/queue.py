@@ -26,8 +26,10 @@ else:
     import cPickle as pickle
     from cStringIO import StringIO
 
+import struct
 import logging
 import traceback
+import numpy as np
 import multiprocessing as mp
 from multiprocessing.queues import Queue
 from .sharedmemory import SharedMemoryMgr
@@ -41,12 +43,109 @@ class SharedQueueError(ValueError):
     pass
 
 
+class SharedNdarray(object):
+    """ placeholder of a ndarray which is stored directly in shared memory
+        pages instead of being pickled
+    """
+
+    def __init__(self, offset, shape, dtype):
+        self.offset = offset
+        self.shape = shape
+        self.dtype = dtype
+
+
+class SharedBufferRef(object):
+    """ keep a SharedBuffer alive while there are ndarray views on it,
+        and free it when all of these views are released
+    """
+
+    def __init__(self, buff, data):
+        self._buff = buff
+        self._data = data
+        # keep the memory manager alive until the buffer is freed
+        self._mgr = buff.owner()
+        self.__array_interface__ = data.__array_interface__
+
+    def __del__(self):
+        if self._buff is not None:
+            self._buff.free()
+            self._buff = None
+
+
+def _align(size, alignment=64):
+    return (size + alignment - 1) // alignment * alignment
+
+
+def _split_ndarrays(obj, arrays, min_size):
+    """ replace large ndarrays in nested dict/list/tuple 'obj' with
+        'SharedNdarray' placeholders and collect them to 'arrays',
+        the offsets of placeholders are aligned and relative to the
+        start of ndarray data
+    """
+    if type(obj) is np.ndarray:
+        if obj.dtype.hasobject or obj.nbytes < min_size:
+            return obj
+        offset = 0
+        if len(arrays) > 0:
+            offset = _align(arrays[-1][0].offset + arrays[-1][1].nbytes)
+        placeholder = SharedNdarray(offset, obj.shape, obj.dtype.str)
+        arrays.append((placeholder, obj))
+        return placeholder
+    elif type(obj) is dict:
+        return {k: _split_ndarrays(v, arrays, min_size)
+                for k, v in obj.items()}
+    elif type(obj) in [list, tuple]:
+        return type(obj)(_split_ndarrays(v, arrays, min_size) for v in obj)
+    else:
+        return obj
+
+
+def _merge_ndarrays(obj, base):
+    """ replace 'SharedNdarray' placeholders in 'obj' with views on 'base'
+    """
+    if type(obj) is SharedNdarray:
+        dtype = np.dtype(obj.dtype)
+        size = int(np.prod(obj.shape)) * dtype.itemsize
+        data = base[obj.offset:obj.offset + size]
+        return data.view(dtype).reshape(obj.shape)
+    elif type(obj) is dict:
+        return {k: _merge_ndarrays(v, base) for k, v in obj.items()}
+    elif type(obj) in [list, tuple]:
+        return type(obj)(_merge_ndarrays(v, base) for v in obj)
+    else:
+        return obj
+
+
+def _has_shared_ndarray(obj):
+    if type(obj) is SharedNdarray:
+        return True
+    elif type(obj) is dict:
+        return any(_has_shared_ndarray(v) for v in obj.values())
+    elif type(obj) in [list, tuple]:
+        return any(_has_shared_ndarray(v) for v in obj)
+    else:
+        return False
+
+
 class SharedQueue(Queue):
     """ a Queue based on shared memory to communicate data between Process,
         and it's interface is compatible with 'multiprocessing.queues.Queue'
+
+        when 'zero_copy' is True, ndarrays in the put object not smaller
+        than 'zero_copy_min_size' bytes are written directly into shared
+        memory pages and the getter receives views on these pages, so
+        only a small header is pickled. The pages are freed when all of
+        the views are released.
     """
+    s_header_size = 8
 
-    def __init__(self, maxsize=0, mem_mgr=None, memsize=None, pagesize=None):
+    def __init__(self,
+                 maxsize=0,
+                 mem_mgr=None,
+                 memsize=None,
+                 pagesize=None,
+                 zero_copy=False,
+                 zero_copy_min_size=4096):
         """ init
         """
         if six.PY3:
@@ -59,10 +158,15 @@ class SharedQueue(Queue):
         else:
             self._shared_mem = SharedMemoryMgr(
                 capacity=memsize, pagesize=pagesize)
+        self._zero_copy = zero_copy
+        self._zero_copy_min_size = zero_copy_min_size
 
     def put(self, obj, **kwargs):
         """ put an object to this queue
         """
+        if self._zero_copy:
+            return self._put_zero_copy(obj, **kwargs)
+
         obj = pickle.dumps(obj, -1)
         buff = None
         try:
@@ -79,6 +183,43 @@ class SharedQueue(Queue):
                 buff.free()
             raise e
 
+    def _put_zero_copy(self, obj, **kwargs):
+        """ put an object with its ndarrays stored out of the pickled
+            header, the layout in shared memory is:
+            [header size][header][aligned ndarray data]...
+        """
+        arrays = []
+        obj = _split_ndarrays(obj, arrays, self._zero_copy_min_size)
+        header = pickle.dumps(obj, -1)
+        start = _align(self.s_header_size + len(header))
+        total = start
+        if len(arrays) > 0:
+            total += arrays[-1][0].offset + arrays[-1][1].nbytes
+
+        buff = None
+        try:
+            buff = self._shared_mem.malloc(total)
+            buff.resize(total)
+            data = buff.get()
+            data[:self.s_header_size] = np.frombuffer(
+                struct.pack(str('Q'), len(header)), dtype='uint8')
+            data[self.s_header_size:self.s_header_size + len(header)] = \
+                np.frombuffer(header, dtype='uint8')
+            for placeholder, arr in arrays:
+                offset = start + placeholder.offset
+                dst = data[offset:offset + arr.nbytes].view(arr.dtype)
+                np.copyto(dst.reshape(arr.shape), arr)
+            super(SharedQueue, self).put(buff, **kwargs)
+        except Exception as e:
+            stack_info = traceback.format_exc()
+            err_msg = 'failed to put a element to SharedQueue '\
+                'with stack info[%s]' % (stack_info)
+            logger.warn(err_msg)
+
+            if buff is not None:
+                buff.free()
+            raise e
+
     def get(self, **kwargs):
         """ get an object from this queue
         """
@@ -86,6 +227,9 @@ class SharedQueue(Queue):
         try:
             buff = super(SharedQueue, self).get(**kwargs)
             data = buff.get()
+            if self._zero_copy:
+                obj, buff = self._get_zero_copy(buff, data)
+                return obj
             return pickle.load(StringIO(data))
         except Exception as e:
             stack_info = traceback.format_exc()
@@ -97,6 +241,19 @@ class SharedQueue(Queue):
             if buff is not None:
                 buff.free()
 
+    def _get_zero_copy(self, buff, data):
+        """ rebuild the object put by '_put_zero_copy', returns the object
+            and the buffer to be freed now if no ndarray view refers to it
+        """
+        header_size = struct.unpack(
+            str('Q'), data[:self.s_header_size].tostring())[0]
+        end = self.s_header_size + header_size
+        obj = pickle.load(StringIO(data[self.s_header_size:end]))
+        if not _has_shared_ndarray(obj):
+            return obj, buff
+        base = np.asarray(SharedBufferRef(buff, data))
+        return _merge_ndarrays(obj, base[_align(end):]), None
+
     def release(self):
         self._shared_mem.release()
         self._shared_mem = None
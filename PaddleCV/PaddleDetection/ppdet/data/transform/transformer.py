@@ -22,6 +22,24 @@ import collections
 from ..dataset import Dataset
 
 
+def has_empty(items):
+    """whether any field of a sample is None or empty"""
+
+    def empty(x):
+        if isinstance(x, np.ndarray) and x.size == 0:
+            return True
+        elif isinstance(x, collections.Sequence) and len(x) == 0:
+            return True
+        else:
+            return False
+
+    if any(x is None for x in items):
+        return True
+    if any(empty(x) for x in items):
+        return True
+    return False
+
+
 class ProxiedDataset(Dataset):
     """proxy method called to 'self._ds' when if not defined"""
 
@@ -77,22 +95,6 @@ class BatchedDataset(ProxiedDataset):
 
     def next(self):
         """proxy to self._ds.next"""
-
-        def empty(x):
-            if isinstance(x, np.ndarray) and x.size == 0:
-                return True
-            elif isinstance(x, collections.Sequence) and len(x) == 0:
-                return True
-            else:
-                return False
-
-        def has_empty(items):
-            if any(x is None for x in items):
-                return True
-            if any(empty(x) for x in items):
-                return True
-            return False
-
         batch = []
         for _ in range(self._batchsz):
             try:
@@ -106,3 +108,62 @@ class BatchedDataset(ProxiedDataset):
                 else:
                     raise StopIteration
         return batch
+
+
+class ShortBatch(list):
+    """
+    Mapped samples of a batch which lost its empty samples, they are not
+    post-processed yet so that 'TopUpDataset' can top them up
+    """
+    pass
+
+
+class TopUpDataset(ProxiedDataset):
+    """
+    Top up the short batches of a dataset of batches mapped in workers
+    with the samples of the following short batches, like the samples
+    fetched again by 'BatchedDataset' for the empty ones
+
+    Args:
+        ds (instance of Dataset): dataset of batches, short ones are
+            instances of 'ShortBatch'
+        batchsize (int): sample number for each batch
+        post_mapper (callable): post-process of the topped up batches
+        drop_last (bool): drop last samples when not enough for one batch
+    """
+
+    def __init__(self, ds, batchsize, post_mapper=None, drop_last=False):
+        super(TopUpDataset, self).__init__(ds)
+        self._batchsz = batchsize
+        self._post_mapper = post_mapper
+        self._drop_last = drop_last
+        self._samples = []
+
+    def next(self):
+        """proxy to self._ds.next"""
+        while len(self._samples) < self._batchsz:
+            try:
+                batch = self._ds.next()
+            except StopIteration:
+                samples, self._samples = self._samples, []
+                if self._drop_last or len(samples) == 0:
+                    raise StopIteration
+                return self._post_map(samples)
+            if not isinstance(batch, ShortBatch):
+                return batch
+            self._samples.extend(batch)
+        batch = self._samples[:self._batchsz]
+        self._samples = self._samples[self._batchsz:]
+        return self._post_map(batch)
+
+    def _post_map(self, batch):
+        if self._post_mapper is not None:
+            batch = self._post_mapper(batch)
+        return batch
+
+    def drained(self):
+        return len(self._samples) == 0 and self._ds.drained()
+
+    def reset(self):
+        self._samples = []
+        self._ds.reset()
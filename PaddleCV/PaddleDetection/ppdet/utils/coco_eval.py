@@ -20,6 +20,8 @@ from __future__ import unicode_literals
 import os
 import sys
 import json
+import time
+import collections
 import cv2
 import numpy as np
 import matplotlib
@@ -33,6 +35,7 @@ __all__ = [
     'mask_eval',
     'bbox2out',
     'mask2out',
+    'COCOResultWriter',
     'get_category_info',
     'proposal_eval',
     'cocoapi_eval',
@@ -69,7 +72,12 @@ def bbox_eval(results,
               outfile,
               with_background=True,
               is_bbox_normalized=False):
-    assert 'bbox' in results[0]
+    """
+    Convert the outputs of each batch in `results` and write them to
+    `outfile` as they come, then evaluate the file by COCO API.
+    `results` can be a generator of the outputs of batches as they are
+    run, eg. `iter_eval_run`, so they are not kept in memory.
+    """
     assert outfile.endswith('.json')
     from pycocotools.coco import COCO
 
@@ -82,16 +90,20 @@ def bbox_eval(results,
         {i + int(with_background): catid
          for i, catid in enumerate(cat_ids)})
 
-    xywh_results = bbox2out(
-        results, clsid2catid, is_bbox_normalized=is_bbox_normalized)
+    start = time.time()
+    with COCOResultWriter(outfile) as writer:
+        for t in _with_key(results, 'bbox'):
+            writer.write(
+                bbox2out(
+                    [t], clsid2catid, is_bbox_normalized=is_bbox_normalized))
+    _log_write_cost(writer, start)
 
-    if len(xywh_results) == 0:
+    if writer.num == 0:
+        os.remove(outfile)
         logger.warning("The number of valid bbox detected is zero.\n \
             Please use reasonable model and check input data.\n \
             stop eval!")
         return [0.0]
-    with open(outfile, 'w') as f:
-        json.dump(xywh_results, f)
 
     map_stats = cocoapi_eval(outfile, 'bbox', coco_gt=coco_gt)
     # flush coco evaluation result
@@ -99,24 +111,89 @@ def bbox_eval(results,
     return map_stats
 
 
-def mask_eval(results, anno_file, outfile, resolution, thresh_binarize=0.5):
-    assert 'mask' in results[0]
+def mask_eval(results,
+              anno_file,
+              outfile,
+              resolution,
+              thresh_binarize=0.5,
+              num_workers=0,
+              bbox_outfile=None,
+              with_background=True,
+              is_bbox_normalized=False):
+    """
+    Same as `bbox_eval` for the masks, which are encoded in a pool of
+    `num_workers` processes if it's positive. If `bbox_outfile` is given,
+    the bboxes of the batches are written to it in the same pass and
+    evaluated too, so a generator of batches is only read once, and the
+    bbox stats are returned.
+    """
     assert outfile.endswith('.json')
     from pycocotools.coco import COCO
 
     coco_gt = COCO(anno_file)
-    clsid2catid = {i + 1: v for i, v in enumerate(coco_gt.getCatIds())}
-
-    segm_results = mask2out(results, clsid2catid, resolution, thresh_binarize)
-    if len(segm_results) == 0:
+    cat_ids = coco_gt.getCatIds()
+    clsid2catid = {i + 1: v for i, v in enumerate(cat_ids)}
+
+    bbox_writer = None
+    if bbox_outfile is not None:
+        assert bbox_outfile.endswith('.json')
+        bbox_writer = COCOResultWriter(bbox_outfile)
+        bbox_clsid2catid = {
+            i + int(with_background): v
+            for i, v in enumerate(cat_ids)
+        }
+
+    def _batches():
+        for t in _with_key(results, 'mask'):
+            if bbox_writer is not None:
+                bbox_writer.write(
+                    bbox2out(
+                        [t],
+                        bbox_clsid2catid,
+                        is_bbox_normalized=is_bbox_normalized))
+            yield t
+
+    start = time.time()
+    with COCOResultWriter(outfile) as writer:
+        try:
+            for segm_res in mask2out_iter(_batches(), clsid2catid,
+                                          resolution, thresh_binarize,
+                                          num_workers):
+                writer.write(segm_res)
+        finally:
+            if bbox_writer is not None:
+                bbox_writer.close()
+    _log_write_cost(writer, start)
+
+    map_stats = None
+    if bbox_writer is not None:
+        if bbox_writer.num == 0:
+            os.remove(bbox_outfile)
+            logger.warning("The number of valid bbox detected is zero.\n \
+                Please use reasonable model and check input data.\n \
+                stop eval!")
+            map_stats = [0.0]
+        else:
+            map_stats = cocoapi_eval(bbox_outfile, 'bbox', coco_gt=coco_gt)
+            sys.stdout.flush()
+
+    if writer.num == 0:
+        os.remove(outfile)
         logger.warning("The number of valid mask detected is zero.\n \
             Please use reasonable model and check input data.")
-        return
-
-    with open(outfile, 'w') as f:
-        json.dump(segm_results, f)
+        return map_stats
 
     cocoapi_eval(outfile, 'segm', coco_gt=coco_gt)
+    return map_stats
+
+
+def _with_key(results, key):
+    """
+    Yield the outputs of the batches in `results`, which must have `key`.
+    """
+    for t in results:
+        assert key in t, "no '{}' in the outputs of batch".format(key)
+        yield t
 
 
 def cocoapi_eval(jsonfile,
@@ -242,84 +319,188 @@ def bbox2out(results, clsid2catid, is_bbox_normalized=False):
     return xywh_res
 
 
-def mask2out(results, clsid2catid, resolution, thresh_binarize=0.5):
-    import pycocotools.mask as mask_util
-    scale = (resolution + 2.0) / resolution
-
+def mask2out(results,
+             clsid2catid,
+             resolution,
+             thresh_binarize=0.5,
+             num_workers=0):
+    """
+    Args:
+        results: request a dict, should include: `bbox`, `mask`, `im_id`
+                 and `im_shape`.
+        clsid2catid: class id to category id map of COCO2017 dataset.
+        resolution: resolution of the predicted masks.
+        thresh_binarize: threshold to binarize the resized masks.
+        num_workers: number of processes to resize and encode masks,
+                     0 to encode them in the current process.
+    """
     segm_res = []
+    for res in mask2out_iter(results, clsid2catid, resolution,
+                             thresh_binarize, num_workers):
+        segm_res.extend(res)
+    return segm_res
 
-    # for each batch
-    for t in results:
-        bboxes = t['bbox'][0]
 
-        lengths = t['bbox'][1][0]
-        im_ids = np.array(t['im_id'][0])
-        if bboxes.shape == (1, 1) or bboxes is None:
-            continue
-        if len(bboxes.tolist()) == 0:
-            continue
+def mask2out_iter(results,
+                  clsid2catid,
+                  resolution,
+                  thresh_binarize=0.5,
+                  num_workers=0):
+    """
+    Same as `mask2out`, but yield the COCO results of each batch in
+    order, so they can be written out without being kept in memory.
+    `results` are read in the calling thread, at most 2 * `num_workers`
+    batches ahead of the yielded ones.
+    """
+    tasks = (_mask_task(t, clsid2catid, resolution, thresh_binarize)
+             for t in results)
+    if num_workers > 0:
+        import multiprocessing as mp
+        pool = mp.Pool(num_workers)
+        pending = collections.deque()
+        try:
+            for task in tasks:
+                pending.append(pool.apply_async(_encode_masks, (task, )))
+                if len(pending) > 2 * num_workers:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+        finally:
+            pool.terminate()
+    else:
+        for task in tasks:
+            yield _encode_masks(task)
 
-        masks = t['mask'][0]
 
-        s = 0
-        # for each sample
-        for i in range(len(lengths)):
-            num = lengths[i]
-            im_id = int(im_ids[i][0])
-            im_shape = t['im_shape'][0][i]
+def _mask_task(t, clsid2catid, resolution, thresh_binarize):
+    """
+    Gather the inputs of encoding masks of a batch. Only the mask of
+    the predicted class of each box is kept, so the task is small
+    enough to be sent to another process.
+    """
+    bboxes = t['bbox'][0]
+    if bboxes is None or bboxes.shape == (1, 1) or len(bboxes) == 0:
+        return None
+
+    lengths = t['bbox'][1][0]
+    im_ids = np.array(t['im_id'][0]).reshape(-1)
+    im_shapes = np.array(t['im_shape'][0])
+    masks = t['mask'][0]
+
+    # image of each box
+    img_idx = np.repeat(np.arange(len(lengths)), lengths)
+    clsids = bboxes[:, 0].astype(np.int32)
+    scale = (resolution + 2.0) / resolution
+    expand_bbox = expand_boxes(bboxes[:, 2:], scale).astype(np.int32)
+    return {
+        'im_ids': im_ids[img_idx].astype(np.int64),
+        'im_shapes': im_shapes[img_idx, :2].astype(np.int32),
+        'expand_bbox': expand_bbox,
+        'catids': [clsid2catid[c] for c in clsids.tolist()],
+        'scores': bboxes[:, 1].tolist(),
+        'masks': masks[np.arange(len(clsids)), clsids],
+        'resolution': resolution,
+        'thresh_binarize': thresh_binarize,
+    }
+
 
-            bbox = bboxes[s:s + num][:, 2:]
-            clsid_scores = bboxes[s:s + num][:, 0:2]
-            mask = masks[s:s + num]
-            s += num
+def _encode_masks(task):
+    """
+    Paste the masks of a batch to images and encode them in RLE.
+    """
+    import pycocotools.mask as mask_util
+    segm_res = []
+    if task is None:
+        return segm_res
+
+    resolution = task['resolution']
+    padded_mask = np.zeros(
+        (resolution + 2, resolution + 2), dtype=np.float32)
+    for j in range(len(task['catids'])):
+        xmin, ymin, xmax, ymax = task['expand_bbox'][j].tolist()
+        im_h, im_w = task['im_shapes'][j].tolist()
+        padded_mask[1:-1, 1:-1] = task['masks'][j]
+
+        w = xmax - xmin + 1
+        h = ymax - ymin + 1
+        w = np.maximum(w, 1)
+        h = np.maximum(h, 1)
+
+        resized_mask = cv2.resize(padded_mask, (w, h))
+        resized_mask = np.array(
+            resized_mask > task['thresh_binarize'], dtype=np.uint8)
+        im_mask = np.zeros((im_h, im_w), dtype=np.uint8)
+
+        x0 = min(max(xmin, 0), im_w)
+        x1 = min(max(xmax + 1, 0), im_w)
+        y0 = min(max(ymin, 0), im_h)
+        y1 = min(max(ymax + 1, 0), im_h)
+
+        im_mask[y0:y1, x0:x1] = resized_mask[(y0 - ymin):(y1 - ymin), (
+            x0 - xmin):(x1 - xmin)]
+        segm = mask_util.encode(
+            np.array(
+                im_mask[:, :, np.newaxis], order='F'))[0]
+        segm['counts'] = segm['counts'].decode('utf8')
+        coco_res = {
+            'image_id': int(task['im_ids'][j]),
+            'category_id': task['catids'][j],
+            'segmentation': segm,
+            'score': task['scores'][j]
+        }
+        segm_res.append(coco_res)
+    return segm_res
 
-            im_h = int(im_shape[0])
-            im_w = int(im_shape[1])
 
-            expand_bbox = expand_boxes(bbox, scale)
-            expand_bbox = expand_bbox.astype(np.int32)
+class COCOResultWriter(object):
+    """
+    Write COCO results to a json file incrementally, so the results
+    of the whole dataset are never kept in memory at the same time.
 
-            padded_mask = np.zeros(
-                (resolution + 2, resolution + 2), dtype=np.float32)
+    Args:
+        outfile (str): path of the json file.
+    """
 
-            for j in range(num):
-                xmin, ymin, xmax, ymax = expand_bbox[j].tolist()
-                clsid, score = clsid_scores[j].tolist()
-                clsid = int(clsid)
-                padded_mask[1:-1, 1:-1] = mask[j, clsid, :, :]
-
-                catid = clsid2catid[clsid]
-
-                w = xmax - xmin + 1
-                h = ymax - ymin + 1
-                w = np.maximum(w, 1)
-                h = np.maximum(h, 1)
-
-                resized_mask = cv2.resize(padded_mask, (w, h))
-                resized_mask = np.array(
-                    resized_mask > thresh_binarize, dtype=np.uint8)
-                im_mask = np.zeros((im_h, im_w), dtype=np.uint8)
-
-                x0 = min(max(xmin, 0), im_w)
-                x1 = min(max(xmax + 1, 0), im_w)
-                y0 = min(max(ymin, 0), im_h)
-                y1 = min(max(ymax + 1, 0), im_h)
-
-                im_mask[y0:y1, x0:x1] = resized_mask[(y0 - ymin):(y1 - ymin), (
-                    x0 - xmin):(x1 - xmin)]
-                segm = mask_util.encode(
-                    np.array(
-                        im_mask[:, :, np.newaxis], order='F'))[0]
-                catid = clsid2catid[clsid]
-                segm['counts'] = segm['counts'].decode('utf8')
-                coco_res = {
-                    'image_id': im_id,
-                    'category_id': catid,
-                    'segmentation': segm,
-                    'score': score
-                }
-                segm_res.append(coco_res)
-    return segm_res
+    def __init__(self, outfile):
+        self.outfile = outfile
+        self.num = 0
+        self._file = open(outfile, 'w')
+        self._file.write('[')
+
+    def write(self, coco_res):
+        """
+        Append a list of COCO result dicts to the json file.
+        """
+        for res in coco_res:
+            if self.num > 0:
+                self._file.write(', ')
+            self._file.write(json.dumps(res))
+            self.num += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.write(']')
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _log_write_cost(writer, start):
+    msg = 'Wrote {} results to {} in {:.2f}s'.format(
+        writer.num, writer.outfile, time.time() - start)
+    try:
+        import resource
+        # ru_maxrss is in kilobytes on linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+        msg += ', peak memory {:.1f}MB'.format(peak)
+    except ImportError:
+        pass
+    logger.info(msg)
 
 
 def expand_boxes(boxes, scale):
@@ -20,13 +20,21 @@ import logging
 import numpy as np
 import os
 import time
+import itertools
+import collections
 
 import paddle.fluid as fluid
 
-from ppdet.utils.voc_eval import bbox_eval as voc_bbox_eval
+from ppdet.utils.voc_eval import bbox_eval as voc_bbox_eval, split_batch
+from ppdet.utils.map_utils import DetectionMAP
 from ppdet.utils.post_process import mstest_box_post_process, mstest_mask_post_process, box_flip
 
-__all__ = ['parse_fetches', 'eval_run', 'eval_results', 'json_eval_results']
+__all__ = [
+    'parse_fetches', 'eval_run', 'iter_eval_run', 'eval_results',
+    'json_eval_results',
+    'pipelined_eval_run', 'create_accumulator', 'COCOAccumulator',
+    'VOCAccumulator'
+]
 
 logger = logging.getLogger(__name__)
 
@@ -94,6 +102,57 @@ def clean_res(result, keep_name_list):
     return clean_result
 
 
+def _post_process(res,
+                  cfg,
+                  exe=None,
+                  sub_prog=None,
+                  sub_keys=None,
+                  sub_values=None):
+    """
+    Multi-scale test post-process of the outputs of a batch.
+    """
+    post_res = mstest_box_post_process(res, cfg)
+    res.update(post_res)
+    if 'Mask' in cfg.architecture:
+        place = fluid.CUDAPlace(0) if cfg.use_gpu else fluid.CPUPlace()
+        sub_feed = get_sub_feed(res, place)
+        sub_prog_outs = exe.run(sub_prog,
+                                feed=sub_feed,
+                                fetch_list=sub_values,
+                                return_numpy=False)
+        sub_prog_res = {
+            k: (np.array(v), v.recursive_sequence_lengths())
+            for k, v in zip(sub_keys, sub_prog_outs)
+        }
+        post_res = mstest_mask_post_process(sub_prog_res, cfg)
+        res.update(post_res)
+    return clean_res(res, ['im_info', 'bbox', 'im_id', 'im_shape', 'mask'])
+
+
+def _run_batch(exe,
+               compile_program,
+               keys,
+               values,
+               cfg=None,
+               sub_prog=None,
+               sub_keys=None,
+               sub_values=None,
+               defer_post=False):
+    """
+    Run evaluation program for a batch, the multi-scale test
+    post-process is skipped if `defer_post` is True.
+    """
+    outs = exe.run(compile_program, fetch_list=values, return_numpy=False)
+    res = {
+        k: (np.array(v), v.recursive_sequence_lengths())
+        for k, v in zip(keys, outs)
+    }
+    multi_scale_test = getattr(cfg, 'MultiScaleTEST', None)
+    if multi_scale_test and not defer_post:
+        res = _post_process(res, cfg, exe, sub_prog, sub_keys, sub_values)
+    return res
+
+
 def eval_run(exe,
              compile_program,
              pyreader,
@@ -107,8 +166,29 @@ def eval_run(exe,
     """
     Run evaluation program, return program outputs.
     """
+    return list(
+        iter_eval_run(exe, compile_program, pyreader, keys, values, cls, cfg,
+                      sub_prog, sub_keys, sub_values))
+
+
+def iter_eval_run(exe,
+                  compile_program,
+                  pyreader,
+                  keys,
+                  values,
+                  cls,
+                  cfg=None,
+                  sub_prog=None,
+                  sub_keys=None,
+                  sub_values=None,
+                  defer_post=False):
+    """
+    Run evaluation program like `eval_run`, but yield the outputs of
+    each batch as it is run, eg. to `coco_eval.bbox_eval`, so that the
+    outputs of all batches are not kept in memory. The multi-scale test
+    post-process is left to the consumer if `defer_post` is True.
+    """
     iter_id = 0
-    results = []
     if len(cls) != 0:
         values = []
         for i in range(len(cls)):
@@ -123,40 +203,13 @@ def eval_run(exe,
     try:
         pyreader.start()
         while True:
-            outs = exe.run(compile_program,
-                           fetch_list=values,
-                           return_numpy=False)
-            res = {
-                k: (np.array(v), v.recursive_sequence_lengths())
-                for k, v in zip(keys, outs)
-            }
-            multi_scale_test = getattr(cfg, 'MultiScaleTEST', None)
-            mask_multi_scale_test = multi_scale_test and 'Mask' in cfg.architecture
-
-            if multi_scale_test:
-                post_res = mstest_box_post_process(res, cfg)
-                res.update(post_res)
-            if mask_multi_scale_test:
-                place = fluid.CUDAPlace(0) if cfg.use_gpu else fluid.CPUPlace()
-                sub_feed = get_sub_feed(res, place)
-                sub_prog_outs = exe.run(sub_prog,
-                                        feed=sub_feed,
-                                        fetch_list=sub_values,
-                                        return_numpy=False)
-                sub_prog_res = {
-                    k: (np.array(v), v.recursive_sequence_lengths())
-                    for k, v in zip(sub_keys, sub_prog_outs)
-                }
-                post_res = mstest_mask_post_process(sub_prog_res, cfg)
-                res.update(post_res)
-            if multi_scale_test:
-                res = clean_res(
-                    res, ['im_info', 'bbox', 'im_id', 'im_shape', 'mask'])
-            results.append(res)
+            res = _run_batch(exe, compile_program, keys, values, cfg,
+                             sub_prog, sub_keys, sub_values, defer_post)
             if iter_id % 100 == 0:
                 logger.info('Test iter {}'.format(iter_id))
             iter_id += 1
             images_num += len(res['bbox'][1][0]) if has_bbox else 1
+            yield res
     except (StopIteration, fluid.core.EOFException):
         pyreader.reset()
     logger.info('Test finish iter {}'.format(iter_id))
@@ -170,8 +223,6 @@ def eval_run(exe,
         logger.info('Total iteration: {}, inference time: {} batch/s.'.format(
             images_num, fps))
 
-    return results
-
 
 def eval_results(results,
                  feed,
@@ -180,41 +231,60 @@ def eval_results(results,
                  resolution=None,
                  is_bbox_normalized=False,
                  output_directory=None,
-                 map_type='11point'):
-    """Evaluation for evaluation program results"""
+                 map_type='11point',
+                 mask_workers=0):
+    """
+    Evaluation for evaluation program results, a list of the outputs of
+    batches or a generator of them like `iter_eval_run`, which is read
+    once so the outputs of all batches are never kept in memory.
+    """
     box_ap_stats = []
+    first, results = _peek(results)
+    if first is None:
+        logger.warning("No outputs of batches to evaluate.")
+        return box_ap_stats
     if metric == 'COCO':
         from ppdet.utils.coco_eval import proposal_eval, bbox_eval, mask_eval
         anno_file = getattr(feed.dataset, 'annotation', None)
         with_background = getattr(feed, 'with_background', True)
-        if 'proposal' in results[0]:
-            output = 'proposal.json'
-            if output_directory:
-                output = os.path.join(output_directory, 'proposal.json')
-            proposal_eval(results, anno_file, output)
-        if 'bbox' in results[0]:
-            output = 'bbox.json'
+
+        def _output(name):
             if output_directory:
-                output = os.path.join(output_directory, 'bbox.json')
+                return os.path.join(output_directory, name)
+            return name
 
+        if 'proposal' in first:
+            # proposal_eval takes all the outputs at once
+            results = list(results)
+            proposal_eval(results, anno_file, _output('proposal.json'))
+        if 'mask' in first:
+            # the bboxes are evaluated in the same pass as the masks
+            bbox_output = _output('bbox.json') if 'bbox' in first else None
+            box_ap_stats = mask_eval(
+                results,
+                anno_file,
+                _output('mask.json'),
+                resolution,
+                num_workers=mask_workers,
+                bbox_outfile=bbox_output,
+                with_background=with_background,
+                is_bbox_normalized=is_bbox_normalized) or []
+        elif 'bbox' in first:
             box_ap_stats = bbox_eval(
                 results,
                 anno_file,
-                output,
+                _output('bbox.json'),
                 with_background,
                 is_bbox_normalized=is_bbox_normalized)
-
-        if 'mask' in results[0]:
-            output = 'mask.json'
-            if output_directory:
-                output = os.path.join(output_directory, 'mask.json')
-            mask_eval(results, anno_file, output, resolution)
     else:
-        if 'accum_map' in results[-1]:
-            res = np.mean(results[-1]['accum_map'][0])
+        if 'accum_map' in first:
+            # the map is accumulated by the program, keep the last batch
+            for last in results:
+                pass
+            res = np.mean(last['accum_map'][0])
             logger.info('mAP: {:.2f}'.format(res * 100.))
             box_ap_stats.append(res * 100.)
-        elif 'bbox' in results[0]:
+        elif 'bbox' in first:
             box_ap = voc_bbox_eval(
                 results,
                 num_classes,
@@ -224,6 +294,21 @@ def eval_results(results,
     return box_ap_stats
 
 
+def _peek(results):
+    """
+    Get the first batch of `results`, and `results` with it still at the
+    front if `results` is a generator. The first batch is None if there
+    are no batches.
+    """
+    if isinstance(results, (list, tuple)):
+        return (results[0] if len(results) > 0 else None), results
+    results = iter(results)
+    first = next(results, None)
+    if first is None:
+        return None, []
+    return first, itertools.chain([first], results)
+
+
 def json_eval_results(feed, metric, json_directory=None):
     """
     cocoapi eval with already exists proposal.json, bbox.json or mask.json
@@ -245,3 +330,265 @@ def json_eval_results(feed, metric, json_directory=None):
             cocoapi_eval(v_json, coco_eval_style[i], anno_file=anno_file)
         else:
             logger.info("{} not exists!".format(v_json))
+
+
+class COCOAccumulator(object):
+    """
+    Convert the outputs of each batch to COCO results and write them to
+    json files as they come, then evaluate the files by COCO API.
+
+    Args:
+        anno_file (str): COCO annotations file.
+        with_background (bool): whether class 0 is background.
+        resolution (int): resolution of the predicted masks.
+        is_bbox_normalized (bool): whether bbox is normalized.
+        output_directory (str): directory of the json files.
+    """
+
+    def __init__(self,
+                 anno_file,
+                 with_background=True,
+                 resolution=None,
+                 is_bbox_normalized=False,
+                 output_directory=None):
+        from pycocotools.coco import COCO
+        self.coco_gt = COCO(anno_file)
+        cat_ids = self.coco_gt.getCatIds()
+        self.clsid2catid = dict(
+            {i + int(with_background): catid
+             for i, catid in enumerate(cat_ids)})
+        self.mask_clsid2catid = {i + 1: v for i, v in enumerate(cat_ids)}
+        self.resolution = resolution
+        self.is_bbox_normalized = is_bbox_normalized
+        self.output_directory = output_directory
+        self.writers = {}
+
+    def convert(self, res):
+        """
+        Convert the outputs of a batch, called in worker threads.
+        """
+        from ppdet.utils.coco_eval import proposal2out, bbox2out, mask2out
+        out = {}
+        if 'proposal' in res:
+            out['proposal'] = proposal2out([res])
+        if 'bbox' in res:
+            out['bbox'] = bbox2out(
+                [res],
+                self.clsid2catid,
+                is_bbox_normalized=self.is_bbox_normalized)
+        if 'mask' in res:
+            out['mask'] = mask2out([res], self.mask_clsid2catid,
+                                   self.resolution)
+        return out
+
+    def update(self, out):
+        """
+        Write the converted results, called in batch order.
+        """
+        from ppdet.utils.coco_eval import COCOResultWriter
+        for k, coco_res in out.items():
+            if k not in self.writers:
+                output = '{}.json'.format(k)
+                if self.output_directory:
+                    output = os.path.join(self.output_directory, output)
+                self.writers[k] = COCOResultWriter(output)
+            self.writers[k].write(coco_res)
+
+    def finish(self):
+        """
+        Evaluate the written results, return the bbox stats.
+        """
+        from ppdet.utils.coco_eval import cocoapi_eval
+        box_ap_stats = []
+        for k, style in [('proposal', 'proposal'), ('bbox', 'bbox'),
+                         ('mask', 'segm')]:
+            if k not in self.writers:
+                continue
+            writer = self.writers[k]
+            writer.close()
+            if writer.num == 0:
+                os.remove(writer.outfile)
+                logger.warning("The number of valid {} detected is zero.\n \
+                    Please use reasonable model and check input data.".format(
+                    k))
+                if k == 'bbox':
+                    box_ap_stats = [0.0]
+                continue
+            stats = cocoapi_eval(writer.outfile, style, coco_gt=self.coco_gt)
+            if k == 'bbox':
+                box_ap_stats = stats
+        return box_ap_stats
+
+
+class VOCAccumulator(object):
+    """
+    Update DetectionMAP with the outputs of each batch as they come.
+
+    Args:
+        num_classes (int): evaluation class number.
+        is_bbox_normalized (bool): whether bbox is normalized.
+        map_type (str): method for mAP calcualtion, '11point' or 'integral'.
+        overlap_thresh (float): the postive threshold of bbox overlap.
+        evaluate_difficult (bool): whether to evaluate difficult gt bbox.
+    """
+
+    def __init__(self,
+                 num_classes,
+                 is_bbox_normalized=False,
+                 map_type='11point',
+                 overlap_thresh=0.5,
+                 evaluate_difficult=False):
+        self.detection_map = DetectionMAP(
+            class_num=num_classes,
+            overlap_thresh=overlap_thresh,
+            map_type=map_type,
+            is_bbox_normalized=is_bbox_normalized,
+            evaluate_difficult=evaluate_difficult)
+        self.overlap_thresh = overlap_thresh
+        self.map_type = map_type
+        self.evaluate_difficult = evaluate_difficult
+        self.accum_map = None
+        self.has_bbox = False
+
+    def convert(self, res):
+        """
+        Split the outputs of a batch by images, called in worker threads.
+        """
+        if 'accum_map' in res:
+            return {'accum_map': res['accum_map'][0]}
+        if 'bbox' not in res:
+            return {}
+        return {'images': list(split_batch(res, self.evaluate_difficult))}
+
+    def update(self, out):
+        """
+        Update DetectionMAP, called in batch order.
+        """
+        if 'accum_map' in out:
+            self.accum_map = out['accum_map']
+        if 'images' in out:
+            self.has_bbox = True
+            for bbox, gt_box, gt_label, difficult in out['images']:
+                self.detection_map.update(bbox, gt_box, gt_label, difficult)
+
+    def finish(self):
+        """
+        Accumulate mAP, return the box stats.
+        """
+        box_ap_stats = []
+        if self.accum_map is not None:
+            res = np.mean(self.accum_map)
+            logger.info('mAP: {:.2f}'.format(res * 100.))
+            box_ap_stats.append(res * 100.)
+        elif self.has_bbox:
+            logger.info("Accumulating evaluatation results...")
+            self.detection_map.accumulate()
+            map_stat = 100. * self.detection_map.get_map()
+            logger.info("mAP({:.2f}, {}) = {:.2f}".format(
+                self.overlap_thresh, self.map_type, map_stat))
+            box_ap_stats.append(map_stat)
+        return box_ap_stats
+
+
+def create_accumulator(feed,
+                       metric,
+                       num_classes,
+                       resolution=None,
+                       is_bbox_normalized=False,
+                       output_directory=None,
+                       map_type='11point'):
+    """
+    Create the accumulator of `metric` for `pipelined_eval_run`, with
+    the same arguments as `eval_results`.
+    """
+    if metric == 'COCO':
+        anno_file = getattr(feed.dataset, 'annotation', None)
+        with_background = getattr(feed, 'with_background', True)
+        return COCOAccumulator(anno_file, with_background, resolution,
+                               is_bbox_normalized, output_directory)
+    return VOCAccumulator(num_classes, is_bbox_normalized, map_type)
+
+
+def pipelined_eval_run(exe,
+                       compile_program,
+                       pyreader,
+                       keys,
+                       values,
+                       cls,
+                       accumulator,
+                       cfg=None,
+                       sub_prog=None,
+                       sub_keys=None,
+                       sub_values=None,
+                       num_workers=2,
+                       max_pending=None):
+    """
+    Run evaluation program like `eval_run`, but the outputs of each
+    batch are post-processed and converted by `accumulator.convert` in
+    a pool of worker threads while the executor keeps running, and
+    `accumulator.update` is called with them in batch order.
+
+    Args:
+        accumulator: COCOAccumulator or VOCAccumulator.
+        num_workers (int): number of worker threads.
+        max_pending (int): max number of batches waiting for workers,
+                           default to 4 * num_workers.
+
+    Returns:
+        box stats returned by `accumulator.finish`
+    """
+    from multiprocessing.pool import ThreadPool
+
+    # multi-scale test post-process of mask models runs the sub
+    # program, so it stays in main thread
+    multi_scale_test = getattr(cfg, 'MultiScaleTEST', None)
+    defer_post = bool(multi_scale_test) and 'Mask' not in cfg.architecture
+    max_pending = max_pending or 4 * num_workers
+    timer = collections.OrderedDict(
+        (k, 0.) for k in ['infer', 'post', 'convert', 'wait', 'update'])
+    pending = collections.deque()
+
+    def _consume(res):
+        start = time.time()
+        if defer_post:
+            res = _post_process(res, cfg)
+        post_end = time.time()
+        out = accumulator.convert(res)
+        return out, post_end - start, time.time() - post_end
+
+    def _drain(max_left):
+        while pending and (len(pending) > max_left or pending[0].ready()):
+            start = time.time()
+            out, post_time, convert_time = pending.popleft().get()
+            timer['wait'] += time.time() - start
+            timer['post'] += post_time
+            timer['convert'] += convert_time
+            start = time.time()
+            accumulator.update(out)
+            timer['update'] += time.time() - start
+
+    results = iter_eval_run(exe, compile_program, pyreader, keys, values,
+                            cls, cfg, sub_prog, sub_keys, sub_values,
+                            defer_post)
+    pool = ThreadPool(num_workers)
+    try:
+        while True:
+            start = time.time()
+            res = next(results, None)
+            timer['infer'] += time.time() - start
+            if res is None:
+                break
+            pending.append(pool.apply_async(_consume, (res, )))
+            _drain(max_pending)
+        _drain(0)
+    finally:
+        pool.terminate()
+
+    start = time.time()
+    box_ap_stats = accumulator.finish()
+    timer['finish'] = time.time() - start
+    # 'post' and 'convert' run in workers, and overlap with 'infer',
+    # 'wait' is the time main thread blocked on them
+    logger.info('Eval stage time: {}'.format(', '.join(
+        '{}: {:.2f}s'.format(k, v) for k, v in timer.items())))
+    return box_ap_stats
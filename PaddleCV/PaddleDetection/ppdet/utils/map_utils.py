@@ -22,7 +22,9 @@ import numpy as np
 import logging
 logger = logging.getLogger(__name__)
 
-__all__ = ['bbox_area', 'jaccard_overlap', 'DetectionMAP']
+__all__ = [
+    'bbox_area', 'jaccard_overlap', 'jaccard_overlap_matrix', 'DetectionMAP'
+]
 
 
 def bbox_area(bbox, is_bbox_normalized):
@@ -54,11 +56,39 @@ def jaccard_overlap(pred, gt, is_bbox_normalized=False):
     return overlap
 
 
+def jaccard_overlap_matrix(preds, gts, is_bbox_normalized=False):
+    """
+    Calculate jaccard overlap ratio between every pair of bounding
+    boxes in preds [P, 4] and gts [G, 4], returns a [P, G] matrix.
+    Element values are the same as those of jaccard_overlap.
+    """
+    preds = np.asarray(preds, dtype=np.float64).reshape(-1, 4)
+    gts = np.asarray(gts, dtype=np.float64).reshape(-1, 4)
+    norm = 1. - float(is_bbox_normalized)
+    p = [preds[:, i:i + 1] for i in range(4)]
+    g = [gts[:, i] for i in range(4)]
+    inter_w = np.minimum(p[2], g[2]) - np.maximum(p[0], g[0]) + norm
+    inter_h = np.minimum(p[3], g[3]) - np.maximum(p[1], g[1]) + norm
+    inter_size = inter_w * inter_h
+    pred_size = (p[2] - p[0] + norm) * (p[3] - p[1] + norm)
+    gt_size = (g[2] - g[0] + norm) * (g[3] - g[1] + norm)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        overlap = inter_size / (pred_size + gt_size - inter_size)
+    disjoint = (p[0] >= g[2]) | (p[2] <= g[0]) | \
+               (p[1] >= g[3]) | (p[3] <= g[1])
+    overlap[disjoint] = 0.
+    return overlap
+
+
 class DetectionMAP(object):
     """
     Calculate detection mean average precision.
     Currently support two types: 11point and integral
 
+    Per-image box matching is done on the whole overlap matrix at once,
+    and [label, score, tp] records are kept in growable NumPy buffers so
+    that accumulation only needs a stable sort and cumulative sums.
+
     Args:
         class_num (int): the class number.
         overlap_thresh (float): The threshold of overlap
@@ -95,92 +125,102 @@ class DetectionMAP(object):
         Update metric statics from given prediction and ground
         truth infomations.
         """
+        gt_label = np.asarray(gt_label).reshape(-1).astype(np.int64)
         if difficult is None:
             difficult = np.zeros_like(gt_label)
+        difficult = np.asarray(difficult).reshape(-1).astype(np.int64)
+        valid_gt = np.ones_like(gt_label, dtype=bool) \
+                if self.evaluate_difficult else difficult == 0
 
         # record class gt count
-        for gtl, diff in zip(gt_label, difficult):
-            if self.evaluate_difficult or int(diff) == 0:
-                self.class_gt_counts[int(np.array(gtl))] += 1
-
-        # record class score positive
-        visited = [False] * len(gt_label)
-        for b in bbox:
-            label, score, xmin, ymin, xmax, ymax = b.tolist()
-            pred = [xmin, ymin, xmax, ymax]
-            max_idx = -1
-            max_overlap = -1.0
-            for i, gl in enumerate(gt_label):
-                if int(gl) == int(label):
-                    overlap = jaccard_overlap(pred, gt_box[i],
-                                              self.is_bbox_normalized)
-                    if overlap > max_overlap:
-                        max_overlap = overlap
-                        max_idx = i
-
-            if max_overlap > self.overlap_thresh:
-                if self.evaluate_difficult or \
-                        int(np.array(difficult[max_idx])) == 0:
-                    if not visited[max_idx]:
-                        self.class_score_poss[int(label)].append([score, 1.0])
-                        visited[max_idx] = True
-                    else:
-                        self.class_score_poss[int(label)].append([score, 0.0])
-            else:
-                self.class_score_poss[int(label)].append([score, 0.0])
+        self.class_gt_counts += np.bincount(
+            gt_label[valid_gt], minlength=self.class_num)[:self.class_num]
+
+        bbox = np.asarray(bbox, dtype=np.float64).reshape(-1, 6)
+        if bbox.shape[0] == 0:
+            return
+        label = bbox[:, 0].astype(np.int64)
+        score = bbox[:, 1]
+
+        # match each prediction with the gt box of the same label which
+        # has the largest overlap, the first one wins on ties
+        overlaps = jaccard_overlap_matrix(bbox[:, 2:], gt_box,
+                                          self.is_bbox_normalized)
+        overlaps[label[:, None] != gt_label[None, :]] = -1.
+        if overlaps.shape[1] > 0:
+            max_idx = overlaps.argmax(axis=1)
+            max_overlap = overlaps[np.arange(len(max_idx)), max_idx]
+        else:
+            max_idx = np.zeros(len(label), dtype=np.int64)
+            max_overlap = np.full(len(label), -1.)
+
+        # predictions matched to an ignored difficult gt are dropped,
+        # only the first prediction matched to a gt is true positive
+        matched = max_overlap > self.overlap_thresh
+        keep = ~matched | valid_gt[max_idx] if len(valid_gt) else ~matched
+        tp = np.zeros(len(label), dtype=np.float64)
+        pos_inds = np.nonzero(matched & keep)[0]
+        _, first = np.unique(max_idx[pos_inds], return_index=True)
+        tp[pos_inds[first]] = 1.
+
+        self._append_records(label[keep], score[keep], tp[keep])
 
     def reset(self):
         """
         Reset metric statics
         """
-        self.class_score_poss = [[] for _ in range(self.class_num)]
-        self.class_gt_counts = [0] * self.class_num
+        self._record_num = 0
+        self._labels = np.zeros((0, ), dtype=np.int64)
+        self._scores = np.zeros((0, ), dtype=np.float64)
+        self._tps = np.zeros((0, ), dtype=np.float64)
+        self.class_gt_counts = np.zeros((self.class_num, ), dtype=np.int64)
         self.mAP = None
 
+    @property
+    def class_score_poss(self):
+        """
+        [score, pos] records of each class in update order
+        """
+        labels, scores, tps = self._get_records()
+        score_poss = [[] for _ in range(self.class_num)]
+        for label, score, tp in zip(labels.tolist(), scores.tolist(),
+                                    tps.tolist()):
+            score_poss[label].append([score, tp])
+        return score_poss
+
     def accumulate(self):
         """
         Accumulate metric results and calculate mAP
         """
+        labels, scores, tps = self._get_records()
+        # group records by class, sorted by descending score inside each
+        # class, stable sort keeps update order of records on ties
+        order = np.lexsort((-scores, labels))
+        labels, tps = labels[order], tps[order]
+        bounds = np.searchsorted(labels, np.arange(self.class_num + 1))
+
         mAP = 0.
         valid_cnt = 0
-        for score_pos, count in zip(self.class_score_poss,
-                                    self.class_gt_counts):
-            if count == 0 or len(score_pos) == 0:
+        for c in range(self.class_num):
+            count = int(self.class_gt_counts[c])
+            start, end = bounds[c], bounds[c + 1]
+            if count == 0 or end == start:
                 continue
 
-            accum_tp_list, accum_fp_list = \
-                    self._get_tp_fp_accum(score_pos)
-            precision = []
-            recall = []
-            for ac_tp, ac_fp in zip(accum_tp_list, accum_fp_list):
-                precision.append(float(ac_tp) / (ac_tp + ac_fp))
-                recall.append(float(ac_tp) / count)
+            accum_tp = np.cumsum(tps[start:end])
+            precision = accum_tp / np.arange(1, end - start + 1)
+            recall = accum_tp / count
 
             if self.map_type == '11point':
-                max_precisions = [0.] * 11
-                start_idx = len(precision) - 1
-                for j in range(10, -1, -1):
-                    for i in range(start_idx, -1, -1):
-                        if recall[i] < float(j) / 10.:
-                            start_idx = i
-                            if j > 0:
-                                max_precisions[j - 1] = max_precisions[j]
-                                break
-                        else:
-                            if max_precisions[j] < precision[i]:
-                                max_precisions[j] = precision[i]
-                mAP += sum(max_precisions) / 11.
+                # max precision over all points whose recall is larger
+                # than each of the 11 recall thresholds
+                max_prec = np.maximum.accumulate(precision[::-1])[::-1]
+                max_prec = np.append(max_prec, 0.)
+                thresh_idx = np.searchsorted(recall, np.arange(11) / 10.)
+                mAP += sum(max_prec[thresh_idx].tolist()) / 11.
                 valid_cnt += 1
             elif self.map_type == 'integral':
-                import math
-                ap = 0.
-                prev_recall = 0.
-                for i in range(len(precision)):
-                    recall_gap = math.fabs(recall[i] - prev_recall)
-                    if recall_gap > 1e-6:
-                        ap += precision[i] * recall_gap
-                        prev_recall = recall[i]
-                mAP += ap
+                mAP += self._integral_ap(precision, recall)
                 valid_cnt += 1
             else:
                 logger.error("Unspported mAP type {}".format(self.map_type))
@@ -196,19 +236,47 @@ class DetectionMAP(object):
             logger.error("mAP is not calculated.")
         return self.mAP
 
-    def _get_tp_fp_accum(self, score_pos_list):
+    def _append_records(self, labels, scores, tps):
+        """
+        Append [label, score, tp] records, buffers grow by doubling
+        """
+        num = len(labels)
+        end = self._record_num + num
+        if end > len(self._labels):
+            capacity = max(end, 2 * len(self._labels), 1024)
+            for name in ['_labels', '_scores', '_tps']:
+                old = getattr(self, name)
+                new = np.zeros((capacity, ), dtype=old.dtype)
+                new[:self._record_num] = old[:self._record_num]
+                setattr(self, name, new)
+        self._labels[self._record_num:end] = labels
+        self._scores[self._record_num:end] = scores
+        self._tps[self._record_num:end] = tps
+        self._record_num = end
+
+    def _get_records(self):
+        num = self._record_num
+        return self._labels[:num], self._scores[:num], self._tps[:num]
+
+    def _integral_ap(self, precision, recall):
         """
-        Calculate accumulating true/false positive results from
-        [score, pos] records
+        Calculate integral AP, recall gaps are accumulated in order
+        so that the result is the same as summing point by point
         """
-        sorted_list = sorted(score_pos_list, key=lambda s: s[0], reverse=True)
-        accum_tp = 0
-        accum_fp = 0
-        accum_tp_list = []
-        accum_fp_list = []
-        for (score, pos) in sorted_list:
-            accum_tp += int(pos)
-            accum_tp_list.append(accum_tp)
-            accum_fp += 1 - int(pos)
-            accum_fp_list.append(accum_fp)
-        return accum_tp_list, accum_fp_list
+        gaps = np.diff(np.append(0., recall))
+        changed = gaps != 0.
+        if np.any(gaps[changed] <= 1e-6):
+            # tiny recall gaps are merged into the following points,
+            # fall back to the sequential calculation
+            import math
+            ap = 0.
+            prev_recall = 0.
+            for p, r in zip(precision.tolist(), recall.tolist()):
+                recall_gap = math.fabs(r - prev_recall)
+                if recall_gap > 1e-6:
+                    ap += p * recall_gap
+                    prev_recall = r
+            return ap
+        if not np.any(changed):
+            return 0.
+        return float(np.cumsum(precision[changed] * gaps[changed])[-1])
@@ -21,7 +21,7 @@ import numpy as np
 
 import paddle.fluid as fluid
 
-__all__ = ['nms']
+__all__ = ['nms', 'batched_nms', 'soft_nms', 'bbox_overlaps', 'box_voting']
 
 logger = logging.getLogger(__name__)
 
@@ -38,7 +38,7 @@ def box_flip(boxes, im_shape):
 def nms(dets, thresh):
     """Apply classic DPM-style greedy NMS."""
     if dets.shape[0] == 0:
-        return []
+        return np.zeros((0, ), dtype=np.int64)
     scores = dets[:, 0]
     x1 = dets[:, 1]
     y1 = dets[:, 2]
@@ -48,46 +48,111 @@ def nms(dets, thresh):
     areas = (x2 - x1 + 1) * (y2 - y1 + 1)
     order = scores.argsort()[::-1]
 
-    ndets = dets.shape[0]
-    suppressed = np.zeros((ndets), dtype=np.int)
-
-    # nominal indices
-    # _i, _j
-    # sorted indices
-    # i, j
-    # temp variables for box i's (the box currently under consideration)
-    # ix1, iy1, ix2, iy2, iarea
-
-    # variables for computing overlap with box j (lower scoring box)
-    # xx1, yy1, xx2, yy2
-    # w, h
-    # inter, ovr
-
-    for _i in range(ndets):
-        i = order[_i]
-        if suppressed[i] == 1:
-            continue
-        ix1 = x1[i]
-        iy1 = y1[i]
-        ix2 = x2[i]
-        iy2 = y2[i]
-        iarea = areas[i]
-        for _j in range(_i + 1, ndets):
-            j = order[_j]
-            if suppressed[j] == 1:
-                continue
-            xx1 = max(ix1, x1[j])
-            yy1 = max(iy1, y1[j])
-            xx2 = min(ix2, x2[j])
-            yy2 = min(iy2, y2[j])
-            w = max(0.0, xx2 - xx1 + 1)
-            h = max(0.0, yy2 - yy1 + 1)
-            inter = w * h
-            ovr = inter / (iarea + areas[j] - inter)
-            if ovr >= thresh:
-                suppressed[j] = 1
+    # each step keeps the highest scoring remaining box, and computes its
+    # overlaps with all the other remaining boxes in one shot
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        xx1 = np.maximum(x1[i], x1[rest])
+        yy1 = np.maximum(y1[i], y1[rest])
+        xx2 = np.minimum(x2[i], x2[rest])
+        yy2 = np.minimum(y2[i], y2[rest])
+        # the widths and heights are in float64 as in the former loop over
+        # numpy scalars, where adding 1 promoted them
+        w = np.maximum(0.0, (xx2 - xx1).astype(np.float64) + 1)
+        h = np.maximum(0.0, (yy2 - yy1).astype(np.float64) + 1)
+        inter = w * h
+        ovr = inter / (areas[i] + areas[rest] - inter)
+        order = rest[ovr < thresh]
+
+    return np.sort(np.array(keep, dtype=np.int64))
+
+
+def batched_nms(dets, labels, thresh):
+    """
+    Apply greedy NMS on boxes of all classes in a single call, boxes
+    only suppress the boxes with the same label.
+
+    Args:
+        dets (np.ndarray): [N, 5] boxes in [score, x1, y1, x2, y2]
+        labels (np.ndarray): [N] class label of each box
+        thresh (float): overlap threshold of suppression
+
+    Returns:
+        indices of kept boxes in ascending order
+    """
+    if dets.shape[0] == 0:
+        return np.zeros((0, ), dtype=np.int64)
+    labels = np.asarray(labels).reshape(-1)
+    # group boxes by label so that each class is only compared with
+    # itself, instead of masking an all-class overlap computation
+    order = np.argsort(labels, kind='mergesort')
+    bounds = np.flatnonzero(np.diff(labels[order])) + 1
+    keep = [
+        inds[nms(dets[inds], thresh)]
+        for inds in np.split(order, bounds)
+    ]
+    return np.sort(np.concatenate(keep))
+
+
+def soft_nms(dets, sigma=0.5, thresh=0.3, score_thresh=0.001,
+             method='linear'):
+    """
+    Apply soft-NMS, overlapped boxes are kept with decayed scores
+    instead of being removed.
+
+    Args:
+        dets (np.ndarray): [N, 5] boxes in [score, x1, y1, x2, y2]
+        sigma (float): gaussian decay parameter
+        thresh (float): overlap threshold of linear decay
+        score_thresh (float): boxes with decayed score not higher
+            than this threshold are removed
+        method (str): 'linear', 'gaussian' or 'hard'
+
+    Returns:
+        (dets, keep): kept boxes with updated scores in descending
+        score order and their indices in input dets
+    """
+    assert method in ['linear', 'gaussian', 'hard'], \
+            "soft_nms method should be 'linear', 'gaussian' or 'hard'"
+    if dets.shape[0] == 0:
+        return dets, np.zeros((0, ), dtype=np.int64)
+    dets = dets.copy()
+    scores = dets[:, 0]
+    x1 = dets[:, 1]
+    y1 = dets[:, 2]
+    x2 = dets[:, 3]
+    y2 = dets[:, 4]
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
 
-    return np.where(suppressed == 0)[0]
+    keep = []
+    inds = np.arange(dets.shape[0])
+    while inds.size > 0:
+        top = scores[inds].argmax()
+        i = inds[top]
+        keep.append(i)
+        rest = np.delete(inds, top)
+        xx1 = np.maximum(x1[i], x1[rest])
+        yy1 = np.maximum(y1[i], y1[rest])
+        xx2 = np.minimum(x2[i], x2[rest])
+        yy2 = np.minimum(y2[i], y2[rest])
+        w = np.maximum(0.0, xx2 - xx1 + 1)
+        h = np.maximum(0.0, yy2 - yy1 + 1)
+        inter = w * h
+        ovr = inter / (areas[i] + areas[rest] - inter)
+        if method == 'linear':
+            weight = np.where(ovr > thresh, 1 - ovr, 1.)
+        elif method == 'gaussian':
+            weight = np.exp(-(ovr * ovr) / sigma)
+        else:
+            weight = np.where(ovr >= thresh, 0., 1.)
+        scores[rest] = scores[rest] * weight
+        inds = rest[scores[rest] > score_thresh]
+
+    keep = np.array(keep, dtype=np.int64)
+    return dets[keep], keep
 
 
 def bbox_area(box):
@@ -96,67 +161,80 @@ def bbox_area(box):
     return w * h
 
 
-def bbox_overlaps(x, y):
+def _extent(start, end):
+    return (end - start).astype(np.float64) + 1
+
+
+def bbox_overlaps(x, y, chunk_size=1 << 22):
+    """
+    Calculate overlaps between boxes x [N, 4] and y [K, 4], returns a
+    [N, K] float32 matrix. Rows are computed in chunks of about
+    chunk_size elements to bound temporary memory.
+    """
     N = x.shape[0]
     K = y.shape[0]
     overlaps = np.zeros((N, K), dtype=np.float32)
-    for k in range(K):
-        y_area = bbox_area(y[k])
-        for n in range(N):
-            iw = min(x[n, 2], y[k, 2]) - max(x[n, 0], y[k, 0]) + 1
-            if iw > 0:
-                ih = min(x[n, 3], y[k, 3]) - max(x[n, 1], y[k, 1]) + 1
-                if ih > 0:
-                    x_area = bbox_area(x[n])
-                    ua = x_area + y_area - iw * ih
-                    overlaps[n, k] = iw * ih / ua
+    if N == 0 or K == 0:
+        return overlaps
+    # the differences of coordinates are in the dtype of the boxes and the
+    # rest in float64, as in the former loop over numpy scalars
+    y_area = _extent(y[:, 0], y[:, 2]) * _extent(y[:, 1], y[:, 3])
+    step = max(1, chunk_size // K)
+    for start in range(0, N, step):
+        xs = x[start:start + step]
+        iw = _extent(
+            np.maximum(xs[:, 0:1], y[:, 0]), np.minimum(xs[:, 2:3], y[:, 2]))
+        ih = _extent(
+            np.maximum(xs[:, 1:2], y[:, 1]), np.minimum(xs[:, 3:4], y[:, 3]))
+        x_area = _extent(xs[:, 0:1], xs[:, 2:3]) * \
+                _extent(xs[:, 1:2], xs[:, 3:4])
+        inter = iw * ih
+        valid = (iw > 0) & (ih > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ovr = inter / (x_area + y_area - inter)
+        overlaps[start:start + step] = np.where(valid, ovr, 0.)
     return overlaps
 
 
 def box_voting(nms_dets, dets, vote_thresh):
     top_dets = nms_dets.copy()
-    top_boxes = nms_dets[:, 1:]
     all_boxes = dets[:, 1:]
     all_scores = dets[:, 0]
-    top_to_all_overlaps = bbox_overlaps(top_boxes, all_boxes)
-    for k in range(nms_dets.shape[0]):
-        inds_to_vote = np.where(top_to_all_overlaps[k] >= vote_thresh)[0]
-        boxes_to_vote = all_boxes[inds_to_vote, :]
-        ws = all_scores[inds_to_vote]
-        top_dets[k, 1:] = np.average(boxes_to_vote, axis=0, weights=ws)
-
+    top_to_all_overlaps = bbox_overlaps(nms_dets[:, 1:], all_boxes)
+    # score weighted average of all the boxes voting for each top box
+    weights = np.where(top_to_all_overlaps >= vote_thresh,
+                       all_scores[np.newaxis, :], 0.)
+    top_dets[:, 1:] = np.dot(weights, all_boxes) / \
+            weights.sum(axis=1, keepdims=True)
     return top_dets
 
 
 def get_nms_result(boxes, scores, cfg):
-    cls_boxes = [[] for _ in range(cfg.num_classes)]
-    for j in range(1, cfg.num_classes):
-        inds = np.where(scores[:, j] > cfg.MultiScaleTEST['score_thresh'])[0]
-        scores_j = scores[inds, j]
-        boxes_j = boxes[inds, j * 4:(j + 1) * 4]
-        dets_j = np.hstack((scores_j[:, np.newaxis], boxes_j)).astype(
-            np.float32, copy=False)
-        keep = nms(dets_j, cfg.MultiScaleTEST['nms_thresh'])
-        nms_dets = dets_j[keep, :]
-        if cfg.MultiScaleTEST['enable_voting']:
-            nms_dets = box_voting(nms_dets, dets_j,
-                                  cfg.MultiScaleTEST['vote_thresh'])
-        #add labels
-        label = np.array([j for _ in range(len(keep))])
-        nms_dets = np.hstack((label[:, np.newaxis], nms_dets)).astype(
-            np.float32, copy=False)
-        cls_boxes[j] = nms_dets
+    ms_cfg = cfg.MultiScaleTEST
+    # gather candidates of all foreground classes, ordered by class and
+    # then by box index, and suppress them in a single batched NMS call
+    cls_inds, inds = np.where(
+        scores[:, 1:cfg.num_classes].T > ms_cfg['score_thresh'])
+    labels = cls_inds + 1
+    boxes = boxes.reshape((boxes.shape[0], -1, 4))
+    dets = np.hstack((scores[inds, labels][:, np.newaxis],
+                      boxes[inds, labels])).astype(
+                          np.float32, copy=False)
+    keep = batched_nms(dets, labels, ms_cfg['nms_thresh'])
+    nms_dets = dets[keep, :]
+    nms_labels = labels[keep]
+    if ms_cfg['enable_voting']:
+        for j in np.unique(nms_labels):
+            top = nms_labels == j
+            nms_dets[top] = box_voting(nms_dets[top], dets[labels == j],
+                                       ms_cfg['vote_thresh'])
+    #add labels
+    im_results = np.hstack((nms_labels[:, np.newaxis], nms_dets)).astype(
+        np.float32, copy=False)
     # Limit to max_per_image detections **over all classes**
-    image_scores = np.hstack(
-        [cls_boxes[j][:, 1] for j in range(1, cfg.num_classes)])
-    if len(image_scores) > cfg.MultiScaleTEST['detections_per_im']:
-        image_thresh = np.sort(image_scores)[-cfg.MultiScaleTEST[
-            'detections_per_im']]
-        for j in range(1, cfg.num_classes):
-            keep = np.where(cls_boxes[j][:, 1] >= image_thresh)[0]
-            cls_boxes[j] = cls_boxes[j][keep, :]
-
-    im_results = np.vstack([cls_boxes[j] for j in range(1, cfg.num_classes)])
+    if len(im_results) > ms_cfg['detections_per_im']:
+        image_thresh = np.sort(im_results[:, 1])[-ms_cfg['detections_per_im']]
+        im_results = im_results[im_results[:, 1] >= image_thresh]
     return im_results
 
 
@@ -0,0 +1,99 @@
+#   Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Compare wall time and peak python memory (of the main process) of
+writing COCO mask results by one json.dump of the whole list with the
+streaming writer, with masks encoded in the current process or by a
+pool of workers:
+
+    python -m ppdet.utils.tests.benchmark_coco_eval --images 500
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import argparse
+import json
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from ppdet.utils.coco_eval import mask2out_iter, COCOResultWriter
+from ppdet.utils.tests.test_coco_eval import loop_mask2out, random_results
+
+
+def dump_all(results, clsid2catid, resolution, outfile, num_workers):
+    segm_res = loop_mask2out(results, clsid2catid, resolution)
+    with open(outfile, 'w') as f:
+        json.dump(segm_res, f)
+
+
+def write_stream(results, clsid2catid, resolution, outfile, num_workers):
+    with COCOResultWriter(outfile) as writer:
+        for segm_res in mask2out_iter(
+                results, clsid2catid, resolution, num_workers=num_workers):
+            writer.write(segm_res)
+
+
+def measure(func, *args):
+    start = time.time()
+    func(*args)
+    cost = time.time() - start
+    # tracing is inherited by forked workers and slows them down,
+    # so peak memory is measured in another run
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cost, peak / 1024.**2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--images', type=int, default=500)
+    parser.add_argument('--boxes', type=int, default=100)
+    parser.add_argument('--num_classes', type=int, default=81)
+    parser.add_argument('--resolution', type=int, default=28)
+    parser.add_argument('--num_workers', type=int, nargs='+', default=[4, 8])
+    args = parser.parse_args()
+
+    results = random_results(
+        args.images,
+        batch_size=1,
+        num_classes=args.num_classes,
+        resolution=args.resolution,
+        max_boxes=args.boxes,
+        im_size=(480, 640))
+    clsid2catid = {i: i for i in range(args.num_classes)}
+    tmp_dir = tempfile.mkdtemp()
+    outfile = os.path.join(tmp_dir, 'mask.json')
+    try:
+        cases = [('json.dump of list', dump_all, 0),
+                 ('streaming writer', write_stream, 0)]
+        cases += [('streaming writer, {} workers'.format(n), write_stream, n)
+                  for n in args.num_workers]
+        for name, func, num_workers in cases:
+            cost, peak = measure(func, results, clsid2catid,
+                                 args.resolution, outfile, num_workers)
+            print("{:<32} {:.2f}s, peak memory {:.1f}MB".format(name, cost,
+                                                                peak))
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#   Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Compare DetectionMAP with the box by box reference implementation:
+
+    python -m ppdet.utils.tests.benchmark_map_utils --image_num 500
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import time
+import numpy as np
+
+from ppdet.utils.map_utils import DetectionMAP
+from ppdet.utils.tests.test_map_utils import LoopDetectionMAP, \
+        random_samples
+
+
+def run(map_cls, samples, class_num, map_type):
+    detection_map = map_cls(class_num, map_type=map_type)
+    start = time.time()
+    for sample in samples:
+        detection_map.update(*sample)
+    update_time = time.time() - start
+    start = time.time()
+    detection_map.accumulate()
+    accum_time = time.time() - start
+    return detection_map.get_map(), update_time, accum_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--image_num', type=int, default=500)
+    parser.add_argument('--class_num', type=int, default=80)
+    parser.add_argument('--gt_num', type=int, default=20)
+    parser.add_argument('--det_num', type=int, default=100)
+    parser.add_argument('--map_type', type=str, default='11point')
+    args = parser.parse_args()
+
+    samples = random_samples(
+        np.random.RandomState(0), args.image_num, args.class_num,
+        args.gt_num, args.det_num)
+    results = {}
+    for name, map_cls in [('loop', LoopDetectionMAP),
+                          ('vectorized', DetectionMAP)]:
+        mAP, update_time, accum_time = run(map_cls, samples, args.class_num,
+                                           args.map_type)
+        results[name] = mAP
+        print("{:<10s} mAP={:.10f} update={:.3f}s accumulate={:.3f}s".format(
+            name, mAP, update_time, accum_time))
+    print("identical: {}".format(results['loop'] == results['vectorized']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#   Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Compare nms/bbox_overlaps with the pair by pair reference implementations
+over realistic per-class box counts of multi-scale test:
+
+    python -m ppdet.utils.tests.benchmark_post_process --box_nums 500 2000
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import time
+import numpy as np
+
+from ppdet.utils.post_process import nms, batched_nms, soft_nms, \
+        bbox_overlaps
+from ppdet.utils.tests.test_post_process import loop_nms, \
+        loop_bbox_overlaps, random_dets
+
+
+def timeit(func, *args, **kwargs):
+    start = time.time()
+    result = func(*args, **kwargs)
+    return result, time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--box_nums', type=int, nargs='+', default=[500, 2000])
+    parser.add_argument('--nms_thresh', type=float, default=0.5)
+    parser.add_argument('--class_num', type=int, default=80)
+    parser.add_argument(
+        '--skip_loop', action='store_true', help="skip slow references")
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    for num in args.box_nums:
+        dets = random_dets(rng, num)
+        print("box_num={}".format(num))
+        keep, t = timeit(nms, dets, args.nms_thresh)
+        print("  nms                   {:.4f}s kept={}".format(t, len(keep)))
+        if not args.skip_loop:
+            ref, t = timeit(loop_nms, dets, args.nms_thresh)
+            print("  nms (loop)            {:.4f}s same={}".format(
+                t, list(ref) == list(keep)))
+        _, t = timeit(soft_nms, dets, method='gaussian')
+        print("  soft_nms              {:.4f}s".format(t))
+
+        boxes = dets[:, 1:]
+        top = boxes[keep]
+        overlaps, t = timeit(bbox_overlaps, top, boxes)
+        print("  bbox_overlaps         {:.4f}s".format(t))
+        if not args.skip_loop:
+            ref, t = timeit(loop_bbox_overlaps, top, boxes)
+            print("  bbox_overlaps (loop)  {:.4f}s same={}".format(
+                t, np.array_equal(ref, overlaps)))
+
+        all_dets = np.vstack(
+            [random_dets(rng, num) for _ in range(args.class_num)])
+        labels = np.repeat(np.arange(args.class_num), num)
+        _, t = timeit(batched_nms, all_dets, labels, args.nms_thresh)
+        print("  batched_nms ({} cls)  {:.4f}s".format(args.class_num, t))
+
+
+if __name__ == '__main__':
+    main()
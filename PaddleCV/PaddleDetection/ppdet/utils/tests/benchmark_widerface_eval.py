@@ -0,0 +1,58 @@
+#   Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Compare the box voting of multi-scale face eval, which deletes and
+stacks boxes in a while loop, with the one visiting boxes in one pass,
+on the detections of dense face images:
+
+    python -m ppdet.utils.tests.benchmark_widerface_eval --faces 500
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import time
+import numpy as np
+
+from ppdet.utils.widerface_eval_utils import bbox_vote
+from ppdet.utils.tests.test_widerface_eval_utils import loop_bbox_vote, \
+        random_faces
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--faces', type=int, default=500)
+    parser.add_argument('--dets_per_face', type=int, default=10)
+    parser.add_argument('--images', type=int, default=5)
+    args = parser.parse_args()
+
+    dets = [
+        random_faces(args.faces, args.faces * args.dets_per_face, seed=i)
+        for i in range(args.images)
+    ]
+    costs = []
+    for func in [loop_bbox_vote, bbox_vote]:
+        start = time.time()
+        outs = [func(det) for det in dets]
+        costs.append((time.time() - start) / args.images)
+    for det in dets:
+        assert np.array_equal(loop_bbox_vote(det), bbox_vote(det))
+    print("bbox_vote of {} boxes: loop {:.1f}ms, one pass {:.1f}ms".format(
+        len(dets[0]), costs[0] * 1e3, costs[1] * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+#   Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import cv2
+import numpy as np
+
+from ppdet.utils.coco_eval import bbox2out, mask2out, expand_boxes, \
+        COCOResultWriter, bbox_eval, mask_eval
+
+
+def loop_mask2out(results, clsid2catid, resolution, thresh_binarize=0.5):
+    """Reference which encodes masks one by one in one loop."""
+    import pycocotools.mask as mask_util
+    scale = (resolution + 2.0) / resolution
+
+    segm_res = []
+
+    # for each batch
+    for t in results:
+        bboxes = t['bbox'][0]
+
+        lengths = t['bbox'][1][0]
+        im_ids = np.array(t['im_id'][0])
+        if bboxes.shape == (1, 1) or bboxes is None:
+            continue
+        if len(bboxes.tolist()) == 0:
+            continue
+
+        masks = t['mask'][0]
+
+        s = 0
+        # for each sample
+        for i in range(len(lengths)):
+            num = lengths[i]
+            im_id = int(im_ids[i][0])
+            im_shape = t['im_shape'][0][i]
+
+            bbox = bboxes[s:s + num][:, 2:]
+            clsid_scores = bboxes[s:s + num][:, 0:2]
+            mask = masks[s:s + num]
+            s += num
+
+            im_h = int(im_shape[0])
+            im_w = int(im_shape[1])
+
+            expand_bbox = expand_boxes(bbox, scale)
+            expand_bbox = expand_bbox.astype(np.int32)
+
+            padded_mask = np.zeros(
+                (resolution + 2, resolution + 2), dtype=np.float32)
+
+            for j in range(num):
+                xmin, ymin, xmax, ymax = expand_bbox[j].tolist()
+                clsid, score = clsid_scores[j].tolist()
+                clsid = int(clsid)
+                padded_mask[1:-1, 1:-1] = mask[j, clsid, :, :]
+
+                catid = clsid2catid[clsid]
+
+                w = xmax - xmin + 1
+                h = ymax - ymin + 1
+                w = np.maximum(w, 1)
+                h = np.maximum(h, 1)
+
+                resized_mask = cv2.resize(padded_mask, (w, h))
+                resized_mask = np.array(
+                    resized_mask > thresh_binarize, dtype=np.uint8)
+                im_mask = np.zeros((im_h, im_w), dtype=np.uint8)
+
+                x0 = min(max(xmin, 0), im_w)
+                x1 = min(max(xmax + 1, 0), im_w)
+                y0 = min(max(ymin, 0), im_h)
+                y1 = min(max(ymax + 1, 0), im_h)
+
+                im_mask[y0:y1, x0:x1] = resized_mask[(y0 - ymin):(y1 - ymin), (
+                    x0 - xmin):(x1 - xmin)]
+                segm = mask_util.encode(
+                    np.array(
+                        im_mask[:, :, np.newaxis], order='F'))[0]
+                catid = clsid2catid[clsid]
+                segm['counts'] = segm['counts'].decode('utf8')
+                coco_res = {
+                    'image_id': im_id,
+                    'category_id': catid,
+                    'segmentation': segm,
+                    'score': score
+                }
+                segm_res.append(coco_res)
+    return segm_res
+
+
+def random_results(batch_num,
+                   batch_size=2,
+                   num_classes=5,
+                   resolution=14,
+                   max_boxes=5,
+                   im_size=(100, 300),
+                   seed=0):
+    """Random Mask R-CNN outputs in the format of eval_run results."""
+    rng = np.random.RandomState(seed)
+    results = []
+    for b in range(batch_num):
+        lengths = rng.randint(0, max_boxes + 1, batch_size).tolist()
+        num = sum(lengths)
+        im_shape = rng.randint(im_size[0], im_size[1],
+                               (batch_size, 2)).astype('float32')
+        xy = rng.uniform(-20, im_size[0] * 2 // 3, (num, 2))
+        wh = rng.uniform(1, im_size[0] * 2 // 5, (num, 2))
+        bbox = np.hstack([
+            rng.randint(1, num_classes, (num, 1)), rng.rand(num, 1), xy,
+            xy + wh
+        ]).astype('float32')
+        if num == 0:
+            bbox = np.zeros((1, 1), dtype='float32')
+        mask = rng.rand(max(num, 1), num_classes, resolution,
+                        resolution).astype('float32')
+        results.append({
+            'bbox': (bbox, [lengths]),
+            'mask': (mask, [lengths]),
+            'im_id': (np.arange(batch_size).reshape(-1, 1) + b * batch_size,
+                      []),
+            'im_shape': (np.hstack([im_shape, np.ones((batch_size, 1))]),
+                         []),
+        })
+    return results
+
+
+class TestCocoEval(unittest.TestCase):
+    def setUp(self):
+        self.clsid2catid = {i: i * 2 + 1 for i in range(5)}
+
+    def test_mask2out(self):
+        results = random_results(6)
+        expect = loop_mask2out(results, self.clsid2catid, 14)
+        self.assertGreater(len(expect), 0)
+        for num_workers in [0, 2]:
+            segm_res = mask2out(
+                results, self.clsid2catid, 14, num_workers=num_workers)
+            self.assertEqual(segm_res, expect)
+
+    def test_result_writer(self):
+        results = random_results(4)
+        expect = bbox2out(results, self.clsid2catid)
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            outfile = os.path.join(tmp_dir, 'bbox.json')
+            with COCOResultWriter(outfile) as writer:
+                for t in results:
+                    writer.write(bbox2out([t], self.clsid2catid))
+            self.assertEqual(writer.num, len(expect))
+            with open(outfile) as f:
+                self.assertEqual(json.load(f), json.loads(json.dumps(expect)))
+
+            with COCOResultWriter(outfile) as writer:
+                pass
+            with open(outfile) as f:
+                self.assertEqual(json.load(f), [])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_eval_batches(self):
+        results = random_results(4)
+        cat_ids = [1, 3, 5, 7]
+        clsid2catid = {i + 1: v for i, v in enumerate(cat_ids)}
+        im_ids = np.vstack([t['im_id'][0] for t in results]).reshape(-1)
+        anno = {
+            'images': [{'id': int(i), 'width': 300, 'height': 300}
+                       for i in im_ids],
+            'categories': [{'id': i, 'name': str(i)} for i in cat_ids],
+            'annotations': [{'id': int(i) + 1, 'image_id': int(i),
+                             'category_id': cat_ids[i % 4],
+                             'bbox': [10, 10, 50, 50], 'area': 2500,
+                             'segmentation': [[10, 10, 60, 10, 60, 60]],
+                             'iscrowd': 0} for i in im_ids],
+        }
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            anno_file = os.path.join(tmp_dir, 'anno.json')
+            with open(anno_file, 'w') as f:
+                json.dump(anno, f)
+            # batches are read one by one from a generator
+            outfile = os.path.join(tmp_dir, 'bbox.json')
+            stats = bbox_eval((t for t in results), anno_file, outfile)
+            self.assertEqual(len(stats), 12)
+            with open(outfile) as f:
+                self.assertEqual(
+                    json.load(f),
+                    json.loads(json.dumps(bbox2out(results, clsid2catid))))
+
+            expect = json.loads(
+                json.dumps(mask2out(results, clsid2catid, 14)))
+            for num_workers in [0, 2]:
+                outfile = os.path.join(tmp_dir, 'mask.json')
+                mask_eval((t for t in results), anno_file, outfile, 14,
+                          num_workers=num_workers)
+                with open(outfile) as f:
+                    self.assertEqual(json.load(f), expect)
+
+            # the bboxes are written in the same pass as the masks
+            bbox_outfile = os.path.join(tmp_dir, 'bbox_mask.json')
+            mask_stats = mask_eval((t for t in results), anno_file, outfile,
+                                   14, bbox_outfile=bbox_outfile)
+            np.testing.assert_array_equal(mask_stats, stats)
+            with open(bbox_outfile) as f:
+                self.assertEqual(
+                    json.load(f),
+                    json.loads(json.dumps(bbox2out(results, clsid2catid))))
+            with open(outfile) as f:
+                self.assertEqual(json.load(f), expect)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+#   Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import unittest
+import numpy as np
+
+from ppdet.utils.eval_utils import eval_run, iter_eval_run, eval_results, \
+        pipelined_eval_run, VOCAccumulator
+
+
+class FakeTensor(object):
+    def __init__(self, data, lengths):
+        self.data = data
+        self.lengths = lengths
+
+    def __array__(self, dtype=None):
+        return self.data
+
+    def recursive_sequence_lengths(self):
+        return self.lengths
+
+
+class FakeExecutor(object):
+    """Return VOC outputs of random batches, then stop."""
+
+    def __init__(self, batch_num, batch_size=4, class_num=5, seed=0):
+        rng = np.random.RandomState(seed)
+        self.batches = []
+        for _ in range(batch_num):
+            lengths = rng.randint(1, 8, batch_size).tolist()
+            gt_lengths = rng.randint(1, 4, batch_size).tolist()
+            num, gt_num = sum(lengths), sum(gt_lengths)
+            xy = rng.uniform(0, 100, (num, 2))
+            bbox = np.hstack([
+                rng.randint(1, class_num, (num, 1)),
+                rng.rand(num, 1), xy, xy + rng.uniform(10, 50, (num, 2))
+            ]).astype('float32')
+            gt_xy = rng.uniform(0, 100, (gt_num, 2))
+            gt_box = np.hstack(
+                [gt_xy, gt_xy + rng.uniform(10, 50, (gt_num, 2))])
+            self.batches.append([
+                FakeTensor(bbox, [lengths]),
+                FakeTensor(gt_box.astype('float32'), [gt_lengths]),
+                FakeTensor(
+                    rng.randint(1, class_num, (gt_num, 1)), [gt_lengths]),
+                FakeTensor(np.zeros((gt_num, 1), 'int32'), [gt_lengths]),
+            ])
+        self.pos = 0
+
+    def run(self, program, fetch_list=None, return_numpy=True):
+        if self.pos >= len(self.batches):
+            raise StopIteration
+        self.pos += 1
+        return self.batches[self.pos - 1]
+
+
+class FakePyReader(object):
+    def __init__(self, exe):
+        self.exe = exe
+
+    def start(self):
+        self.exe.pos = 0
+
+    def reset(self):
+        pass
+
+
+class TestEvalUtils(unittest.TestCase):
+    def test_pipelined_voc(self):
+        keys = ['bbox', 'gt_box', 'gt_label', 'is_difficult']
+        exe = FakeExecutor(20)
+        pyreader = FakePyReader(exe)
+
+        results = eval_run(exe, None, pyreader, keys, keys, [])
+        self.assertEqual(len(results), 20)
+        expect = eval_results(results, None, 'VOC', 5)
+        self.assertEqual(len(expect), 1)
+
+        # the batches are evaluated as they are run
+        box_ap_stats = eval_results(
+            iter_eval_run(exe, None, pyreader, keys, keys, []), None, 'VOC',
+            5)
+        self.assertEqual(box_ap_stats, expect)
+        self.assertEqual(eval_results(iter([]), None, 'VOC', 5), [])
+
+        for num_workers, max_pending in [(1, 1), (4, None)]:
+            accumulator = VOCAccumulator(5)
+            box_ap_stats = pipelined_eval_run(
+                exe,
+                None,
+                pyreader,
+                keys,
+                keys, [],
+                accumulator,
+                num_workers=num_workers,
+                max_pending=max_pending)
+            self.assertEqual(box_ap_stats, expect)
+
+
+if __name__ == '__main__':
+    unittest.main()
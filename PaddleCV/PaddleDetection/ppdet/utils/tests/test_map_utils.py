@@ -0,0 +1,197 @@
+#   Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import math
+import unittest
+import numpy as np
+
+from ppdet.utils.map_utils import jaccard_overlap, \
+        jaccard_overlap_matrix, DetectionMAP
+
+
+class LoopDetectionMAP(DetectionMAP):
+    """
+    Reference DetectionMAP which matches boxes and accumulates
+    precision/recall with plain Python loops, box by box.
+    """
+
+    def reset(self):
+        self.loop_score_poss = [[] for _ in range(self.class_num)]
+        self.loop_gt_counts = [0] * self.class_num
+        self.mAP = None
+
+    def update(self, bbox, gt_box, gt_label, difficult=None):
+        if difficult is None:
+            difficult = np.zeros_like(gt_label)
+        for gtl, diff in zip(gt_label, difficult):
+            if self.evaluate_difficult or int(diff) == 0:
+                self.loop_gt_counts[int(np.array(gtl))] += 1
+
+        visited = [False] * len(gt_label)
+        for b in bbox:
+            label, score, xmin, ymin, xmax, ymax = b.tolist()
+            pred = [xmin, ymin, xmax, ymax]
+            max_idx = -1
+            max_overlap = -1.0
+            for i, gl in enumerate(gt_label):
+                if int(gl) == int(label):
+                    overlap = jaccard_overlap(pred, gt_box[i],
+                                              self.is_bbox_normalized)
+                    if overlap > max_overlap:
+                        max_overlap = overlap
+                        max_idx = i
+
+            if max_overlap > self.overlap_thresh:
+                if self.evaluate_difficult or \
+                        int(np.array(difficult[max_idx])) == 0:
+                    if not visited[max_idx]:
+                        self.loop_score_poss[int(label)].append([score, 1.0])
+                        visited[max_idx] = True
+                    else:
+                        self.loop_score_poss[int(label)].append([score, 0.0])
+            else:
+                self.loop_score_poss[int(label)].append([score, 0.0])
+
+    def accumulate(self):
+        mAP = 0.
+        valid_cnt = 0
+        for score_pos, count in zip(self.loop_score_poss,
+                                    self.loop_gt_counts):
+            if count == 0 or len(score_pos) == 0:
+                continue
+
+            sorted_list = sorted(score_pos, key=lambda s: s[0], reverse=True)
+            precision = []
+            recall = []
+            ac_tp = 0
+            for i, (score, pos) in enumerate(sorted_list):
+                ac_tp += int(pos)
+                precision.append(float(ac_tp) / (i + 1))
+                recall.append(float(ac_tp) / count)
+
+            if self.map_type == '11point':
+                max_precisions = [0.] * 11
+                start_idx = len(precision) - 1
+                for j in range(10, -1, -1):
+                    for i in range(start_idx, -1, -1):
+                        if recall[i] < float(j) / 10.:
+                            start_idx = i
+                            if j > 0:
+                                max_precisions[j - 1] = max_precisions[j]
+                                break
+                        else:
+                            if max_precisions[j] < precision[i]:
+                                max_precisions[j] = precision[i]
+                mAP += sum(max_precisions) / 11.
+            else:
+                ap = 0.
+                prev_recall = 0.
+                for i in range(len(precision)):
+                    recall_gap = math.fabs(recall[i] - prev_recall)
+                    if recall_gap > 1e-6:
+                        ap += precision[i] * recall_gap
+                        prev_recall = recall[i]
+                mAP += ap
+            valid_cnt += 1
+
+        self.mAP = mAP / float(valid_cnt) if valid_cnt > 0 else mAP
+
+
+def random_boxes(rng, num, size=500.):
+    xy = rng.uniform(0, size * 0.8, (num, 2))
+    wh = rng.uniform(1, size * 0.4, (num, 2))
+    return np.round(np.hstack([xy, xy + wh]), 1)
+
+
+def random_samples(rng, image_num, class_num, gt_num=10, det_num=50):
+    """
+    Generate per image (bbox, gt_box, gt_label, difficult) samples,
+    detections are jittered copies of gt boxes mixed with random boxes
+    """
+    samples = []
+    for _ in range(image_num):
+        gt_box = random_boxes(rng, gt_num)
+        gt_label = rng.randint(0, class_num, gt_num)
+        difficult = (rng.uniform(size=gt_num) < 0.1).astype('int32')
+        src = rng.randint(0, gt_num, det_num)
+        boxes = gt_box[src] + rng.normal(0, 10., (det_num, 4))
+        noise = rng.uniform(size=det_num) < 0.3
+        boxes[noise] = random_boxes(rng, int(noise.sum()))
+        labels = gt_label[src].astype('float64')
+        labels[noise] = rng.randint(0, class_num, int(noise.sum()))
+        # coarse scores to produce ties across and within images
+        scores = np.round(rng.uniform(size=det_num), 2)
+        bbox = np.hstack([labels[:, None], scores[:, None], boxes])
+        samples.append((bbox, gt_box, gt_label, difficult))
+    return samples
+
+
+class TestDetectionMAP(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(0)
+
+    def check_same_map(self, samples, class_num, **kwargs):
+        expect = LoopDetectionMAP(class_num, **kwargs)
+        actual = DetectionMAP(class_num, **kwargs)
+        for sample in samples:
+            expect.update(*sample)
+            actual.update(*sample)
+        expect.accumulate()
+        actual.accumulate()
+        self.assertEqual(expect.loop_gt_counts,
+                         actual.class_gt_counts.tolist())
+        self.assertEqual(expect.loop_score_poss, actual.class_score_poss)
+        self.assertEqual(expect.get_map(), actual.get_map())
+
+    def test_jaccard_overlap_matrix(self):
+        preds = random_boxes(self.rng, 20)
+        gts = random_boxes(self.rng, 30)
+        overlaps = jaccard_overlap_matrix(preds, gts)
+        for i in range(len(preds)):
+            for j in range(len(gts)):
+                self.assertEqual(overlaps[i, j],
+                                 jaccard_overlap(preds[i].tolist(), gts[j]))
+
+    def test_11point(self):
+        samples = random_samples(self.rng, 50, 8)
+        self.check_same_map(samples, 8, map_type='11point')
+        self.check_same_map(
+            samples, 8, map_type='11point', evaluate_difficult=True)
+
+    def test_integral(self):
+        samples = random_samples(self.rng, 50, 8)
+        self.check_same_map(samples, 8, map_type='integral')
+        self.check_same_map(
+            samples, 8, map_type='integral', evaluate_difficult=True)
+
+    def test_normalized(self):
+        samples = random_samples(self.rng, 20, 4)
+        samples = [(np.hstack([b[:, :2], b[:, 2:] / 500.]), g / 500., l, d)
+                   for b, g, l, d in samples]
+        self.check_same_map(samples, 4, is_bbox_normalized=True)
+
+    def test_empty(self):
+        samples = random_samples(self.rng, 10, 4)
+        samples.append((np.zeros((0, 6)), ) + samples[0][1:])
+        samples.append((samples[0][0], np.zeros((0, 4)), np.zeros(
+            0, dtype='int32'), np.zeros(0, dtype='int32')))
+        self.check_same_map(samples, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+#   Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import unittest
+import numpy as np
+
+from ppdet.utils.post_process import nms, batched_nms, soft_nms, \
+        bbox_overlaps, box_voting, get_nms_result
+
+
+def loop_nms(dets, thresh):
+    """Reference greedy NMS comparing boxes pair by pair."""
+    if dets.shape[0] == 0:
+        return []
+    scores = dets[:, 0]
+    x1, y1, x2, y2 = dets[:, 1], dets[:, 2], dets[:, 3], dets[:, 4]
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    order = scores.argsort()[::-1]
+    ndets = dets.shape[0]
+    suppressed = np.zeros((ndets), dtype=np.int64)
+    for _i in range(ndets):
+        i = order[_i]
+        if suppressed[i] == 1:
+            continue
+        for _j in range(_i + 1, ndets):
+            j = order[_j]
+            if suppressed[j] == 1:
+                continue
+            w = max(0.0, min(x2[i], x2[j]) - max(x1[i], x1[j]) + 1)
+            h = max(0.0, min(y2[i], y2[j]) - max(y1[i], y1[j]) + 1)
+            inter = w * h
+            ovr = inter / (areas[i] + areas[j] - inter)
+            if ovr >= thresh:
+                suppressed[j] = 1
+    return np.where(suppressed == 0)[0]
+
+
+def loop_bbox_overlaps(x, y):
+    """Reference overlaps computed pair by pair."""
+    overlaps = np.zeros((x.shape[0], y.shape[0]), dtype=np.float32)
+    for k in range(y.shape[0]):
+        y_area = (y[k, 2] - y[k, 0] + 1) * (y[k, 3] - y[k, 1] + 1)
+        for n in range(x.shape[0]):
+            iw = min(x[n, 2], y[k, 2]) - max(x[n, 0], y[k, 0]) + 1
+            if iw > 0:
+                ih = min(x[n, 3], y[k, 3]) - max(x[n, 1], y[k, 1]) + 1
+                if ih > 0:
+                    x_area = (x[n, 2] - x[n, 0] + 1) * \
+                            (x[n, 3] - x[n, 1] + 1)
+                    ua = x_area + y_area - iw * ih
+                    overlaps[n, k] = iw * ih / ua
+    return overlaps
+
+
+def random_dets(rng, num, size=800.):
+    xy = rng.uniform(0, size, (num, 2))
+    wh = rng.uniform(5, size / 4, (num, 2))
+    scores = rng.uniform(size=(num, 1))
+    return np.hstack([scores, xy, xy + wh]).astype(np.float32)
+
+
+class TestPostProcess(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.RandomState(0)
+
+    def test_nms(self):
+        for num in [0, 1, 20, 300]:
+            dets = random_dets(self.rng, num)
+            for thresh in [0.3, 0.5, 0.7]:
+                self.assertEqual(
+                    list(loop_nms(dets, thresh)), list(nms(dets, thresh)))
+        empty = np.zeros((0, 5), dtype=np.float32)
+        self.assertEqual(nms(empty, 0.5).dtype, np.int64)
+        self.assertEqual(batched_nms(empty, [], 0.5).dtype, np.int64)
+
+    def test_batched_nms(self):
+        dets = random_dets(self.rng, 300)
+        labels = self.rng.randint(0, 5, 300)
+        keep = []
+        for c in range(5):
+            inds = np.where(labels == c)[0]
+            keep.append(inds[nms(dets[inds], 0.5)])
+        self.assertEqual(
+            list(np.sort(np.concatenate(keep))),
+            list(batched_nms(dets, labels, 0.5)))
+
+    def test_soft_nms(self):
+        dets = random_dets(self.rng, 200)
+        hard_dets, hard_keep = soft_nms(
+            dets, thresh=0.5, score_thresh=0., method='hard')
+        self.assertEqual(list(np.sort(hard_keep)), list(nms(dets, 0.5)))
+        for method in ['linear', 'gaussian']:
+            soft_dets, soft_keep = soft_nms(dets, method=method)
+            self.assertTrue(len(soft_keep) >= len(hard_keep))
+            self.assertTrue(np.all(soft_dets[:, 0] <= dets[soft_keep, 0]))
+            self.assertTrue(np.all(np.diff(soft_dets[:, 0]) <= 0))
+
+    def test_bbox_overlaps(self):
+        x = random_dets(self.rng, 50)[:, 1:]
+        y = random_dets(self.rng, 30)[:, 1:]
+        expect = loop_bbox_overlaps(x, y)
+        self.assertTrue(np.array_equal(expect, bbox_overlaps(x, y)))
+        self.assertTrue(
+            np.array_equal(expect, bbox_overlaps(
+                x, y, chunk_size=64)))
+
+    def test_box_voting(self):
+        dets = random_dets(self.rng, 300)
+        nms_dets = dets[nms(dets, 0.5)]
+        overlaps = loop_bbox_overlaps(nms_dets[:, 1:], dets[:, 1:])
+        expect = nms_dets.copy()
+        for k in range(nms_dets.shape[0]):
+            inds = np.where(overlaps[k] >= 0.8)[0]
+            expect[k, 1:] = np.average(
+                dets[inds, 1:], axis=0, weights=dets[inds, 0])
+        actual = box_voting(nms_dets, dets, 0.8)
+        self.assertTrue(np.allclose(expect, actual, rtol=1e-5))
+
+    def test_get_nms_result(self):
+        class Config(object):
+            num_classes = 5
+            MultiScaleTEST = {
+                'score_thresh': 0.05,
+                'nms_thresh': 0.5,
+                'enable_voting': False,
+                'vote_thresh': 0.9,
+                'detections_per_im': 50,
+            }
+
+        boxes = np.hstack([random_dets(self.rng, 200)[:, 1:] for _ in range(5)])
+        scores = self.rng.uniform(size=(200, 5)).astype(np.float32)**4
+        results = get_nms_result(boxes, scores, Config)
+        self.assertEqual(results.shape, (50, 6))
+        for j in range(1, 5):
+            inds = np.where(scores[:, j] > 0.05)[0]
+            dets = np.hstack((scores[inds, j][:, np.newaxis],
+                              boxes[inds, j * 4:(j + 1) * 4]))
+            kept = dets[loop_nms(dets, 0.5)]
+            cls_results = results[results[:, 0] == j, 1:]
+            self.assertTrue(
+                np.array_equal(kept[kept[:, 0] >= results[:, 1].min()],
+                               cls_results))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+#   Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import unittest
+import numpy as np
+
+from ppdet.utils.widerface_eval_utils import bbox_vote, get_shrink, \
+        get_multi_scale_jobs, filter_face_bboxes
+
+
+def loop_bbox_vote(det):
+    """Reference which deletes and stacks boxes in a while loop."""
+    order = det[:, 4].ravel().argsort()[::-1]
+    det = det[order, :]
+    if det.shape[0] == 0:
+        dets = np.array([[10, 10, 20, 20, 0.002]])
+        det = np.empty(shape=[0, 5])
+    while det.shape[0] > 0:
+        # IOU
+        area = (det[:, 2] - det[:, 0] + 1) * (det[:, 3] - det[:, 1] + 1)
+        xx1 = np.maximum(det[0, 0], det[:, 0])
+        yy1 = np.maximum(det[0, 1], det[:, 1])
+        xx2 = np.minimum(det[0, 2], det[:, 2])
+        yy2 = np.minimum(det[0, 3], det[:, 3])
+        w = np.maximum(0.0, xx2 - xx1 + 1)
+        h = np.maximum(0.0, yy2 - yy1 + 1)
+        inter = w * h
+        o = inter / (area[0] + area[:] - inter)
+
+        # nms
+        merge_index = np.where(o >= 0.3)[0]
+        det_accu = det[merge_index, :]
+        det = np.delete(det, merge_index, 0)
+        if merge_index.shape[0] <= 1:
+            if det.shape[0] == 0:
+                try:
+                    dets = np.row_stack((dets, det_accu))
+                except:
+                    dets = det_accu
+            continue
+        det_accu[:, 0:4] = det_accu[:, 0:4] * np.tile(det_accu[:, -1:], (1, 4))
+        max_score = np.max(det_accu[:, 4])
+        det_accu_sum = np.zeros((1, 5))
+        det_accu_sum[:, 0:4] = np.sum(det_accu[:, 0:4],
+                                      axis=0) / np.sum(det_accu[:, -1:])
+        det_accu_sum[:, 4] = max_score
+        try:
+            dets = np.row_stack((dets, det_accu_sum))
+        except:
+            dets = det_accu_sum
+    dets = dets[0:750, :]
+    keep_index = np.where(dets[:, 4] >= 0.01)[0]
+    dets = dets[keep_index, :]
+    return dets
+
+
+def random_faces(num_faces, num_dets, im_size=1024, seed=0):
+    """Detections of multi-scale test, jittered around dense faces."""
+    rng = np.random.RandomState(seed)
+    xy = rng.uniform(0, im_size, (num_faces, 2))
+    wh = rng.uniform(4, 64, (num_faces, 2))
+    faces = np.concatenate([xy, xy + wh], axis=1)
+    idx = rng.randint(0, num_faces, num_dets)
+    jitter = rng.normal(0, 1, (num_dets, 4)) * np.tile(wh[idx] * 0.1, (1, 2))
+    boxes = faces[idx] + jitter
+    scores = rng.uniform(0, 1, (num_dets, 1))
+    return np.concatenate([boxes, scores], axis=1).astype('float32')
+
+
+class TestWiderFaceEvalUtils(unittest.TestCase):
+    def assertDetsEqual(self, dets, expect):
+        self.assertEqual(dets.shape, expect.shape)
+        self.assertTrue(np.array_equal(dets, expect))
+
+    def test_bbox_vote(self):
+        for num_faces, num_dets in [(1, 1), (1, 5), (20, 30), (300, 3000)]:
+            det = random_faces(num_faces, num_dets, seed=num_dets)
+            self.assertDetsEqual(bbox_vote(det), loop_bbox_vote(det))
+            det = det.astype('float64')
+            self.assertDetsEqual(bbox_vote(det), loop_bbox_vote(det))
+        # separated boxes are all single clusters
+        det = np.array([[0, 0, 10, 10, 0.9], [100, 100, 110, 110, 0.8],
+                        [200, 200, 210, 210, 0.7]])
+        self.assertDetsEqual(bbox_vote(det), loop_bbox_vote(det))
+        self.assertEqual(bbox_vote(det).shape, (1, 5))
+        self.assertEqual(bbox_vote(np.empty((0, 5))).shape, (0, 5))
+
+    def test_multi_scale_jobs(self):
+        for height, width in [(1024, 768), (300, 200), (100, 80), (32, 48)]:
+            shrink, max_shrink = get_shrink(height, width)
+            jobs = get_multi_scale_jobs(shrink, max_shrink)
+            self.assertEqual(jobs[:2], [(shrink, False, None),
+                                        (shrink, True, None)])
+            self.assertIn((0.25, False, 'big'), jobs)
+            for scale, flip, keep in jobs[2:]:
+                self.assertFalse(flip)
+                self.assertLessEqual(scale, max(max_shrink, 0.25))
+
+        # max_shrink > 2: enlarge by 2, 4 and max_shrink for small faces
+        jobs = get_multi_scale_jobs(1, 4.5)
+        self.assertEqual(jobs, [(1, False, None), (1, True, None),
+                                (0.5, False, 'big'), (2, False, 'small'),
+                                (4, False, 'small'), (4.5, False, 'small'),
+                                (0.25, False, 'big'), (0.75, False, 'big'),
+                                (1.25, False, 'small'), (1.5, False, 'small'),
+                                (1.75, False, 'small')])
+        # max_shrink < 1: the enlarged image is shrinked actually
+        jobs = get_multi_scale_jobs(0.5, 0.5)
+        self.assertEqual(jobs, [(0.5, False, None), (0.5, True, None),
+                                (0.25, False, 'big'), (0.375, False, 'big'),
+                                (0.25, False, 'big')])
+
+    def test_filter_face_bboxes(self):
+        det = np.array([[0, 0, 10, 10, 0.9], [0, 0, 50, 200, 0.8],
+                        [0, 0, 200, 200, 0.7]])
+        self.assertEqual(len(filter_face_bboxes(det)), 3)
+        self.assertEqual(filter_face_bboxes(det, 'big')[:, 4].tolist(),
+                         [0.8, 0.7])
+        self.assertEqual(filter_face_bboxes(det, 'small')[:, 4].tolist(),
+                         [0.9, 0.8])
+
+
+if __name__ == '__main__':
+    unittest.main()
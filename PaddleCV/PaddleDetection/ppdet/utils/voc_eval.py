@@ -29,7 +29,7 @@ import logging
 logger = logging.getLogger(__name__)
 
 __all__ = [
-    'bbox_eval', 'bbox2out', 'get_category_info'
+    'bbox_eval', 'bbox2out', 'split_batch', 'get_category_info'
 ]
 
 
@@ -43,7 +43,8 @@ def bbox_eval(results,
     Bounding box evaluation for VOC dataset
 
     Args:
-        results (list): prediction bounding box results.
+        results (list): prediction bounding box results of batches,
+                        or a generator of them.
         class_num (int): evaluation class number.
         overlap_thresh (float): the postive threshold of
                         bbox overlap
@@ -54,7 +55,6 @@ def bbox_eval(results,
         evaluate_difficult (bool): whether to evaluate
                         difficult gt bbox.
     """
-    assert 'bbox' in results[0]
     logger.info("Start evaluate...")
 
     detection_map = DetectionMAP(class_num=class_num,
@@ -64,47 +64,10 @@ def bbox_eval(results,
                         evaluate_difficult=evaluate_difficult)
 
     for t in results:
-        bboxes = t['bbox'][0]
-        bbox_lengths = t['bbox'][1][0]
-
-        if bboxes.shape == (1, 1) or bboxes is None:
-            continue
-
-        gt_boxes = t['gt_box'][0]
-        gt_labels = t['gt_label'][0]
-        difficults = t['is_difficult'][0] if not evaluate_difficult \
-                            else None
-
-        if len(t['gt_box'][1]) == 0:
-            # gt_box, gt_label, difficult read as zero padded Tensor
-            bbox_idx = 0
-            for i in range(len(gt_boxes)):
-                gt_box = gt_boxes[i]
-                gt_label = gt_labels[i]
-                difficult = None if difficults is None \
-                                else difficults[i]
-                bbox_num = bbox_lengths[i]
-                bbox = bboxes[bbox_idx: bbox_idx + bbox_num]
-                gt_box, gt_label, difficult = prune_zero_padding(
-                                        gt_box, gt_label, difficult)
-                detection_map.update(bbox, gt_box, gt_label, difficult)
-                bbox_idx += bbox_num
-        else:
-            # gt_box, gt_label, difficult read as LoDTensor
-            gt_box_lengths = t['gt_box'][1][0]
-            bbox_idx = 0
-            gt_box_idx = 0
-            for i in range(len(bbox_lengths)):
-                bbox_num = bbox_lengths[i]
-                gt_box_num = gt_box_lengths[i]
-                bbox = bboxes[bbox_idx: bbox_idx + bbox_num]
-                gt_box = gt_boxes[gt_box_idx: gt_box_idx + gt_box_num]
-                gt_label = gt_labels[gt_box_idx: gt_box_idx + gt_box_num]
-                difficult = None if difficults is None else \
-                            difficults[gt_box_idx: gt_box_idx + gt_box_num]
-                detection_map.update(bbox, gt_box, gt_label, difficult)
-                bbox_idx += bbox_num
-                gt_box_idx += gt_box_num
+        assert 'bbox' in t, "no 'bbox' in the outputs of batch"
+        for bbox, gt_box, gt_label, difficult in split_batch(
+                t, evaluate_difficult):
+            detection_map.update(bbox, gt_box, gt_label, difficult)
 
     logger.info("Accumulating evaluatation results...")
     detection_map.accumulate()
@@ -114,6 +77,62 @@ def bbox_eval(results,
     return map_stat
 
 
+def split_batch(t, evaluate_difficult=False):
+    """
+    Split the prediction and ground truth of a batch by images.
+
+    Args:
+        t (dict): prediction result of a batch, should include
+                  `bbox`, `gt_box`, `gt_label` and `is_difficult`.
+        evaluate_difficult (bool): whether to evaluate
+                        difficult gt bbox.
+
+    Returns:
+        a generator of (bbox, gt_box, gt_label, difficult) of each image
+    """
+    bboxes = t['bbox'][0]
+    bbox_lengths = t['bbox'][1][0]
+
+    if bboxes.shape == (1, 1) or bboxes is None:
+        return
+
+    gt_boxes = t['gt_box'][0]
+    gt_labels = t['gt_label'][0]
+    difficults = t['is_difficult'][0] if not evaluate_difficult \
+                        else None
+
+    if len(t['gt_box'][1]) == 0:
+        # gt_box, gt_label, difficult read as zero padded Tensor
+        bbox_idx = 0
+        for i in range(len(gt_boxes)):
+            gt_box = gt_boxes[i]
+            gt_label = gt_labels[i]
+            difficult = None if difficults is None \
+                            else difficults[i]
+            bbox_num = bbox_lengths[i]
+            bbox = bboxes[bbox_idx: bbox_idx + bbox_num]
+            gt_box, gt_label, difficult = prune_zero_padding(
+                                    gt_box, gt_label, difficult)
+            yield bbox, gt_box, gt_label, difficult
+            bbox_idx += bbox_num
+    else:
+        # gt_box, gt_label, difficult read as LoDTensor
+        gt_box_lengths = t['gt_box'][1][0]
+        bbox_idx = 0
+        gt_box_idx = 0
+        for i in range(len(bbox_lengths)):
+            bbox_num = bbox_lengths[i]
+            gt_box_num = gt_box_lengths[i]
+            bbox = bboxes[bbox_idx: bbox_idx + bbox_num]
+            gt_box = gt_boxes[gt_box_idx: gt_box_idx + gt_box_num]
+            gt_label = gt_labels[gt_box_idx: gt_box_idx + gt_box_num]
+            difficult = None if difficults is None else \
+                        difficults[gt_box_idx: gt_box_idx + gt_box_num]
+            yield bbox, gt_box, gt_label, difficult
+            bbox_idx += bbox_num
+            gt_box_idx += gt_box_num
+
+
 def prune_zero_padding(gt_box, gt_label, difficult=None):
     valid_cnt = 0
     for i in range(len(gt_box)):
@@ -27,7 +27,8 @@ logger = logging.getLogger(__name__)
 
 __all__ = [
     'get_shrink', 'bbox_vote', 'save_widerface_bboxes', 'save_fddb_bboxes',
-    'to_chw_bgr', 'bbox2out', 'get_category_info'
+    'to_chw_bgr', 'bbox2out', 'get_category_info', 'get_multi_scale_jobs',
+    'filter_face_bboxes'
 ]
 
 
@@ -46,50 +47,69 @@ def to_chw_bgr(image):
     return image
 
 
-def bbox_vote(det):
+def bbox_vote(det, vote_thresh=0.3, max_dets=750, score_thresh=0.01):
+    """
+    Merge the detections of multi-scale test by box voting. Boxes are
+    visited by descending score, each unvisited box collects the boxes
+    overlapping with it by IoU >= 'vote_thresh' into a cluster, which is
+    merged into one box weighted by scores. A cluster of a single box is
+    dropped unless it is the last one.
+
+    Args:
+        det (np.ndarray): detections with shape [N, 5], each row is
+                          [xmin, ymin, xmax, ymax, score].
+        vote_thresh (float): IoU threshold of clustering.
+        max_dets (int): max number of merged boxes.
+        score_thresh (float): min score of merged boxes.
+
+    Returns:
+        np.ndarray with shape [M, 5]
+    """
     order = det[:, 4].ravel().argsort()[::-1]
     det = det[order, :]
-    if det.shape[0] == 0:
-        dets = np.array([[10, 10, 20, 20, 0.002]])
-        det = np.empty(shape=[0, 5])
-    while det.shape[0] > 0:
-        # IOU
-        area = (det[:, 2] - det[:, 0] + 1) * (det[:, 3] - det[:, 1] + 1)
-        xx1 = np.maximum(det[0, 0], det[:, 0])
-        yy1 = np.maximum(det[0, 1], det[:, 1])
-        xx2 = np.minimum(det[0, 2], det[:, 2])
-        yy2 = np.minimum(det[0, 3], det[:, 3])
+    num = det.shape[0]
+    if num == 0:
+        return np.empty(shape=[0, 5])
+    x1 = det[:, 0]
+    y1 = det[:, 1]
+    x2 = det[:, 2]
+    y2 = det[:, 3]
+    scores = det[:, 4:5]
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+
+    # indexes of unvisited boxes, in descending order of score
+    left = np.arange(num)
+    dets = np.empty((min(num, max_dets), 5))
+    dets_num = 0
+    while left.shape[0] > 0 and dets_num < max_dets:
+        i = left[0]
+        xx1 = np.maximum(x1[i], x1[left])
+        yy1 = np.maximum(y1[i], y1[left])
+        xx2 = np.minimum(x2[i], x2[left])
+        yy2 = np.minimum(y2[i], y2[left])
         w = np.maximum(0.0, xx2 - xx1 + 1)
         h = np.maximum(0.0, yy2 - yy1 + 1)
         inter = w * h
-        o = inter / (area[0] + area[:] - inter)
+        o = inter / (areas[i] + areas[left] - inter)
 
-        # nms
-        merge_index = np.where(o >= 0.3)[0]
-        det_accu = det[merge_index, :]
-        det = np.delete(det, merge_index, 0)
+        merged = o >= vote_thresh
+        # box i is always in its own cluster
+        merged[0] = True
+        merge_index = left[merged]
+        left = left[~merged]
         if merge_index.shape[0] <= 1:
-            if det.shape[0] == 0:
-                try:
-                    dets = np.row_stack((dets, det_accu))
-                except:
-                    dets = det_accu
+            if left.shape[0] == 0:
+                dets[dets_num] = det[i]
+                dets_num += 1
             continue
-        det_accu[:, 0:4] = det_accu[:, 0:4] * np.tile(det_accu[:, -1:], (1, 4))
-        max_score = np.max(det_accu[:, 4])
-        det_accu_sum = np.zeros((1, 5))
-        det_accu_sum[:, 0:4] = np.sum(det_accu[:, 0:4],
-                                      axis=0) / np.sum(det_accu[:, -1:])
-        det_accu_sum[:, 4] = max_score
-        try:
-            dets = np.row_stack((dets, det_accu_sum))
-        except:
-            dets = det_accu_sum
-    dets = dets[0:750, :]
-    # Only keep 0.3 or more
-    keep_index = np.where(dets[:, 4] >= 0.01)[0]
-    dets = dets[keep_index, :]
-    return dets
+        det_accu = det[merge_index, 0:4] * scores[merge_index]
+        dets[dets_num, 0:4] = np.sum(det_accu, axis=0) / \
+            np.sum(scores[merge_index])
+        dets[dets_num, 4] = np.max(scores[merge_index])
+        dets_num += 1
+    dets = dets[:dets_num]
+    keep_index = np.where(dets[:, 4] >= score_thresh)[0]
+    return dets[keep_index, :]
 
 
 def get_shrink(height, width):
@@ -129,6 +149,58 @@ def get_shrink(height, width):
     return shrink, max_shrink
 
 
+def get_multi_scale_jobs(shrink, max_shrink):
+    """
+    Detections of multi-scale test, in the order they are merged.
+
+    Args:
+        shrink (float): scale of the original image, see 'get_shrink'.
+        max_shrink (float): max scale not out of memory.
+
+    Returns:
+        list of (scale, flip, keep), 'keep' is None to keep all boxes,
+        'big' to keep faces larger than 30 pixels, which is used for
+        shrinked images, and 'small' to keep faces smaller than 100
+        pixels, which is used for enlarged images.
+    """
+    jobs = [(shrink, False, None), (shrink, True, None)]
+    # Shrink detecting is only used to detect big faces
+    st = 0.5 if max_shrink >= 0.75 else 0.5 * max_shrink
+    jobs.append((st, False, 'big'))
+    # Enlarge one times, and small image x times for small faces
+    bt = min(2, max_shrink) if max_shrink > 1 else (st + max_shrink) / 2
+    enlarged = [bt]
+    if max_shrink > 2:
+        bt *= 2
+        while bt < max_shrink:
+            enlarged.append(bt)
+            bt *= 2
+        enlarged.append(max_shrink)
+    keep = 'small' if bt > 1 else 'big'
+    jobs.extend([(scale, False, keep) for scale in enlarged])
+    # image pyramids
+    jobs.append((0.25, False, 'big'))
+    for scale in [0.75, 1.25, 1.5, 1.75]:
+        if scale <= max_shrink:
+            jobs.append((scale, False, 'small' if scale > 1 else 'big'))
+    return jobs
+
+
+def filter_face_bboxes(det, keep=None):
+    """
+    Keep the big or small faces of 'det', see 'get_multi_scale_jobs'.
+    """
+    if keep is None:
+        return det
+    w = det[:, 2] - det[:, 0] + 1
+    h = det[:, 3] - det[:, 1] + 1
+    if keep == 'big':
+        index = np.where(np.maximum(w, h) > 30)[0]
+    else:
+        index = np.where(np.minimum(w, h) < 100)[0]
+    return det[index, :]
+
+
 def save_widerface_bboxes(image_path, bboxes_scores, output_dir):
     image_name = image_path.split('/')[-1]
     image_class = image_path.split('/')[-2]
@@ -33,7 +33,8 @@ set_paddle_flags(
 
 import paddle.fluid as fluid
 
-from ppdet.utils.eval_utils import parse_fetches, eval_run, eval_results, json_eval_results
+from ppdet.utils.eval_utils import parse_fetches, iter_eval_run, eval_results, json_eval_results, \
+    pipelined_eval_run, create_accumulator
 import ppdet.utils.checkpoint as checkpoint
 from ppdet.utils.check import check_gpu
 from ppdet.modeling.model_input import create_feed
@@ -147,17 +148,48 @@ def main():
         if 'weights' in cfg:
             checkpoint.load_params(exe, sub_eval_prog, cfg.weights)
 
-    results = eval_run(exe, compile_program, pyreader, keys, values, cls, cfg,
-                       sub_eval_prog, sub_keys, sub_values)
+    # if map_type not set, use default 11point, only use in VOC eval
+    map_type = cfg.map_type if 'map_type' in cfg else '11point'
 
-    # evaluation
     resolution = None
-    if 'mask' in results[0]:
+    if 'Mask' in main_arch:
         resolution = model.mask_head.resolution
-    # if map_type not set, use default 11point, only use in VOC eval
-    map_type = cfg.map_type if 'map_type' in cfg else '11point'
-    eval_results(results, eval_feed, cfg.metric, cfg.num_classes, resolution,
-                 is_bbox_normalized, FLAGS.output_eval, map_type)
+
+    if FLAGS.eval_workers > 0:
+        # evaluate batches in worker threads while running the program
+        accumulator = create_accumulator(
+            eval_feed, cfg.metric, cfg.num_classes, resolution,
+            is_bbox_normalized, FLAGS.output_eval, map_type)
+        pipelined_eval_run(
+            exe,
+            compile_program,
+            pyreader,
+            keys,
+            values,
+            cls,
+            accumulator,
+            cfg,
+            sub_eval_prog,
+            sub_keys,
+            sub_values,
+            num_workers=FLAGS.eval_workers)
+        return
+
+    # the outputs of batches are evaluated as they are run
+    results = iter_eval_run(exe, compile_program, pyreader, keys, values, cls,
+                            cfg, sub_eval_prog, sub_keys, sub_values)
+
+    # evaluation
+    eval_results(
+        results,
+        eval_feed,
+        cfg.metric,
+        cfg.num_classes,
+        resolution,
+        is_bbox_normalized,
+        FLAGS.output_eval,
+        map_type,
+        mask_workers=FLAGS.mask_workers)
 
 
 if __name__ == '__main__':
@@ -179,5 +211,17 @@ if __name__ == '__main__':
         default=None,
         type=str,
         help="Evaluation file directory, default is current directory.")
+    parser.add_argument(
+        "--eval_workers",
+        default=0,
+        type=int,
+        help="Number of threads to evaluate batches while running the "
+        "program, 0 to evaluate them in the main thread as they are inferred.")
+    parser.add_argument(
+        "--mask_workers",
+        default=0,
+        type=int,
+        help="Number of processes to encode the masks of COCO evaluation, "
+        "0 to encode them in the main process.")
     FLAGS = parser.parse_args()
     main()
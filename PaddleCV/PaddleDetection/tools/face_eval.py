@@ -21,13 +21,14 @@ import os
 import paddle.fluid as fluid
 import numpy as np
 from PIL import Image
-from collections import OrderedDict
+from collections import OrderedDict, deque
 
 import ppdet.utils.checkpoint as checkpoint
 from ppdet.utils.cli import ArgsParser
 from ppdet.utils.check import check_gpu
 from ppdet.utils.widerface_eval_utils import get_shrink, bbox_vote, \
-    save_widerface_bboxes, save_fddb_bboxes, to_chw_bgr
+    save_widerface_bboxes, save_fddb_bboxes, to_chw_bgr, \
+    get_multi_scale_jobs, filter_face_bboxes
 from ppdet.core.workspace import load_config, merge_config, create
 from ppdet.modeling.model_input import create_feed
 
@@ -57,7 +58,8 @@ def face_eval_run(exe,
                   gt_file,
                   pred_dir='output/pred',
                   eval_mode='widerface',
-                  multi_scale=False):
+                  multi_scale=False,
+                  num_workers=0):
     # load ground truth files
     with open(gt_file, 'r') as f:
         gt_lines = f.readlines()
@@ -71,138 +73,166 @@ def face_eval_run(exe,
         pos_gt += 1 + n_gt
     logger.info('The ground truth file load {} images'.format(len(imid2path)))
 
-    dets_dist = OrderedDict()
-    for iter_id, im_path in enumerate(imid2path):
+    def _prepare(im_path):
         image_path = os.path.join(img_root_dir, im_path)
         if eval_mode == 'fddb':
             image_path += '.jpg'
         image = Image.open(image_path).convert('RGB')
         if multi_scale:
             shrink, max_shrink = get_shrink(image.size[1], image.size[0])
-            det0 = detect_face(exe, compile_program, fetches, image, shrink)
-            det1 = flip_test(exe, compile_program, fetches, image, shrink)
-            [det2, det3] = multi_scale_test(exe, compile_program, fetches, image,
-                                        max_shrink)
-            det4 = multi_scale_test_pyramid(exe, compile_program, fetches, image,
-                                        max_shrink)
-            det = np.row_stack((det0, det1, det2, det3, det4))
-            dets = bbox_vote(det)
+            jobs = get_multi_scale_jobs(shrink, max_shrink)
         else:
-            dets = detect_face(exe, compile_program, fetches, image, 1)
+            jobs = [(1, False, None)]
+        return image_path, image.size, jobs, face_batches(image, jobs)
+
+    def _merge(image_size, jobs, detections):
+        dets = [
+            face_dets(det, image_size, job)
+            for det, job in zip(detections, jobs)
+        ]
+        if not multi_scale:
+            return dets[0]
+        return bbox_vote(np.concatenate(dets, axis=0))
+
+    def _save(iter_id, im_path, image_path, dets):
         if eval_mode == 'widerface':
             save_widerface_bboxes(image_path, dets, pred_dir)
         else:
             dets_dist[im_path] = dets
         if iter_id % 100 == 0:
             logger.info('Test iter {}'.format(iter_id))
+
+    dets_dist = OrderedDict()
+    if num_workers <= 0:
+        for iter_id, im_path in enumerate(imid2path):
+            image_path, image_size, jobs, batches = _prepare(im_path)
+            detections = detect_faces(exe, compile_program, fetches, batches,
+                                      len(jobs))
+            dets = _merge(image_size, jobs, detections)
+            _save(iter_id, im_path, image_path, dets)
+    else:
+        # load and resize the next images, and vote the boxes of the
+        # previous ones in worker threads while running the program
+        from multiprocessing.pool import ThreadPool
+        max_pending = 2 * num_workers
+        pool = ThreadPool(num_workers)
+        prepared = deque()
+        merged = deque()
+        try:
+            for im_path in imid2path[:max_pending]:
+                prepared.append(pool.apply_async(_prepare, (im_path, )))
+            for iter_id, im_path in enumerate(imid2path):
+                image_path, image_size, jobs, batches = \
+                    prepared.popleft().get()
+                if iter_id + max_pending < len(imid2path):
+                    prepared.append(
+                        pool.apply_async(_prepare, (
+                            imid2path[iter_id + max_pending], )))
+                detections = detect_faces(exe, compile_program, fetches,
+                                          batches, len(jobs))
+                merged.append((iter_id, im_path, image_path,
+                               pool.apply_async(_merge, (image_size, jobs,
+                                                         detections))))
+                while merged and (len(merged) > max_pending or
+                                  merged[0][-1].ready()):
+                    iter_id, im_path, image_path, dets = merged.popleft()
+                    _save(iter_id, im_path, image_path, dets.get())
+            while merged:
+                iter_id, im_path, image_path, dets = merged.popleft()
+                _save(iter_id, im_path, image_path, dets.get())
+        finally:
+            pool.terminate()
     if eval_mode == 'fddb':
         save_fddb_bboxes(dets_dist, pred_dir)
     logger.info("Finish evaluation.")
 
 
-def detect_face(exe, compile_program, fetches, image, shrink):
-    image_shape = [3, image.size[1], image.size[0]]
-    if shrink != 1:
-        h, w = int(image_shape[1] * shrink), int(image_shape[2] * shrink)
-        image = image.resize((w, h), Image.ANTIALIAS)
-        image_shape = [3, h, w]
-
-    img = face_img_process(image)
-    detection, = exe.run(compile_program,
-                         feed={'image': img},
-                         fetch_list=[fetches['bbox']],
-                         return_numpy=False)
-    detection = np.array(detection)
+def face_batches(image, jobs):
+    """
+    Resize (and flip) 'image' for every detection of 'jobs', the images
+    of the same shape are stacked in one batch.
+
+    Returns:
+        list of (indexes of jobs, image batch)
+    """
+    batches = OrderedDict()
+    for idx, (shrink, flip, _) in enumerate(jobs):
+        img = image.transpose(Image.FLIP_LEFT_RIGHT) if flip else image
+        if shrink != 1:
+            h, w = int(img.size[1] * shrink), int(img.size[0] * shrink)
+            img = img.resize((w, h), Image.ANTIALIAS)
+        img = face_img_process(img)
+        batches.setdefault(img.shape, []).append((idx, img))
+    return [([idx for idx, _ in batch],
+             np.concatenate([img for _, img in batch], axis=0))
+            for batch in batches.values()]
+
+
+def detect_faces(exe, compile_program, fetches, batches, num):
+    """
+    Run the program on every batch of 'face_batches'.
+
+    Returns:
+        list of 'num' detections, in the order of jobs, each is a pair
+        of the normalized detection and the shape of the input image
+    """
+    detections = [None] * num
+    for indexes, imgs in batches:
+        detection, = exe.run(compile_program,
+                             feed={'image': imgs},
+                             fetch_list=[fetches['bbox']],
+                             return_numpy=False)
+        lod = detection.lod()[0] if len(indexes) > 1 else None
+        detection = np.array(detection)
+        image_shape = imgs.shape[1:]
+        for i, idx in enumerate(indexes):
+            if np.prod(detection.shape) == 1:
+                # no face detected in all images
+                det = detection
+            elif lod is not None:
+                det = detection[lod[i]:lod[i + 1]]
+            else:
+                det = detection
+            detections[idx] = (det, image_shape)
+    return detections
+
+
+def face_dets(detection, image_size, job):
+    """
+    Scale the normalized 'detection' of 'job' to boxes in the original
+    image, and flip them back or filter them by face size.
+    """
+    detection, image_shape = detection
+    shrink, flip, keep = job
     # layout: xmin, ymin, xmax. ymax, score
-    if np.prod(detection.shape) == 1:
+    if np.prod(detection.shape) <= 1:
         logger.info("No face detected")
-        return np.array([[0, 0, 0, 0, 0]])
-    det_conf = detection[:, 1]
-    det_xmin = image_shape[2] * detection[:, 2] / shrink
-    det_ymin = image_shape[1] * detection[:, 3] / shrink
-    det_xmax = image_shape[2] * detection[:, 4] / shrink
-    det_ymax = image_shape[1] * detection[:, 5] / shrink
-
-    det = np.column_stack((det_xmin, det_ymin, det_xmax, det_ymax, det_conf))
-    return det
-
-
-def flip_test(exe, compile_program, fetches, image, shrink):
-    img = image.transpose(Image.FLIP_LEFT_RIGHT)
-    det_f = detect_face(exe, compile_program, fetches, img, shrink)
-    det_t = np.zeros(det_f.shape)
-    # image.size: [width, height]
-    det_t[:, 0] = image.size[0] - det_f[:, 2]
-    det_t[:, 1] = det_f[:, 1]
-    det_t[:, 2] = image.size[0] - det_f[:, 0]
-    det_t[:, 3] = det_f[:, 3]
-    det_t[:, 4] = det_f[:, 4]
-    return det_t
-
-
-def multi_scale_test(exe, compile_program, fetches, image, max_shrink):
-    # Shrink detecting is only used to detect big faces
-    st = 0.5 if max_shrink >= 0.75 else 0.5 * max_shrink
-    det_s = detect_face(exe, compile_program, fetches, image, st)
-    index = np.where(
-        np.maximum(det_s[:, 2] - det_s[:, 0] + 1, det_s[:, 3] - det_s[:, 1] + 1)
-        > 30)[0]
-    det_s = det_s[index, :]
-    # Enlarge one times
-    bt = min(2, max_shrink) if max_shrink > 1 else (st + max_shrink) / 2
-    det_b = detect_face(exe, compile_program, fetches, image, bt)
-
-    # Enlarge small image x times for small faces
-    if max_shrink > 2:
-        bt *= 2
-        while bt < max_shrink:
-            det_b = np.row_stack((det_b, detect_face(exe, compile_program,
-                                                     fetches, image, bt)))
-            bt *= 2
-        det_b = np.row_stack((det_b, detect_face(exe, compile_program, fetches,
-                                                 image, max_shrink)))
-
-    # Enlarged images are only used to detect small faces.
-    if bt > 1:
-        index = np.where(
-            np.minimum(det_b[:, 2] - det_b[:, 0] + 1,
-                       det_b[:, 3] - det_b[:, 1] + 1) < 100)[0]
-        det_b = det_b[index, :]
-    # Shrinked images are only used to detect big faces.
+        det = np.array([[0, 0, 0, 0, 0]])
     else:
-        index = np.where(
-            np.maximum(det_b[:, 2] - det_b[:, 0] + 1,
-                       det_b[:, 3] - det_b[:, 1] + 1) > 30)[0]
-        det_b = det_b[index, :]
-    return det_s, det_b
-
-
-def multi_scale_test_pyramid(exe, compile_program, fetches, image, max_shrink):
-    # Use image pyramids to detect faces
-    det_b = detect_face(exe, compile_program, fetches, image, 0.25)
-    index = np.where(
-        np.maximum(det_b[:, 2] - det_b[:, 0] + 1, det_b[:, 3] - det_b[:, 1] + 1)
-        > 30)[0]
-    det_b = det_b[index, :]
-
-    st = [0.75, 1.25, 1.5, 1.75]
-    for i in range(len(st)):
-        if st[i] <= max_shrink:
-            det_temp = detect_face(exe, compile_program, fetches, image, st[i])
-            # Enlarged images are only used to detect small faces.
-            if st[i] > 1:
-                index = np.where(
-                    np.minimum(det_temp[:, 2] - det_temp[:, 0] + 1,
-                               det_temp[:, 3] - det_temp[:, 1] + 1) < 100)[0]
-                det_temp = det_temp[index, :]
-            # Shrinked images are only used to detect big faces.
-            else:
-                index = np.where(
-                    np.maximum(det_temp[:, 2] - det_temp[:, 0] + 1,
-                               det_temp[:, 3] - det_temp[:, 1] + 1) > 30)[0]
-                det_temp = det_temp[index, :]
-            det_b = np.row_stack((det_b, det_temp))
-    return det_b
+        det_conf = detection[:, 1]
+        det_xmin = image_shape[2] * detection[:, 2] / shrink
+        det_ymin = image_shape[1] * detection[:, 3] / shrink
+        det_xmax = image_shape[2] * detection[:, 4] / shrink
+        det_ymax = image_shape[1] * detection[:, 5] / shrink
+        det = np.column_stack((det_xmin, det_ymin, det_xmax, det_ymax,
+                               det_conf))
+    if flip:
+        det_t = np.zeros(det.shape)
+        # image_size: [width, height]
+        det_t[:, 0] = image_size[0] - det[:, 2]
+        det_t[:, 1] = det[:, 1]
+        det_t[:, 2] = image_size[0] - det[:, 0]
+        det_t[:, 3] = det[:, 3]
+        det_t[:, 4] = det[:, 4]
+        det = det_t
+    return filter_face_bboxes(det, keep)
+
+
+def detect_face(exe, compile_program, fetches, image, shrink):
+    jobs = [(shrink, False, None)]
+    detections = detect_faces(exe, compile_program, fetches,
+                              face_batches(image, jobs), 1)
+    return face_dets(detections[0], image.size, jobs[0])
 
 
 def main():
@@ -265,7 +295,8 @@ def main():
         gt_file,
         pred_dir=pred_dir,
         eval_mode=FLAGS.eval_mode,
-        multi_scale=FLAGS.multi_scale)
+        multi_scale=FLAGS.multi_scale,
+        num_workers=FLAGS.eval_workers)
 
 
 if __name__ == '__main__':
@@ -294,5 +325,11 @@ if __name__ == '__main__':
         action='store_true',
         default=False,
         help="If True it will select `multi_scale` evaluation. Default is `False`, it will select `single-scale` evaluation.")
+    parser.add_argument(
+        "--eval_workers",
+        default=0,
+        type=int,
+        help="Number of threads to load images and vote boxes while "
+        "running the program, 0 to run them in main thread.")
     FLAGS = parser.parse_args()
     main()
@@ -0,0 +1,95 @@
+#copyright (c) 2019 PaddlePaddle Authors. All Rights Reserve.
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+"""Benchmark the ms per image of the AutoAugment ops applied to PIL
+images one by one (utils/autoaugment.py) and to uint8 batches
+(utils/batch_augment.py):
+
+    python benchmark_augment.py --batch_size 64 --image_size 224
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+import argparse
+import numpy as np
+import cv2
+from PIL import Image
+
+from utils.autoaugment import ImageNetPolicy, SubPolicy
+from utils.batch_augment import BatchPolicy
+
+OPS = [("shearX", 5), ("shearY", 5), ("translateX", 5), ("translateY", 5),
+       ("rotate", 5), ("color", 5), ("posterize", 5), ("solarize", 5),
+       ("contrast", 5), ("sharpness", 5), ("brightness", 5),
+       ("autocontrast", 5), ("equalize", 5), ("invert", 5)]
+
+
+class OnePolicy(object):
+    """ a policy of one sub-policy, which applies one op to all images """
+
+    def __init__(self, op, magnitude_idx):
+        sub = SubPolicy(1.0, op, magnitude_idx, 0.0, op, magnitude_idx)
+        self.policies = [sub]
+
+    def __call__(self, img):
+        return self.policies[0](img)
+
+
+def pil_cost(policy, images, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        for img in images:
+            # the conversions of the per image reader
+            np.asarray(policy(Image.fromarray(img)))
+    return (time.time() - start) / repeat / len(images) * 1e3
+
+
+def batch_cost(policy, images, repeat):
+    batch_policy = BatchPolicy(policy)
+    start = time.time()
+    for _ in range(repeat):
+        batch_policy(np.stack(images))
+    return (time.time() - start) / repeat / len(images) * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--batch_size', type=int, default=64)
+    parser.add_argument('--image_size', type=int, default=224)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    images = [
+        cv2.GaussianBlur(
+            rng.randint(0, 256, (args.image_size, args.image_size, 3))
+            .astype('uint8'), (7, 7), 0) for _ in range(args.batch_size)
+    ]
+    print("ms per image of batch size {}:".format(args.batch_size))
+    for op, magnitude_idx in OPS:
+        policy = OnePolicy(op, magnitude_idx)
+        print("  {:<12s}: PIL {:.3f}, batch {:.3f}".format(
+            op,
+            pil_cost(policy, images, args.repeat),
+            batch_cost(policy, images, args.repeat)))
+    policy = ImageNetPolicy()
+    print("  {:<12s}: PIL {:.3f}, batch {:.3f}".format(
+        "ImageNetPolicy",
+        pil_cost(policy, images, args.repeat),
+        batch_cost(policy, images, args.repeat)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+#copyright (c) 2019 PaddlePaddle Authors. All Rights Reserve.
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+"""Benchmark the images/sec of decoding training images in threads
+(reader_mode=thread) and in processes (reader_mode=process) with
+different numbers of workers, on the train_list.txt of data_dir, or on
+synthetic JPEG images if data_dir is not given:
+
+    python benchmark_reader.py --workers 1 2 4 8 --batch_size 64
+
+The images are also packed into record files (data_format=record) in
+record_dir, and the speed of reading the encoded images from image files
+and from record files is compared.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import functools
+import tempfile
+import numpy as np
+import cv2
+
+from paddle import fluid
+import reader
+from utils.record import RecordKey, RecordFile, record_samples, \
+        write_records
+
+
+def make_images(data_dir, num, seed=0):
+    """ write 'num' random JPEG images and a train_list.txt """
+    rng = np.random.RandomState(seed)
+    lines = []
+    for i in range(num):
+        h, w = rng.randint(300, 500, 2)
+        img = rng.randint(0, 256, (h, w, 3)).astype('uint8')
+        img = cv2.GaussianBlur(img, (7, 7), 0)
+        name = '%d.jpg' % i
+        cv2.imwrite(os.path.join(data_dir, name), img)
+        lines.append('%s %d' % (name, i % 1000))
+    with open(os.path.join(data_dir, 'train_list.txt'), 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def list_samples(data_dir):
+    with open(os.path.join(data_dir, 'train_list.txt')) as flist:
+        full_lines = [line.strip() for line in flist]
+    samples = []
+    for line in full_lines:
+        img_path, label = line.split()
+        samples.append([os.path.join(data_dir, img_path), int(label)])
+    return samples
+
+
+def batch_reader(samples, batch_size, num_batches):
+    def read_file_list():
+        batch_data = []
+        num = 0
+        while num < num_batches:
+            for sample in samples:
+                batch_data.append(sample)
+                if len(batch_data) == batch_size:
+                    yield batch_data
+                    batch_data = []
+                    num += 1
+                    if num == num_batches:
+                        return
+
+    return read_file_list
+
+
+def thread_reader(settings, samples, batch_size, num_batches, num_workers):
+    mapper = functools.partial(
+        reader.process_batch_data,
+        settings=settings,
+        mode='train',
+        color_jitter=False,
+        rotate=False)
+    return fluid.io.xmap_readers(
+        mapper,
+        batch_reader(samples, batch_size, num_batches),
+        num_workers,
+        settings.reader_buf_size,
+        order=False)
+
+
+def process_reader(settings, samples, batch_size, num_batches, num_workers):
+    return reader.process_batch_reader(
+        batch_reader(samples, batch_size, num_batches),
+        settings,
+        'train',
+        color_jitter=False,
+        rotate=False,
+        batch_size=batch_size,
+        num_workers=num_workers)
+
+
+def measure(create_reader, settings, samples, batch_size, num_batches,
+            num_workers):
+    rd = create_reader(settings, samples, batch_size, num_batches,
+                       num_workers)
+    num = 0
+    start = None
+    for i, batch in enumerate(rd()):
+        # what the feeder does: copy images into one array
+        if isinstance(batch[0], np.ndarray):
+            images = np.array(batch[0])
+        else:
+            images = np.array([sample[0] for sample in batch])
+        if i == 0:
+            # skip the startup of workers
+            start = time.time()
+            continue
+        num += len(images)
+    return num / (time.time() - start)
+
+
+def measure_read(samples):
+    """ images/sec of reading the encoded images without decoding """
+    records = {}
+    start = time.time()
+    for sample in samples:
+        if isinstance(sample[0], RecordKey):
+            path, index = sample[0]
+            if path not in records:
+                records[path] = RecordFile(path)
+            records[path].read(index)
+        else:
+            with open(sample[0], 'rb') as f:
+                f.read()
+    return len(samples) / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--data_dir', type=str, default=None)
+    parser.add_argument('--record_dir', type=str, default=None)
+    parser.add_argument('--record_shards', type=int, default=4)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--batch_size', type=int, default=32)
+    parser.add_argument('--batches', type=int, default=20)
+    parser.add_argument('--images', type=int, default=256)
+    args = parser.parse_args()
+
+    settings = argparse.Namespace(
+        data_dir=args.data_dir,
+        image_shape='3,224,224',
+        crop_size=224,
+        resize_short_size=256,
+        lower_scale=0.08,
+        lower_ratio=3. / 4.,
+        upper_ratio=4. / 3.,
+        interpolation=None,
+        image_mean=[0.485, 0.456, 0.406],
+        image_std=[0.229, 0.224, 0.225],
+        reader_buf_size=2048,
+        use_aa=False)
+    tmp_dirs = []
+    if settings.data_dir is None:
+        settings.data_dir = tempfile.mkdtemp()
+        tmp_dirs.append(settings.data_dir)
+        make_images(settings.data_dir, args.images)
+    record_dir = args.record_dir
+    if record_dir is None:
+        record_dir = tempfile.mkdtemp()
+        tmp_dirs.append(record_dir)
+
+    try:
+        paths = write_records(
+            os.path.join(settings.data_dir, 'train_list.txt'),
+            settings.data_dir, record_dir, 'train', args.record_shards)
+        formats = [('file_list', list_samples(settings.data_dir)),
+                   ('record', record_samples(paths))]
+
+        print("images/sec of reading encoded images:")
+        for data_format, samples in formats:
+            print("  {}: {:.1f}".format(data_format, measure_read(samples)))
+        print("images/sec of batch size {}:".format(args.batch_size))
+        for data_format, samples in formats:
+            for num_workers in args.workers:
+                thread_speed = measure(thread_reader, settings, samples,
+                                       args.batch_size, args.batches,
+                                       num_workers)
+                process_speed = measure(process_reader, settings, samples,
+                                        args.batch_size, args.batches,
+                                        num_workers)
+                print("  {} {} workers: thread {:.1f}, process {:.1f}".format(
+                    data_format, num_workers, thread_speed, process_speed))
+                sys.stdout.flush()
+    finally:
+        for tmp_dir in tmp_dirs:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    main()
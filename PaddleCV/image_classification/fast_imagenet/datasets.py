@@ -14,10 +14,13 @@
 
 from PIL import Image
 
+import io
 import os
 import os.path
 import sys
 
+from utils.record import RecordFile, record_files
+
 IMG_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
 
 
@@ -210,3 +213,59 @@ class ImageFolder(DatasetFolder):
             transform=transform,
             target_transform=target_transform)
         self.imgs = self.samples
+
+
+class RecordFolder(object):
+    """A data loader of the images packed into record files by
+    make_record.py, root/../train-00000.rec, root/../train-00001.rec ...
+    for the images of root/../train, read from the memory-mapped record
+    files instead of opening every image file. The folder root itself
+    is not needed.
+
+    Args:
+        root (string): Path of the packed image folder.
+        transform (callable, optional): A function/transform that  takes in an PIL image
+            and returns a transformed version. E.g, ``transforms.RandomCrop``
+        target_transform (callable, optional): A function/transform that takes in the
+            target and transforms it.
+    """
+
+    def __init__(self, root, transform=None, target_transform=None):
+        root = os.path.normpath(root)
+        paths = record_files(os.path.dirname(root), os.path.basename(root))
+        if len(paths) == 0:
+            raise (RuntimeError("Found 0 record files of: " + root))
+        self.root = root
+        self.transform = transform
+        self.target_transform = target_transform
+        self.records = [RecordFile(path) for path in paths]
+        self.samples = [(record, i) for record in self.records
+                        for i in range(len(record))]
+        self.targets = [
+            int(label) for record in self.records for label in record.labels
+        ]
+
+    def __getitem__(self, index):
+        record, i = self.samples[index]
+        img = Image.open(io.BytesIO(record.read(i)))
+        sample = img.convert('RGB')
+        target = self.targets[index]
+        if self.transform is not None:
+            sample = self.transform(sample)
+        if self.target_transform is not None:
+            target = self.target_transform(target)
+
+        return sample, target
+
+    def __len__(self):
+        return len(self.samples)
+
+
+def image_folder(root, transform=None):
+    """RecordFolder if root is packed into record files, or ImageFolder
+    of root
+    """
+    root = os.path.normpath(root)
+    if len(record_files(os.path.dirname(root), os.path.basename(root))) > 0:
+        return RecordFolder(root, transform)
+    return ImageFolder(root, transform)
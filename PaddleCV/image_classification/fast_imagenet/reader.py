@@ -98,17 +98,27 @@ class PaddleDataLoader(object):
         return _reader_creator
 
 
-def train(traindir, sz, min_scale=0.08, shuffle_seed=0):
+def train(traindir,
+          sz,
+          min_scale=0.08,
+          shuffle_seed=0,
+          resize_cache=None,
+          cache_ratio=1.25):
     train_tfms = [
         transforms.RandomResizedCrop(
             sz, scale=(min_scale, 1.0)), transforms.RandomHorizontalFlip()
     ]
-    train_dataset = datasets.ImageFolder(traindir,
-                                         transforms.Compose(train_tfms))
+    if resize_cache is not None:
+        # crops are read from images of short side cache_ratio * sz
+        train_dataset = resize_cache.image_folder(
+            traindir, sz, transforms.Compose(train_tfms), ratio=cache_ratio)
+    else:
+        train_dataset = datasets.image_folder(traindir,
+                                              transforms.Compose(train_tfms))
     return PaddleDataLoader(train_dataset, shuffle_seed=shuffle_seed).reader()
 
 
-def test(valdir, bs, sz, rect_val=False):
+def test(valdir, bs, sz, rect_val=False, resize_cache=None):
     if rect_val:
         idx_ar_sorted = sort_ar(valdir)
         idx_sorted, _ = zip(*idx_ar_sorted)
@@ -121,7 +131,12 @@ def test(valdir, bs, sz, rect_val=False):
             shuffle=False).reader()
 
     val_tfms = [transforms.Resize(int(sz * 1.14)), transforms.CenterCrop(sz)]
-    val_dataset = datasets.ImageFolder(valdir, transforms.Compose(val_tfms))
+    if resize_cache is not None:
+        val_dataset = resize_cache.image_folder(
+            valdir, int(sz * 1.14), transforms.Compose(val_tfms))
+    else:
+        val_dataset = datasets.image_folder(valdir,
+                                            transforms.Compose(val_tfms))
 
     return PaddleDataLoader(val_dataset).reader()
 
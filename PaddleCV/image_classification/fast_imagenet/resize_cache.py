@@ -0,0 +1,153 @@
+#copyright (c) 2019 PaddlePaddle Authors. All Rights Reserve.
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import shutil
+import multiprocessing
+from PIL import Image
+
+import datasets
+from utils.record import record_files
+
+
+class ResizeCache(object):
+    """A cache of the images of data_dir shrinked to short sides 'sizes',
+    the image data_dir/train/n01/x.jpeg shrinked to 160 is cached in
+    cache_dir/160/train/n01/x.jpeg, as tools/resize.py does.
+
+    The images of an epoch are read from the smallest cached size which
+    is not less than ratio * target size, so the small images of early
+    epochs are decoded from small files. Missing cached images are
+    shrinked and saved when they are read, or built by 'build' in
+    parallel processes ahead of time.
+
+    Args:
+        data_dir (string): root of the full size images.
+        sizes (list): short sides of the cached images.
+        cache_dir (string): root of the cached images, default data_dir.
+    """
+
+    def __init__(self, data_dir, sizes=(160, 352), cache_dir=None):
+        self.data_dir = os.path.normpath(data_dir)
+        self.sizes = sorted(sizes)
+        self.cache_dir = os.path.normpath(cache_dir or data_dir)
+
+    def select(self, target_size, ratio=1.0):
+        """The smallest cached size not less than ratio * target_size,
+        or None to read the full size images.
+        """
+        for size in self.sizes:
+            if size >= ratio * target_size:
+                return size
+        return None
+
+    def cache_path(self, path, size):
+        return os.path.join(self.cache_dir,
+                            str(size), os.path.relpath(path, self.data_dir))
+
+    def load(self, path, size):
+        """Load the image of 'path' shrinked to short side 'size', and
+        cache it if it is not cached yet.
+        """
+        cache_path = self.cache_path(path, size)
+        if os.path.isfile(cache_path):
+            return datasets.pil_loader(cache_path)
+        return self._shrink(path, size, cache_path).convert('RGB')
+
+    def _shrink(self, path, size, cache_path):
+        cache_dir = os.path.dirname(cache_path)
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError:
+                # made by another worker
+                pass
+        # readers in other workers never see a partially written file
+        tmp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+        with open(path, 'rb') as f:
+            img = Image.open(f)
+            img_format = img.format
+            w, h = img.size
+            ratio = min(h / size, w / size)
+            if ratio > 1:
+                new_size = (int(w / ratio), int(h / ratio))
+                # decode a JPEG at the smallest DCT scale of new_size
+                img.draft('RGB', new_size)
+                img = img.resize(new_size, resample=Image.BICUBIC)
+                img.save(tmp_path, format=img_format)
+            else:
+                # small images are cached as they are
+                img.load()
+                shutil.copyfile(path, tmp_path)
+        os.rename(tmp_path, cache_path)
+        return img
+
+    def image_folder(self, root, target_size, transform=None, ratio=1.0):
+        """ImageFolder of root reading cached images sufficient for
+        'target_size'. The folder of the selected size is read as a
+        RecordFolder if it is packed into record files.
+        """
+        size = self.select(target_size, ratio)
+        if size is None:
+            return datasets.image_folder(root, transform)
+        cache_root = self.cache_path(os.path.normpath(root), size)
+        if len(
+                record_files(
+                    os.path.dirname(cache_root), os.path.basename(
+                        cache_root))) > 0:
+            return datasets.RecordFolder(cache_root, transform)
+        return datasets.ImageFolder(
+            root, transform, loader=_CachedLoader(self, size))
+
+    def build(self, root, num_workers=8):
+        """Shrink all images of root to all the sizes in parallel."""
+        dataset = datasets.ImageFolder(root)
+        tasks = [(path, size) for path, _ in dataset.samples
+                 for size in self.sizes]
+        pool = multiprocessing.Pool(num_workers)
+        try:
+            for i, _ in enumerate(
+                    pool.imap_unordered(
+                        _CachedBuilder(self), tasks, chunksize=64)):
+                if (i + 1) % 10000 == 0:
+                    print("resized {}/{} images of {}".format(
+                        i + 1, len(tasks), root))
+        finally:
+            pool.close()
+            pool.join()
+
+
+class _CachedLoader(object):
+    # a picklable loader of size
+    def __init__(self, cache, size):
+        self.cache = cache
+        self.size = size
+
+    def __call__(self, path):
+        return self.cache.load(path, self.size)
+
+
+class _CachedBuilder(object):
+    def __init__(self, cache):
+        self.cache = cache
+
+    def __call__(self, task):
+        path, size = task
+        cache_path = self.cache.cache_path(path, size)
+        if not os.path.isfile(cache_path):
+            self.cache._shrink(path, size, cache_path)
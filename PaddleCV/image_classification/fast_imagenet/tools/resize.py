@@ -12,49 +12,39 @@
 #See the License for the specific language governing permissions and
 #limitations under the License.
 
-from PIL import Image
-from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
-from functools import partial
-
-import multiprocessing
-
-cpus = multiprocessing.cpu_count()
-cpus = min(36,cpus)
+"""Shrink the images of data_dir/train and data_dir/validation to the
+short sides of the cache used by train.py, in parallel processes:
 
+    python tools/resize.py --data_dir /data/imagenet --sizes 160 352
 
-PATH = Path('/data/imagenet2')
-DEST = Path('/data/imagenet2/sz')
-def mkdir(path):
-    if not path.exists():
-        path.mkdir()
-
-mkdir(DEST)
-szs = (160, 352)
+Images missing in the cache are also shrinked by train.py when they are
+read first, so this pass is optional.
+"""
+import os
+import sys
+import argparse
+import multiprocessing
 
-def resize_img(p, im, fn, sz):
-    w,h = im.size
-    ratio = min(h/sz,w/sz)
-    im = im.resize((int(w/ratio), int(h/ratio)), resample=Image.BICUBIC)
-    new_fn = DEST/str(sz)/fn.relative_to(PATH)
-    mkdir(new_fn.parent())
-    im.save(new_fn)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from resize_cache import ResizeCache
 
-def resizes(p, fn):
-    im = Image.open(fn)
-    for sz in szs: resize_img(p, im, fn, sz)
 
-def resize_imgs(p):
-    files = p.glob('*/*.jpeg')
-    with ProcessPoolExecutor(cpus) as e: e.map(partial(resizes, p), files)
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--data_dir', type=str, default='/data/imagenet')
+    parser.add_argument('--cache_dir', type=str, default=None)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[160, 352])
+    parser.add_argument(
+        '--num_workers', type=int, default=min(36, multiprocessing.cpu_count()))
+    args = parser.parse_args()
 
+    cache = ResizeCache(args.data_dir, args.sizes, args.cache_dir)
+    for ds in ("validation", "train"):
+        print(os.path.join(args.data_dir, ds))
+        cache.build(os.path.join(args.data_dir, ds), args.num_workers)
 
-for sz in szs:
-    ssz=str(sz)
-    mkdir((DEST/ssz))
-    for ds in ('validation','train'): mkdir((DEST/ssz/ds))
-    for ds in ('train',): mkdir((DEST/ssz/ds))
 
-for ds in ("validation", "train"):
-    print(PATH/ds)
-    resize_imgs(PATH/ds)
+if __name__ == '__main__':
+    main()
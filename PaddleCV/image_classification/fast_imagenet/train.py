@@ -20,14 +20,15 @@ import traceback
 
 import numpy as np
 import math
+import sys
+sys.path.append("..")
 import reader
+from resize_cache import ResizeCache
 import paddle
 import paddle.fluid as fluid
 import paddle.fluid.profiler as profiler
 import paddle.fluid.transpiler.distribute_transpiler as distribute_transpiler
 
-import sys
-sys.path.append("..")
 from utility import add_arguments, print_arguments
 import functools
 from models.fast_imagenet import FastImageNet, lr_decay
@@ -47,6 +48,8 @@ def parse_args():
     add_arg('lr',               float, 1.0,                  "set learning rate.")
     add_arg('lr_strategy',      str,   "piecewise_decay",    "Set the learning rate decay strategy.")
     add_arg('data_dir',         str,   "./data/ILSVRC2012",  "The ImageNet dataset root dir.")
+    add_arg('cache_dir',        str,   None,                 "The root dir of the shrinked images cache, default data_dir.")
+    add_arg('cache_sizes',      str,   "160,352",            "The short sides of the shrinked images cache.")
     add_arg('model_category',   str,   "models",             "Whether to use models_name or not, valid value:'models','models_name'" )
     add_arg('fp16',             bool,  False,                "Enable half precision training with fp16." )
     add_arg('scale_loss',       float, 1.0,                  "Scale loss for fp16." )
@@ -62,6 +65,8 @@ def parse_args():
 
 
 DEVICE_NUM = fluid.core.get_cuda_device_count()
+# train images of size sz are cropped from cached images of CACHE_RATIO * sz
+CACHE_RATIO = 1.25
 
 
 def test_parallel(exe, test_args, args, test_reader, feeder, bs):
@@ -276,22 +281,30 @@ def refresh_program(args,
     return train_args, test_args, test_prog, train_exe, test_exe
 
 
-def prepare_reader(epoch_id, train_py_reader, train_bs, val_bs, trn_dir,
+def cached_dir(resize_cache, img_dim):
+    size = resize_cache.select(img_dim, CACHE_RATIO)
+    return "" if size is None else "%d/" % size
+
+
+def prepare_reader(epoch_id, train_py_reader, train_bs, val_bs, resize_cache,
                    img_dim, min_scale, rect_val, args):
     train_reader = reader.train(
-        traindir="%s/%strain" % (args.data_dir, trn_dir),
+        traindir="%s/train" % args.data_dir,
         sz=img_dim,
         min_scale=min_scale,
-        shuffle_seed=epoch_id + 1)
+        shuffle_seed=epoch_id + 1,
+        resize_cache=resize_cache,
+        cache_ratio=CACHE_RATIO)
     train_py_reader.decorate_paddle_reader(
         fluid.io.batch(
             train_reader, batch_size=train_bs))
 
     test_reader = reader.test(
-        valdir="%s/%svalidation" % (args.data_dir, trn_dir),
+        valdir="%s/validation" % args.data_dir,
         bs=val_bs * DEVICE_NUM,
         sz=img_dim,
-        rect_val=rect_val)
+        rect_val=rect_val,
+        resize_cache=resize_cache)
     test_batched_reader = fluid.io.batch(
         test_reader, batch_size=val_bs * DEVICE_NUM)
 
@@ -306,11 +319,14 @@ def train_parallel(args):
     test_exe = None
     train_args = None
     test_args = None
+    resize_cache = ResizeCache(
+        args.data_dir, [int(size) for size in args.cache_sizes.split(",")],
+        args.cache_dir)
     ## dynamic batch size, image size...
     bs = 224
     val_bs = 64
-    trn_dir = "160/"
     img_dim = 128
+    trn_dir = cached_dir(resize_cache, img_dim)
     min_scale = 0.08
     rect_val = False
     for epoch_id in range(args.num_epochs):
@@ -326,8 +342,8 @@ def train_parallel(args):
                 need_update_start_prog=True)
         elif epoch_id == 13:  #13
             bs = 96
-            trn_dir = "352/"
             img_dim = 224
+            trn_dir = cached_dir(resize_cache, img_dim)
             min_scale = 0.087
             train_args, test_args, test_prog, exe, test_exe = refresh_program(
                 args,
@@ -340,8 +356,8 @@ def train_parallel(args):
         elif epoch_id == 25:  #25
             bs = 50
             val_bs = 8
-            trn_dir = ""
             img_dim = 288
+            trn_dir = cached_dir(resize_cache, img_dim)
             min_scale = 0.5
             rect_val = True
             train_args, test_args, test_prog, exe, test_exe = refresh_program(
@@ -366,7 +382,7 @@ def train_parallel(args):
             train_py_reader,
             bs,
             val_bs,
-            trn_dir,
+            resize_cache,
             img_dim=img_dim,
             min_scale=min_scale,
             rect_val=rect_val,
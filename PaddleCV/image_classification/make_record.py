@@ -0,0 +1,91 @@
+#copyright (c) 2019 PaddlePaddle Authors. All Rights Reserve.
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+"""Pack the images of train_list.txt and val_list.txt in data_dir into
+record files train-* and val-* of output_dir, to train with
+--data_format=record --data_dir=output_dir:
+
+    python make_record.py --data_dir ./data/ILSVRC2012/ \
+        --output_dir ./data/ILSVRC2012_record/ --train_shards 256
+
+or pack the class folders of fast_imagenet, e.g. data_dir/160/train into
+record files output_dir/160/train-*:
+
+    python make_record.py --data_dir /data/imagenet \
+        --output_dir /data/imagenet_record \
+        --image_folders 160/train 160/validation 352/train 352/validation
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import time
+import argparse
+import functools
+
+from utils.utility import add_arguments, print_arguments
+from utils.record import write_records, image_folder_list
+
+parser = argparse.ArgumentParser(description=__doc__)
+add_arg = functools.partial(add_arguments, argparser=parser)
+# yapf: disable
+add_arg('data_dir',         str,  "./data/ILSVRC2012/",        "The ImageNet dataset root directory.")
+add_arg('output_dir',       str,  "./data/ILSVRC2012_record/", "The directory of record files.")
+add_arg('train_shards',     int,  256,                         "The number of record files of train_list.txt.")
+add_arg('val_shards',       int,  16,                          "The number of record files of val_list.txt.")
+add_arg('num_workers',      int,  8,                           "The number of processes writing record files.")
+parser.add_argument('--image_folders', nargs='+', type=str, default=None, help="Pack these folders of data_dir instead of the list files, train folders are split into train_shards files, the others into val_shards files")
+# yapf: enable
+
+
+def main():
+    args = parser.parse_args()
+    print_arguments(args)
+    # (source, lines or list file, image root, output dir, name, is_train)
+    jobs = []
+    if args.image_folders:
+        for folder in args.image_folders:
+            root = os.path.join(args.data_dir, folder)
+            jobs.append((root, image_folder_list(root), root,
+                         os.path.join(args.output_dir,
+                                      os.path.dirname(folder)),
+                         os.path.basename(folder),
+                         'train' in os.path.basename(folder)))
+    else:
+        for name in ['train', 'val']:
+            file_list = os.path.join(args.data_dir, name + '_list.txt')
+            if not os.path.isfile(file_list):
+                print("{} doesn't exist, skip it".format(file_list))
+                continue
+            jobs.append((file_list, file_list, args.data_dir,
+                         args.output_dir, name, name == 'train'))
+
+    for source, file_list, data_dir, output_dir, name, is_train in jobs:
+        if not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+        start = time.time()
+        paths = write_records(
+            file_list,
+            data_dir,
+            output_dir,
+            name,
+            args.train_shards if is_train else args.val_shards,
+            shuffle=is_train,
+            num_workers=args.num_workers)
+        print("packed {} into {} record files in {:.1f}s".format(
+            source, len(paths), time.time() - start))
+
+
+if __name__ == '__main__':
+    main()
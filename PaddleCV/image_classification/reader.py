@@ -16,13 +16,17 @@ import os
 import math
 import random
 import functools
+import traceback
+import multiprocessing
 import numpy as np
 import cv2
 
 import paddle
 from paddle import fluid
 from utils.autoaugment import ImageNetPolicy
-from PIL import Image
+from utils import batch_augment
+from utils.record import RecordKey, record_files, record_samples, \
+        read_record_image
 
 policy = None
 
@@ -94,17 +98,16 @@ def random_crop(img, size, settings, scale=None, ratio=None,
     return resized
 
 
-#NOTE:(2019/08/08) distort color func is not implemented
 def distort_color(img):
-    """distort image color
+    """distort image color by random brightness, contrast and color
 
     Args:
-        img: image data
+        img: image data in RGB order
 
     Returns:
         distorted color image data
     """
-    return img
+    return batch_augment.color_jitter(img[np.newaxis])[0]
 
 
 def resize_short(img, target_size, interpolation=None):
@@ -195,23 +198,34 @@ def create_mixup_reader(settings, rd):
 
     return mixup_reader
 
-def process_image(sample, settings, mode, color_jitter, rotate):
-    """ process_image """
 
-    mean = settings.image_mean
-    std = settings.image_std
+def read_image(img_path):
+    """ read image of a file path, or a RecordKey of record files """
+    if isinstance(img_path, RecordKey):
+        return read_record_image(img_path)
+    return cv2.imread(img_path)
+
+
+def image_exists(img_path):
+    return isinstance(img_path, RecordKey) or os.path.isfile(img_path)
+
+
+def decode_image(sample, settings, mode, color_jitter, rotate):
+    """ decode, crop and flip image, without the color jitter and auto
+    augment of augment_images, and without normalization
+
+    Returns:
+        uint8 image data in HWC layout and RGB order
+    """
     crop_size = settings.crop_size
 
-    img_path = sample[0]
-    img = cv2.imread(img_path)
+    img = read_image(sample[0])
 
     if mode == 'train':
         if rotate:
             img = rotate_image(img)
         if crop_size > 0:
             img = random_crop(img, crop_size, settings, interpolation=settings.interpolation)
-        if color_jitter:
-            img = distort_color(img)
         if np.random.randint(0, 2) == 1:
             img = img[:, ::-1, :]
     else:
@@ -221,12 +235,50 @@ def process_image(sample, settings, mode, color_jitter, rotate):
             img = crop_image(img, target_size=crop_size, center=True)
 
     img = img[:, :, ::-1]
+    return img
+
+
+def augment_images(images, settings, mode, color_jitter):
+    """ color jitter and auto augment the decoded images of a batch
 
-    if 'use_aa' in settings and settings.use_aa and mode == 'train':
-        img = np.ascontiguousarray(img)
-        img = Image.fromarray(img)
-        img = policy(img)
-        img = np.asarray(img)
+    Args:
+        images: list of uint8 images in HWC layout and RGB order
+
+    Returns:
+        augmented images, an array if the images are of the same shape
+    """
+    use_aa = 'use_aa' in settings and settings.use_aa
+    if mode != 'train' or not (color_jitter or use_aa):
+        return images
+    if any(img.shape != images[0].shape for img in images):
+        # not cropped, augment them one by one
+        return [
+            augment_images(img[np.newaxis], settings, mode, color_jitter)[0]
+            for img in images
+        ]
+
+    images = np.stack(images)
+    if color_jitter:
+        images = batch_augment.color_jitter(images)
+    if use_aa:
+        images = policy(images)
+    return images
+
+
+def process_image(sample, settings, mode, color_jitter, rotate, img=None):
+    """ process_image
+
+    Args:
+        img: the augmented image of sample, which is decoded and
+            augmented if it is None
+    """
+
+    mean = settings.image_mean
+    std = settings.image_std
+
+    if img is None:
+        img = decode_image(sample, settings, mode, color_jitter, rotate)
+        img = augment_images([img], settings, mode, color_jitter)[0]
 
     img = img.astype('float32').transpose((2, 0, 1)) / 255
     img_mean = np.array(mean).reshape((3, 1, 1))
@@ -240,15 +292,167 @@ def process_image(sample, settings, mode, color_jitter, rotate):
         return (img, )
 
 def process_batch_data(input_data, settings, mode, color_jitter, rotate):
-    batch_data = []
+    samples = []
+    images = []
     for sample in input_data:
-        if os.path.isfile(sample[0]):
-            batch_data.append(
-                process_image(sample, settings, mode, color_jitter, rotate))
+        if image_exists(sample[0]):
+            samples.append(sample)
+            images.append(
+                decode_image(sample, settings, mode, color_jitter, rotate))
         else:
             print("File not exist : %s" % sample[0])
+    if len(images) > 0:
+        images = augment_images(images, settings, mode, color_jitter)
+    batch_data = []
+    for sample, img in zip(samples, images):
+        batch_data.append(
+            process_image(sample, settings, mode, color_jitter, rotate, img))
     return batch_data
 
+
+class SharedBatchRing(object):
+    """ a ring of uint8 NCHW image batches and int64 labels in shared
+    memory, which are filled by forked worker processes, so decoded
+    images are passed to the consumer without pickling
+
+    Args:
+        num_slots: number of batches in the ring
+        batch_size: max number of images of a batch
+        image_shape: [channels, height, width] of an image
+    """
+
+    def __init__(self, num_slots, batch_size, image_shape):
+        self.num_slots = num_slots
+        self.batch_size = batch_size
+        self.image_shape = tuple(image_shape)
+        image_size = int(np.prod(self.image_shape))
+        self._images = multiprocessing.RawArray(
+            'B', num_slots * batch_size * image_size)
+        self._labels = multiprocessing.RawArray(
+            'q', num_slots * batch_size)
+
+    def images(self, slot):
+        images = np.frombuffer(self._images, dtype='uint8').reshape(
+            (self.num_slots, self.batch_size) + self.image_shape)
+        return images[slot]
+
+    def labels(self, slot):
+        labels = np.frombuffer(self._labels, dtype='int64').reshape(
+            (self.num_slots, self.batch_size, 1))
+        return labels[slot]
+
+
+def _decode_batch_worker(ring, task_queue, done_queue, seed, settings, mode,
+                         color_jitter, rotate):
+    # forked workers inherit the random state, so reseed them
+    np.random.seed(seed)
+    random.seed(seed)
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+        slot, input_data = task
+        try:
+            images = ring.images(slot)
+            labels = ring.labels(slot)
+            samples = []
+            decoded = []
+            for sample in input_data:
+                if not image_exists(sample[0]):
+                    print("File not exist : %s" % sample[0])
+                    continue
+                samples.append(sample)
+                decoded.append(
+                    decode_image(sample, settings, mode, color_jitter,
+                                 rotate))
+            if len(decoded) > 0:
+                decoded = augment_images(decoded, settings, mode,
+                                         color_jitter)
+            num = 0
+            for sample, img in zip(samples, decoded):
+                images[num] = img.transpose((2, 0, 1))
+                if mode != 'test':
+                    labels[num] = sample[1]
+                num += 1
+            done_queue.put((slot, num, None))
+        except Exception:
+            done_queue.put((slot, 0, traceback.format_exc()))
+
+
+def process_batch_reader(batch_reader, settings, mode, color_jitter, rotate,
+                         batch_size, num_workers, num_slots=None):
+    """ decode the batches of file list in worker processes into a
+    SharedBatchRing, the batches are yielded in the order they are done
+
+    Args:
+        batch_reader: reader of batches of [image path, label]
+        batch_size: max number of images of a batch
+        num_workers: number of worker processes
+        num_slots: number of batches in the ring, default 2 * num_workers
+
+    Returns:
+        reader of [uint8 images in NCHW layout, int64 labels] batches,
+        or [images] in test mode. The arrays are views of the ring, so
+        they are only valid until the next batch is requested.
+    """
+    num_slots = num_slots or 2 * num_workers
+    image_shape = [int(m) for m in settings.image_shape.split(",")]
+    assert settings.crop_size > 0 and \
+        image_shape[1:] == [settings.crop_size] * 2, \
+        "process reader needs images cropped to image_shape"
+    ring = SharedBatchRing(num_slots, batch_size, image_shape)
+
+    def reader():
+        task_queue = multiprocessing.Queue()
+        done_queue = multiprocessing.Queue()
+        seeds = [int(seed) for seed in np.random.randint(0, 2**31 - 1, num_workers)]
+        workers = [
+            multiprocessing.Process(
+                target=_decode_batch_worker,
+                args=(ring, task_queue, done_queue, seeds[i], settings, mode,
+                      color_jitter, rotate)) for i in range(num_workers)
+        ]
+        for w in workers:
+            w.daemon = True
+            w.start()
+
+        free_slots = list(range(num_slots))
+        source = batch_reader()
+        pending = 0
+        exhausted = False
+        try:
+            while True:
+                while free_slots and not exhausted:
+                    try:
+                        input_data = next(source)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    task_queue.put((free_slots.pop(), input_data))
+                    pending += 1
+                if pending == 0:
+                    break
+                slot, num, error = done_queue.get()
+                pending -= 1
+                if error is not None:
+                    raise RuntimeError(
+                        "decode batch failed in worker:\n" + error)
+                if num > 0:
+                    if mode == 'test':
+                        yield [ring.images(slot)[:num]]
+                    else:
+                        yield [ring.images(slot)[:num], ring.labels(slot)[:num]]
+                free_slots.append(slot)
+        finally:
+            for w in workers:
+                if w.is_alive():
+                    w.terminate()
+            for w in workers:
+                w.join()
+
+    return reader
+
+
 class ImageNetReader:
     def __init__(self, seed=None):
         self.shuffle_seed = seed
@@ -271,24 +475,32 @@ class ImageNetReader:
             batch_size = settings.batch_size / paddle.fluid.core.get_cuda_device_count()
         def reader():
             def read_file_list():
-                with open(file_list) as flist:
-                    full_lines = [line.strip() for line in flist]
-                    if mode != "test" and len(full_lines) < settings.batch_size:
-                        print(
-                            "Warning: The number of the whole data ({}) is smaller than the batch_size ({}), and drop_last is turnning on, so nothing  will feed in program, Terminated now. Please reset batch_size to a smaller number or feed more data!"
-                            .format(len(full_lines), settings.batch_size))
-                        os._exit(1)
-                    if num_trainers > 1 and mode == "train":
-                        assert self.shuffle_seed is not None, "multiprocess train, shuffle seed must be set!"
-                        np.random.RandomState(self.shuffle_seed).shuffle(full_lines)
-                    elif shuffle:
-                        np.random.shuffle(full_lines)
+                if isinstance(file_list, list):
+                    # record files, the images of all the files are
+                    # shuffled together
+                    full_lines = record_samples(file_list)
+                else:
+                    with open(file_list) as flist:
+                        full_lines = [line.strip() for line in flist]
+                if mode != "test" and len(full_lines) < settings.batch_size:
+                    print(
+                        "Warning: The number of the whole data ({}) is smaller than the batch_size ({}), and drop_last is turnning on, so nothing  will feed in program, Terminated now. Please reset batch_size to a smaller number or feed more data!"
+                        .format(len(full_lines), settings.batch_size))
+                    os._exit(1)
+                if num_trainers > 1 and mode == "train":
+                    assert self.shuffle_seed is not None, "multiprocess train, shuffle seed must be set!"
+                    np.random.RandomState(self.shuffle_seed).shuffle(full_lines)
+                elif shuffle:
+                    np.random.shuffle(full_lines)
 
                 batch_data = []
                 for line in full_lines:
-                    img_path, label = line.split()
-                    img_path = os.path.join(data_dir, img_path)
-                    batch_data.append([img_path, int(label)])
+                    if isinstance(line, list):
+                        batch_data.append(line)
+                    else:
+                        img_path, label = line.split()
+                        img_path = os.path.join(data_dir, img_path)
+                        batch_data.append([img_path, int(label)])
                     if len(batch_data) == batch_size:
                         if mode == 'train' or mode == 'val' or mode == 'test':
                             yield batch_data
@@ -305,6 +517,16 @@ class ImageNetReader:
                 "must be the same in the respective processes."
             data_reader = paddle.fluid.contrib.reader.distributed_batch_reader(data_reader)
 
+        if 'reader_mode' in settings and settings.reader_mode == 'process':
+            return process_batch_reader(
+                data_reader,
+                settings,
+                mode,
+                color_jitter,
+                rotate,
+                batch_size=int(batch_size),
+                num_workers=settings.reader_thread)
+
         mapper = functools.partial(
             process_batch_data,
             settings=settings,
@@ -320,6 +542,22 @@ class ImageNetReader:
             order=False)
 
 
+    def _file_list(self, settings, name):
+        """ the list file '{name}_list.txt' of data_dir, or the paths of
+        record files '{name}-*' with data_format record
+        """
+        if 'data_format' in settings and settings.data_format == 'record':
+            paths = record_files(settings.data_dir, name)
+            assert len(paths) > 0, "record files {}-* don't exist in {}, please check data_dir".format(
+                name, settings.data_dir)
+            return paths
+
+        file_list = os.path.join(settings.data_dir, name + '_list.txt')
+        assert os.path.isfile(
+            file_list), "{} doesn't exist, please check data list path".format(
+                file_list)
+        return file_list
+
     def train(self, settings):
         """Create a reader for trainning
 
@@ -329,14 +567,11 @@ class ImageNetReader:
         Returns:
             train reader
         """
-        file_list = os.path.join(settings.data_dir, 'train_list.txt')
-        assert os.path.isfile(
-            file_list), "{} doesn't exist, please check data list path".format(
-                file_list)
+        file_list = self._file_list(settings, 'train')
 
         if 'use_aa' in settings and settings.use_aa:
             global policy
-            policy = ImageNetPolicy()
+            policy = batch_augment.BatchPolicy(ImageNetPolicy())
 
         reader = self._reader_creator(
             settings,
@@ -366,10 +601,7 @@ class ImageNetReader:
             eval reader
         """
 
-        file_list = os.path.join(settings.data_dir, 'val_list.txt')
-        assert os.path.isfile(
-            file_list), "{} doesn't exist, please check data list path".format(
-                file_list)
+        file_list = self._file_list(settings, 'val')
 
         return self._reader_creator(
             settings, file_list, 'val', shuffle=False, data_dir=settings.data_dir)
@@ -384,9 +616,6 @@ class ImageNetReader:
         Returns:
             test reader
         """
-        file_list = os.path.join(settings.data_dir, 'val_list.txt')
-        assert os.path.isfile(
-            file_list), "{} doesn't exist, please check data list path".format(
-                file_list)
+        file_list = self._file_list(settings, 'val')
         return self._reader_creator(
             settings, file_list, 'test', shuffle=False, data_dir=settings.data_dir)
@@ -173,8 +173,13 @@ def train(args):
     train_reader = imagenet_reader.train(settings=args)
     test_reader = imagenet_reader.val(settings=args)
 
-    train_py_reader.decorate_sample_list_generator(train_reader, place)
-    test_py_reader.decorate_sample_list_generator(test_reader, place)
+    if args.reader_mode == "process":
+        # process reader yields batches of uint8 images and labels
+        train_py_reader.decorate_batch_generator(train_reader, place)
+        test_py_reader.decorate_batch_generator(test_reader, place)
+    else:
+        train_py_reader.decorate_sample_list_generator(train_reader, place)
+        test_py_reader.decorate_sample_list_generator(test_reader, place)
 
     compiled_train_prog = best_strategy_compiled(args, train_prog,
                                                  train_fetch_vars[0], exe)
@@ -186,7 +186,7 @@ class SubPolicy(object):
             "translateY": np.linspace(0, 150 / 331, 10),
             "rotate": np.linspace(0, 30, 10),
             "color": np.linspace(0.0, 0.9, 10),
-            "posterize": np.round(np.linspace(8, 4, 10), 0).astype(np.int),
+            "posterize": np.round(np.linspace(8, 4, 10), 0).astype(int),
             "solarize": np.linspace(256, 0, 10),
             "contrast": np.linspace(0.0, 0.9, 10),
             "sharpness": np.linspace(0.0, 0.9, 10),
@@ -236,6 +236,9 @@ class SubPolicy(object):
         self.p2 = p2
         self.operation2 = func[operation2]
         self.magnitude2 = ranges[operation2][magnitude_idx2]
+        # (probability, op name, magnitude) of the ops, for BatchPolicy
+        self.ops = [(p1, operation1, self.magnitude1),
+                    (p2, operation2, self.magnitude2)]
 
     def __call__(self, img):
         if random.random() < self.p1: img = self.operation1(img, self.magnitude1)
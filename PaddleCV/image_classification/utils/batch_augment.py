@@ -0,0 +1,333 @@
+#copyright (c) 2019 PaddlePaddle Authors. All Rights Reserve.
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+"""Augmentations of uint8 image batches in NHWC layout and RGB order.
+
+The ops follow the PIL ops of autoaugment.py without converting images to
+PIL images. The parameters of the ops, e.g. the lookup tables of
+brightness, contrast, autocontrast and equalize, are computed for the
+whole batch by numpy, with a factor per image, and the pixels are mapped
+by the cv2 kernels of every image.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+import random
+import collections
+import numpy as np
+import cv2
+
+__all__ = [
+    'posterize', 'solarize', 'invert', 'brightness', 'color', 'contrast',
+    'sharpness', 'autocontrast', 'equalize', 'affine', 'rotate',
+    'color_jitter', 'BatchPolicy'
+]
+
+
+def _factors(factors, num):
+    return np.broadcast_to(np.asarray(factors, dtype='float32'), (num, ))
+
+
+def _apply_luts(images, luts):
+    # luts: [N, 256] or [N, C, 256], a lookup table of every image, or of
+    # every channel of every image
+    out = np.empty_like(images)
+    luts = luts.astype('uint8')
+    for i, img in enumerate(images):
+        lut = luts[i]
+        if lut.ndim == 2:
+            lut = np.ascontiguousarray(lut.T).reshape((1, 256, -1))
+        out[i] = cv2.LUT(img, lut).reshape(img.shape)
+    return out
+
+
+def _blend_luts(degenerate, factors):
+    # Image.blend of PIL with a constant degenerate image, truncated to
+    # uint8, as [N, 256] lookup tables
+    degenerate = np.asarray(degenerate, dtype='float32').reshape((-1, 1))
+    ix = np.arange(256, dtype='float32')
+    out = degenerate + factors.reshape((-1, 1)) * (ix - degenerate)
+    return np.clip(out, 0, 255).astype('uint8')
+
+
+def _blend(degenerate, images, factors):
+    # Image.blend of PIL, rounded to uint8 where PIL truncates, so the
+    # pixels differ from PIL by at most 1
+    out = np.empty_like(images)
+    for i, f in enumerate(factors):
+        out[i] = cv2.addWeighted(images[i], float(f), degenerate[i],
+                                 1 - float(f), 0)
+    return out
+
+
+def _histograms(images):
+    # [N, C, 256] histograms of every channel of every image
+    hist = np.empty((len(images), images.shape[3], 256), dtype='int64')
+    for i, img in enumerate(images):
+        for c in range(images.shape[3]):
+            hist[i, c] = cv2.calcHist([img], [c], None, [256],
+                                      [0, 256]).ravel()
+    return hist
+
+
+# convert('L') of PIL, L = R * 299/1000 + G * 587/1000 + B * 114/1000 in
+# 16 bits fixed point, rounded. The sums are below 2**24, exact in float32
+_GRAY = np.array([[19595, 38470, 7471, 0x8000]], dtype='float32')
+
+
+def _grayscale(images):
+    return np.stack([(cv2.transform(img.astype('float32'), _GRAY) *
+                      np.float32(1. / 65536)).astype('uint8')
+                     for img in images])
+
+
+def posterize(images, bits):
+    mask = np.uint8(~(2**(8 - int(bits)) - 1) & 0xff)
+    return images & mask
+
+
+def solarize(images, threshold):
+    ix = np.arange(256)
+    lut = np.where(ix < threshold, ix, 255 - ix)
+    return _apply_luts(images, np.broadcast_to(lut, (len(images), 256)))
+
+
+def invert(images):
+    return 255 - images
+
+
+def brightness(images, factors):
+    factors = _factors(factors, len(images))
+    return _apply_luts(images, _blend_luts(np.zeros(len(images)), factors))
+
+
+def color(images, factors):
+    # blend with the grayscale of PIL, at most 1 off PIL by the rounding
+    # of _blend
+    factors = _factors(factors, len(images))
+    degenerate = [
+        cv2.cvtColor(gray, cv2.COLOR_GRAY2RGB)
+        for gray in _grayscale(images)
+    ]
+    return _blend(degenerate, images, factors)
+
+
+def contrast(images, factors):
+    factors = _factors(factors, len(images))
+    mean = [int(gray.mean() + 0.5) for gray in _grayscale(images)]
+    return _apply_luts(images, _blend_luts(mean, factors))
+
+
+_SMOOTH = np.array([[1, 1, 1], [1, 5, 1], [1, 1, 1]], dtype='float32') / 13
+
+
+def sharpness(images, factors):
+    # blend with the image smoothed by the 3x3 kernel
+    # [[1, 1, 1], [1, 5, 1], [1, 1, 1]] / 13, the borders are not smoothed
+    factors = _factors(factors, len(images))
+    degenerate = []
+    for img in images:
+        smooth = img.copy()
+        smooth[1:-1, 1:-1] = cv2.filter2D(img, -1, _SMOOTH)[1:-1, 1:-1]
+        degenerate.append(smooth)
+    return _blend(degenerate, images, factors)
+
+
+def autocontrast(images):
+    # map the [lowest, highest] value of every channel to [0, 255]
+    hist = _histograms(images) > 0
+    lo = hist.argmax(axis=2)[..., np.newaxis]
+    hi = 255 - hist[..., ::-1].argmax(axis=2)[..., np.newaxis]
+    valid = hi > lo
+    scale = 255.0 / np.where(valid, hi - lo, 1)
+    ix = np.arange(256)
+    luts = np.clip(np.trunc(ix * scale - lo * scale), 0, 255)
+    luts = np.where(valid, luts, ix)
+    return _apply_luts(images, luts)
+
+
+def equalize(images):
+    # equalize the histogram of every channel, as ImageOps.equalize
+    hist = _histograms(images)
+    nonzero = hist > 0
+    last = 255 - nonzero[..., ::-1].argmax(axis=2)
+    last_count = np.take_along_axis(hist, last[..., np.newaxis], 2)[..., 0]
+    step = (hist.sum(axis=2) - last_count) // 255
+    valid = (step > 0)[..., np.newaxis]
+    step = np.maximum(step, 1)[..., np.newaxis]
+    cumsum = np.cumsum(hist, axis=2) - hist
+    luts = np.minimum((step // 2 + cumsum) // step, 255)
+    luts = np.where(valid, luts, np.arange(256))
+    return _apply_luts(images, luts)
+
+
+def affine(images, matrices, interpolation=cv2.INTER_NEAREST,
+           fillcolor=(128, 128, 128)):
+    """transform every image by the affine matrix (a, b, c, d, e, f) of
+    Image.transform of PIL, which maps output pixel (x, y) to input pixel
+    (a x + b y + c, d x + e y + f)
+    """
+    out = np.empty_like(images)
+    h, w = images.shape[1:3]
+    for i, (a, b, c, d, e, f) in enumerate(matrices):
+        # PIL maps the centers of pixels, (x + 0.5, y + 0.5)
+        m = np.array(
+            [[a, b, c + 0.5 * (a + b - 1)], [d, e, f + 0.5 * (d + e - 1)]],
+            dtype='float64')
+        out[i] = cv2.warpAffine(
+            images[i],
+            m, (w, h),
+            flags=interpolation | cv2.WARP_INVERSE_MAP,
+            borderMode=cv2.BORDER_CONSTANT,
+            borderValue=tuple(int(v) for v in fillcolor))
+    return out
+
+
+def rotate(images, angles, fillcolor=(128, 128, 128)):
+    """rotate every image counter clockwise by angles in degrees"""
+    out = np.empty_like(images)
+    h, w = images.shape[1:3]
+    center = ((w - 1) / 2., (h - 1) / 2.)
+    angles = np.broadcast_to(angles, (len(images), ))
+    for i, angle in enumerate(angles):
+        m = cv2.getRotationMatrix2D(center, float(angle), 1.0)
+        out[i] = cv2.warpAffine(
+            images[i],
+            m, (w, h),
+            flags=cv2.INTER_NEAREST,
+            borderMode=cv2.BORDER_CONSTANT,
+            borderValue=tuple(int(v) for v in fillcolor))
+    return out
+
+
+def color_jitter(images, lower=0.5, upper=1.5):
+    """random brightness, contrast and color of every image, in a random
+    order of every image
+    """
+    ops = [brightness, contrast, color]
+    num = len(images)
+    orders = np.argsort(np.random.rand(num, len(ops)), axis=1)
+    factors = np.random.uniform(lower, upper, (num, len(ops)))
+    for step in range(len(ops)):
+        for k, op in enumerate(ops):
+            ids = np.nonzero(orders[:, step] == k)[0]
+            if len(ids) > 0:
+                images[ids] = op(images[ids], factors[ids, k])
+    return images
+
+
+def _signs(num):
+    return np.random.choice([-1, 1], num)
+
+
+def _shear_x(images, magnitude, fillcolor):
+    matrices = [(1, s, 0, 0, 1, 0) for s in magnitude * _signs(len(images))]
+    return affine(images, matrices, cv2.INTER_CUBIC, fillcolor)
+
+
+def _shear_y(images, magnitude, fillcolor):
+    matrices = [(1, 0, 0, s, 1, 0) for s in magnitude * _signs(len(images))]
+    return affine(images, matrices, cv2.INTER_CUBIC, fillcolor)
+
+
+def _translate_x(images, magnitude, fillcolor):
+    width = images.shape[2]
+    matrices = [(1, 0, t, 0, 1, 0)
+                for t in magnitude * width * _signs(len(images))]
+    return affine(images, matrices, cv2.INTER_NEAREST, fillcolor)
+
+
+def _translate_y(images, magnitude, fillcolor):
+    height = images.shape[1]
+    matrices = [(1, 0, 0, 0, 1, t)
+                for t in magnitude * height * _signs(len(images))]
+    return affine(images, matrices, cv2.INTER_NEAREST, fillcolor)
+
+
+def _enhance(op):
+    def func(images, magnitude, fillcolor):
+        return op(images, 1 + magnitude * _signs(len(images)))
+
+    return func
+
+
+_OPS = {
+    "shearX": _shear_x,
+    "shearY": _shear_y,
+    "translateX": _translate_x,
+    "translateY": _translate_y,
+    # as rotate_with_fill of autoaugment.py, filled by gray
+    "rotate": lambda images, magnitude, fillcolor: rotate(images, magnitude),
+    "color": _enhance(color),
+    "posterize": lambda images, magnitude, fillcolor: posterize(images, magnitude),
+    "solarize": lambda images, magnitude, fillcolor: solarize(images, magnitude),
+    "contrast": _enhance(contrast),
+    "sharpness": _enhance(sharpness),
+    "brightness": _enhance(brightness),
+    "autocontrast": lambda images, magnitude, fillcolor: autocontrast(images),
+    "equalize": lambda images, magnitude, fillcolor: equalize(images),
+    "invert": lambda images, magnitude, fillcolor: invert(images)
+}
+
+
+class BatchPolicy(object):
+    """ Apply the sub-policies of an AutoAugment policy, such as
+    ImageNetPolicy, to a batch of images. A random sub-policy is chosen
+    for every image as the policy does, and the images of the same op are
+    transformed together.
+
+        Example:
+        >>> batch_policy = BatchPolicy(ImageNetPolicy())
+        >>> images = batch_policy(images)  # uint8 NHWC RGB
+
+    Args:
+        policy: an ImageNetPolicy, CIFAR10Policy or SVHNPolicy
+        fillcolor: the color of the pixels out of the sheared or
+            translated images
+
+    Attributes:
+        op_time: dict of the seconds spent in every op
+        op_count: dict of the number of images transformed by every op
+    """
+
+    def __init__(self, policy, fillcolor=(128, 128, 128)):
+        self.policies = policy.policies
+        self.fillcolor = fillcolor
+        self.op_time = collections.defaultdict(float)
+        self.op_count = collections.defaultdict(int)
+
+    def __call__(self, images):
+        subs = [
+            self.policies[random.randint(0, len(self.policies) - 1)]
+            for _ in range(len(images))
+        ]
+        for stage in range(2):
+            groups = collections.OrderedDict()
+            for i, sub in enumerate(subs):
+                p, name, magnitude = sub.ops[stage]
+                if random.random() < p:
+                    groups.setdefault((name, magnitude), []).append(i)
+            for (name, magnitude), ids in groups.items():
+                start = time.time()
+                ids = np.array(ids)
+                images[ids] = _OPS[name](images[ids], magnitude,
+                                         self.fillcolor)
+                self.op_time[name] += time.time() - start
+                self.op_count[name] += len(ids)
+        return images
+
+    def __repr__(self):
+        return "Batch AutoAugment Policy"
@@ -0,0 +1,231 @@
+#copyright (c) 2019 PaddlePaddle Authors. All Rights Reserve.
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+"""Packed record files of encoded images.
+
+A dataset, such as "train", is split into shards, every shard has two
+files:
+
+    train-00000.rec: the encoded images (e.g. JPEG) concatenated
+    train-00000.idx: int64 array of [offset, length, label] of every
+                     image in .rec, saved by numpy.save
+
+so the images of a shard are read from one memory-mapped file instead
+of opening every small image file.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import glob
+import mmap
+import collections
+import multiprocessing
+import numpy as np
+import cv2
+
+__all__ = [
+    'RecordKey', 'RecordWriter', 'RecordFile', 'record_files',
+    'record_samples', 'read_record_image', 'image_folder_list',
+    'write_records'
+]
+
+IMG_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+
+# an image in record file 'path' (without suffix) at 'index'
+RecordKey = collections.namedtuple('RecordKey', ['path', 'index'])
+
+
+class RecordWriter(object):
+    """ write encoded images into a record file
+
+    Args:
+        path: path of the record file without suffix
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path + '.rec', 'wb')
+        self._index = []
+        self._offset = 0
+
+    def write(self, data, label):
+        self._file.write(data)
+        self._index.append([self._offset, len(data), label])
+        self._offset += len(data)
+
+    def close(self):
+        self._file.close()
+        index = np.array(self._index, dtype='int64').reshape((-1, 3))
+        with open(self.path + '.idx', 'wb') as f:
+            np.save(f, index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class RecordFile(object):
+    """ random access to the images of a record file, the .rec file is
+    memory-mapped when the first image is read
+
+    Args:
+        path: path of the record file without suffix
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path + '.idx', 'rb') as f:
+            self.index = np.load(f)
+        self._file = None
+        self._data = None
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def labels(self):
+        return self.index[:, 2]
+
+    def read(self, i):
+        """ encoded bytes of the i-th image """
+        if self._data is None:
+            self._file = open(self.path + '.rec', 'rb')
+            self._data = mmap.mmap(
+                self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        offset, length = self.index[i, :2]
+        return self._data[offset:offset + length]
+
+    def read_image(self, i):
+        """ the i-th image decoded in BGR order, as cv2.imread """
+        data = np.frombuffer(self.read(i), dtype='uint8')
+        return cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+    def close(self):
+        if self._data is not None:
+            self._data.close()
+            self._file.close()
+            self._data = None
+            self._file = None
+
+
+def record_files(data_dir, name):
+    """ paths (without suffix) of the record files of dataset 'name' """
+    paths = glob.glob(os.path.join(data_dir, name + '-*.idx'))
+    return sorted(path[:-len('.idx')] for path in paths)
+
+
+def record_samples(paths):
+    """ [RecordKey, label] of all images in record files 'paths' """
+    samples = []
+    for path in paths:
+        labels = RecordFile(path).labels.tolist()
+        samples.extend([RecordKey(path, i), label]
+                       for i, label in enumerate(labels))
+    return samples
+
+
+# record files opened by this process, forked processes share the
+# opened memory maps read only
+_record_files = {}
+
+
+def read_record_image(key):
+    """ decode the image of RecordKey 'key' """
+    record = _record_files.get(key.path)
+    if record is None:
+        record = RecordFile(key.path)
+        _record_files[key.path] = record
+    return record.read_image(key.index)
+
+
+def image_folder_list(root, extensions=IMG_EXTENSIONS):
+    """ lines "image_path label" of the images in class folders of root,
+    labeled by the sorted class folder names, as ImageFolder of
+    fast_imagenet
+    """
+    classes = sorted(d for d in os.listdir(root)
+                     if os.path.isdir(os.path.join(root, d)))
+    full_lines = []
+    for label, cls in enumerate(classes):
+        for dirpath, _, fnames in sorted(os.walk(os.path.join(root, cls))):
+            for fname in sorted(fnames):
+                if fname.lower().endswith(extensions):
+                    img_path = os.path.relpath(
+                        os.path.join(dirpath, fname), root)
+                    full_lines.append('{} {}'.format(img_path, label))
+    return full_lines
+
+
+def _write_shard(args):
+    path, lines, data_dir = args
+    with RecordWriter(path) as writer:
+        for line in lines:
+            img_path, label = line.split()
+            img_path = os.path.join(data_dir, img_path)
+            if not os.path.isfile(img_path):
+                print("File not exist : %s" % img_path)
+                continue
+            with open(img_path, 'rb') as f:
+                writer.write(f.read(), int(label))
+    return path
+
+
+def write_records(file_list,
+                  data_dir,
+                  output_dir,
+                  name,
+                  num_shards,
+                  shuffle=True,
+                  seed=0,
+                  num_workers=1):
+    """ pack the images of file_list into num_shards record files, the
+    encoded images are copied as they are
+
+    Args:
+        file_list: list file of lines "image_path label", or the list of
+            lines, image_path is relative to data_dir
+        output_dir: directory of the record files
+        name: record files are named "{name}-{shard:05d}"
+        num_shards: number of record files
+        shuffle: shuffle images before packing, so a shard has images
+            of different labels
+        num_workers: number of processes writing shards
+
+    Returns:
+        paths of the record files
+    """
+    if isinstance(file_list, list):
+        full_lines = list(file_list)
+    else:
+        with open(file_list) as flist:
+            full_lines = [line.strip() for line in flist if line.strip()]
+    if shuffle:
+        np.random.RandomState(seed).shuffle(full_lines)
+
+    shard_size = int(np.ceil(len(full_lines) / float(num_shards)))
+    tasks = [(os.path.join(output_dir, '{}-{:05d}'.format(name, shard)),
+              full_lines[shard * shard_size:(shard + 1) * shard_size],
+              data_dir) for shard in range(num_shards)]
+    if num_workers > 1:
+        pool = multiprocessing.Pool(num_workers)
+        try:
+            return pool.map(_write_shard, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    return [_write_shard(task) for task in tasks]
@@ -89,6 +89,7 @@ def parse_args():
     add_arg('use_gpu',                  bool,   True,                   "Whether to use GPU.")
     add_arg('model_save_dir',           str,    "./output",        "The directory path to save model.")
     add_arg('data_dir',                 str,    "./data/ILSVRC2012/",   "The ImageNet dataset root directory.")
+    add_arg('data_format',              str,    "file_list",            "The format of data in data_dir, file_list: image files listed in train_list.txt and val_list.txt, record: record files train-* and val-* packed by make_record.py")
     add_arg('pretrained_model',         str,    None,                   "Whether to load pretrained model.")
     add_arg('checkpoint',               str,    None,                   "Whether to resume checkpoint.")
     add_arg('print_step',               int,    10,                     "The steps interval to print logs")
@@ -122,6 +123,7 @@ def parse_args():
     add_arg('mixup_alpha',              float,  0.2,                    "The value of mixup_alpha")
     add_arg('reader_thread',            int,    8,                      "The number of multi thread reader")
     add_arg('reader_buf_size',          int,    2048,                   "The buf size of multi thread reader")
+    add_arg('reader_mode',              str,    "thread",               "The mode of reader, thread: decode images in reader_thread threads, process: decode images in reader_thread processes into shared memory uint8 batches, which are normalized in program")
     add_arg('interpolation',            int,    None,                   "The interpolation mode")
     add_arg('use_aa',                   bool,   False,                  "Whether to use auto augment")
     parser.add_argument('--image_mean', nargs='+', type=float, default=[0.485, 0.456, 0.406], help="The mean of input image data")
@@ -194,6 +196,12 @@ def check_args(args):
     if args.model == "GoogLeNet":
         assert args.use_mixup == False, "Cannot use mixup processing in GoogLeNet, please set use_mixup = False."
 
+    assert args.data_format in ["file_list", "record"], "Wrong data_format, please set:\nfile_list\nrecord"
+    assert args.reader_mode in ["thread", "process"], "Wrong reader_mode, please set:\nthread\nprocess"
+    # check confict of process reader and mixup
+    if args.reader_mode == "process":
+        assert args.use_mixup == False, "Cannot use mixup processing with process reader, please set use_mixup = False."
+
     if args.interpolation:
         assert args.interpolation in [
             0, 1, 2, 3, 4
@@ -269,6 +277,25 @@ def save_model(args, exe, train_prog, info):
     print("Already save model in %s" % (model_path))
 
 
+def normalize_image(image, mean, std):
+    """normalize uint8 images in NCHW layout in program
+
+    Args:
+        image: uint8 image variable
+        mean: the mean of RGB channels of images scaled to [0, 1]
+        std: the std of RGB channels of images scaled to [0, 1]
+
+    Returns:
+        float32 image variable, same as the images normalized by reader
+    """
+    image = fluid.layers.cast(image, "float32")
+    mean = fluid.layers.assign(np.array(mean, dtype="float32") * 255.)
+    std = fluid.layers.assign(np.array(std, dtype="float32") * 255.)
+    image = fluid.layers.elementwise_sub(image, mean, axis=1)
+    image = fluid.layers.elementwise_div(image, std, axis=1)
+    return image
+
+
 def create_pyreader(is_train, args):
     """create PyReader
 
@@ -284,8 +311,15 @@ def create_pyreader(is_train, args):
     """
     image_shape = [int(m) for m in args.image_shape.split(",")]
 
-    feed_image = fluid.layers.data(
-        name="feed_image", shape=image_shape, dtype="float32", lod_level=0)
+    if args.reader_mode == "process":
+        # uint8 images from process reader are normalized in program
+        feed_image = fluid.layers.data(
+            name="feed_image", shape=image_shape, dtype="uint8", lod_level=0)
+        image = normalize_image(feed_image, args.image_mean, args.image_std)
+    else:
+        feed_image = fluid.layers.data(
+            name="feed_image", shape=image_shape, dtype="float32", lod_level=0)
+        image = feed_image
 
     feed_label = fluid.layers.data(
         name="feed_label", shape=[1], dtype="int64", lod_level=0)
@@ -303,7 +337,7 @@ def create_pyreader(is_train, args):
             capacity=64,
             use_double_buffer=True,
             iterable=False)
-        return py_reader, [feed_image, feed_y_a, feed_y_b, feed_lam]
+        return py_reader, [image, feed_y_a, feed_y_b, feed_lam]
     else:
         py_reader = fluid.io.PyReader(
             feed_list=[feed_image, feed_label],
@@ -311,7 +345,7 @@ def create_pyreader(is_train, args):
             use_double_buffer=True,
             iterable=False)
 
-        return py_reader, [feed_image, feed_label]
+        return py_reader, [image, feed_label]
 
 
 def print_info(pass_id, batch_id, print_step, metrics, time_info, info_mode):
@@ -0,0 +1,230 @@
+#  Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserve.
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+"""Compare box_utils.batched_nms and the batched get_nmsed_box and
+segm_results of eval_helper with the former loops over images, classes and
+masks, on network outputs saved by np.savez with the keys rpn_rois, lod,
+cls_prob, bbox_pred, im_info and optionally masks (num_rois x class_num x
+resolution x resolution, masks of the first rois are pasted into the
+detections), or on synthetic outputs:
+
+    python benchmark_eval_helper.py --outputs outputs.npz
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+import argparse
+import numpy as np
+import cv2
+import paddle.fluid as fluid
+import pycocotools.mask as mask_util
+
+import box_utils
+from config import cfg
+from eval_helper import box_decoder, clip_tiled_boxes, get_nmsed_box, \
+        segm_results
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('--outputs', type=str, default=None)
+parser.add_argument('--batch_size', type=int, default=2)
+parser.add_argument('--num_rois', type=int, default=1000)
+parser.add_argument('--repeat', type=int, default=3)
+
+
+def nms_inputs(rpn_rois, confs, locs, class_nums, im_info):
+    # the decoded boxes of every class of every image above score_thresh,
+    # grouped by image and class
+    lod = rpn_rois.lod()[0]
+    rpn_rois_v = np.array(rpn_rois)
+    variance_v = np.array(cfg.bbox_reg_weights)
+    boxes, scores, groups = [], [], []
+    for i in range(len(lod) - 1):
+        start = lod[i]
+        end = lod[i + 1]
+        rois_n = rpn_rois_v[start:end, :] / im_info[i][2]
+        rois_n = box_decoder(locs[start:end, :], rois_n, variance_v)
+        rois_n = clip_tiled_boxes(rois_n, im_info[i][:2] / im_info[i][2])
+        for j in range(1, class_nums):
+            inds = np.where(confs[start:end, j] > cfg.TEST.score_thresh)[0]
+            boxes.append(rois_n[inds, j * 4:(j + 1) * 4])
+            scores.append(confs[start + inds, j])
+            groups.append(np.full(len(inds), i * class_nums + j))
+    return np.vstack(boxes), np.hstack(scores), np.hstack(groups)
+
+
+def loop_nms(boxes, scores, groups, thresh):
+    # NMS of every group by box_utils.nms
+    keep = []
+    for group in np.unique(groups):
+        inds = np.where(groups == group)[0]
+        dets = np.hstack((boxes[inds], scores[inds, np.newaxis]))
+        keep.append(inds[box_utils.nms(dets, thresh)])
+    return np.hstack(keep)
+
+
+def loop_nmsed_box(rpn_rois, confs, locs, class_nums, im_info):
+    # NMS of every class of every image by box_utils.nms
+    lod = rpn_rois.lod()[0]
+    rpn_rois_v = np.array(rpn_rois)
+    variance_v = np.array(cfg.bbox_reg_weights)
+    confs_v = np.array(confs)
+    locs_v = np.array(locs)
+    im_results = []
+    new_lod = [0]
+    for i in range(len(lod) - 1):
+        start = lod[i]
+        end = lod[i + 1]
+        rois_n = rpn_rois_v[start:end, :] / im_info[i][2]
+        rois_n = box_decoder(locs_v[start:end, :], rois_n, variance_v)
+        rois_n = clip_tiled_boxes(rois_n, im_info[i][:2] / im_info[i][2])
+        scores_n = confs_v[start:end, :]
+        cls_boxes = []
+        for j in range(1, class_nums):
+            inds = np.where(scores_n[:, j] > cfg.TEST.score_thresh)[0]
+            dets_j = np.hstack((rois_n[inds, j * 4:(j + 1) * 4],
+                                scores_n[inds, j][:, np.newaxis]))
+            keep = box_utils.nms(dets_j, cfg.TEST.nms_thresh)
+            cls_boxes.append(
+                np.hstack((np.full((len(keep), 1), j), dets_j[keep, 4:],
+                           dets_j[keep, :4])))
+        cls_boxes = np.vstack(cls_boxes)
+        if len(cls_boxes) > cfg.TEST.detections_per_im:
+            image_thresh = np.sort(
+                cls_boxes[:, 1])[-cfg.TEST.detections_per_im]
+            cls_boxes = cls_boxes[cls_boxes[:, 1] >= image_thresh]
+        im_results.append(cls_boxes)
+        new_lod.append(len(cls_boxes) + new_lod[-1])
+    return new_lod, np.vstack(im_results).astype(np.float32)
+
+
+def loop_segm_results(im_results, masks, im_info):
+    # paste and encode the masks one by one
+    M = cfg.resolution
+    scale = (M + 2.0) / M
+    lod = masks.lod()[0]
+    masks_v = np.array(masks)
+    segms = []
+    for i in range(len(lod) - 1):
+        im_h = int(round(im_info[i][0] / im_info[i][2]))
+        im_w = int(round(im_info[i][1] / im_info[i][2]))
+        boxes_n = box_utils.expand_boxes(im_results[lod[i]:lod[i + 1], 2:],
+                                         scale).astype(np.int32)
+        padded_mask = np.zeros((M + 2, M + 2), dtype=np.float32)
+        for j in range(lod[i + 1] - lod[i]):
+            class_id = int(im_results[lod[i] + j, 0])
+            padded_mask[1:-1, 1:-1] = masks_v[lod[i] + j, class_id]
+            ref_box = boxes_n[j]
+            w = max(ref_box[2] - ref_box[0] + 1, 1)
+            h = max(ref_box[3] - ref_box[1] + 1, 1)
+            mask = cv2.resize(padded_mask, (w, h))
+            mask = np.array(mask > cfg.mrcnn_thresh_binarize, dtype=np.uint8)
+            im_mask = np.zeros((im_h, im_w), dtype=np.uint8)
+            x_0 = max(ref_box[0], 0)
+            x_1 = min(ref_box[2] + 1, im_w)
+            y_0 = max(ref_box[1], 0)
+            y_1 = min(ref_box[3] + 1, im_h)
+            im_mask[y_0:y_1, x_0:x_1] = mask[(y_0 - ref_box[1]):(
+                y_1 - ref_box[1]), (x_0 - ref_box[0]):(x_1 - ref_box[0])]
+            segms.append(
+                mask_util.encode(
+                    np.array(
+                        im_mask[:, :, np.newaxis], order='F'))[0])
+    return segms
+
+
+def synthetic_outputs(batch_size, num_rois, seed=0):
+    rng = np.random.RandomState(seed)
+    class_num = cfg.class_num
+    im_info = np.array(
+        [[800, 1216, 1.6]] * batch_size, dtype=np.float32)
+    xy = rng.uniform(0, 1100, (batch_size * num_rois, 2))
+    wh = rng.uniform(16, 400, (batch_size * num_rois, 2))
+    rpn_rois = np.hstack((xy, np.minimum(xy + wh, [1215, 799])))
+    logits = rng.randn(batch_size * num_rois, class_num) * 2
+    cls_prob = np.exp(logits) / np.exp(logits).sum(axis=1, keepdims=True)
+    bbox_pred = rng.randn(batch_size * num_rois, 4 * class_num) * 0.1
+    masks = rng.uniform(0, 1, (batch_size * num_rois, class_num,
+                               cfg.resolution, cfg.resolution))
+    return {
+        'rpn_rois': rpn_rois.astype(np.float32),
+        'lod': np.arange(batch_size + 1) * num_rois,
+        'cls_prob': cls_prob.astype(np.float32),
+        'bbox_pred': bbox_pred.astype(np.float32),
+        'im_info': im_info,
+        'masks': masks.astype(np.float32),
+    }
+
+
+def lod_tensor(data, lod):
+    tensor = fluid.core.LoDTensor()
+    tensor.set(data, fluid.CPUPlace())
+    tensor.set_lod([list(lod)])
+    return tensor
+
+
+def measure(func, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        out = func()
+    return out, (time.time() - start) / repeat
+
+
+def main():
+    args = parser.parse_args()
+    if args.outputs:
+        outputs = dict(np.load(args.outputs))
+    else:
+        outputs = synthetic_outputs(args.batch_size, args.num_rois)
+    rpn_rois = lod_tensor(outputs['rpn_rois'], outputs['lod'])
+    im_info = outputs['im_info']
+    args_nms = (rpn_rois, outputs['cls_prob'], outputs['bbox_pred'],
+                cfg.class_num, im_info)
+
+    boxes, scores, groups = nms_inputs(*args_nms)
+    # the scores rounded to 2 decimals, whose ties are taken in index order
+    for name, scores in [('', scores), (' (tied scores)', np.round(scores, 2))]:
+        keep, loop_time = measure(
+            lambda: loop_nms(boxes, scores, groups, cfg.TEST.nms_thresh),
+            args.repeat)
+        new_keep, batch_time = measure(
+            lambda: box_utils.batched_nms(boxes, scores, groups,
+                                          cfg.TEST.nms_thresh), args.repeat)
+        print("batched_nms{}: loop {:.1f}ms, batched {:.1f}ms, identical {}".
+              format(name, loop_time * 1000, batch_time * 1000,
+                     np.array_equal(np.sort(keep), np.sort(new_keep))))
+
+    (lod, dets), loop_time = measure(lambda: loop_nmsed_box(*args_nms),
+                                     args.repeat)
+    (new_lod, new_dets), batch_time = measure(
+        lambda: get_nmsed_box(*args_nms), args.repeat)
+    print("get_nmsed_box: loop {:.1f}ms, batched {:.1f}ms, identical {}".
+          format(loop_time * 1000, batch_time * 1000,
+                 list(lod) == list(new_lod) and np.array_equal(dets,
+                                                                new_dets)))
+
+    if 'masks' in outputs:
+        masks = lod_tensor(outputs['masks'][:len(dets)], lod)
+        segms, loop_time = measure(
+            lambda: loop_segm_results(dets, masks, im_info), args.repeat)
+        new_segms, batch_time = measure(
+            lambda: segm_results(dets, masks, im_info), args.repeat)
+        print("segm_results: loop {:.1f}ms, batched {:.1f}ms, identical {}".
+              format(loop_time * 1000, batch_time * 1000, segms == list(
+                  new_segms[:, 0])))
+
+
+if __name__ == '__main__':
+    main()
@@ -81,10 +81,11 @@ def nms(dets, thresh):
     scores = dets[:, 4]
 
     areas = (x2 - x1 + 1) * (y2 - y1 + 1)
-    order = scores.argsort()[::-1]
+    # a stable sort, so boxes of tied scores are taken last index first
+    order = scores.argsort(kind='mergesort')[::-1]
 
     ndets = dets.shape[0]
-    suppressed = np.zeros((ndets), dtype=np.int)
+    suppressed = np.zeros((ndets), dtype=np.int32)
 
     # nominal indices
     # _i, _j
@@ -125,6 +126,47 @@ def nms(dets, thresh):
     return np.where(suppressed == 0)[0]
 
 
+def batched_nms(boxes, scores, groups, thresh):
+    """Apply the greedy NMS of nms to the boxes of all groups, e.g. of all
+    classes of all images, in one call. Every step keeps the best remaining
+    box of every group and suppresses the boxes of its group overlapping
+    it, so the steps are as many as the most boxes kept in a group. Returns
+    the indices of the kept boxes sorted by group and decreasing score.
+    Boxes of tied scores are taken last index first, as nms does.
+    """
+    order = np.lexsort((-np.arange(len(scores)), -scores, groups))
+    groups = groups[order]
+    x1 = boxes[order, 0]
+    y1 = boxes[order, 1]
+    x2 = boxes[order, 2]
+    y2 = boxes[order, 3]
+
+    areas = (x2 - x1 + 1) * (y2 - y1 + 1)
+    kept = np.zeros(len(order), dtype=np.bool_)
+    alive = np.ones(len(order), dtype=np.bool_)
+    while alive.any():
+        ids = np.nonzero(alive)[0]
+        first = np.ones(len(ids), dtype=np.bool_)
+        first[1:] = groups[ids[1:]] != groups[ids[:-1]]
+        heads = ids[first]
+        kept[heads] = True
+        alive[heads] = False
+        # every remaining box against the best box of its group
+        i = heads[np.cumsum(first) - 1][~first]
+        j = ids[~first]
+        xx1 = np.maximum(x1[i], x1[j])
+        yy1 = np.maximum(y1[i], y1[j])
+        xx2 = np.minimum(x2[i], x2[j])
+        yy2 = np.minimum(y2[i], y2[j])
+        w = np.maximum(0.0, xx2 - xx1 + 1)
+        h = np.maximum(0.0, yy2 - yy1 + 1)
+        inter = w * h
+        ovr = inter / (areas[i] + areas[j] - inter)
+        alive[j[ovr >= thresh]] = False
+
+    return order[kept]
+
+
 def expand_boxes(boxes, scale):
     """Expand an array of boxes by a given scale."""
     w_half = (boxes[:, 2] - boxes[:, 0]) * .5
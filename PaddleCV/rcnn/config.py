@@ -213,6 +213,14 @@ _C.class_num = 81
 # support pyreader
 _C.use_pyreader = True
 
+# directory caching the train roidb, empty to parse the annotations of
+# every launch
+_C.roidb_cache_dir = 'dataset/coco/roidb_cache'
+
+# batch the train images of the same orientation together, landscape or
+# portrait, which pads less pixels in batches
+_C.group_by_aspect_ratio = False
+
 # pixel mean values
 _C.pixel_means = [102.9801, 115.9465, 122.7717]
 
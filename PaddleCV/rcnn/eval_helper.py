@@ -85,55 +85,58 @@ def clip_tiled_boxes(boxes, im_shape):
 
 
 def get_nmsed_box(rpn_rois, confs, locs, class_nums, im_info):
-    lod = rpn_rois.lod()[0]
+    """Decode and clip the boxes of the rois of all images, apply NMS to
+    the boxes of every class of every image with batched_nms and keep
+    detections_per_im detections of every image. Returns the lod and the
+    detections [label, score, x1, y1, x2, y2] of all images, sorted by
+    image, label and roi, as the output of multiclass_nms.
+    """
+    lod = np.array(rpn_rois.lod()[0])
     rpn_rois_v = np.array(rpn_rois)
     variance_v = np.array(cfg.bbox_reg_weights)
     confs_v = np.array(confs)
     locs_v = np.array(locs)
-    im_results = [[] for _ in range(len(lod) - 1)]
-    new_lod = [0]
-    for i in range(len(lod) - 1):
-        start = lod[i]
-        end = lod[i + 1]
-        if start == end:
-            continue
-        locs_n = locs_v[start:end, :]
-        rois_n = rpn_rois_v[start:end, :]
-        rois_n = rois_n / im_info[i][2]
-        rois_n = box_decoder(locs_n, rois_n, variance_v)
-        rois_n = clip_tiled_boxes(rois_n, im_info[i][:2] / im_info[i][2])
+    im_info = np.array(im_info)
+    num_rois = len(rpn_rois_v)
+    # the image of every roi
+    roi_im = np.repeat(np.arange(len(lod) - 1), lod[1:] - lod[:-1])
+    im_scale = im_info[roi_im, 2][:, np.newaxis]
+    rois = box_decoder(locs_v, rpn_rois_v / im_scale, variance_v)
+    # clip_tiled_boxes to the shape of the image of every roi
+    im_h = im_info[roi_im, 0][:, np.newaxis] / im_scale
+    im_w = im_info[roi_im, 1][:, np.newaxis] / im_scale
+    rois[:, 0::4] = np.maximum(np.minimum(rois[:, 0::4], im_w - 1), 0)
+    rois[:, 1::4] = np.maximum(np.minimum(rois[:, 1::4], im_h - 1), 0)
+    rois[:, 2::4] = np.maximum(np.minimum(rois[:, 2::4], im_w - 1), 0)
+    rois[:, 3::4] = np.maximum(np.minimum(rois[:, 3::4], im_h - 1), 0)
+
+    # the boxes of all foreground classes above score_thresh
+    roi_ids, labels = np.nonzero(confs_v[:, 1:] > cfg.TEST.score_thresh)
+    labels += 1
+    scores = confs_v[roi_ids, labels]
+    boxes = rois.reshape((num_rois, class_nums, 4))[roi_ids, labels]
+    images = roi_im[roi_ids]
+    keep = box_utils.batched_nms(boxes, scores, images * class_nums + labels,
+                                 cfg.TEST.nms_thresh)
+    keep = keep[np.lexsort((roi_ids[keep], labels[keep], images[keep]))]
 
-        cls_boxes = [[] for _ in range(class_nums)]
-        scores_n = confs_v[start:end, :]
-        for j in range(1, class_nums):
-            inds = np.where(scores_n[:, j] > cfg.TEST.score_thresh)[0]
-            scores_j = scores_n[inds, j]
-            rois_j = rois_n[inds, j * 4:(j + 1) * 4]
-            dets_j = np.hstack((scores_j[:, np.newaxis], rois_j)).astype(
-                np.float32, copy=False)
-            keep = box_utils.nms(dets_j, cfg.TEST.nms_thresh)
-            nms_dets = dets_j[keep, :]
-            #add labels
-            label = np.array([j for _ in range(len(keep))])
-            nms_dets = np.hstack((nms_dets, label[:, np.newaxis])).astype(
-                np.float32, copy=False)
-            cls_boxes[j] = nms_dets
     # Limit to max_per_image detections **over all classes**
-        image_scores = np.hstack(
-            [cls_boxes[j][:, 1] for j in range(1, class_nums)])
-        if len(image_scores) > cfg.TEST.detections_per_im:
-            image_thresh = np.sort(image_scores)[-cfg.TEST.detections_per_im]
-            for j in range(1, class_nums):
-                keep = np.where(cls_boxes[j][:, 1] >= image_thresh)[0]
-                cls_boxes[j] = cls_boxes[j][keep, :]
-
-        im_results_n = np.vstack([cls_boxes[j] for j in range(1, class_nums)])
-        im_results[i] = im_results_n
-        new_lod.append(len(im_results_n) + new_lod[-1])
-        boxes = im_results_n[:, 2:]
-        scores = im_results_n[:, 1]
-        labels = im_results_n[:, 0]
-    im_results = np.vstack([im_results[k] for k in range(len(lod) - 1)])
+    im_results = []
+    new_lod = [0]
+    starts = np.searchsorted(images[keep], np.arange(len(lod)))
+    for i in range(len(lod) - 1):
+        keep_n = keep[starts[i]:starts[i + 1]]
+        if len(keep_n) > cfg.TEST.detections_per_im:
+            image_thresh = np.partition(
+                scores[keep_n],
+                -cfg.TEST.detections_per_im)[-cfg.TEST.detections_per_im]
+            keep_n = keep_n[scores[keep_n] >= image_thresh]
+        im_results.append(keep_n)
+        new_lod.append(len(keep_n) + new_lod[-1])
+    keep = np.hstack(im_results).astype(np.int64)
+    im_results = np.hstack((labels[keep, np.newaxis], scores[keep, np.newaxis],
+                            boxes[keep])).astype(
+                                np.float32, copy=False)
     return new_lod, im_results
 
 
@@ -246,55 +249,44 @@ def draw_mask_on_image(image_path, segms_out, draw_threshold, alpha=0.7):
     return image
 
 
-def segm_results(im_results, masks, im_info):
+def segm_results(im_results, masks, im_info, batch_size=32):
+    """Paste the mask of the class of every detection into its box in the
+    image, and encode the masks of every image to RLEs batch_size masks at
+    a time.
+    """
     im_results = np.array(im_results)
-    class_num = cfg.class_num
     M = cfg.resolution
     scale = (M + 2.0) / M
     lod = masks.lod()[0]
     masks_v = np.array(masks)
-    boxes = im_results[:, 2:]
-    labels = im_results[:, 0]
-    segms_results = [[] for _ in range(len(lod) - 1)]
-    sum = 0
+    labels = im_results[:, 0].astype(np.int32)
+    padded_masks = np.zeros((len(labels), M + 2, M + 2), dtype=np.float32)
+    padded_masks[:, 1:-1, 1:-1] = masks_v[np.arange(len(labels)), labels]
+    boxes = box_utils.expand_boxes(im_results[:, 2:], scale).astype(np.int32)
+    widths = np.maximum(boxes[:, 2] - boxes[:, 0] + 1, 1)
+    heights = np.maximum(boxes[:, 3] - boxes[:, 1] + 1, 1)
+    segms = []
     for i in range(len(lod) - 1):
-        im_results_n = im_results[lod[i]:lod[i + 1]]
-        cls_segms = []
-        masks_n = masks_v[lod[i]:lod[i + 1]]
-        boxes_n = boxes[lod[i]:lod[i + 1]]
-        labels_n = labels[lod[i]:lod[i + 1]]
         im_h = int(round(im_info[i][0] / im_info[i][2]))
         im_w = int(round(im_info[i][1] / im_info[i][2]))
-        boxes_n = box_utils.expand_boxes(boxes_n, scale)
-        boxes_n = boxes_n.astype(np.int32)
-        padded_mask = np.zeros((M + 2, M + 2), dtype=np.float32)
-        for j in range(len(im_results_n)):
-            class_id = int(labels_n[j])
-            padded_mask[1:-1, 1:-1] = masks_n[j, class_id, :, :]
-
-            ref_box = boxes_n[j, :]
-            w = ref_box[2] - ref_box[0] + 1
-            h = ref_box[3] - ref_box[1] + 1
-            w = np.maximum(w, 1)
-            h = np.maximum(h, 1)
-
-            mask = cv2.resize(padded_mask, (w, h))
-            mask = np.array(mask > cfg.mrcnn_thresh_binarize, dtype=np.uint8)
-            im_mask = np.zeros((im_h, im_w), dtype=np.uint8)
-
-            x_0 = max(ref_box[0], 0)
-            x_1 = min(ref_box[2] + 1, im_w)
-            y_0 = max(ref_box[1], 0)
-            y_1 = min(ref_box[3] + 1, im_h)
-            im_mask[y_0:y_1, x_0:x_1] = mask[(y_0 - ref_box[1]):(y_1 - ref_box[
-                1]), (x_0 - ref_box[0]):(x_1 - ref_box[0])]
-            sum += im_mask.sum()
-            rle = mask_util.encode(
-                np.array(
-                    im_mask[:, :, np.newaxis], order='F'))[0]
-            cls_segms.append(rle)
-        segms_results[i] = np.array(cls_segms)[:, np.newaxis]
-    segms_results = np.vstack([segms_results[k] for k in range(len(lod) - 1)])
+        for start in range(lod[i], lod[i + 1], batch_size):
+            end = min(start + batch_size, lod[i + 1])
+            im_masks = np.zeros(
+                (im_h, im_w, end - start), dtype=np.uint8, order='F')
+            for j in range(start, end):
+                mask = cv2.resize(padded_masks[j], (widths[j], heights[j]))
+                mask = mask > cfg.mrcnn_thresh_binarize
+                ref_box = boxes[j]
+                x_0 = max(ref_box[0], 0)
+                x_1 = min(ref_box[2] + 1, im_w)
+                y_0 = max(ref_box[1], 0)
+                y_1 = min(ref_box[3] + 1, im_h)
+                im_masks[y_0:y_1, x_0:x_1, j - start] = mask[(
+                    y_0 - ref_box[1]):(y_1 - ref_box[1]), (x_0 - ref_box[0]):(
+                        x_1 - ref_box[0])]
+            segms.extend(mask_util.encode(im_masks))
+    segms_results = np.empty((len(segms), 1), dtype=object)
+    segms_results[:, 0] = segms
     im_results = np.hstack([segms_results, im_results])
     return im_results[:, :3]
 
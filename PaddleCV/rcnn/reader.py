@@ -81,11 +81,21 @@ def coco(mode,
 
     print("{} on {} with {} roidbs".format(mode, cfg.dataset, len(roidbs)))
 
+    # pixels of the images and of the padded images of an epoch
+    padding_stats = {'batches': 0, 'pixels': 0, 'padded_pixels': 0}
+
     def padding_minibatch(batch_data):
+        pixels = sum(data[0].shape[1] * data[0].shape[2]
+                     for data in batch_data)
+        padding_stats['batches'] += 1
+        padding_stats['pixels'] += pixels
         if len(batch_data) == 1:
+            padding_stats['padded_pixels'] += pixels
             return batch_data
 
         max_shape = np.array([data[0].shape for data in batch_data]).max(axis=0)
+        padding_stats['padded_pixels'] += \
+            len(batch_data) * max_shape[1] * max_shape[2]
 
         padding_batch = []
         for data in batch_data:
@@ -101,22 +111,34 @@ def coco(mode,
             if shuffle:
                 if shuffle_seed is not None:
                     np.random.seed(shuffle_seed)
-                roidb_perm = deque(np.random.permutation(roidbs))
+                roidb_perm = deque(np.random.permutation(len(roidbs)))
             else:
-                roidb_perm = deque(roidbs)
+                roidb_perm = deque(range(len(roidbs)))
             roidb_cur = 0
             count = 0
             batch_out = []
             device_num = total_batch_size / batch_size
+            # batches are padded to the largest image of the batch, images
+            # of the same orientation are batched together to pad less
+            group_size = total_batch_size if padding_total else batch_size
+            groups = {True: [], False: []}
             while True:
-                roidb = roidb_perm[0]
+                roidb = roidbs[roidb_perm[0]]
                 roidb_cur += 1
                 roidb_perm.rotate(-1)
                 if roidb_cur >= len(roidbs):
+                    if padding_stats['batches'] > 0:
+                        print("padded {} batches of the epoch, {:.1%} of "
+                              "the pixels are padding".format(
+                                  padding_stats['batches'], 1 - float(
+                                      padding_stats['pixels']) / padding_stats[
+                                          'padded_pixels']))
+                        padding_stats.update(
+                            batches=0, pixels=0, padded_pixels=0)
                     if shuffle:
-                        roidb_perm = deque(np.random.permutation(roidbs))
+                        roidb_perm = deque(np.random.permutation(len(roidbs)))
                     else:
-                        roidb_perm = deque(roidbs)
+                        roidb_perm = deque(range(len(roidbs)))
                     roidb_cur = 0
                 # im, gt_boxes, gt_classes, is_crowd, im_info, im_id, gt_masks
                 datas = roidb_reader(roidb, mode)
@@ -125,7 +147,14 @@ def coco(mode,
                 if cfg.MASK_ON:
                     if len(datas[-1]) != datas[1].shape[0]:
                         continue
-                batch_out.append(datas)
+                if cfg.group_by_aspect_ratio:
+                    landscape = roidb['width'] >= roidb['height']
+                    groups[landscape].append(datas)
+                    if len(groups[landscape]) < group_size:
+                        continue
+                    batch_out, groups[landscape] = groups[landscape], []
+                else:
+                    batch_out.append(datas)
                 if not padding_total:
                     if len(batch_out) == batch_size:
                         yield padding_minibatch(batch_out)
@@ -26,9 +26,12 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import copy
+import hashlib
+import json
 import logging
 import numpy as np
 import os
+import shutil
 import scipy.sparse
 import random
 import time
@@ -39,9 +42,16 @@ import box_utils
 import segm_utils
 from config import cfg
 from data_utils import DatasetPath
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 logger = logging.getLogger(__name__)
 
+# bump when the layout or the content of the cached roidbs changes
+ROIDB_CACHE_VERSION = 1
+
 
 class JsonDataset(object):
     """A class representing a COCO json dataset."""
@@ -54,16 +64,31 @@ class JsonDataset(object):
         data_dir = data_path.get_data_dir()
         file_list = data_path.get_file_list()
         self.image_directory = data_dir
-        self.COCO = COCO(file_list)
+        self.file_list = file_list
+        self.COCO = None
+        self.cache_path = None
+        if self.is_train and cfg.roidb_cache_dir:
+            self.cache_path = self._roidb_cache_path(file_list)
+        if self.cache_path and os.path.isdir(self.cache_path):
+            # the annotations are not parsed if the roidb is cached
+            with open(os.path.join(self.cache_path, 'meta.json')) as f:
+                meta = json.load(f)
+            category_ids = meta['category_ids']
+            categories = meta['categories']
+        else:
+            self.COCO = COCO(file_list)
+            category_ids = self.COCO.getCatIds()
+            categories = [
+                c['name'] for c in self.COCO.loadCats(category_ids)
+            ]
         # Set up dataset classes
-        category_ids = self.COCO.getCatIds()
-        categories = [c['name'] for c in self.COCO.loadCats(category_ids)]
+        self.category_ids = category_ids
         self.category_to_id_map = dict(zip(categories, category_ids))
         self.classes = ['__background__'] + categories
         self.num_classes = len(self.classes)
         self.json_category_id_to_contiguous_id = {
             v: i + 1
-            for i, v in enumerate(self.COCO.getCatIds())
+            for i, v in enumerate(category_ids)
         }
         self.contiguous_category_id_to_json_id = {
             v: k
@@ -76,7 +101,29 @@ class JsonDataset(object):
            - add proposals specified in a proposals file
            - filter proposals based on a minimum side length
            - filter proposals that intersect with crowd regions
+
+        The train roidb is cached in cfg.roidb_cache_dir, see
+        _get_cached_roidb.
         """
+        if self.cache_path:
+            try:
+                return self._get_cached_roidb()
+            except (IOError, OSError) as e:
+                print('Failed to cache roidb in {}: {}'.format(
+                    cfg.roidb_cache_dir, e))
+        if self.COCO is None:
+            self.COCO = COCO(self.file_list)
+        roidb = self._parse_roidb()
+        if self.is_train and cfg.TRAIN.use_flipped:
+            print('Appending horizontally-flipped training examples...')
+            self._extend_with_flipped_entries(roidb)
+        print('Loaded dataset: {:s}'.format(self.name))
+        print('{:d} roidb entries'.format(len(roidb)))
+        if self.is_train:
+            self._filter_for_training(roidb)
+        return roidb
+
+    def _parse_roidb(self):
         image_ids = self.COCO.getImgIds()
         image_ids.sort()
         roidb = copy.deepcopy(self.COCO.loadImgs(image_ids))
@@ -90,15 +137,102 @@ class JsonDataset(object):
             end_time = time.time()
             print('_add_gt_annotations took {:.3f}s'.format(end_time -
                                                             start_time))
-            if cfg.TRAIN.use_flipped:
-                print('Appending horizontally-flipped training examples...')
-                self._extend_with_flipped_entries(roidb)
-        print('Loaded dataset: {:s}'.format(self.name))
+        return roidb
+
+    def _roidb_cache_path(self, file_list):
+        """The cache of the roidb of file_list, keyed by the md5 of the
+        annotation file and the options the roidb depends on.
+        """
+        md5 = hashlib.md5()
+        with open(file_list, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                md5.update(chunk)
+        md5.update('{} {}'.format(ROIDB_CACHE_VERSION, cfg.TRAIN.gt_min_area)
+                   .encode('utf-8'))
+        return os.path.join(cfg.roidb_cache_dir, '{}_{}'.format(
+            os.path.splitext(os.path.basename(file_list))[0],
+            md5.hexdigest()))
+
+    def _get_cached_roidb(self):
+        """Load the roidb cached in self.cache_path, which is built from
+        the annotations if it is not cached yet. The trainers sharing the
+        cache wait on a file lock while one of them builds it.
+        """
+        cache_dir = os.path.dirname(self.cache_path)
+        if not os.path.isdir(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError:
+                # made by another trainer
+                if not os.path.isdir(cache_dir):
+                    raise
+        with open(self.cache_path + '.lock', 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            if not os.path.isdir(self.cache_path):
+                if self.COCO is None:
+                    self.COCO = COCO(self.file_list)
+                start_time = time.time()
+                self._write_roidb_cache(self._parse_roidb())
+                print('Cached roidb in {} in {:.3f}s'.format(
+                    self.cache_path, time.time() - start_time))
+        roidb = CachedRoidb(self.cache_path, self.image_directory,
+                            cfg.TRAIN.use_flipped)
+        print('Loaded dataset: {:s} from {}'.format(self.name,
+                                                     self.cache_path))
         print('{:d} roidb entries'.format(len(roidb)))
-        if self.is_train:
-            self._filter_for_training(roidb)
         return roidb
 
+    def _write_roidb_cache(self, roidb):
+        """Write the arrays of roidb into a temporary directory renamed to
+        self.cache_path, so that a partial cache is never loaded. The
+        polygons of every object are kept, RLE segms of crowd objects,
+        which are not read in training, are dropped.
+        """
+        tmp_path = '{}.{}.tmp'.format(self.cache_path, os.getpid())
+        if os.path.isdir(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+        polys = [[p for p in segm] if segm_utils.is_poly(segm) else []
+                 for entry in roidb for segm in entry['segms']]
+        arrays = {
+            'id': np.array(
+                [entry['id'] for entry in roidb], dtype=np.int64),
+            'file_name': np.array([
+                os.path.relpath(entry['image'], self.image_directory)
+                for entry in roidb
+            ]),
+            'height': np.array(
+                [entry['height'] for entry in roidb], dtype=np.int32),
+            'width': np.array(
+                [entry['width'] for entry in roidb], dtype=np.int32),
+            'box_lod': _lod([len(entry['gt_boxes']) for entry in roidb]),
+            'gt_boxes': np.concatenate(
+                [np.empty((0, 4), dtype=np.float32)] +
+                [entry['gt_boxes'] for entry in roidb]),
+            'gt_classes': np.concatenate(
+                [np.empty((0), dtype=np.int32)] +
+                [entry['gt_classes'] for entry in roidb]),
+            'gt_id': np.concatenate([np.empty((0), dtype=np.int64)] +
+                                    [entry['gt_id'] for entry in roidb]),
+            'is_crowd': np.concatenate([np.empty((0), dtype=np.bool_)] +
+                                       [entry['is_crowd'] for entry in roidb]),
+            'segm_lod': _lod([len(segm) for segm in polys]),
+            'poly_lod': _lod([len(p) for segm in polys for p in segm]),
+            'polys': np.concatenate([np.empty((0), dtype=np.float64)] + [
+                np.asarray(
+                    p, dtype=np.float64) for segm in polys for p in segm
+            ]),
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_path, name + '.npy'), array)
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump({
+                'category_ids': self.category_ids,
+                'categories': self.classes[1:]
+            }, f)
+        os.rename(tmp_path, self.cache_path)
+
     def _prep_roidb_entry(self, entry):
         """Adds empty metadata fields to an roidb entry."""
         # Make file_name an abs path
@@ -110,7 +244,7 @@ class JsonDataset(object):
         entry['gt_boxes'] = np.empty((0, 4), dtype=np.float32)
         entry['gt_classes'] = np.empty((0), dtype=np.int32)
         entry['gt_id'] = np.empty((0), dtype=np.int32)
-        entry['is_crowd'] = np.empty((0), dtype=np.bool)
+        entry['is_crowd'] = np.empty((0), dtype=np.bool_)
         entry['segms'] = []
         # Remove unwanted fields that come from the json file (if they exist)
         for k in ['date_captured', 'url', 'license', 'file_name']:
@@ -214,3 +348,70 @@ class JsonDataset(object):
         num_after = len(filtered_roidb)
         print('Filtered {} roidb entries: {} -> {}'.format(num - num_after, num,
                                                            num_after))
+
+
+def _lod(lengths):
+    lod = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=lod[1:])
+    return lod
+
+
+class CachedRoidb(object):
+    """A read-only roidb of the arrays cached by JsonDataset, memory-mapped
+    so that the trainers of a machine share their pages. The entries are
+    built when they are indexed, and the entries after the first
+    num_images entries are the horizontally-flipped entries.
+    """
+
+    def __init__(self, cache_path, image_directory, use_flipped):
+        self.image_directory = image_directory
+        self.arrays = {}
+        for name in os.listdir(cache_path):
+            if name.endswith('.npy'):
+                self.arrays[name[:-4]] = np.load(
+                    os.path.join(cache_path, name), mmap_mode='r')
+        self.num_images = len(self.arrays['id'])
+        self.use_flipped = use_flipped
+
+    def __len__(self):
+        return self.num_images * (2 if self.use_flipped else 1)
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError('roidb index {} out of range'.format(idx))
+        flipped = idx >= self.num_images
+        i = idx % self.num_images
+        a = self.arrays
+        width = int(a['width'][i])
+        start, end = a['box_lod'][i:i + 2]
+        gt_boxes = np.array(a['gt_boxes'][start:end])
+        segms = []
+        for j in range(start, end):
+            segm = []
+            for k in range(a['segm_lod'][j], a['segm_lod'][j + 1]):
+                poly = a['polys'][a['poly_lod'][k]:a['poly_lod'][k + 1]]
+                if flipped:
+                    poly = np.array(poly)
+                    poly[0::2] = width - poly[0::2] - 1
+                segm.append(poly.tolist())
+            segms.append(segm)
+        if flipped:
+            oldx1 = gt_boxes[:, 0].copy()
+            oldx2 = gt_boxes[:, 2].copy()
+            gt_boxes[:, 0] = width - oldx2 - 1
+            gt_boxes[:, 2] = width - oldx1 - 1
+        return {
+            'id': int(a['id'][i]),
+            'image': os.path.join(self.image_directory,
+                                  str(a['file_name'][i])),
+            'height': int(a['height'][i]),
+            'width': width,
+            'flipped': flipped,
+            'gt_boxes': gt_boxes,
+            'gt_classes': np.array(a['gt_classes'][start:end]),
+            'gt_id': np.array(a['gt_id'][start:end]),
+            'is_crowd': np.array(a['is_crowd'][start:end]),
+            'segms': segms,
+        }
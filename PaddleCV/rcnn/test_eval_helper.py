@@ -0,0 +1,64 @@
+#  Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserve.
+#
+#Licensed under the Apache License, Version 2.0 (the "License");
+#you may not use this file except in compliance with the License.
+#You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+#Unless required by applicable law or agreed to in writing, software
+#distributed under the License is distributed on an "AS IS" BASIS,
+#WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#See the License for the specific language governing permissions and
+#limitations under the License.
+"""Check the batched get_nmsed_box against the former loop over images and
+classes:
+
+    python -m unittest test_eval_helper
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import unittest
+import numpy as np
+
+from config import cfg
+from eval_helper import get_nmsed_box
+from benchmark_eval_helper import loop_nmsed_box, synthetic_outputs, \
+        lod_tensor
+
+
+class TestGetNmsedBox(unittest.TestCase):
+    def setUp(self):
+        self.detections_per_im = cfg.TEST.detections_per_im
+
+    def tearDown(self):
+        cfg.TEST.detections_per_im = self.detections_per_im
+
+    def check(self, outputs):
+        rpn_rois = lod_tensor(outputs['rpn_rois'], outputs['lod'])
+        args = (rpn_rois, outputs['cls_prob'], outputs['bbox_pred'],
+                cfg.class_num, outputs['im_info'])
+        lod, dets = loop_nmsed_box(*args)
+        new_lod, new_dets = get_nmsed_box(*args)
+        self.assertEqual(list(lod), list(new_lod))
+        np.testing.assert_array_equal(dets, new_dets)
+
+    def test_get_nmsed_box(self):
+        self.check(synthetic_outputs(3, 200, seed=1))
+
+    def test_tied_scores(self):
+        outputs = synthetic_outputs(2, 200, seed=2)
+        outputs['cls_prob'] = np.round(outputs['cls_prob'], 2)
+        self.check(outputs)
+
+    def test_detections_per_im(self):
+        # the detections of every image are limited to the top ones
+        cfg.TEST.detections_per_im = 10
+        self.check(synthetic_outputs(2, 200, seed=3))
+
+
+if __name__ == '__main__':
+    unittest.main()
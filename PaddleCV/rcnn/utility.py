@@ -134,10 +134,13 @@ def parse_args():
     add_arg('class_num',        int,   81,          "Class number.")
     add_arg('data_dir',         str,   'dataset/coco',        "The data root path.")
     add_arg('use_pyreader',     bool,   True,           "Use pyreader.")
+    add_arg('roidb_cache_dir',  str,   'dataset/coco/roidb_cache', "The directory caching the train roidb, an empty string disables the cache.")
     add_arg('use_profile',         bool,   False,       "Whether use profiler.")
     add_arg('padding_minibatch',bool,   False,
         "If False, only resize image and not pad, image shape is different between"
         " GPUs in one mini-batch. If True, image shape is the same in one mini-batch.")
+    add_arg('group_by_aspect_ratio', bool, False,
+        "Whether batch the train images of the same orientation together, which pads less pixels in mini-batches.")
     #SOLVER
     add_arg('learning_rate',    float,  0.01,     "Learning rate.")
     add_arg('max_iter',         int,    180000,   "Iter number.")
@@ -0,0 +1,124 @@
+# Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmark the batches/sec of the multiprocess train reader, the
+polling GeneratorEnqueuer and the PrefetchPool of shared memory slots,
+on synthetic batches shaped as the batches of reader.train:
+
+    python benchmark_reader.py --workers 1 2 4 8 --batch_size 8 --size 608
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+import argparse
+import numpy as np
+import cv2
+
+from data_utils import GeneratorEnqueuer, PrefetchPool
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('--workers', nargs='+', type=int, default=[1, 2, 4, 8])
+parser.add_argument('--batch_size', type=int, default=8)
+parser.add_argument('--size', type=int, default=608)
+parser.add_argument('--max_box_num', type=int, default=50)
+parser.add_argument('--max_queue', type=int, default=32)
+parser.add_argument('--batches', type=int, default=200)
+
+
+def synthetic_reader(batch_size, size, max_box_num):
+    """ an endless generator of batches of resized random images """
+
+    def reader(shard_id=0, num_shards=1):
+        src = np.random.randint(0, 256, (480, 640, 3)).astype('uint8')
+        while True:
+            batch = []
+            for _ in range(batch_size):
+                im = cv2.resize(src, (size, size),
+                                interpolation=cv2.INTER_CUBIC)
+                im = (im.astype('float32') / 255.0).transpose((2, 0, 1))
+                gt_boxes = np.random.rand(max_box_num, 4).astype('float32')
+                gt_labels = np.random.randint(
+                    0, 80, max_box_num).astype('int32')
+                gt_scores = np.ones(max_box_num, dtype='float32')
+                batch.append([im, gt_boxes, gt_labels, gt_scores])
+            yield batch
+
+    return reader
+
+
+def measure(batches, num_batches):
+    # skip the first batches, which include the start up of workers
+    warmup = max(num_batches // 10, 1)
+    for i, _ in enumerate(batches):
+        if i + 1 == warmup:
+            start = time.time()
+        if i + 1 == warmup + num_batches:
+            break
+    return num_batches / (time.time() - start)
+
+
+def enqueuer_batches(reader, num_workers, max_queue):
+    # the consumer of the former reader.train, polling the queue
+    enqueuer = GeneratorEnqueuer(reader(), use_multiprocessing=True)
+    enqueuer.start(max_queue_size=max_queue, workers=num_workers)
+    try:
+        while enqueuer.is_running():
+            if not enqueuer.queue.empty():
+                yield enqueuer.queue.get()
+            else:
+                time.sleep(0.02)
+    finally:
+        enqueuer.stop()
+
+
+def main():
+    args = parser.parse_args()
+    reader = synthetic_reader(args.batch_size, args.size, args.max_box_num)
+    slot_bytes = args.batch_size * (3 * args.size * args.size * 4 + 4096)
+
+    start = time.time()
+    for _ in range(10):
+        next(reader())
+    print("one worker generates {:.1f} batches/sec".format(10 / (
+        time.time() - start)))
+
+    for num_workers in args.workers:
+        speed = measure(
+            enqueuer_batches(reader, num_workers, args.max_queue),
+            args.batches)
+        print("workers {}: GeneratorEnqueuer {:.1f} batches/sec".format(
+            num_workers, speed))
+
+        pool = PrefetchPool(
+            lambda worker_id: reader(worker_id, num_workers),
+            num_workers=num_workers,
+            num_slots=args.max_queue,
+            slot_bytes=slot_bytes)
+        pool.start()
+        try:
+            speed = measure(pool.get(), args.batches)
+        finally:
+            pool.stop()
+        stats = pool.stats()
+        print("workers {}: PrefetchPool {:.1f} batches/sec, mean queue "
+              "depth {:.1f}, consumer waited {:.2f}s, workers stalled "
+              "{:.2f}s".format(num_workers, speed, stats['queue_depth'],
+                               stats['consumer_wait'],
+                               sum(stats['worker_stall'])))
+
+
+if __name__ == '__main__':
+    main()
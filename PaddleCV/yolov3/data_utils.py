@@ -6,6 +6,7 @@ import os
 import sys
 import signal
 import time
+import random
 import numpy as np
 import threading
 import multiprocessing
@@ -166,3 +167,233 @@ class GeneratorEnqueuer(object):
                     yield inputs
             else:
                 time.sleep(self.wait_time)
+
+
+class PrefetchPool(object):
+    """
+    Prefetch batches of generators in worker processes. Each worker runs
+    its own generator, e.g. over its own shard of the dataset, and writes
+    every batch into a free slot of shared memory. A worker blocks while
+    all slots are filled, and the consumer blocks while no batch is
+    ready, so neither side polls.
+
+    A batch is a list of samples, and a sample is a list of numpy arrays
+    or picklable values, the arrays are written into the slot and only
+    their dtypes, shapes and offsets are sent through the queue. A batch
+    larger than slot_bytes is sent through the queue as it is.
+
+    Args:
+        generator_fn: function(worker_id) returning the generator of a
+            worker, which yields batches.
+        num_workers (int): number of worker processes.
+        num_slots (int): number of batches in shared memory.
+        slot_bytes (int): size of a slot in bytes.
+        random_seed (int): numpy seed of the first worker, incremented by
+            one for each worker, random if None.
+    """
+
+    def __init__(self,
+                 generator_fn,
+                 num_workers=8,
+                 num_slots=16,
+                 slot_bytes=64 << 20,
+                 random_seed=None):
+        self._generator_fn = generator_fn
+        self.num_workers = num_workers
+        self.num_slots = max(num_slots, 2)
+        self.slot_bytes = slot_bytes
+        if random_seed is None:
+            random_seed = np.random.randint(0, 2**31 - num_workers)
+        self.seed = random_seed
+        self._workers = []
+        self._buffer = None
+        self._stop_event = None
+        # batches and seconds blocked on free slots of every worker
+        self._worker_stats = None
+        self._depth = None
+        self._batches = 0
+        self._depth_sum = 0
+        self._wait_time = 0.0
+
+    def start(self):
+        """
+        Allocate the slots and start the worker processes.
+        """
+        self._buffer = multiprocessing.RawArray('b', self.num_slots *
+                                                self.slot_bytes)
+        self._free_slots = multiprocessing.Queue()
+        for slot in range(self.num_slots):
+            self._free_slots.put(slot)
+        self._ready = multiprocessing.Queue()
+        self._stop_event = multiprocessing.Event()
+        self._worker_stats = multiprocessing.RawArray('d',
+                                                      2 * self.num_workers)
+        # number of filled slots
+        self._depth = multiprocessing.Value('i', 0)
+        try:
+            for worker_id in range(self.num_workers):
+                worker = multiprocessing.Process(
+                    target=self._work, args=(worker_id, ))
+                worker.daemon = True
+                self._workers.append(worker)
+                worker.start()
+        except:
+            self.stop()
+            raise
+
+    def _slot(self, slot):
+        return np.frombuffer(
+            self._buffer,
+            dtype=np.uint8,
+            count=self.slot_bytes,
+            offset=slot * self.slot_bytes)
+
+    def _write(self, batch, slot):
+        # returns the layout of the batch in the slot, None if the batch
+        # does not fit in
+        buf = self._slot(slot)
+        layout = []
+        offset = 0
+        for sample in batch:
+            fields = []
+            for field in sample:
+                if not isinstance(field, np.ndarray):
+                    fields.append(('value', field))
+                    continue
+                end = offset + field.nbytes
+                if end > self.slot_bytes:
+                    return None
+                buf[offset:end].view(field.dtype).reshape(field.shape)[...] \
+                        = field
+                fields.append(('array', field.dtype.str, field.shape,
+                               offset))
+                # keep every array aligned
+                offset = (end + 63) // 64 * 64
+            layout.append(fields)
+        return layout
+
+    def _read(self, layout, slot, copy):
+        buf = self._slot(slot)
+        batch = []
+        for fields in layout:
+            sample = []
+            for field in fields:
+                if field[0] == 'value':
+                    sample.append(field[1])
+                    continue
+                _, dtype, shape, offset = field
+                dtype = np.dtype(dtype)
+                size = int(np.prod(shape)) * dtype.itemsize
+                array = buf[offset:offset + size].view(dtype).reshape(shape)
+                sample.append(array.copy() if copy else array)
+            batch.append(sample)
+        return batch
+
+    def _work(self, worker_id):
+        np.random.seed(self.seed + worker_id)
+        random.seed(self.seed + worker_id)
+        stats = self._worker_stats
+        try:
+            for batch in self._generator_fn(worker_id):
+                start = time.time()
+                slot = self._free_slots.get()
+                stats[2 * worker_id + 1] += time.time() - start
+                if slot is None or self._stop_event.is_set():
+                    return
+                layout = self._write(batch, slot)
+                with self._depth.get_lock():
+                    self._depth.value += 1
+                if layout is None:
+                    self._ready.put(('batch', slot, batch))
+                else:
+                    self._ready.put(('slot', slot, layout))
+                stats[2 * worker_id] += 1
+            self._ready.put(('end', worker_id, None))
+        except Exception:
+            import traceback
+            self._ready.put(('error', worker_id, traceback.format_exc()))
+
+    def get(self, copy=True):
+        """
+        Creates a generator of the batches of all workers, which ends when
+        all the generators end.
+
+        Args:
+            copy (bool): copy the arrays out of shared memory. If False,
+                the arrays of a batch are views of its slot, which is
+                reused when the next batch is requested.
+
+        Yields:
+            batch of a worker.
+        """
+        running = self.num_workers
+        slot = None
+        while running > 0:
+            if slot is not None:
+                self._free_slots.put(slot)
+                slot = None
+            start = time.time()
+            kind, key, data = self._ready.get()
+            self._wait_time += time.time() - start
+            if kind == 'end':
+                running -= 1
+                continue
+            if kind == 'error':
+                raise RuntimeError("reader worker {} failed:\n{}".format(
+                    key, data))
+            with self._depth.get_lock():
+                self._depth_sum += self._depth.value
+                self._depth.value -= 1
+            self._batches += 1
+            slot = key
+            if kind == 'batch':
+                yield data
+            else:
+                yield self._read(data, slot, copy)
+
+    def stats(self):
+        """
+        Returns:
+            dict: number of batches consumed, mean number of filled slots
+            when a batch is consumed, seconds the consumer waited for
+            ready batches, number of batches written and seconds blocked
+            on free slots by every worker.
+        """
+        stats = self._worker_stats
+        workers = range(self.num_workers)
+        return {
+            'batches': self._batches,
+            'queue_depth': self._depth_sum / float(max(self._batches, 1)),
+            'consumer_wait': self._wait_time,
+            'worker_batches': [int(stats[2 * i]) for i in workers]
+            if stats is not None else [],
+            'worker_stall': [stats[2 * i + 1] for i in workers]
+            if stats is not None else [],
+        }
+
+    def stop(self, timeout=10):
+        """
+        Stop the workers and wait for them to exit, the workers still
+        alive after timeout seconds are terminated.
+
+        Args:
+            timeout(int): maximum seconds to wait for the workers.
+        """
+        if self._stop_event is not None:
+            self._stop_event.set()
+            # wake up the workers blocked on free slots
+            for _ in self._workers:
+                self._free_slots.put(None)
+        deadline = time.time() + timeout
+        for worker in self._workers:
+            # a worker exits after its batches are flushed to the queue
+            while worker.is_alive() and time.time() < deadline:
+                try:
+                    self._ready.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+        self._workers = []
+        self._stop_event = None
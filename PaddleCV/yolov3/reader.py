@@ -27,7 +27,7 @@ import cv2
 import box_utils
 import image_utils
 from pycocotools.coco import COCO
-from data_utils import GeneratorEnqueuer
+from data_utils import PrefetchPool
 from config import cfg
 import paddle.fluid as fluid
 
@@ -155,6 +155,9 @@ class DataSetReader(object):
                 "batch size connot be None in mode {}".format(mode)
             self._parse_dataset_dir(mode)
             self._parse_dataset_catagory()
+        if mode == 'train':
+            # parsed once, before the train reader is forked into workers
+            train_imgs = self._parse_images_by_mode(mode)
 
         def img_reader(img, size, mean, std):
             im_path = img['image']
@@ -221,9 +224,10 @@ class DataSetReader(object):
             mixup_img = imgs[(read_cnt + mixup_idx) % len(imgs)]
             return mixup_img
 
-        def reader():
+        def reader(shard_id=0, num_shards=1):
+            # a train reader reads the images of shard shard_id only
             if mode == 'train':
-                imgs = self._parse_images_by_mode(mode)
+                imgs = train_imgs[shard_id::num_shards]
                 if shuffle:
                     if shuffle_seed is not None:
                         np.random.seed(shuffle_seed)
@@ -310,36 +314,34 @@ def train(size=416,
                     "by multiprocess.")
         print("multiprocess reader starting up, it takes a while...")
 
-    def infinite_reader():
-        while True:
-            for data in generator():
-                yield data
+    # a slot holds a batch of the largest images and their ground truths
+    max_size = max([size] + list(random_sizes))
+    slot_bytes = batch_size * (3 * max_size * max_size * 4 + 4096)
+
+    def worker_generator(worker_id):
+        return generator(worker_id, num_workers)
 
     def reader():
-        cnt = 0
+        pool = PrefetchPool(
+            worker_generator,
+            num_workers=num_workers,
+            num_slots=max_queue,
+            slot_bytes=slot_bytes,
+            random_seed=shuffle_seed)
         try:
-            enqueuer = GeneratorEnqueuer(
-                infinite_reader(), use_multiprocessing=use_multiprocess_reader)
-            enqueuer.start(max_queue_size=max_queue, workers=num_workers)
-            generator_out = None
-            while True:
-                while enqueuer.is_running():
-                    if not enqueuer.queue.empty():
-                        generator_out = enqueuer.queue.get()
-                        break
-                    else:
-                        time.sleep(0.02)
-                yield generator_out
-                cnt += 1
-                if cnt >= total_iter:
-                    enqueuer.stop()
+            pool.start()
+            for cnt, batch in enumerate(pool.get()):
+                yield batch
+                if cnt + 1 >= total_iter:
                     return
-                generator_out = None
-        except Exception as e:
-            print("Exception occured in reader: {}".format(str(e)))
         finally:
-            if enqueuer:
-                enqueuer.stop()
+            pool.stop()
+            stats = pool.stats()
+            print("reader stopped after {} batches, mean queue depth "
+                  "{:.1f}/{}, waited {:.1f}s for batches, workers stalled "
+                  "{:.1f}s on full queue".format(
+                      stats['batches'], stats['queue_depth'], max_queue,
+                      stats['consumer_wait'], sum(stats['worker_stall'])))
 
     return reader
 
@@ -22,8 +22,14 @@ from __future__ import print_function
 import collections
 import unicodedata
 import six
+import threading
 import io
 
+try:
+    from functools import lru_cache
+except ImportError:  # python 2
+    lru_cache = None
+
 
 def convert_to_unicode(text):
     """Converts `text` to Unicode (if it's not already), assuming utf-8 input."""
@@ -99,6 +105,63 @@ def convert_ids_to_tokens(inv_vocab, ids):
     return convert_by_vocab(inv_vocab, ids)
 
 
+class _LRUCache(object):
+    """Thread safe map of the most recently used keys, as lru_cache of
+    python 2."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is not None:
+                # move to the most recently used end
+                self._entries[key] = value
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            if key not in self._entries and len(
+                    self._entries) >= self.capacity:
+                self._entries.popitem(last=False)
+            self._entries[key] = value
+
+
+def _lru_memoize(func, maxsize):
+    """Memoizes func of a single argument for the maxsize most recently used
+    arguments, maxsize 0 disables the memoization."""
+    if not maxsize:
+        return func
+    if lru_cache is not None:
+        return lru_cache(maxsize=maxsize)(func)
+    cache = _LRUCache(maxsize)
+
+    def memoized(key):
+        value = cache.get(key)
+        if value is None:
+            value = func(key)
+            cache.put(key, value)
+        return value
+
+    return memoized
+
+
+class _CharMap(dict):
+    """Memoizes map_char of every code point, as a table of `translate`."""
+
+    def __init__(self, map_char):
+        super(_CharMap, self).__init__()
+        self._map_char = map_char
+
+    def __missing__(self, cp):
+        value = self._map_char(six.unichr(cp))
+        self[cp] = value
+        return value
+
+
 def whitespace_tokenize(text):
     """Runs basic whitespace cleaning and splitting on a peice of text."""
     text = text.strip()
@@ -120,11 +183,14 @@ class FullTokenizer(object):
     def tokenize(self, text):
         split_tokens = []
         for token in self.basic_tokenizer.tokenize(text):
-            for sub_token in self.wordpiece_tokenizer.tokenize(token):
-                split_tokens.append(sub_token)
+            split_tokens.extend(self.wordpiece_tokenizer.tokenize_word(token))
 
         return split_tokens
 
+    def tokenize_batch(self, texts):
+        """Tokenizes a list of texts, which share the memoized words."""
+        return [self.tokenize(text) for text in texts]
+
     def convert_tokens_to_ids(self, tokens):
         return convert_by_vocab(self.vocab, tokens)
 
@@ -158,13 +224,18 @@ class CharTokenizer(object):
 class BasicTokenizer(object):
     """Runs basic tokenization (punctuation splitting, lower casing, etc.)."""
 
-    def __init__(self, do_lower_case=True):
+    def __init__(self, do_lower_case=True, cache_size=100000):
         """Constructs a BasicTokenizer.
 
         Args:
             do_lower_case: Whether to lower case the input.
+            cache_size: Number of the most recently used tokens whose splits
+                are memoized.
         """
         self.do_lower_case = do_lower_case
+        self._clean_map = _CharMap(self._clean_char)
+        self._chinese_map = _CharMap(self._chinese_char)
+        self._split_token = _lru_memoize(self._run_split_token, cache_size)
 
     def tokenize(self, text):
         """Tokenizes a piece of text."""
@@ -182,14 +253,18 @@ class BasicTokenizer(object):
         orig_tokens = whitespace_tokenize(text)
         split_tokens = []
         for token in orig_tokens:
-            if self.do_lower_case:
-                token = token.lower()
-                token = self._run_strip_accents(token)
-            split_tokens.extend(self._run_split_on_punc(token))
+            split_tokens.extend(self._split_token(token))
 
         output_tokens = whitespace_tokenize(" ".join(split_tokens))
         return output_tokens
 
+    def _run_split_token(self, token):
+        """Lower cases, strips accents and splits punctuation of a token."""
+        if self.do_lower_case:
+            token = token.lower()
+            token = self._run_strip_accents(token)
+        return self._run_split_on_punc(token)
+
     def _run_strip_accents(self, text):
         """Strips accents from a piece of text."""
         text = unicodedata.normalize("NFD", text)
@@ -223,16 +298,12 @@ class BasicTokenizer(object):
 
     def _tokenize_chinese_chars(self, text):
         """Adds whitespace around any CJK character."""
-        output = []
-        for char in text:
-            cp = ord(char)
-            if self._is_chinese_char(cp):
-                output.append(" ")
-                output.append(char)
-                output.append(" ")
-            else:
-                output.append(char)
-        return "".join(output)
+        return text.translate(self._chinese_map)
+
+    def _chinese_char(self, char):
+        if self._is_chinese_char(ord(char)):
+            return u" " + char + u" "
+        return char
 
     def _is_chinese_char(self, cp):
         """Checks whether CP is the codepoint of a CJK character."""
@@ -258,25 +329,44 @@ class BasicTokenizer(object):
 
     def _clean_text(self, text):
         """Performs invalid character removal and whitespace cleanup on text."""
-        output = []
-        for char in text:
-            cp = ord(char)
-            if cp == 0 or cp == 0xfffd or _is_control(char):
-                continue
-            if _is_whitespace(char):
-                output.append(" ")
-            else:
-                output.append(char)
-        return "".join(output)
+        return text.translate(self._clean_map)
+
+    def _clean_char(self, char):
+        cp = ord(char)
+        if cp == 0 or cp == 0xfffd or _is_control(char):
+            return None
+        if _is_whitespace(char):
+            return u" "
+        return char
 
 
 class WordpieceTokenizer(object):
     """Runs WordPiece tokenziation."""
 
-    def __init__(self, vocab, unk_token="[UNK]", max_input_chars_per_word=100):
+    def __init__(self,
+                 vocab,
+                 unk_token="[UNK]",
+                 max_input_chars_per_word=100,
+                 cache_size=100000):
         self.vocab = vocab
         self.unk_token = unk_token
         self.max_input_chars_per_word = max_input_chars_per_word
+        # prefix tries of the word pieces at the start of a word and of the
+        # "##" pieces inside a word, a node maps None to its word piece
+        self._word_trie = {}
+        self._suffix_trie = {}
+        for piece in vocab:
+            if piece:
+                self._add_to_trie(self._word_trie, piece, piece)
+            if piece.startswith("##") and len(piece) > 2:
+                self._add_to_trie(self._suffix_trie, piece[2:], piece)
+        self._match = _lru_memoize(self._match_word, cache_size)
+
+    def _add_to_trie(self, trie, chars, piece):
+        node = trie
+        for char in chars:
+            node = node.setdefault(char, {})
+        node[None] = piece
 
     def tokenize(self, text):
         """Tokenizes a piece of text into its word pieces.
@@ -300,36 +390,41 @@ class WordpieceTokenizer(object):
 
         output_tokens = []
         for token in whitespace_tokenize(text):
-            chars = list(token)
-            if len(chars) > self.max_input_chars_per_word:
-                output_tokens.append(self.unk_token)
-                continue
+            output_tokens.extend(self.tokenize_word(token))
+        return output_tokens
 
-            is_bad = False
-            start = 0
-            sub_tokens = []
-            while start < len(chars):
-                end = len(chars)
-                cur_substr = None
-                while start < end:
-                    substr = "".join(chars[start:end])
-                    if start > 0:
-                        substr = "##" + substr
-                    if substr in self.vocab:
-                        cur_substr = substr
-                        break
-                    end -= 1
-                if cur_substr is None:
-                    is_bad = True
+    def tokenize_word(self, token):
+        """Tokenizes a single token into its word pieces.
+
+        The word pieces of the most recently used tokens are memoized, so the
+        returned list is shared by the calls with the same token and must not
+        be mutated, copy it first to modify it."""
+        return self._match(token)
+
+    def _match_word(self, token):
+        if len(token) > self.max_input_chars_per_word:
+            return [self.unk_token]
+
+        sub_tokens = []
+        trie = self._word_trie
+        start = 0
+        while start < len(token):
+            # walk the trie for the longest word piece from start
+            node = trie
+            cur_substr = None
+            for i in range(start, len(token)):
+                node = node.get(token[i])
+                if node is None:
                     break
-                sub_tokens.append(cur_substr)
-                start = end
-
-            if is_bad:
-                output_tokens.append(self.unk_token)
-            else:
-                output_tokens.extend(sub_tokens)
-        return output_tokens
+                if None in node:
+                    cur_substr = node[None]
+                    end = i + 1
+            if cur_substr is None:
+                return [self.unk_token]
+            sub_tokens.append(cur_substr)
+            trie = self._suffix_trie
+            start = end
+        return sub_tokens
 
 
 def _is_whitespace(char):
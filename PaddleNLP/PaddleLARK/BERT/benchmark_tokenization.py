@@ -0,0 +1,186 @@
+#   Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compare the memoized trie tokenization of FullTokenizer with the former
+loops over characters and substrings, on a corpus of one text per line or
+on synthetic texts of the vocab words:
+
+    python benchmark_tokenization.py --vocab_path vocab.txt --corpus wiki.txt
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import io
+import bisect
+import time
+import random
+import argparse
+
+import tokenization
+
+
+
+def str2bool(v):
+    return v.lower() in ("true", "t", "1")
+
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('--vocab_path', type=str,
+                    default='data/demo_config/vocab.txt')
+parser.add_argument('--corpus', type=str, default=None)
+parser.add_argument('--do_lower_case', type=str2bool, default=True)
+parser.add_argument('--max_lines', type=int, default=100000)
+parser.add_argument('--batch_size', type=int, default=64)
+
+
+class LoopBasicTokenizer(tokenization.BasicTokenizer):
+    # the former BasicTokenizer, walking the characters of every text
+    def tokenize(self, text):
+        text = tokenization.convert_to_unicode(text)
+        text = self._clean_text(text)
+        text = self._tokenize_chinese_chars(text)
+        split_tokens = []
+        for token in tokenization.whitespace_tokenize(text):
+            if self.do_lower_case:
+                token = token.lower()
+                token = self._run_strip_accents(token)
+            split_tokens.extend(self._run_split_on_punc(token))
+        return tokenization.whitespace_tokenize(" ".join(split_tokens))
+
+    def _tokenize_chinese_chars(self, text):
+        output = []
+        for char in text:
+            if self._is_chinese_char(ord(char)):
+                output.extend([" ", char, " "])
+            else:
+                output.append(char)
+        return "".join(output)
+
+    def _clean_text(self, text):
+        output = []
+        for char in text:
+            cp = ord(char)
+            if cp == 0 or cp == 0xfffd or tokenization._is_control(char):
+                continue
+            if tokenization._is_whitespace(char):
+                output.append(" ")
+            else:
+                output.append(char)
+        return "".join(output)
+
+
+class LoopWordpieceTokenizer(tokenization.WordpieceTokenizer):
+    # the former WordpieceTokenizer, probing the vocab with every substring
+    def tokenize(self, text):
+        output_tokens = []
+        for token in tokenization.whitespace_tokenize(text):
+            chars = list(token)
+            if len(chars) > self.max_input_chars_per_word:
+                output_tokens.append(self.unk_token)
+                continue
+            is_bad = False
+            start = 0
+            sub_tokens = []
+            while start < len(chars):
+                end = len(chars)
+                cur_substr = None
+                while start < end:
+                    substr = "".join(chars[start:end])
+                    if start > 0:
+                        substr = "##" + substr
+                    if substr in self.vocab:
+                        cur_substr = substr
+                        break
+                    end -= 1
+                if cur_substr is None:
+                    is_bad = True
+                    break
+                sub_tokens.append(cur_substr)
+                start = end
+            if is_bad:
+                output_tokens.append(self.unk_token)
+            else:
+                output_tokens.extend(sub_tokens)
+        return output_tokens
+
+
+def loop_tokenize(basic_tokenizer, wordpiece_tokenizer, text):
+    split_tokens = []
+    for token in basic_tokenizer.tokenize(text):
+        split_tokens.extend(wordpiece_tokenizer.tokenize(token))
+    return split_tokens
+
+
+def synthetic_corpus(vocab, num_lines, seed=0):
+    # words of Zipf distributed frequencies, as words of natural texts
+    rng = random.Random(seed)
+    words = [w.lstrip("#") for w in vocab if not w.startswith("[")]
+    # accents, CJK, punctuation, whitespace and invalid characters
+    words += [u"Caf\u00e9", u"na\u00efve", u"\u4e2d\u6587", u"don't",
+              u"(x)", u"\u3000", u"\t", u"\ufffd", u"\x00"]
+    rng.shuffle(words)
+    cum_weights = []
+    total = 0.
+    for rank in range(1, len(words) + 1):
+        total += 1. / rank
+        cum_weights.append(total)
+
+    def choice():
+        return words[bisect.bisect(cum_weights, rng.random() * total)]
+
+    lines = []
+    for _ in range(num_lines):
+        num_words = rng.randint(5, 200)
+        lines.append(u" ".join(
+            choice() + choice() if rng.random() < 0.3 else choice()
+            for _ in range(num_words)))
+    return lines
+
+
+def measure(func, texts, batch_size):
+    start = time.time()
+    outputs = []
+    for i in range(0, len(texts), batch_size):
+        outputs.extend(func(texts[i:i + batch_size]))
+    return outputs, time.time() - start
+
+
+def main():
+    args = parser.parse_args()
+    tokenizer = tokenization.FullTokenizer(
+        vocab_file=args.vocab_path, do_lower_case=args.do_lower_case)
+    if args.corpus:
+        with io.open(args.corpus, encoding='utf8') as f:
+            texts = [line.strip() for _, line in zip(range(args.max_lines), f)]
+    else:
+        texts = synthetic_corpus(tokenizer.vocab, args.max_lines)
+
+    basic_tokenizer = LoopBasicTokenizer(do_lower_case=args.do_lower_case)
+    wordpiece_tokenizer = LoopWordpieceTokenizer(vocab=tokenizer.vocab)
+    loop_tokens, loop_time = measure(
+        lambda batch: [loop_tokenize(basic_tokenizer, wordpiece_tokenizer, text)
+                       for text in batch], texts, args.batch_size)
+    tokens, batch_time = measure(tokenizer.tokenize_batch, texts,
+                                 args.batch_size)
+    mismatches = sum(a != b for a, b in zip(loop_tokens, tokens))
+    num_tokens = sum(len(t) for t in tokens)
+    print("{} texts, {} tokens: loop {:.0f} tokens/sec, memoized trie {:.0f} "
+          "tokens/sec, mismatched texts {}".format(
+              len(texts), num_tokens, num_tokens / loop_time,
+              num_tokens / batch_time, mismatches))
+
+
+if __name__ == '__main__':
+    main()
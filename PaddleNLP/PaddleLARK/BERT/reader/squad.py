@@ -15,14 +15,24 @@
 """Run BERT on SQuAD 1.1 and SQuAD 2.0."""
 
 import io
+import os
 import six
 import math
 import json
+import time
 import random
+import shutil
+import hashlib
+import functools
 import collections
+import multiprocessing
+import numpy as np
 import tokenization
 from batching import prepare_batch_data
 
+# bump when the layout or the content of the cached features changes
+FEATURE_CACHE_VERSION = 1
+
 
 class SquadExample(object):
     """A single training/test example for simple sequence classification.
@@ -185,159 +195,156 @@ def convert_examples_to_features(
         max_query_length,
         is_training,
         #output_fn
-):
-    """Loads a data file into a list of `InputBatch`s."""
+        pool=None):
+    """Loads a data file into a list of `InputBatch`s. The examples are
+    converted by the worker processes of pool if given, see
+    DataProcessor."""
+
+    if pool is None:
+        example_features = (convert_example_to_features(
+            example, tokenizer, max_seq_length, doc_stride, max_query_length,
+            is_training) for example in examples)
+    else:
+        example_features = pool.imap(
+            functools.partial(
+                _convert_example_in_worker,
+                max_seq_length=max_seq_length,
+                doc_stride=doc_stride,
+                max_query_length=max_query_length,
+                is_training=is_training),
+            examples,
+            chunksize=64)
 
     unique_id = 1000000000
 
-    for (example_index, example) in enumerate(examples):
-        query_tokens = tokenizer.tokenize(example.question_text)
+    for (example_index, features) in enumerate(example_features):
+        for feature in features:
+            feature.unique_id = unique_id
+            feature.example_index = example_index
+            if example_index < 3:
+                _print_feature(feature, is_training)
 
-        if len(query_tokens) > max_query_length:
-            query_tokens = query_tokens[0:max_query_length]
+            unique_id += 1
 
-        tok_to_orig_index = []
-        orig_to_tok_index = []
-        all_doc_tokens = []
-        for (i, token) in enumerate(example.doc_tokens):
-            orig_to_tok_index.append(len(all_doc_tokens))
-            sub_tokens = tokenizer.tokenize(token)
-            for sub_token in sub_tokens:
-                tok_to_orig_index.append(i)
-                all_doc_tokens.append(sub_token)
+            yield feature
 
-        tok_start_position = None
-        tok_end_position = None
-        if is_training and example.is_impossible:
-            tok_start_position = -1
-            tok_end_position = -1
-        if is_training and not example.is_impossible:
-            tok_start_position = orig_to_tok_index[example.start_position]
-            if example.end_position < len(example.doc_tokens) - 1:
-                tok_end_position = orig_to_tok_index[example.end_position +
-                                                     1] - 1
-            else:
-                tok_end_position = len(all_doc_tokens) - 1
-            (tok_start_position, tok_end_position) = _improve_answer_span(
-                all_doc_tokens, tok_start_position, tok_end_position, tokenizer,
-                example.orig_answer_text)
-
-        # The -3 accounts for [CLS], [SEP] and [SEP]
-        max_tokens_for_doc = max_seq_length - len(query_tokens) - 3
-
-        # We can have documents that are longer than the maximum sequence length.
-        # To deal with this we do a sliding window approach, where we take chunks
-        # of the up to our max length with a stride of `doc_stride`.
-        _DocSpan = collections.namedtuple(  # pylint: disable=invalid-name
-            "DocSpan", ["start", "length"])
-        doc_spans = []
-        start_offset = 0
-        while start_offset < len(all_doc_tokens):
-            length = len(all_doc_tokens) - start_offset
-            if length > max_tokens_for_doc:
-                length = max_tokens_for_doc
-            doc_spans.append(_DocSpan(start=start_offset, length=length))
-            if start_offset + length == len(all_doc_tokens):
-                break
-            start_offset += min(length, doc_stride)
-
-        for (doc_span_index, doc_span) in enumerate(doc_spans):
-            tokens = []
-            token_to_orig_map = {}
-            token_is_max_context = {}
-            segment_ids = []
-            tokens.append("[CLS]")
-            segment_ids.append(0)
-            for token in query_tokens:
-                tokens.append(token)
-                segment_ids.append(0)
-            tokens.append("[SEP]")
-            segment_ids.append(0)
 
-            for i in range(doc_span.length):
-                split_token_index = doc_span.start + i
-                token_to_orig_map[len(tokens)] = tok_to_orig_index[
-                    split_token_index]
-
-                is_max_context = _check_is_max_context(
-                    doc_spans, doc_span_index, split_token_index)
-                token_is_max_context[len(tokens)] = is_max_context
-                tokens.append(all_doc_tokens[split_token_index])
-                segment_ids.append(1)
-            tokens.append("[SEP]")
+def convert_example_to_features(example, tokenizer, max_seq_length,
+                                doc_stride, max_query_length, is_training):
+    """Converts an example into the features of its doc spans, whose
+    unique_id and example_index are left to convert_examples_to_features."""
+    query_tokens = tokenizer.tokenize(example.question_text)
+
+    if len(query_tokens) > max_query_length:
+        query_tokens = query_tokens[0:max_query_length]
+
+    tok_to_orig_index = []
+    orig_to_tok_index = []
+    all_doc_tokens = []
+    for (i, token) in enumerate(example.doc_tokens):
+        orig_to_tok_index.append(len(all_doc_tokens))
+        sub_tokens = tokenizer.tokenize(token)
+        for sub_token in sub_tokens:
+            tok_to_orig_index.append(i)
+            all_doc_tokens.append(sub_token)
+
+    tok_start_position = None
+    tok_end_position = None
+    if is_training and example.is_impossible:
+        tok_start_position = -1
+        tok_end_position = -1
+    if is_training and not example.is_impossible:
+        tok_start_position = orig_to_tok_index[example.start_position]
+        if example.end_position < len(example.doc_tokens) - 1:
+            tok_end_position = orig_to_tok_index[example.end_position + 1] - 1
+        else:
+            tok_end_position = len(all_doc_tokens) - 1
+        (tok_start_position, tok_end_position) = _improve_answer_span(
+            all_doc_tokens, tok_start_position, tok_end_position, tokenizer,
+            example.orig_answer_text)
+
+    # The -3 accounts for [CLS], [SEP] and [SEP]
+    max_tokens_for_doc = max_seq_length - len(query_tokens) - 3
+
+    # We can have documents that are longer than the maximum sequence length.
+    # To deal with this we do a sliding window approach, where we take chunks
+    # of the up to our max length with a stride of `doc_stride`.
+    _DocSpan = collections.namedtuple(  # pylint: disable=invalid-name
+        "DocSpan", ["start", "length"])
+    doc_spans = []
+    start_offset = 0
+    while start_offset < len(all_doc_tokens):
+        length = len(all_doc_tokens) - start_offset
+        if length > max_tokens_for_doc:
+            length = max_tokens_for_doc
+        doc_spans.append(_DocSpan(start=start_offset, length=length))
+        if start_offset + length == len(all_doc_tokens):
+            break
+        start_offset += min(length, doc_stride)
+
+    max_context_spans = _max_context_span_indexes(doc_spans,
+                                                  len(all_doc_tokens))
+
+    features = []
+    for (doc_span_index, doc_span) in enumerate(doc_spans):
+        tokens = []
+        token_to_orig_map = {}
+        token_is_max_context = {}
+        segment_ids = []
+        tokens.append("[CLS]")
+        segment_ids.append(0)
+        for token in query_tokens:
+            tokens.append(token)
+            segment_ids.append(0)
+        tokens.append("[SEP]")
+        segment_ids.append(0)
+
+        for i in range(doc_span.length):
+            split_token_index = doc_span.start + i
+            token_to_orig_map[len(tokens)] = tok_to_orig_index[
+                split_token_index]
+
+            is_max_context = (
+                max_context_spans[split_token_index] == doc_span_index)
+            token_is_max_context[len(tokens)] = is_max_context
+            tokens.append(all_doc_tokens[split_token_index])
             segment_ids.append(1)
+        tokens.append("[SEP]")
+        segment_ids.append(1)
 
-            input_ids = tokenizer.convert_tokens_to_ids(tokens)
-
-            # The mask has 1 for real tokens and 0 for padding tokens. Only real
-            # tokens are attended to.
-            input_mask = [1] * len(input_ids)
-
-            # Zero-pad up to the sequence length.
-            #while len(input_ids) < max_seq_length:
-            #  input_ids.append(0)
-            #  input_mask.append(0)
-            #  segment_ids.append(0)
-
-            #assert len(input_ids) == max_seq_length
-            #assert len(input_mask) == max_seq_length
-            #assert len(segment_ids) == max_seq_length
-
-            start_position = None
-            end_position = None
-            if is_training and not example.is_impossible:
-                # For training, if our document chunk does not contain an annotation
-                # we throw it out, since there is nothing to predict.
-                doc_start = doc_span.start
-                doc_end = doc_span.start + doc_span.length - 1
-                out_of_span = False
-                if not (tok_start_position >= doc_start and
-                        tok_end_position <= doc_end):
-                    out_of_span = True
-                if out_of_span:
-                    start_position = 0
-                    end_position = 0
-                else:
-                    doc_offset = len(query_tokens) + 2
-                    start_position = tok_start_position - doc_start + doc_offset
-                    end_position = tok_end_position - doc_start + doc_offset
+        input_ids = tokenizer.convert_tokens_to_ids(tokens)
+
+        # The mask has 1 for real tokens and 0 for padding tokens. Only real
+        # tokens are attended to.
+        input_mask = [1] * len(input_ids)
 
-            if is_training and example.is_impossible:
+        start_position = None
+        end_position = None
+        if is_training and not example.is_impossible:
+            # For training, if our document chunk does not contain an annotation
+            # we throw it out, since there is nothing to predict.
+            doc_start = doc_span.start
+            doc_end = doc_span.start + doc_span.length - 1
+            out_of_span = False
+            if not (tok_start_position >= doc_start and
+                    tok_end_position <= doc_end):
+                out_of_span = True
+            if out_of_span:
                 start_position = 0
                 end_position = 0
+            else:
+                doc_offset = len(query_tokens) + 2
+                start_position = tok_start_position - doc_start + doc_offset
+                end_position = tok_end_position - doc_start + doc_offset
 
-            if example_index < 3:
-                print("*** Example ***")
-                print("unique_id: %s" % (unique_id))
-                print("example_index: %s" % (example_index))
-                print("doc_span_index: %s" % (doc_span_index))
-                print("tokens: %s" % " ".join(
-                    [tokenization.printable_text(x) for x in tokens]))
-                print("token_to_orig_map: %s" % " ".join([
-                    "%d:%d" % (x, y)
-                    for (x, y) in six.iteritems(token_to_orig_map)
-                ]))
-                print("token_is_max_context: %s" % " ".join([
-                    "%d:%s" % (x, y)
-                    for (x, y) in six.iteritems(token_is_max_context)
-                ]))
-                print("input_ids: %s" % " ".join([str(x) for x in input_ids]))
-                print("input_mask: %s" % " ".join([str(x) for x in input_mask]))
-                print("segment_ids: %s" %
-                      " ".join([str(x) for x in segment_ids]))
-                if is_training and example.is_impossible:
-                    print("impossible example")
-                if is_training and not example.is_impossible:
-                    answer_text = " ".join(tokens[start_position:(end_position +
-                                                                  1)])
-                    print("start_position: %d" % (start_position))
-                    print("end_position: %d" % (end_position))
-                    print("answer: %s" %
-                          (tokenization.printable_text(answer_text)))
-
-            feature = InputFeatures(
-                unique_id=unique_id,
-                example_index=example_index,
+        if is_training and example.is_impossible:
+            start_position = 0
+            end_position = 0
+
+        features.append(
+            InputFeatures(
+                unique_id=None,
+                example_index=None,
                 doc_span_index=doc_span_index,
                 tokens=tokens,
                 token_to_orig_map=token_to_orig_map,
@@ -347,11 +354,52 @@ def convert_examples_to_features(
                 segment_ids=segment_ids,
                 start_position=start_position,
                 end_position=end_position,
-                is_impossible=example.is_impossible)
-
-            unique_id += 1
-
-            yield feature
+                is_impossible=example.is_impossible))
+    return features
+
+
+def _print_feature(feature, is_training):
+    print("*** Example ***")
+    print("unique_id: %s" % (feature.unique_id))
+    print("example_index: %s" % (feature.example_index))
+    print("doc_span_index: %s" % (feature.doc_span_index))
+    print("tokens: %s" % " ".join(
+        [tokenization.printable_text(x) for x in feature.tokens]))
+    print("token_to_orig_map: %s" % " ".join([
+        "%d:%d" % (x, y) for (x, y) in six.iteritems(feature.token_to_orig_map)
+    ]))
+    print("token_is_max_context: %s" % " ".join([
+        "%d:%s" % (x, y)
+        for (x, y) in six.iteritems(feature.token_is_max_context)
+    ]))
+    print("input_ids: %s" % " ".join([str(x) for x in feature.input_ids]))
+    print("input_mask: %s" % " ".join([str(x) for x in feature.input_mask]))
+    print("segment_ids: %s" % " ".join([str(x) for x in feature.segment_ids]))
+    if is_training and feature.is_impossible:
+        print("impossible example")
+    if is_training and not feature.is_impossible:
+        answer_text = " ".join(feature.tokens[feature.start_position:(
+            feature.end_position + 1)])
+        print("start_position: %d" % (feature.start_position))
+        print("end_position: %d" % (feature.end_position))
+        print("answer: %s" % (tokenization.printable_text(answer_text)))
+
+
+# the tokenizer of a worker process of DataProcessor
+_worker_tokenizer = None
+
+
+def _init_worker(vocab_path, do_lower_case):
+    global _worker_tokenizer
+    _worker_tokenizer = tokenization.FullTokenizer(
+        vocab_file=vocab_path, do_lower_case=do_lower_case)
+
+
+def _convert_example_in_worker(example, max_seq_length, doc_stride,
+                               max_query_length, is_training):
+    return convert_example_to_features(example, _worker_tokenizer,
+                                       max_seq_length, doc_stride,
+                                       max_query_length, is_training)
 
 
 def _improve_answer_span(doc_tokens, input_start, input_end, tokenizer,
@@ -380,19 +428,23 @@ def _improve_answer_span(doc_tokens, input_start, input_end, tokenizer,
     # the word "Japanese". Since our WordPiece tokenizer does not split
     # "Japanese", we just use "Japanese" as the annotation. This is fairly rare
     # in SQuAD, but does happen.
-    tok_answer_text = " ".join(tokenizer.tokenize(orig_answer_text))
-
-    for new_start in range(input_start, input_end + 1):
-        for new_end in range(input_end, new_start - 1, -1):
-            text_span = " ".join(doc_tokens[new_start:(new_end + 1)])
-            if text_span == tok_answer_text:
+    tok_answer_tokens = tokenizer.tokenize(orig_answer_text)
+
+    # Word pieces have no whitespace, so only the spans of as many tokens as
+    # the answer can match its text, the first one from input_start is kept.
+    num_answer_tokens = len(tok_answer_tokens)
+    if num_answer_tokens > 0:
+        for new_start in range(input_start,
+                               input_end - num_answer_tokens + 2):
+            new_end = new_start + num_answer_tokens - 1
+            if doc_tokens[new_start:(new_end + 1)] == tok_answer_tokens:
                 return (new_start, new_end)
 
     return (input_start, input_end)
 
 
-def _check_is_max_context(doc_spans, cur_span_index, position):
-    """Check if this is the 'max context' doc span for the token."""
+def _max_context_span_indexes(doc_spans, num_tokens):
+    """Returns the index of the 'max context' doc span of every token."""
 
     # Because of the sliding window approach taken to scoring documents, a single
     # token can appear in multiple documents. E.g.
@@ -410,34 +462,130 @@ def _check_is_max_context(doc_spans, cur_span_index, position):
     # In the example the maximum context for 'bought' would be span C since
     # it has 1 left context and 3 right context, while span B has 4 left context
     # and 0 right context.
-    best_score = None
-    best_span_index = None
+    #
+    # The scores of every span are visited once, instead of all the spans for
+    # every token of every span.
+    best_scores = [None] * num_tokens
+    best_span_indexes = [None] * num_tokens
     for (span_index, doc_span) in enumerate(doc_spans):
         end = doc_span.start + doc_span.length - 1
-        if position < doc_span.start:
-            continue
-        if position > end:
-            continue
-        num_left_context = position - doc_span.start
-        num_right_context = end - position
-        score = min(num_left_context,
-                    num_right_context) + 0.01 * doc_span.length
-        if best_score is None or score > best_score:
-            best_score = score
-            best_span_index = span_index
+        for position in range(doc_span.start, end + 1):
+            num_left_context = position - doc_span.start
+            num_right_context = end - position
+            score = min(num_left_context,
+                        num_right_context) + 0.01 * doc_span.length
+            if best_scores[position] is None or score > best_scores[position]:
+                best_scores[position] = score
+                best_span_indexes[position] = span_index
+
+    return best_span_indexes
+
+
+def _lod(lengths):
+    lod = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=lod[1:])
+    return lod
+
+
+class CachedFeatures(object):
+    """The features of the examples cached by DataProcessor, memory-mapped
+    so that the pages are shared and only read when used. The features of
+    an example are looked up by its qas_id and built when they are read.
+    """
+
+    def __init__(self, cache_path, inv_vocab):
+        self.inv_vocab = inv_vocab
+        self.arrays = {}
+        for name in os.listdir(cache_path):
+            if name.endswith('.npy'):
+                self.arrays[name[:-4]] = np.load(
+                    os.path.join(cache_path, name), mmap_mode='r')
+        self.example_ids = dict(
+            (qas_id, i) for i, qas_id in enumerate(self.arrays['qas_id']))
+
+    def has_examples(self, examples):
+        return all(example.qas_id in self.example_ids for example in examples)
+
+    def example_features(self, example, is_training):
+        """The features of example, whose unique_id and example_index are
+        left to get_features."""
+        a = self.arrays
+        i = self.example_ids[example.qas_id]
+        feature_start, feature_end = a['example_lod'][i:i + 2]
+        token_lod = a['token_lod'][feature_start:feature_end + 1].tolist()
+        # read the tokens of all the features of the example at once
+        token_start = token_lod[0]
+        token_lod = [k - token_start for k in token_lod]
+        all_input_ids = a['input_ids'][token_start:token_lod[-1] +
+                                       token_start].tolist()
+        all_token_to_orig = a['token_to_orig'][token_start:token_lod[-1] +
+                                               token_start].tolist()
+        all_is_max_context = a['is_max_context'][token_start:token_lod[-1] +
+                                                 token_start].tolist()
+        features = []
+        for j in range(feature_end - feature_start):
+            start, end = token_lod[j:j + 2]
+            input_ids = all_input_ids[start:end]
+            doc_start = int(a['doc_start'][feature_start + j])
+            # the doc tokens are between the first [SEP] and the last [SEP]
+            doc_positions = range(doc_start, len(input_ids) - 1)
+            features.append(
+                InputFeatures(
+                    unique_id=None,
+                    example_index=None,
+                    doc_span_index=int(a['doc_span_index'][feature_start + j]),
+                    tokens=list(map(self.inv_vocab.__getitem__, input_ids)),
+                    token_to_orig_map=dict(
+                        zip(doc_positions, all_token_to_orig[start + doc_start:
+                                                             end - 1])),
+                    token_is_max_context=dict(
+                        zip(doc_positions, all_is_max_context[start + doc_start:
+                                                              end - 1])),
+                    input_ids=input_ids,
+                    input_mask=[1] * len(input_ids),
+                    segment_ids=[0] * doc_start + [1] *
+                    (len(input_ids) - doc_start),
+                    start_position=int(a['start_position'][feature_start + j])
+                    if is_training else None,
+                    end_position=int(a['end_position'][feature_start + j])
+                    if is_training else None,
+                    is_impossible=example.is_impossible))
+        return features
 
-    return cur_span_index == best_span_index
+    def get_features(self, examples, is_training):
+        unique_id = 1000000000
+        for (example_index, example) in enumerate(examples):
+            for feature in self.example_features(example, is_training):
+                feature.unique_id = unique_id
+                feature.example_index = example_index
+                unique_id += 1
+                yield feature
 
 
 class DataProcessor(object):
-    def __init__(self, vocab_path, do_lower_case, max_seq_length, in_tokens,
-                 doc_stride, max_query_length):
+    def __init__(self,
+                 vocab_path,
+                 do_lower_case,
+                 max_seq_length,
+                 in_tokens,
+                 doc_stride,
+                 max_query_length,
+                 num_workers=1,
+                 feature_cache_dir=None):
+        """The features are converted by num_workers processes, and cached
+        in feature_cache_dir if given, see _get_cached_features."""
         self._tokenizer = tokenization.FullTokenizer(
             vocab_file=vocab_path, do_lower_case=do_lower_case)
+        self._vocab_path = vocab_path
+        self._do_lower_case = do_lower_case
         self._max_seq_length = max_seq_length
         self._doc_stride = doc_stride
         self._max_query_length = max_query_length
         self._in_tokens = in_tokens
+        self._num_workers = num_workers
+        self._feature_cache_dir = feature_cache_dir
+        # the cached features of the train and predict examples
+        self._cached_features = {}
 
         self.vocab = self._tokenizer.vocab
         self.vocab_size = len(self.vocab)
@@ -466,6 +614,15 @@ class DataProcessor(object):
             input_file=data_path,
             is_training=is_training,
             version_2_with_negative=version_2_with_negative)
+        self._cached_features.pop(is_training, None)
+        if self._feature_cache_dir:
+            try:
+                cached_features = self._get_cached_features(
+                    data_path, examples, is_training, version_2_with_negative)
+                self._cached_features[is_training] = cached_features
+            except (IOError, OSError) as e:
+                print('Failed to cache features in {}: {}'.format(
+                    self._feature_cache_dir, e))
         return examples
 
     def get_num_examples(self, phase):
@@ -475,6 +632,12 @@ class DataProcessor(object):
         return self.num_examples[phase]
 
     def get_features(self, examples, is_training):
+        cached_features = self._cached_features.get(is_training)
+        if cached_features is not None and cached_features.has_examples(
+                examples):
+            return cached_features.get_features(examples, is_training)
+        if self._num_workers > 1:
+            return self._convert_in_pool(examples, is_training)
         features = convert_examples_to_features(
             examples=examples,
             tokenizer=self._tokenizer,
@@ -484,6 +647,110 @@ class DataProcessor(object):
             is_training=is_training)
         return features
 
+    def _convert_in_pool(self, examples, is_training):
+        pool = multiprocessing.Pool(
+            self._num_workers,
+            initializer=_init_worker,
+            initargs=(self._vocab_path, self._do_lower_case))
+        try:
+            for feature in convert_examples_to_features(
+                    examples=examples,
+                    tokenizer=self._tokenizer,
+                    max_seq_length=self._max_seq_length,
+                    doc_stride=self._doc_stride,
+                    max_query_length=self._max_query_length,
+                    is_training=is_training,
+                    pool=pool):
+                yield feature
+        finally:
+            pool.terminate()
+
+    def _feature_cache_path(self, data_path, is_training,
+                            version_2_with_negative):
+        """The cache of the features of data_path, keyed by the md5 of the
+        data file, the vocab and the options the features depend on.
+        """
+        md5 = hashlib.md5()
+        for path in (data_path, self._vocab_path):
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    md5.update(chunk)
+        md5.update('{} {} {} {} {} {} {}'.format(
+            FEATURE_CACHE_VERSION, self._do_lower_case, self._max_seq_length,
+            self._doc_stride, self._max_query_length, is_training,
+            version_2_with_negative).encode('utf-8'))
+        return os.path.join(self._feature_cache_dir, '{}_{}'.format(
+            os.path.splitext(os.path.basename(data_path))[0],
+            md5.hexdigest()))
+
+    def _get_cached_features(self, data_path, examples, is_training,
+                             version_2_with_negative):
+        """Load the features cached for data_path, which are converted from
+        examples if they are not cached yet. Returns None if the qas_id of
+        the examples are not unique.
+        """
+        if len(set(example.qas_id for example in examples)) != len(examples):
+            print('Not caching the features of {}, whose qas_id are not '
+                  'unique'.format(data_path))
+            return None
+        cache_path = self._feature_cache_path(data_path, is_training,
+                                              version_2_with_negative)
+        if not os.path.isdir(cache_path):
+            if not os.path.isdir(self._feature_cache_dir):
+                os.makedirs(self._feature_cache_dir)
+            start_time = time.time()
+            self._write_feature_cache(
+                cache_path, examples,
+                list(self.get_features(examples, is_training)))
+            print('Cached features in {} in {:.3f}s'.format(
+                cache_path, time.time() - start_time))
+        return CachedFeatures(cache_path, self._tokenizer.inv_vocab)
+
+    def _write_feature_cache(self, cache_path, examples, features):
+        """Write the features of examples as packed arrays into a temporary
+        directory renamed to cache_path, so that a partial cache is never
+        loaded. The arrays of the tokens of all features are flattened with
+        token_lod, the tokens are kept as their ids.
+        """
+        tmp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+        if os.path.isdir(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+        num_features = [0] * len(examples)
+        for feature in features:
+            num_features[feature.example_index] += 1
+        token_to_orig = np.full(
+            sum(len(f.input_ids) for f in features), -1, dtype=np.int32)
+        is_max_context = np.zeros(len(token_to_orig), dtype=np.bool_)
+        token_lod = _lod([len(f.input_ids) for f in features])
+        for (feature, start) in zip(features, token_lod):
+            for (k, v) in six.iteritems(feature.token_to_orig_map):
+                token_to_orig[start + k] = v
+            for (k, v) in six.iteritems(feature.token_is_max_context):
+                is_max_context[start + k] = v
+        arrays = {
+            'qas_id': np.array([example.qas_id for example in examples]),
+            'example_lod': _lod(num_features),
+            'token_lod': token_lod,
+            'input_ids': np.array(
+                [i for f in features for i in f.input_ids], dtype=np.int32),
+            'doc_start': np.array(
+                [f.segment_ids.index(1) for f in features], dtype=np.int32),
+            'token_to_orig': token_to_orig,
+            'is_max_context': is_max_context,
+            'doc_span_index': np.array(
+                [f.doc_span_index for f in features], dtype=np.int32),
+            'start_position': np.array(
+                [-1 if f.start_position is None else f.start_position
+                 for f in features], dtype=np.int32),
+            'end_position': np.array(
+                [-1 if f.end_position is None else f.end_position
+                 for f in features], dtype=np.int32),
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_path, name + '.npy'), array)
+        os.rename(tmp_path, cache_path)
+
     def data_generator(self,
                        data_path,
                        batch_size,
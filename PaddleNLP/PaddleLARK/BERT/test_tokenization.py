@@ -0,0 +1,110 @@
+#   Copyright (c) 2019 PaddlePaddle Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Check the memoized trie tokenization of FullTokenizer against the former
+loops over characters and substrings:
+
+    python -m unittest test_tokenization
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import tokenization
+from benchmark_tokenization import LoopBasicTokenizer, \
+        LoopWordpieceTokenizer, loop_tokenize, synthetic_corpus
+
+VOCAB = [
+    u"[PAD]", u"[UNK]", u"[CLS]", u"[SEP]", u"the", u"The", u"un", u"##aff",
+    u"##able", u"affable", u"run", u"##ning", u"##s", u"a", u"##a", u"cafe",
+    u"caf", u"##\u00e9", u"Caf", u"na", u"##ive", u"##\u00efve", u"\u4e2d",
+    u"\u6587", u"don", u"'", u"t", u"(", u")", u"x", u",", u".", u"!", u"1",
+    u"##2", u"12"
+]
+
+TEXTS = [
+    u"The unaffable cafe, running!",
+    # accents, stripped when lower casing
+    u"Caf\u00e9 na\u00efve CAF\u00c9 NA\u00cfVE",
+    # CJK characters are split from the words around them
+    u"the\u4e2d\u6587cafe \u4e2d \u6587\u4e2d",
+    # control characters, invalid characters and whitespace
+    u"the\x00cafe\ufffd\tun\u200baffable\r\nrun\x07s \u3000a",
+    # words with no word pieces in vocab
+    u"zebra unzebra theq \u65e5\u672c",
+    u"don't (x) 12, 123.",
+    u"",
+    u"   ",
+]
+
+
+class TestTokenization(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.vocab_file = os.path.join(self.tmp_dir, 'vocab.txt')
+        with io.open(self.vocab_file, 'w', encoding='utf8') as f:
+            f.write(u"".join(token + u"\n" for token in VOCAB))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def check(self, texts, do_lower_case):
+        tokenizer = tokenization.FullTokenizer(
+            vocab_file=self.vocab_file, do_lower_case=do_lower_case)
+        basic_tokenizer = LoopBasicTokenizer(do_lower_case=do_lower_case)
+        wordpiece_tokenizer = LoopWordpieceTokenizer(vocab=tokenizer.vocab)
+        expect = [
+            loop_tokenize(basic_tokenizer, wordpiece_tokenizer, text)
+            for text in texts
+        ]
+        self.assertEqual(tokenizer.tokenize_batch(texts), expect)
+        # again from the memoized words
+        self.assertEqual([tokenizer.tokenize(text) for text in texts], expect)
+        return expect
+
+    def test_texts(self):
+        for do_lower_case in [True, False]:
+            tokens = self.check(TEXTS, do_lower_case)
+            self.assertTrue(any(u"[UNK]" in t for t in tokens))
+
+    def test_lower_case(self):
+        text = [u"Caf\u00e9 NA\u00cfVE"]
+        self.assertEqual(
+            self.check(text, True), [[u"cafe", u"na", u"##ive"]])
+        self.assertEqual(
+            self.check(text, False), [[u"Caf", u"##\u00e9", u"[UNK]"]])
+
+    def test_long_words(self):
+        tokenizer = tokenization.FullTokenizer(vocab_file=self.vocab_file)
+        max_chars = tokenizer.wordpiece_tokenizer.max_input_chars_per_word
+        text = u" ".join([u"a" * max_chars, u"a" * (max_chars + 1)])
+        tokens = self.check([text], True)[0]
+        self.assertEqual(tokens[:max_chars], [u"a"] + [u"##a"] *
+                         (max_chars - 1))
+        self.assertEqual(tokens[max_chars:], [u"[UNK]"])
+
+    def test_synthetic_corpus(self):
+        texts = synthetic_corpus(VOCAB, 50, seed=1)
+        for do_lower_case in [True, False]:
+            self.check(texts, do_lower_case)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Batching of the features of concurrent requests, shared by the model servers"""
+import time
+import threading
+import numpy as np
+try:
+    from Queue import Queue, Empty
+except ImportError:
+    from queue import Queue, Empty
+
+
+class _PendingBatch(object):
+    """Features of a request waiting in the BatchScheduler"""
+    def __init__(self, batch):
+        self.batch = batch
+        self.size = len(batch[0])
+        # the padded sequence length of the features
+        self.seq_len = batch[0].shape[1] if batch[0].ndim > 1 else 0
+        self.enqueue_time = time.time()
+        self.results = None
+        self.error = None
+        self.done = threading.Event()
+
+    def result(self):
+        """Wait for the mrc results of the features, one per feature"""
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.results
+
+
+def _pad_concatenate(arrays):
+    """Concatenate the arrays of the features, zero padding the sequences
+    (axis 1) to the longest one. The padded positions are masked out by the
+    input mask, as the padding of the readers."""
+    max_len = max(a.shape[1] if a.ndim > 1 else 0 for a in arrays)
+    padded = []
+    for a in arrays:
+        if a.ndim > 1 and a.shape[1] < max_len:
+            pad_width = [(0, 0)] * a.ndim
+            pad_width[1] = (0, max_len - a.shape[1])
+            a = np.pad(a, pad_width, 'constant')
+        padded.append(a)
+    return np.concatenate(padded)
+
+
+class BatchScheduler(object):
+    """Batch the features of concurrent requests for model.call_mrc
+
+    The requests submit their batches of features, a thread concatenates
+    the queued batches into a batch of at most max_batch_size features,
+    waiting at most max_wait_time seconds for more features after the
+    first one, runs call_mrc and routes the results back to the requests.
+    The features of different lengths are padded to the longest one, and
+    the seq_keys of their results are cut back to their own lengths.
+    """
+    def __init__(self, call_mrc, max_batch_size=16, max_wait_time=0.005,
+                 seq_keys=('start_logits', 'end_logits')):
+        """ """
+        self.call_mrc = call_mrc
+        self.max_batch_size = max_batch_size
+        self.max_wait_time = max_wait_time
+        self.seq_keys = seq_keys
+        self._queue = Queue()
+        self._carry = None
+        self._lock = threading.Lock()
+        self._stats = {'queued': 0, 'batches': 0, 'features': 0,
+                       'queue_time': 0., 'run_time': 0.}
+        self._start_time = time.time()
+        self._thread = threading.Thread(target=self._loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, batch):
+        """Queue a batch of features, a list of arrays with a row per feature"""
+        pending = _PendingBatch(batch)
+        self._queue.put(pending)
+        return pending
+
+    def stats(self):
+        """Throughput and latency of the batches run so far"""
+        with self._lock:
+            stats = dict(self._stats)
+        batches = max(stats['batches'], 1)
+        return {
+            'queued': stats['queued'],
+            'batches': stats['batches'],
+            'features': stats['features'],
+            'mean_batch_size': float(stats['features']) / batches,
+            'mean_queue_time_ms': stats['queue_time'] * 1000 / max(stats['queued'], 1),
+            'mean_run_time_ms': stats['run_time'] * 1000 / batches,
+            'features_per_sec': stats['features'] / max(time.time() - self._start_time, 1e-6),
+        }
+
+    def _compatible(self, first, pending):
+        # the features may differ in their sequence lengths (axis 1) only
+        return len(first.batch) == len(pending.batch) and all(
+            a.ndim == b.ndim and a.shape[2:] == b.shape[2:]
+            for a, b in zip(first.batch, pending.batch))
+
+    def _next_batches(self):
+        if self._carry is not None:
+            first, self._carry = self._carry, None
+        else:
+            first = self._queue.get()
+        batches = [first]
+        size = first.size
+        deadline = time.time() + self.max_wait_time
+        while size < self.max_batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                pending = self._queue.get(timeout=remaining)
+            except Empty:
+                break
+            if size + pending.size > self.max_batch_size or \
+                    not self._compatible(first, pending):
+                self._carry = pending
+                break
+            batches.append(pending)
+            size += pending.size
+        return batches
+
+    def _split_results(self, batches, results):
+        max_len = max(b.seq_len for b in batches)
+        offset = 0
+        for pending in batches:
+            pending.results = results[offset:offset + pending.size]
+            offset += pending.size
+            if pending.seq_len < max_len:
+                pending.results = [self._cut(r, pending.seq_len) for r in pending.results]
+
+    def _cut(self, result, seq_len):
+        result = dict(result)
+        for key in self.seq_keys:
+            if key in result:
+                result[key] = result[key][:seq_len]
+        return result
+
+    def _loop(self):
+        while True:
+            batches = self._next_batches()
+            start = time.time()
+            try:
+                if len(batches) == 1:
+                    feed = batches[0].batch
+                else:
+                    feed = [_pad_concatenate(arrays) for arrays in zip(*[b.batch for b in batches])]
+                results = self.call_mrc(feed, return_list=True)
+                self._split_results(batches, results)
+            except Exception as e:
+                for pending in batches:
+                    pending.error = e
+            end = time.time()
+            with self._lock:
+                self._stats['queued'] += len(batches)
+                self._stats['batches'] += 1
+                self._stats['features'] += sum(b.size for b in batches)
+                self._stats['queue_time'] += sum(start - b.enqueue_time for b in batches)
+                self._stats['run_time'] += end - start
+            for pending in batches:
+                pending.done.set()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""LRU cache of the tokenized contexts of MRC requests, shared by the model servers"""
+import hashlib
+import threading
+import collections
+
+
+class ContextCache(object):
+    """Cache the tokenization of contexts, keyed by the md5 of the context
+    text, so that the questions about the same context only tokenize the
+    questions. The least recently used contexts are evicted when the cached
+    contexts hold more than max_tokens tokens.
+    """
+    def __init__(self, max_tokens=2000000):
+        """ """
+        self.max_tokens = max_tokens
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._tokens = 0
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, text, build):
+        """Get the cached value of text, or cache the value of build(), which
+        returns the value and its number of tokens"""
+        key = hashlib.md5(text if isinstance(text, bytes) else text.encode('utf-8')).hexdigest()
+        with self._lock:
+            if key in self._entries:
+                self._hits += 1
+                # move to the most recently used end
+                entry = self._entries.pop(key)
+                self._entries[key] = entry
+                return entry[0]
+            self._misses += 1
+        value, num_tokens = build()
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (value, num_tokens)
+                self._tokens += num_tokens
+            while self._tokens > self.max_tokens and len(self._entries) > 1:
+                _, (_, evicted_tokens) = self._entries.popitem(last=False)
+                self._tokens -= evicted_tokens
+        return value
+
+    def stats(self):
+        """Hit rate and size of the cache"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': float(self._hits) / lookups if lookups else 0.,
+                'contexts': len(self._entries),
+                'tokens': self._tokens,
+            }
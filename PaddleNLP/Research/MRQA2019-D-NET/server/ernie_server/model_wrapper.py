@@ -25,6 +25,8 @@ do_lower_case = True
 doc_stride = 128
 n_best_size = 20
 use_cuda = True
+# number of tokens of the contexts cached for the following questions
+context_cache_tokens = 2000000
 
 
 
@@ -50,11 +52,18 @@ class ERNIEModelWrapper():
             max_seq_length=max_seq_len,
             in_tokens=in_tokens,
             doc_stride=doc_stride,
-            max_query_length=max_query_length)
+            max_query_length=max_query_length,
+            context_cache_tokens=context_cache_tokens)
 
         self.inference_program, self.feed_target_names, self.fetch_targets = \
             fluid.io.load_inference_model(dirname=model_dir, executor=self.exe)
 
+    def context_cache_stats(self):
+        """Hit rate and size of the context cache"""
+        if self.bert_preprocessor.context_cache is None:
+            return {}
+        return self.bert_preprocessor.context_cache.stats()
+
     def preprocessor(self, samples, batch_size, examples_start_id, features_start_id):
         """Preprocess the input samples, including word seg, padding, token to ids"""
         # Tokenization and paragraph padding
@@ -8,7 +8,6 @@ import time
 import numpy as np
 from flask import Response
 from flask import request
-from copy import deepcopy
 
 verbose = False
 
@@ -41,23 +40,30 @@ def _split_input_json(input_json):
     if len(input_json['qas']) == 1:
         return [input_json]
     else:
+        # the questions share the context and tokens of the input
         rets = []
-        for i in range(len(input_json['qas'])):
-            temp = deepcopy(input_json)
-            temp['qas'] = [input_json['qas'][i]]
+        for qa in input_json['qas']:
+            temp = dict(input_json)
+            temp['qas'] = [qa]
             rets.append(temp)
         return rets
-            
+
+
 class BasicMRCService(object):
     """Provide basic MRC service for flask"""
-    def __init__(self, name, logger=None, log_data=False):
-        """ """
+    def __init__(self, name, logger=None, log_data=False, batch_scheduler=None):
+        """
+        Args:
+            batch_scheduler: a BatchScheduler batching the features of
+                concurrent requests, otherwise every request calls the model
+        """
         self.name = name
         if logger is None:
             self.logger = logging.getLogger('flask')
         else:
             self.logger = logger
         self.log_data = log_data
+        self.batch_scheduler = batch_scheduler
 
     def __call__(self, model, process_mode='serial', max_batch_size=5, timmer=False):
         """
@@ -67,22 +73,22 @@ class BasicMRCService(object):
         if timmer:
             start = time.time()
         """Call mrc model wrapper and handle expectations"""
-        self.input_json = request.get_json(silent=True)
+        input_json = request.get_json(silent=True)
         try:
             if timmer:
                 start_request_check = time.time()
-            request_status = _request_check(self.input_json)
+            request_status = _request_check(input_json)
             if timmer:
                 current_time = time.time()
                 _timmer(start, start_request_check, current_time, 'request check')
             if self.log_data:
                 if self.logger is None:
                     logging.info(
-                        'Client input - {}'.format(json.dumps(self.input_json, ensure_ascii=False))
+                        'Client input - {}'.format(json.dumps(input_json, ensure_ascii=False))
                     )
                 else:
                     self.logger.info(
-                        'Client input - {}'.format(json.dumps(self.input_json, ensure_ascii=False))
+                        'Client input - {}'.format(json.dumps(input_json, ensure_ascii=False))
                     )
         except Exception as e:
             self.logger.error('server request checker error')
@@ -96,7 +102,7 @@ class BasicMRCService(object):
             if timmer:
                 start_preprocess = time.time()
 
-            jsons = _split_input_json(self.input_json)
+            jsons = _split_input_json(input_json)
             processed = []
             ex_start_idx = 0
             feat_start_idx = 1000000000
@@ -122,26 +128,33 @@ class BasicMRCService(object):
             if timmer:
                 start_call_mrc = time.time()
 
-            self.mrc_results = []
-            self.examples = []
-            self.features = []
+            mrc_results = []
+            examples = []
+            features = []
+            pendings = []
             for e, f, batches in processed:
                 if verbose:
                     if len(f) > max_batch_size:
                         print("get a too long example....")
-                if process_mode == 'serial':
-                    self.mrc_results.extend([model.call_mrc(b, squeeze_dim0=True) for b in batches[:max_batch_size]])
+                if self.batch_scheduler is not None:
+                    # batched with the features of concurrent requests, the
+                    # features of all questions are queued before waiting
+                    pendings.extend(self.batch_scheduler.submit(b) for b in batches)
+                elif process_mode == 'serial':
+                    mrc_results.extend([model.call_mrc(b, squeeze_dim0=True) for b in batches[:max_batch_size]])
                 elif process_mode == 'parallel':
                     # only keep first max_batch_size features
                     # batches = batches[0]
 
                     for b in batches:
-                        self.mrc_results.extend(model.call_mrc(b, return_list=True))
+                        mrc_results.extend(model.call_mrc(b, return_list=True))
                 else:
                     raise NotImplementedError()
-                self.examples.extend(e)
-                # self.features.extend(f[:max_batch_size])
-                self.features.extend(f)
+                examples.extend(e)
+                # features.extend(f[:max_batch_size])
+                features.extend(f)
+            for pending in pendings:
+                mrc_results.extend(pending.result())
 
             if timmer:
                 current_time = time.time()
@@ -155,11 +168,11 @@ class BasicMRCService(object):
         try:
             if timmer:
                 start_post_precess = time.time()
-            self.results = model.postprocessor(self.examples, self.features, self.mrc_results)
+            results = model.postprocessor(examples, features, mrc_results)
 
             # only nbest results is POSTed back
-            self.results = self.results[1]
-            # self.results = self.results[0]
+            results = results[1]
+            # results = results[0]
 
             if timmer:
                 current_time = time.time()
@@ -169,14 +182,14 @@ class BasicMRCService(object):
             self.logger.exception(e)
             return _abort(500, 'postprocessor error - {}'.format(e))
 
-        return self._response_constructor()
+        return self._response_constructor(results)
 
-    def _response_constructor(self):
+    def _response_constructor(self, results):
         """construct http response object"""
         try:
             response = {
-                # 'requestID': self.input_json['requestID'],
-                'results': self.results
+                # 'requestID': input_json['requestID'],
+                'results': results
             }
             if self.log_data:
                 self.logger.info(
@@ -4,6 +4,7 @@
 ERNIE model service
 """
 import json
+import os
 import sys
 import logging
 logging.basicConfig(
@@ -14,19 +15,30 @@ from flask import Flask
 from flask import Response
 from flask import request
 import mrc_service
+# the batch scheduler and the context cache are shared by the model servers
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from batch_scheduler import BatchScheduler
 import model_wrapper as ernie_wrapper
 
-assert len(sys.argv) == 3 or len(sys.argv) == 4, "Usage: python serve.py <model_dir> <port> [process_mode]"
+assert len(sys.argv) == 3 or len(sys.argv) == 4, "Usage: python serve.py <model_dir> <port> [process_mode: dynamic, parallel, serial]"
 if len(sys.argv) == 3:
     _, model_dir, port = sys.argv
-    mode = 'parallel'
+    mode = 'dynamic'
 else:
     _, model_dir, port, mode = sys.argv
 
+# in the dynamic mode, the features of concurrent requests are batched in at
+# most dynamic_batch_size features, waiting at most dynamic_wait_time seconds
+dynamic_batch_size = 8
+dynamic_wait_time = 0.005
+
 app = Flask(__name__)
 app.logger.setLevel(logging.INFO)
 ernie_model = ernie_wrapper.ERNIEModelWrapper(model_dir=model_dir)
-server = mrc_service.BasicMRCService('Short answer MRC service', app.logger)
+batch_scheduler = None
+if mode == 'dynamic':
+    batch_scheduler = BatchScheduler(ernie_model.call_mrc, dynamic_batch_size, dynamic_wait_time)
+server = mrc_service.BasicMRCService('Short answer MRC service', app.logger, batch_scheduler=batch_scheduler)
 
 @app.route('/', methods=['POST'])
 def mrqa_service():
@@ -35,6 +47,17 @@ def mrqa_service():
     return server(model, process_mode=mode, max_batch_size=5)
 
 
+@app.route('/stats', methods=['GET'])
+def mrqa_stats():
+    """Throughput and latency of the batches of the dynamic mode, and the
+    hit rate of the context cache"""
+    stats = batch_scheduler.stats() if batch_scheduler is not None else {}
+    stats['context_cache'] = ernie_model.context_cache_stats()
+    return Response(json.dumps(stats), mimetype='application/json')
+
+
 if __name__ == '__main__':
-    app.run(port=port, debug=False, threaded=False, processes=1)
+    # only the batch scheduler runs the model of concurrent requests, the
+    # other modes run it in the request thread
+    app.run(port=port, debug=False, threaded=(mode == 'dynamic'), processes=1)
 
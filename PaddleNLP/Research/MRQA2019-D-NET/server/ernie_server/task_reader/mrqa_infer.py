@@ -19,10 +19,14 @@ import six
 import math
 import json
 import random
+import threading
 import collections
 import numpy as np
 from task_reader import tokenization
 from task_reader.batching import prepare_batch_data
+# the context cache is shared by the model servers, whose directory is
+# added to sys.path by start_service.py
+from context_cache import ContextCache
 
 
 class MRQAExample(object):
@@ -38,10 +42,12 @@ class MRQAExample(object):
                  orig_answer_text=None,
                  start_position=None,
                  end_position=None,
-                 is_impossible=False):
+                 is_impossible=False,
+                 context=None):
         self.qas_id = qas_id
         self.question_text = question_text
         self.doc_tokens = doc_tokens
+        self.context = context
         self.orig_answer_text = orig_answer_text
         self.start_position = start_position
         self.end_position = end_position
@@ -95,18 +101,14 @@ class InputFeatures(object):
         self.is_impossible = is_impossible
 
 
-def read_mrqa_examples(sample, is_training=False, with_negative=False):
-    """Read a MRQA json file into a list of MRQAExample."""
+def _split_doc_tokens(paragraph_text):
+    """Split the paragraph by whitespaces"""
 
     def is_whitespace(c):
         if c == " " or c == "\t" or c == "\r" or c == "\n" or ord(c) == 0x202F:
             return True
         return False
 
-    examples = []
-    # sample = json.loads(raw_sample)
-    paragraph_text = sample["context"]
-    paragraph_text = re.sub(r'\[TLE\]|\[DOC\]|\[PAR\]', '[SEP]', paragraph_text)
     doc_tokens = []
     char_to_word_offset = []
     prev_is_whitespace = True
@@ -120,6 +122,87 @@ def read_mrqa_examples(sample, is_training=False, with_negative=False):
                 doc_tokens[-1] += c
             prev_is_whitespace = False
         char_to_word_offset.append(len(doc_tokens) - 1)
+    return doc_tokens, char_to_word_offset
+
+
+class TokenizedContext(object):
+    """The tokenization of a context shared by its questions: the doc tokens,
+    their word pieces and ids, and the doc spans of the max_doc_spans most
+    recently used query lengths."""
+
+    # the doc spans of a query length hold about a bool per doc token, only a
+    # few are kept so that a cached context stays within a few times the
+    # tokens counted by the ContextCache
+    max_doc_spans = 4
+
+    def __init__(self, doc_tokens, tokenizer):
+        self.doc_tokens = doc_tokens
+        self.tok_to_orig_index = []
+        self.orig_to_tok_index = []
+        self.all_doc_tokens = []
+        for (i, token) in enumerate(doc_tokens):
+            self.orig_to_tok_index.append(len(self.all_doc_tokens))
+            sub_tokens = tokenizer.tokenize(token)
+            for sub_token in sub_tokens:
+                self.tok_to_orig_index.append(i)
+                self.all_doc_tokens.append(sub_token)
+        self.doc_ids = tokenizer.convert_tokens_to_ids(self.all_doc_tokens)
+        self._doc_spans = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def doc_spans(self, max_tokens_for_doc, doc_stride):
+        """The sliding window doc spans, and for every span whether its
+        tokens are at their max context"""
+        key = (max_tokens_for_doc, doc_stride)
+        with self._lock:
+            if key in self._doc_spans:
+                # move to the most recently used end
+                value = self._doc_spans.pop(key)
+                self._doc_spans[key] = value
+                return value
+        # We can have documents that are longer than the maximum sequence length.
+        # To deal with this we do a sliding window approach, where we take chunks
+        # of the up to our max length with a stride of `doc_stride`.
+        _DocSpan = collections.namedtuple(  # pylint: disable=invalid-name
+            "DocSpan", ["start", "length"])
+        doc_spans = []
+        start_offset = 0
+        while start_offset < len(self.all_doc_tokens):
+            length = len(self.all_doc_tokens) - start_offset
+            if length > max_tokens_for_doc:
+                length = max_tokens_for_doc
+            doc_spans.append(_DocSpan(start=start_offset, length=length))
+            if start_offset + length == len(self.all_doc_tokens):
+                break
+            start_offset += min(length, doc_stride)
+        is_max_context = [[
+            _check_is_max_context(doc_spans, doc_span_index, doc_span.start + i)
+            for i in range(doc_span.length)
+        ] for (doc_span_index, doc_span) in enumerate(doc_spans)]
+        with self._lock:
+            self._doc_spans[key] = (doc_spans, is_max_context)
+            while len(self._doc_spans) > self.max_doc_spans:
+                self._doc_spans.popitem(last=False)
+        return doc_spans, is_max_context
+
+
+def read_mrqa_examples(sample, is_training=False, with_negative=False, get_context=None):
+    """Read a MRQA json file into a list of MRQAExample.
+
+    get_context: returns the TokenizedContext of a paragraph text, e.g. from
+        a cache, otherwise the paragraph is tokenized with the questions
+    """
+
+    examples = []
+    # sample = json.loads(raw_sample)
+    paragraph_text = sample["context"]
+    paragraph_text = re.sub(r'\[TLE\]|\[DOC\]|\[PAR\]', '[SEP]', paragraph_text)
+    context = None
+    if get_context is not None:
+        context = get_context(paragraph_text)
+        doc_tokens = context.doc_tokens
+    else:
+        doc_tokens, _ = _split_doc_tokens(paragraph_text)
 
     for qa in sample["qas"]:
         qas_id = qa["qid"]
@@ -132,7 +215,8 @@ def read_mrqa_examples(sample, is_training=False, with_negative=False):
         example = MRQAExample(
             qas_id=qas_id,
             question_text=question_text,
-            doc_tokens=doc_tokens)
+            doc_tokens=doc_tokens,
+            context=context)
         examples.append(example)
 
     return examples
@@ -161,15 +245,12 @@ def convert_examples_to_features(
         if len(query_tokens) > max_query_length:
             query_tokens = query_tokens[0:max_query_length]
 
-        tok_to_orig_index = []
-        orig_to_tok_index = []
-        all_doc_tokens = []
-        for (i, token) in enumerate(example.doc_tokens):
-            orig_to_tok_index.append(len(all_doc_tokens))
-            sub_tokens = tokenizer.tokenize(token)
-            for sub_token in sub_tokens:
-                tok_to_orig_index.append(i)
-                all_doc_tokens.append(sub_token)
+        context = example.context
+        if context is None:
+            context = TokenizedContext(example.doc_tokens, tokenizer)
+        tok_to_orig_index = context.tok_to_orig_index
+        orig_to_tok_index = context.orig_to_tok_index
+        all_doc_tokens = context.all_doc_tokens
 
         tok_start_position = None
         tok_end_position = None
@@ -190,21 +271,9 @@ def convert_examples_to_features(
         # The -3 accounts for [CLS], [SEP] and [SEP]
         max_tokens_for_doc = max_seq_length - len(query_tokens) - 3
 
-        # We can have documents that are longer than the maximum sequence length.
-        # To deal with this we do a sliding window approach, where we take chunks
-        # of the up to our max length with a stride of `doc_stride`.
-        _DocSpan = collections.namedtuple(  # pylint: disable=invalid-name
-            "DocSpan", ["start", "length"])
-        doc_spans = []
-        start_offset = 0
-        while start_offset < len(all_doc_tokens):
-            length = len(all_doc_tokens) - start_offset
-            if length > max_tokens_for_doc:
-                length = max_tokens_for_doc
-            doc_spans.append(_DocSpan(start=start_offset, length=length))
-            if start_offset + length == len(all_doc_tokens):
-                break
-            start_offset += min(length, doc_stride)
+        doc_spans, is_max_context = context.doc_spans(max_tokens_for_doc, doc_stride)
+        query_ids = tokenizer.convert_tokens_to_ids(["[CLS]"] + query_tokens + ["[SEP]"])
+        sep_ids = tokenizer.convert_tokens_to_ids(["[SEP]"])
 
         for (doc_span_index, doc_span) in enumerate(doc_spans):
             tokens = []
@@ -224,15 +293,14 @@ def convert_examples_to_features(
                 token_to_orig_map[len(tokens)] = tok_to_orig_index[
                     split_token_index]
 
-                is_max_context = _check_is_max_context(
-                    doc_spans, doc_span_index, split_token_index)
-                token_is_max_context[len(tokens)] = is_max_context
+                token_is_max_context[len(tokens)] = is_max_context[doc_span_index][i]
                 tokens.append(all_doc_tokens[split_token_index])
                 segment_ids.append(1)
             tokens.append("[SEP]")
             segment_ids.append(1)
 
-            input_ids = tokenizer.convert_tokens_to_ids(tokens)
+            input_ids = query_ids + context.doc_ids[
+                doc_span.start:doc_span.start + doc_span.length] + sep_ids
 
             # The mask has 1 for real tokens and 0 for padding tokens. Only real
             # tokens are attended to.
@@ -524,9 +592,14 @@ def _check_is_max_context(doc_spans, cur_span_index, position):
 
 class DataProcessor(object):
     def __init__(self, vocab_path, do_lower_case, max_seq_length, in_tokens,
-                 doc_stride, max_query_length):
+                 doc_stride, max_query_length, context_cache_tokens=0):
         self._tokenizer = tokenization.FullTokenizer(
             vocab_file=vocab_path, do_lower_case=do_lower_case)
+        # tokenized contexts of at most context_cache_tokens tokens are
+        # cached for the following questions about them, 0 to disable
+        self.context_cache = None
+        if context_cache_tokens > 0:
+            self.context_cache = ContextCache(context_cache_tokens)
         self._max_seq_length = max_seq_length
         self._doc_stride = doc_stride
         self._max_query_length = max_query_length
@@ -573,6 +646,13 @@ class DataProcessor(object):
                                   self._max_seq_length, self._doc_stride, self._max_query_length, \
                                   remove_impossible_questions=True, filter_invalid_spans=True)
 
+    def _get_context(self, paragraph_text):
+        def build():
+            doc_tokens, _ = _split_doc_tokens(paragraph_text)
+            context = TokenizedContext(doc_tokens, self._tokenizer)
+            return context, len(context.all_doc_tokens)
+        return self.context_cache.get(paragraph_text, build)
+
     def get_features(self, examples, is_training, examples_start_id, features_start_id):
         features = convert_examples_to_features(
             examples=examples,
@@ -596,7 +676,9 @@ class DataProcessor(object):
                        epoch=1,
                        examples_start_id=0,
                        features_start_id=1000000000):
-        examples = read_mrqa_examples(raw_samples)
+        examples = read_mrqa_examples(
+            raw_samples,
+            get_context=self._get_context if self.context_cache is not None else None)
 
         def batch_reader(features, batch_size, in_tokens):
             batch, total_token_num, max_len = [], 0, 0
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Load test of the main server with local stub model servers, which answer
+after a random latency and sometimes much later. Reports the p50/p99
+latency of the former sequential queries of the model servers and of the
+concurrent queries of main_server.
+
+    python load_test.py --latency 0.05 0.08 0.06 --slow_prob 0.02 --timeout 0.5
+"""
+import json
+import time
+import random
+import argparse
+import threading
+import numpy as np
+import requests
+from werkzeug.serving import make_server
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+import main_server
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def stub_handler(latency, slow_prob, slow_latency):
+    """A model server answering n-best predictions of every question."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            length = int(self.headers['Content-Length'])
+            input_json = json.loads(self.rfile.read(length).decode('utf-8'))
+            if random.random() < slow_prob:
+                time.sleep(slow_latency)
+            else:
+                time.sleep(latency * random.uniform(0.5, 1.5))
+            results = {}
+            for qa in input_json['qas']:
+                probs = np.random.dirichlet(np.ones(5))
+                results[qa['qid']] = [{'text': 'answer {}'.format(k), 'probability': float(p)}
+                                      for k, p in enumerate(probs)]
+            body = json.dumps({'results': results}).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            try:
+                self.end_headers()
+                self.wfile.write(body)
+            except (IOError, OSError):
+                # the main server stopped waiting for a slow answer
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve(server):
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return 'http://127.0.0.1:{}'.format(server.server_port)
+
+
+def sequential_query(urls, input_json):
+    """The former main server, querying the model servers one after
+    another over new connections."""
+    nbests = [requests.post(url, json=input_json).json()['results'] for url in urls]
+    pred = {}
+    for qid in nbests[0]:
+        ensemble_nbest = main_server.ensemble_example([nbest[qid] for nbest in nbests])
+        pred[qid] = ensemble_nbest[0]['text']
+    return pred
+
+
+def run_load(query, contexts, num_requests, concurrency):
+    """Send num_requests by concurrency clients, returns the latencies."""
+    latencies = []
+    lock = threading.Lock()
+    counter = [0]
+
+    def client():
+        session = requests.Session()
+        while True:
+            with lock:
+                if counter[0] >= num_requests:
+                    return
+                i = counter[0]
+                counter[0] += 1
+            start = time.time()
+            query(session, contexts[i % len(contexts)])
+            with lock:
+                latencies.append(time.time() - start)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return np.array(latencies) * 1000
+
+
+def report(name, latencies):
+    print('{}: p50 {:.1f} ms, p99 {:.1f} ms, max {:.1f} ms'.format(
+        name, np.percentile(latencies, 50), np.percentile(latencies, 99), latencies.max()))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser('load test of the main server')
+    parser.add_argument('--dataset', default='client/demo.txt', help="Requests in MRQA format")
+    parser.add_argument('--latency', type=float, nargs='+', default=[0.05, 0.08, 0.06],
+                        help="Mean seconds of every stub model server")
+    parser.add_argument('--slow_prob', type=float, default=0.02,
+                        help="Probability that a model server answers after slow_latency")
+    parser.add_argument('--slow_latency', type=float, default=2.0)
+    parser.add_argument('--timeout', type=float, default=0.5, help="Timeout of the model servers")
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=4)
+    args = parser.parse_args()
+
+    contexts = []
+    with open(args.dataset) as f:
+        for line in f:
+            context = json.loads(line)
+            if 'header' not in context:
+                contexts.append(context)
+
+    urls = [serve(ThreadingHTTPServer(('127.0.0.1', 0),
+                                      stub_handler(latency, args.slow_prob, args.slow_latency)))
+            for latency in args.latency]
+    main_server.init_backends(urls, args.timeout, args.concurrency)
+    main_url = serve(make_server('127.0.0.1', 0, main_server.app, threaded=True))
+
+    latencies = run_load(lambda session, context: sequential_query(urls, context),
+                         contexts, args.requests, args.concurrency)
+    report('sequential', latencies)
+    latencies = run_load(lambda session, context: session.post(main_url, json=context).json(),
+                         contexts, args.requests, args.concurrency)
+    report('main_server', latencies)
+    main_server.pool.terminate()
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 import json
 import sys
+import time
 import logging
 logging.basicConfig(
     level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -12,12 +13,49 @@ from flask import Response
 from flask import request
 import numpy as np
 import argparse
+from multiprocessing import TimeoutError
 from multiprocessing.dummy import Pool as ThreadPool
 
 app = Flask(__name__)
 
 logger = logging.getLogger('flask')
 
+# model server urls, keep-alive sessions of the urls and the thread pool
+# querying them, which are shared by all requests, see init_backends
+urls = []
+sessions = {}
+pool = None
+timeout = 10.0
+
+
+def init_backends(model_urls, backend_timeout=10.0, pool_size=8):
+    """Create a keep-alive connection pool for every model server and the
+    threads querying them concurrently.
+
+    Args:
+        model_urls: urls of the model servers
+        backend_timeout: seconds to wait for the model servers of a
+            request, the results of the servers answering in time are
+            ensembled
+        pool_size: number of concurrent requests to every model server
+    """
+    global urls, pool, timeout
+    urls = list(model_urls)
+    timeout = backend_timeout
+    for url in urls:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size)
+        session.mount(url, adapter)
+        sessions[url] = session
+    pool = ThreadPool(len(urls) * pool_size)
+
+
+def _call_model(url, input_json):
+    response = sessions[url].post(url, json=input_json, timeout=timeout)
+    response.raise_for_status()
+    return response.json()['results']
+
 
 def ensemble_example(answers, n_models=None):
     if n_models is None:
@@ -45,20 +83,23 @@ def mrqa_main():
     """Description"""
     # parse input data
     pred = {}
-    def _call_model(url, input_json):
-        nbest = requests.post(url, json=input_json)
-        return nbest
     try:
         input_json = request.get_json(silent=True)
-        n_models = len(urls)
-        pool = ThreadPool(n_models)
-        results = []
-        for url in urls:
-            result = pool.apply_async(_call_model, (url, input_json))
-            results.append(result.get())
-        pool.close()
-        pool.join()
-        nbests = [nbest.json()['results'] for nbest in results]
+        # query all model servers at once, and wait for them until the
+        # deadline, the servers answering in time are ensembled
+        results = [pool.apply_async(_call_model, (url, input_json)) for url in urls]
+        deadline = time.time() + timeout
+        nbests = []
+        for url, result in zip(urls, results):
+            try:
+                nbests.append(result.get(max(deadline - time.time(), 0)))
+            except TimeoutError:
+                logger.warning('model server {} timed out'.format(url))
+            except Exception as e:
+                logger.warning('model server {} failed - {}'.format(url, e))
+        if len(nbests) == 0:
+            raise RuntimeError('no model server answered')
+        n_models = len(nbests)
         qids = list(nbests[0].keys())
         for qid in qids:
             ensemble_nbest = ensemble_example([nbest[qid] for nbest in nbests], n_models=n_models)
@@ -78,6 +119,10 @@ if __name__ == '__main__':
     parser.add_argument('--ernie', action='store_true', default=False, help="Include ERNIE")
     parser.add_argument('--xlnet', action='store_true', default=False, help="Include XL-NET")
     parser.add_argument('--bert', action='store_true', default=False, help="Include BERT")
+    parser.add_argument('--timeout', type=float, default=10.0,
+                        help="Seconds to wait for the model servers, the models answering in time are ensembled")
+    parser.add_argument('--pool_size', type=int, default=8,
+                        help="Number of concurrent requests to every model server")
     args = parser.parse_args()
     urls = []
     if args.ernie:
@@ -90,5 +135,6 @@ if __name__ == '__main__':
         print('Include BERT model')
         urls.append(url_3)
     assert len(urls) > 0, "At lease one model is required"
-    app.run(host='127.0.0.1', port=5121, debug=False, threaded=False, processes=1)
+    init_backends(urls, args.timeout, args.pool_size)
+    app.run(host='127.0.0.1', port=5121, debug=False, threaded=True, processes=1)
 
@@ -8,7 +8,6 @@ import time
 import numpy as np
 from flask import Response
 from flask import request
-from copy import deepcopy
 
 verbose = False
 
@@ -41,23 +40,30 @@ def _split_input_json(input_json):
     if len(input_json['qas']) == 1:
         return [input_json]
     else:
+        # the questions share the context and tokens of the input
         rets = []
-        for i in range(len(input_json['qas'])):
-            temp = deepcopy(input_json)
-            temp['qas'] = [input_json['qas'][i]]
+        for qa in input_json['qas']:
+            temp = dict(input_json)
+            temp['qas'] = [qa]
             rets.append(temp)
         return rets
-            
+
+
 class BasicMRCService(object):
     """Provide basic MRC service for flask"""
-    def __init__(self, name, logger=None, log_data=False):
-        """ """
+    def __init__(self, name, logger=None, log_data=False, batch_scheduler=None):
+        """
+        Args:
+            batch_scheduler: a BatchScheduler batching the features of
+                concurrent requests, otherwise every request calls the model
+        """
         self.name = name
         if logger is None:
             self.logger = logging.getLogger('flask')
         else:
             self.logger = logger
         self.log_data = log_data
+        self.batch_scheduler = batch_scheduler
 
     def __call__(self, model, process_mode='serial', max_batch_size=5, timmer=False):
         """
@@ -67,13 +73,13 @@ class BasicMRCService(object):
         if timmer:
             start = time.time()
         """Call mrc model wrapper and handle expectations"""
-        self.input_json = request.get_json(silent=True)
+        input_json = request.get_json(silent=True)
         try:
             if timmer:
                 start_request_check = time.time()
 
-            request_status = _request_check(self.input_json)
-            jsons = _split_input_json(self.input_json)
+            request_status = _request_check(input_json)
+            jsons = _split_input_json(input_json)
 
             if timmer:
                 current_time = time.time()
@@ -81,11 +87,11 @@ class BasicMRCService(object):
             if self.log_data:
                 if self.logger is None:
                     logging.info(
-                        'Client input - {}'.format(json.dumps(self.input_json, ensure_ascii=False))
+                        'Client input - {}'.format(json.dumps(input_json, ensure_ascii=False))
                     )
                 else:
                     self.logger.info(
-                        'Client input - {}'.format(json.dumps(self.input_json, ensure_ascii=False))
+                        'Client input - {}'.format(json.dumps(input_json, ensure_ascii=False))
                     )
         except Exception as e:
             self.logger.error('server request checker error')
@@ -94,7 +100,7 @@ class BasicMRCService(object):
         if request_status != 'OK':
             return _abort(400, request_status)
 
-        self.results = {}
+        all_results = {}
         for single_sample in jsons:
         # call preprocessor
             try:
@@ -128,7 +134,12 @@ class BasicMRCService(object):
                 if verbose:
                     if len(features) > max_batch_size:
                         print("get a too long example....")
-                if process_mode == 'serial':
+                if self.batch_scheduler is not None:
+                    # batched with the features of concurrent requests
+                    pendings = [self.batch_scheduler.submit(b) for b in batches]
+                    for pending in pendings:
+                        mrc_results.extend(pending.result())
+                elif process_mode == 'serial':
                     mrc_results = [model.call_mrc(b, squeeze_dim0=True) for b in batches[:max_batch_size]]
                 elif process_mode == 'parallel':
                     # only keep first max_batch_size features
@@ -159,10 +170,10 @@ class BasicMRCService(object):
                 results = model.postprocessor(example, features, mrc_results)
 
                 # only nbest results is POSTed back
-                self.results.update(results[1])
+                all_results.update(results[1])
 
-                # self.results = results[1]
-                # # self.results = results[0]
+                # all_results = results[1]
+                # # all_results = results[0]
 
                 if timmer:
                     current_time = time.time()
@@ -173,14 +184,14 @@ class BasicMRCService(object):
                 return _abort(500, 'postprocessor error - {}'.format(e))
         
 
-        return self._response_constructor()
+        return self._response_constructor(all_results)
 
-    def _response_constructor(self):
+    def _response_constructor(self, results):
         """construct http response object"""
         try:
             response = {
-                # 'requestID': self.input_json['requestID'],
-                'results': self.results
+                # 'requestID': input_json['requestID'],
+                'results': results
             }
             if self.log_data:
                 self.logger.info(
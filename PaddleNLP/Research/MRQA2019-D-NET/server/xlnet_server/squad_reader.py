@@ -26,6 +26,9 @@ import numpy as np
 
 sys.path.append('.')
 import squad_utils
+# the context cache is shared by the model servers, whose directory is
+# added to sys.path by serve.py
+from context_cache import ContextCache
 from data_utils import SEP_ID, CLS_ID, VOCAB_SIZE
 
 import sentencepiece as spm
@@ -167,15 +170,114 @@ def _convert_index(index, pos, M=None, is_start=True):
       return index[front]
 
 
+def _tokenize_paragraph(paragraph_text, sp_model, uncased):
+  """Tokenize the paragraph to sentence pieces and align the pieces with the
+  characters of the paragraph, None if they mismatch"""
+
+  para_tokens = encode_pieces(
+      sp_model,
+      preprocess_text(paragraph_text, lower=uncased))
+
+  chartok_to_tok_index = []
+  tok_start_to_chartok_index = []
+  tok_end_to_chartok_index = []
+  char_cnt = 0
+  for i, token in enumerate(para_tokens):
+    chartok_to_tok_index.extend([i] * len(token))
+    tok_start_to_chartok_index.append(char_cnt)
+    char_cnt += len(token)
+    tok_end_to_chartok_index.append(char_cnt - 1)
+
+  tok_cat_text = ''.join(para_tokens).replace(SPIECE_UNDERLINE, ' ')
+  N, M = len(paragraph_text), len(tok_cat_text)
+
+  f = np.zeros((max(N, 1), max(M, 1)), dtype=np.float32)
+  g = {}
+
+  def _lcs_match(max_dist):
+    f.fill(0)
+    g.clear()
+
+    ### longest common sub sequence
+    # f[i, j] = max(f[i - 1, j], f[i, j - 1], f[i - 1, j - 1] + match(i, j))
+    for i in range(N):
+
+      # note(zhiliny):
+      # unlike standard LCS, this is specifically optimized for the setting
+      # because the mismatch between sentence pieces and original text will
+      # be small
+      for j in range(i - max_dist, i + max_dist):
+        if j >= M or j < 0: continue
+
+        if i > 0:
+          g[(i, j)] = 0
+          f[i, j] = f[i - 1, j]
+
+        if j > 0 and f[i, j - 1] > f[i, j]:
+          g[(i, j)] = 1
+          f[i, j] = f[i, j - 1]
+
+        f_prev = f[i - 1, j - 1] if i > 0 and j > 0 else 0
+        if (preprocess_text(paragraph_text[i], lower=uncased,
+            remove_space=False)
+            == tok_cat_text[j]
+            and f_prev + 1 > f[i, j]):
+          g[(i, j)] = 2
+          f[i, j] = f_prev + 1
+
+  max_dist = abs(N - M) + 5
+  for _ in range(2):
+    _lcs_match(max_dist)
+    if f[N - 1, M - 1] > 0.8 * N: break
+    max_dist *= 2
+
+  orig_to_chartok_index = [None] * N
+  chartok_to_orig_index = [None] * M
+  i, j = N - 1, M - 1
+  while i >= 0 and j >= 0:
+    if (i, j) not in g: break
+    if g[(i, j)] == 2:
+      orig_to_chartok_index[i] = j
+      chartok_to_orig_index[j] = i
+      i, j = i - 1, j - 1
+    elif g[(i, j)] == 1:
+      j = j - 1
+    else:
+      i = i - 1
+
+  if all(v is None for v in orig_to_chartok_index) or f[N - 1, M - 1] < 0.8 * N:
+    return None
+
+  tok_start_to_orig_index = []
+  tok_end_to_orig_index = []
+  for i in range(len(para_tokens)):
+    start_chartok_pos = tok_start_to_chartok_index[i]
+    end_chartok_pos = tok_end_to_chartok_index[i]
+    start_orig_pos = _convert_index(chartok_to_orig_index, start_chartok_pos,
+                                    N, is_start=True)
+    end_orig_pos = _convert_index(chartok_to_orig_index, end_chartok_pos,
+                                  N, is_start=False)
+
+    tok_start_to_orig_index.append(start_orig_pos)
+    tok_end_to_orig_index.append(end_orig_pos)
+
+  def _piece_to_id(x):
+    if six.PY2 and isinstance(x, unicode):
+      x = x.encode('utf-8')
+    return sp_model.PieceToId(x)
+
+  all_doc_tokens = list(map(_piece_to_id, para_tokens))
+  return (all_doc_tokens, chartok_to_tok_index, orig_to_chartok_index,
+          tok_start_to_orig_index, tok_end_to_orig_index)
+
+
 def convert_examples_to_features(examples, sp_model, max_seq_length,
                                  doc_stride, max_query_length, is_training,
-                                 uncased):
+                                 uncased, context_cache=None):
   """Loads a data file into a list of `InputBatch`s."""
 
   cnt_pos, cnt_neg = 0, 0
   unique_id = 1000000000
-  max_N, max_M = 1024, 1024
-  f = np.zeros((max_N, max_M), dtype=np.float32)
 
   for (example_index, example) in enumerate(examples):
 
@@ -191,98 +293,21 @@ def convert_examples_to_features(examples, sp_model, max_seq_length,
       query_tokens = query_tokens[0:max_query_length]
 
     paragraph_text = example.paragraph_text
-    para_tokens = encode_pieces(
-        sp_model,
-        preprocess_text(example.paragraph_text, lower=uncased))
-
-    chartok_to_tok_index = []
-    tok_start_to_chartok_index = []
-    tok_end_to_chartok_index = []
-    char_cnt = 0
-    for i, token in enumerate(para_tokens):
-      chartok_to_tok_index.extend([i] * len(token))
-      tok_start_to_chartok_index.append(char_cnt)
-      char_cnt += len(token)
-      tok_end_to_chartok_index.append(char_cnt - 1)
-
-    tok_cat_text = ''.join(para_tokens).replace(SPIECE_UNDERLINE, ' ')
-    N, M = len(paragraph_text), len(tok_cat_text)
-
-    if N > max_N or M > max_M:
-      max_N = max(N, max_N)
-      max_M = max(M, max_M)
-      f = np.zeros((max_N, max_M), dtype=np.float32)
-      gc.collect()
-
-    g = {}
-
-    def _lcs_match(max_dist):
-      f.fill(0)
-      g.clear()
-
-      ### longest common sub sequence
-      # f[i, j] = max(f[i - 1, j], f[i, j - 1], f[i - 1, j - 1] + match(i, j))
-      for i in range(N):
-
-        # note(zhiliny):
-        # unlike standard LCS, this is specifically optimized for the setting
-        # because the mismatch between sentence pieces and original text will
-        # be small
-        for j in range(i - max_dist, i + max_dist):
-          if j >= M or j < 0: continue
-
-          if i > 0:
-            g[(i, j)] = 0
-            f[i, j] = f[i - 1, j]
-
-          if j > 0 and f[i, j - 1] > f[i, j]:
-            g[(i, j)] = 1
-            f[i, j] = f[i, j - 1]
-
-          f_prev = f[i - 1, j - 1] if i > 0 and j > 0 else 0
-          if (preprocess_text(paragraph_text[i], lower=uncased,
-              remove_space=False)
-              == tok_cat_text[j]
-              and f_prev + 1 > f[i, j]):
-            g[(i, j)] = 2
-            f[i, j] = f_prev + 1
-
-    max_dist = abs(N - M) + 5
-    for _ in range(2):
-      _lcs_match(max_dist)
-      if f[N - 1, M - 1] > 0.8 * N: break
-      max_dist *= 2
-
-    orig_to_chartok_index = [None] * N
-    chartok_to_orig_index = [None] * M
-    i, j = N - 1, M - 1
-    while i >= 0 and j >= 0:
-      if (i, j) not in g: break
-      if g[(i, j)] == 2:
-        orig_to_chartok_index[i] = j
-        chartok_to_orig_index[j] = i
-        i, j = i - 1, j - 1
-      elif g[(i, j)] == 1:
-        j = j - 1
-      else:
-        i = i - 1
 
-    if all(v is None for v in orig_to_chartok_index) or f[N - 1, M - 1] < 0.8 * N:
+    def _build():
+      paragraph = _tokenize_paragraph(paragraph_text, sp_model, uncased)
+      return paragraph, len(paragraph[0]) if paragraph is not None else 1
+
+    # the paragraph is tokenized and aligned once for all its questions
+    if context_cache is not None:
+      paragraph = context_cache.get(paragraph_text, _build)
+    else:
+      paragraph = _tokenize_paragraph(paragraph_text, sp_model, uncased)
+    if paragraph is None:
       print('MISMATCH DETECTED!')
       continue
-
-    tok_start_to_orig_index = []
-    tok_end_to_orig_index = []
-    for i in range(len(para_tokens)):
-      start_chartok_pos = tok_start_to_chartok_index[i]
-      end_chartok_pos = tok_end_to_chartok_index[i]
-      start_orig_pos = _convert_index(chartok_to_orig_index, start_chartok_pos,
-                                      N, is_start=True)
-      end_orig_pos = _convert_index(chartok_to_orig_index, end_chartok_pos,
-                                    N, is_start=False)
-
-      tok_start_to_orig_index.append(start_orig_pos)
-      tok_end_to_orig_index.append(end_orig_pos)
+    (all_doc_tokens, chartok_to_tok_index, orig_to_chartok_index,
+     tok_start_to_orig_index, tok_end_to_orig_index) = paragraph
 
     if not is_training:
       tok_start_position = tok_end_position = None
@@ -304,13 +329,6 @@ def convert_examples_to_features(examples, sp_model, max_seq_length,
       tok_end_position = chartok_to_tok_index[end_chartok_pos]
       assert tok_start_position <= tok_end_position
 
-    def _piece_to_id(x):
-      if six.PY2 and isinstance(x, unicode):
-        x = x.encode('utf-8')
-      return sp_model.PieceToId(x)
-
-    all_doc_tokens = list(map(_piece_to_id, para_tokens))
-
     # The -3 accounts for [CLS], [SEP] and [SEP]
     max_tokens_for_doc = max_seq_length - len(query_tokens) - 3
 
@@ -526,9 +544,14 @@ def _check_is_max_context(doc_spans, cur_span_index, position):
 
 class DataProcessor(object):
     def __init__(self, spiece_model_file, uncased, max_seq_length,
-                 doc_stride, max_query_length):
+                 doc_stride, max_query_length, context_cache_tokens=0):
         self._sp_model = spm.SentencePieceProcessor()
         self._sp_model.Load(spiece_model_file)
+        # tokenized paragraphs of at most context_cache_tokens tokens are
+        # cached for the following questions about them, 0 to disable
+        self.context_cache = None
+        if context_cache_tokens > 0:
+            self.context_cache = ContextCache(context_cache_tokens)
         self._uncased = uncased 
         self._max_seq_length = max_seq_length
         self._doc_stride = doc_stride
@@ -568,7 +591,8 @@ class DataProcessor(object):
             doc_stride=self._doc_stride,
             max_query_length=self._max_query_length,
             is_training=is_training,
-            uncased=self._uncased)
+            uncased=self._uncased,
+            context_cache=self.context_cache)
         return features
 
     def data_generator(self,
@@ -578,11 +602,12 @@ class DataProcessor(object):
                        shuffle=False,
                        dev_count=1,
                        epoch=1):
-        self.predict_examples = self.get_examples(
+        # local examples, the requests of a threaded server share the reader
+        examples = self.get_examples(
             sample,
             is_training=False)
-        examples = self.predict_examples
-        self.num_examples['predict'] = len(self.predict_examples)
+        self.predict_examples = examples
+        self.num_examples['predict'] = len(examples)
 
         def batch_reader(features, batch_size):
             batch = []
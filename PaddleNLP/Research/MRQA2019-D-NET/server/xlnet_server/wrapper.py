@@ -31,6 +31,8 @@ n_best_size = 20
 start_n_top = 5
 end_n_top = 5
 use_cuda = True
+# number of tokens of the contexts cached for the following questions
+context_cache_tokens = 2000000
 
 
 class BertModelWrapper():
@@ -57,7 +59,8 @@ class BertModelWrapper():
             uncased=do_lower_case,
             max_seq_length=max_seq_len,
             doc_stride=doc_stride,
-            max_query_length=max_query_length)
+            max_query_length=max_query_length,
+            context_cache_tokens=context_cache_tokens)
 
         self.inference_program, self.feed_target_names, self.fetch_targets = \
             fluid.io.load_inference_model(dirname=model_dir, executor=self.exe)
@@ -67,6 +70,12 @@ class BertModelWrapper():
         #     use_cuda=use_cuda,
         #     main_program=self.inference_program)
 
+    def context_cache_stats(self):
+        """Hit rate and size of the context cache"""
+        if self.processor.context_cache is None:
+            return {}
+        return self.processor.context_cache.stats()
+
     def preprocessor(self, samples, batch_size):
         """Preprocess the input samples, including word seg, padding, token to ids"""
         # Tokenization and paragraph padding